@@ -0,0 +1,389 @@
+"""
+本地的 Binance / CoinGecko / 飞书替身，给基准测试和集成测试用，不碰线上接口。
+
+提供监控脚本用到的全部接口，数据是按 symbol 确定性生成的（同样的参数每次结果一样）：
+
+    /fapi/v1/exchangeInfo  /fapi/v1/ticker/24hr  /fapi/v1/klines  /fapi/v1/premiumIndex  /fapi/v1/depth
+    /futures/data/openInterestHist  /futures/data/takerlongshortRatio
+    /api/v3/coins/list  /api/v3/simple/price            （CoinGecko）
+    POST /open-apis/bot/v2/hook/<任意>                   （飞书机器人）
+    GET /__stats                                          （请求数 / 字节数统计，不计入统计）
+
+可配置 symbol 数量、每个请求的延迟（固定 + 随机抖动）和错误率（按比例返回 5xx）。
+一部分 symbol 是「异动币」：启动前后几小时价格和 OI 每小时涨 ~15%，会命中默认告警规则。
+
+    server = FakeBinance(symbols=500, latency=0.02, error_rate=0.01)
+    server.start()                     # 后台线程；命令行方式见 main()
+    base = server.base_url             # http://127.0.0.1:<port>
+    ...
+    server.stop()
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+FEISHU_HOOK_PREFIX = "/open-apis/bot/v2/hook/"
+STATS_PATH = "/__stats"
+
+# 前几个用真实名字，其余是 SYMxxxx
+REAL_BASES = ["BTC", "ETH", "SOL", "BNB", "XRP", "DOGE", "ADA", "AVAX", "LINK", "DOT"]
+
+HOUR_MS = 3_600_000
+DAY_MS = 24 * HOUR_MS
+
+# 异动币每小时的涨幅（倍数），默认规则的 1H / 15m 条件都能命中
+MOVER_HOURLY_GAIN = 1.15
+
+_PERIOD_MS = {"m": 60_000, "h": HOUR_MS, "d": DAY_MS}
+
+
+def period_ms(text: str) -> int:
+    return int(text[:-1]) * _PERIOD_MS[text[-1]]
+
+
+class FakeMarket:
+    """确定性生成的行情：每个 symbol 的价格、OI 都是时间的函数。"""
+
+    def __init__(self, symbols: int = 200, *, seed: int = 7, movers: float = 0.02, anchor_ms: Optional[int] = None) -> None:
+        rng = np.random.default_rng(seed)
+        self.symbols: List[str] = [
+            (REAL_BASES[i] if i < len(REAL_BASES) else f"SYM{i:04d}") + "USDT" for i in range(symbols)
+        ]
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.anchor_ms = anchor_ms if anchor_ms is not None else int(time.time() * 1000)
+        self.base_price = 10 ** rng.uniform(-4, 4.5, symbols)
+        self.quote_volume = np.exp(rng.normal(math.log(2e7), 1.5, symbols))
+        self.oi_ratio = rng.uniform(0.1, 1.0, symbols)
+        self.mc_ratio = rng.uniform(5, 50, symbols)
+        self.phase = rng.uniform(0, 2 * math.pi, symbols)
+        self.funding = rng.normal(0.0001, 0.0003, symbols)
+        self.depth_skew = rng.uniform(0.5, 2.0, symbols)
+        self.mover = rng.random(symbols) < movers
+
+    # ---------- 序列 ----------
+
+    def _ramp(self, i: int, t_ms: float) -> float:
+        """异动币从 anchor 前 2 小时到 anchor 后 2 小时，价格和 OI 每小时复合上涨 15%。"""
+        if not self.mover[i]:
+            return 1.0
+        hours = min(max((t_ms - (self.anchor_ms - 2 * HOUR_MS)) / HOUR_MS, 0.0), 4.0)
+        return MOVER_HOURLY_GAIN ** hours
+
+    def price(self, i: int, t_ms: float) -> float:
+        wave = 1.0 + 0.01 * math.sin(2 * math.pi * t_ms / (3 * HOUR_MS) + self.phase[i])
+        return float(self.base_price[i] * wave * self._ramp(i, t_ms))
+
+    def oi_value(self, i: int, t_ms: float) -> float:
+        wave = 1.0 + 0.005 * math.cos(2 * math.pi * t_ms / (5 * HOUR_MS) + self.phase[i])
+        return float(self.quote_volume[i] * self.oi_ratio[i] * wave * self._ramp(i, t_ms))
+
+    def taker_ratio(self, i: int, t_ms: float) -> float:
+        return 1.0 + 0.2 * math.sin(2 * math.pi * t_ms / (2 * HOUR_MS) + self.phase[i])
+
+    # ---------- 接口 ----------
+
+    def exchange_info(self) -> Dict:
+        def entry(symbol: str, contract: str = "PERPETUAL", status: str = "TRADING") -> Dict:
+            return {
+                "symbol": symbol, "pair": symbol, "contractType": contract, "status": status,
+                "baseAsset": symbol[:-4], "quoteAsset": "USDT", "marginAsset": "USDT",
+                "pricePrecision": 4, "quantityPrecision": 1, "underlyingType": "COIN",
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "minPrice": "0.0001", "maxPrice": "1000000", "tickSize": "0.0001"},
+                    {"filterType": "LOT_SIZE", "minQty": "0.1", "maxQty": "10000000", "stepSize": "0.1"},
+                    {"filterType": "MARKET_LOT_SIZE", "minQty": "0.1", "maxQty": "1000000", "stepSize": "0.1"},
+                    {"filterType": "MAX_NUM_ORDERS", "limit": 200},
+                    {"filterType": "MIN_NOTIONAL", "notional": "5"},
+                    {"filterType": "PERCENT_PRICE", "multiplierUp": "1.05", "multiplierDown": "0.95"},
+                ],
+                "orderTypes": ["LIMIT", "MARKET", "STOP", "STOP_MARKET", "TAKE_PROFIT", "TRAILING_STOP_MARKET"],
+                "timeInForce": ["GTC", "IOC", "FOK", "GTX"],
+            }
+
+        items = [entry(s) for s in self.symbols]
+        items.append(entry("BTCUSDT_261225", contract="CURRENT_QUARTER"))
+        items.append(entry("OLDUSDT", status="SETTLING"))
+        return {"timezone": "UTC", "serverTime": int(time.time() * 1000), "symbols": items}
+
+    def ticker_24h(self, i: int, now: int) -> Dict:
+        last, prev = self.price(i, now), self.price(i, now - DAY_MS)
+        high, low = max(last, prev) * 1.02, min(last, prev) * 0.98
+        qv = float(self.quote_volume[i])
+        return {
+            "symbol": self.symbols[i], "priceChange": f"{last - prev:.8f}",
+            "priceChangePercent": f"{(last - prev) / prev * 100:.3f}", "weightedAvgPrice": f"{(last + prev) / 2:.8f}",
+            "lastPrice": f"{last:.8f}", "lastQty": "1", "openPrice": f"{prev:.8f}",
+            "highPrice": f"{high:.8f}", "lowPrice": f"{low:.8f}",
+            "volume": f"{qv / last:.2f}", "quoteVolume": f"{qv:.2f}",
+            "openTime": now - DAY_MS, "closeTime": now, "firstId": 1, "lastId": 100_000, "count": 100_000,
+        }
+
+    def klines(self, i: int, interval: str, limit: int, start: Optional[int], end: Optional[int], now: int) -> List:
+        step = period_ms(interval)
+        last_open = now - now % step
+        if start is not None:
+            first = start + (-start) % step
+        else:
+            first = (min(end, now) if end is not None else now)
+            first = first - first % step - (limit - 1) * step
+        rows = []
+        t = first
+        while t <= last_open and len(rows) < limit and (end is None or t <= end):
+            o, c = self.price(i, t), self.price(i, min(t + step, now))
+            qv = float(self.quote_volume[i]) * step / DAY_MS
+            rows.append([
+                t, f"{o:.8f}", f"{max(o, c) * 1.001:.8f}", f"{min(o, c) * 0.999:.8f}", f"{c:.8f}",
+                f"{qv / c:.2f}", t + step - 1, f"{qv:.2f}", 1000, f"{qv / c / 2:.2f}", f"{qv / 2:.2f}", "0",
+            ])
+            t += step
+        return rows
+
+    def _periodic(self, period: str, limit: int, start: Optional[int], end: Optional[int], now: int) -> List[int]:
+        step = period_ms(period)
+        latest = (min(end, now) if end is not None else now)
+        latest -= latest % step
+        if start is not None:
+            first = start + (-start) % step
+            times = list(range(first, latest + 1, step))[:limit]
+        else:
+            times = [latest - k * step for k in range(limit)][::-1]
+        return times
+
+    def oi_hist(self, i: int, period: str, limit: int, start: Optional[int], end: Optional[int], now: int) -> List:
+        out = []
+        for t in self._periodic(period, limit, start, end, now):
+            value = self.oi_value(i, t)
+            out.append({
+                "symbol": self.symbols[i], "sumOpenInterest": f"{value / self.price(i, t):.4f}",
+                "sumOpenInterestValue": f"{value:.4f}", "timestamp": t,
+            })
+        return out
+
+    def taker(self, i: int, period: str, limit: int, start: Optional[int], end: Optional[int], now: int) -> List:
+        out = []
+        for t in self._periodic(period, limit, start, end, now):
+            ratio = self.taker_ratio(i, t)
+            sell = float(self.quote_volume[i]) / 288 / 2
+            out.append({
+                "buySellRatio": f"{ratio:.4f}", "buyVol": f"{sell * ratio:.4f}", "sellVol": f"{sell:.4f}", "timestamp": t,
+            })
+        return out
+
+    def premium(self, i: int, now: int) -> Dict:
+        mark = self.price(i, now)
+        return {
+            "symbol": self.symbols[i], "markPrice": f"{mark:.8f}", "indexPrice": f"{mark * 0.9995:.8f}",
+            "estimatedSettlePrice": f"{mark:.8f}", "lastFundingRate": f"{self.funding[i]:.8f}",
+            "interestRate": "0.00010000", "nextFundingTime": now - now % (8 * HOUR_MS) + 8 * HOUR_MS, "time": now,
+        }
+
+    def depth(self, i: int, limit: int, now: int) -> Dict:
+        mid = self.price(i, now)
+        tick = mid * 1e-4
+        qty = float(self.quote_volume[i]) / mid / 10_000
+        skew = float(self.depth_skew[i])
+        bids = [[f"{mid - (k + 1) * tick:.8f}", f"{qty * skew * (1 + k % 7):.3f}"] for k in range(limit)]
+        asks = [[f"{mid + (k + 1) * tick:.8f}", f"{qty * (1 + k % 5):.3f}"] for k in range(limit)]
+        return {"lastUpdateId": now, "E": now, "T": now, "bids": bids, "asks": asks}
+
+    def coins_list(self) -> List[Dict]:
+        return [{"id": s[:-4].lower(), "symbol": s[:-4].lower(), "name": s[:-4].title()} for s in self.symbols]
+
+    def simple_price(self, ids: List[str], now: int) -> Dict:
+        out = {}
+        for cid in ids:
+            i = self.index.get(cid.upper() + "USDT")
+            if i is not None:
+                price = self.price(i, now)
+                out[cid] = {"usd": price, "usd_market_cap": float(self.quote_volume[i] * self.mc_ratio[i])}
+        return out
+
+
+class FakeBinance:
+    """ThreadingHTTPServer 包一层 FakeMarket，统计每个路径的请求数 / 响应字节数 / 注入的错误数。"""
+
+    def __init__(
+        self,
+        symbols: int = 200,
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        movers: float = 0.02,
+        seed: int = 7,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.market = FakeMarket(symbols, seed=seed, movers=movers)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.bytes_sent: Dict[str, int] = {}
+        self.errors = 0
+        self.feishu_messages: List[Dict] = []
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeBinance":
+        self._thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "bytes": dict(self.bytes_sent),
+                "errors": self.errors,
+                "feishu_messages": len(self.feishu_messages),
+            }
+
+    # ---------- 路由 ----------
+
+    def _inject_error(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def route(self, method: str, path: str, query: Dict[str, List[str]], body: bytes) -> Tuple[int, object]:
+        m = self.market
+        now = int(time.time() * 1000)
+
+        def arg(name: str, default: Optional[str] = None) -> Optional[str]:
+            return query.get(name, [default])[0]
+
+        def int_arg(name: str) -> Optional[int]:
+            value = arg(name)
+            return int(value) if value is not None else None
+
+        def symbol_index() -> Optional[int]:
+            return m.index.get(arg("symbol") or "")
+
+        if method == "POST" and path.startswith(FEISHU_HOOK_PREFIX):
+            with self._lock:
+                self.feishu_messages.append(json.loads(body or b"{}"))
+            return 200, {"code": 0, "msg": "success", "StatusCode": 0}
+        if path == "/fapi/v1/exchangeInfo":
+            return 200, m.exchange_info()
+        if path == "/fapi/v1/ticker/24hr":
+            if arg("symbol"):
+                i = symbol_index()
+                return (200, m.ticker_24h(i, now)) if i is not None else (400, {"code": -1121, "msg": "Invalid symbol."})
+            return 200, [m.ticker_24h(i, now) for i in range(len(m.symbols))]
+        if path == "/fapi/v1/premiumIndex":
+            if arg("symbol"):
+                i = symbol_index()
+                return (200, m.premium(i, now)) if i is not None else (400, {"code": -1121, "msg": "Invalid symbol."})
+            return 200, [m.premium(i, now) for i in range(len(m.symbols))]
+
+        # 以下接口都需要合法的 symbol
+        i = symbol_index()
+        if path in ("/fapi/v1/klines", "/fapi/v1/depth", "/futures/data/openInterestHist",
+                    "/futures/data/takerlongshortRatio") and i is None:
+            return 400, {"code": -1121, "msg": "Invalid symbol."}
+        if path == "/fapi/v1/klines":
+            limit = min(int(arg("limit", "500")), 1500)
+            return 200, m.klines(i, arg("interval", "5m"), limit, int_arg("startTime"), int_arg("endTime"), now)
+        if path == "/futures/data/openInterestHist":
+            limit = min(int(arg("limit", "30")), 500)
+            return 200, m.oi_hist(i, arg("period", "5m"), limit, int_arg("startTime"), int_arg("endTime"), now)
+        if path == "/futures/data/takerlongshortRatio":
+            limit = min(int(arg("limit", "30")), 500)
+            return 200, m.taker(i, arg("period", "5m"), limit, int_arg("startTime"), int_arg("endTime"), now)
+        if path == "/fapi/v1/depth":
+            return 200, m.depth(i, min(int(arg("limit", "500")), 1000), now)
+        if path == "/api/v3/coins/list":
+            return 200, m.coins_list()
+        if path == "/api/v3/simple/price":
+            return 200, m.simple_price((arg("ids") or "").split(","), now)
+        return 404, {"code": -1, "msg": f"unknown path {path}"}
+
+    def _handler(self):
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self, method: str) -> None:
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if parsed.path == STATS_PATH:
+                    self._reply(200, json.dumps(outer.stats()).encode())
+                    return
+                if outer.latency or outer.jitter:
+                    time.sleep(outer.latency + outer._rng.uniform(0, outer.jitter))
+                if outer._inject_error():
+                    payload = json.dumps({"code": -1001, "msg": "injected error"}).encode()
+                    status = outer.error_status
+                    with outer._lock:
+                        outer.errors += 1
+                else:
+                    status, data = outer.route(method, parsed.path, parse_qs(parsed.query), body)
+                    payload = json.dumps(data, separators=(",", ":")).encode()
+                with outer._lock:
+                    outer.requests[parsed.path] = outer.requests.get(parsed.path, 0) + 1
+                    outer.bytes_sent[parsed.path] = outer.bytes_sent.get(parsed.path, 0) + len(payload)
+                self._reply(status, payload)
+
+            def _reply(self, status: int, payload: bytes) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for Binance futures, CoinGecko and Feishu.")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="额外的随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server = FakeBinance(
+        args.symbols, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, error_status=args.error_status, port=args.port,
+    )
+    print(f"fake binance with {args.symbols} symbols on {server.base_url}")
+    server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+监控脚本的基准测试：对着本地假服务（bench/fake_binance.py）跑每个监控的前几轮，
+报告每轮耗时、请求数、解析的响应字节数、注入错误数、飞书消息数和内存峰值。
+
+    python -m bench.run_bench --symbols 500 --latency 0.02 --rounds 3
+    python -m bench.run_bench --monitors oi1 --symbols 2000 --error-rate 0.02 --json after.json --baseline before.json
+    python -m bench.run_bench --monitors oi1,oi,futures,hub   # 分别跑 vs 共享数据层（scripts/market_hub.py）
+
+- 假服务单独一个进程，每个监控也各自在一个新进程里跑（互不影响，RSS 峰值各算各的）；
+- 监控模块里所有 https://fapi.binance.com / CoinGecko / 飞书地址改成假服务，
+  缓存 / 快照文件放到临时目录；分层调度的刷新间隔全部置 0，每轮都是全量扫描；
+- 监控主循环末尾的 time.sleep 被换成「记一轮」再停 --gap 秒：第 1 轮包含启动（读合约列表、发启动消息），
+  MC 还没从后台拿到时 OI 监控的 mc > 0 规则会在 bulk 阶段全部筛掉；之后是稳态轮次（MC、增量序列缓存已经热了）。
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import multiprocessing
+import resource
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+from unittest.mock import patch
+
+import requests
+
+from bench.fake_binance import FEISHU_HOOK_PREFIX, STATS_PATH, FakeBinance
+
+MONITORS: Dict[str, str] = {
+    "oi1": "scripts.binance_features_oi_1",
+    "oi": "scripts.binance_features_OI",
+    "futures": "scripts.Binance_features_monitor",
+}
+
+BINANCE_PREFIX = "https://fapi.binance.com"
+COINGECKO_PREFIX = "https://api.coingecko.com"
+
+# 分层调度相关的模块常量：置 0 让每轮都拉全部 symbol
+ZERO_INTERVALS = ("FUTURES_POLL_INTERVAL", "WARM_INTERVAL", "COLD_INTERVAL", "PRICE_CHANGE_LOOKBACK")
+
+# 插件 setup 时会重新绑定的模块变量
+MODULE_STATE = ("series_store", "oi_store", "rule_set", "alert_state", "market_stream", "order_books")
+
+# --monitors hub：这几个监控作为插件跑在一个共享数据层上
+HUB_PLUGINS = ("oi1", "oi", "futures")
+
+
+class _BenchDone(Exception):
+    pass
+
+
+class _RoundClock:
+    """替换监控模块里的 time：sleep 时记录一轮的统计，跑够轮数后抛 _BenchDone 结束 main()。"""
+
+    def __init__(self, base_url: str, rounds: int, trace: bool, gap: float) -> None:
+        self.base_url = base_url
+        self.rounds = rounds
+        self.gap = gap
+        self.trace = trace
+        self.records: List[Dict] = []
+        self._started = time.perf_counter()
+        self._last = self._fetch_stats()
+
+    def __getattr__(self, name: str):
+        return getattr(time, name)
+
+    def _fetch_stats(self) -> Dict:
+        return requests.get(self.base_url + STATS_PATH, timeout=10).json()
+
+    def sleep(self, seconds: float) -> None:
+        now = time.perf_counter()
+        stats = self._fetch_stats()
+        requests_by_path = {
+            path: count - self._last["requests"].get(path, 0) for path, count in stats["requests"].items()
+        }
+        record = {
+            "round": len(self.records) + 1,
+            "wall_s": now - self._started,
+            "requests": sum(n for p, n in requests_by_path.items() if not p.startswith(FEISHU_HOOK_PREFIX)),
+            "bytes": sum(stats["bytes"].values()) - sum(self._last["bytes"].values()),
+            "errors": stats["errors"] - self._last["errors"],
+            "by_path": {p: n for p, n in requests_by_path.items() if n},
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+        if self.trace:
+            record["py_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.reset_peak()
+        self.records.append(record)
+        self._last = stats
+        if len(self.records) >= self.rounds:
+            raise _BenchDone()
+        # 轮间真的停一下（不计入耗时），让 MC / 合约列表这类后台刷新有机会完成
+        time.sleep(self.gap)
+        self._last = self._fetch_stats()
+        self._started = time.perf_counter()
+
+
+def patch_module(
+    stack: contextlib.ExitStack,
+    module,
+    name: str,
+    base_url: str,
+    workdir: str,
+    max_symbols: Optional[int] = None,
+) -> None:
+    """把监控模块里的线上地址、缓存 / 快照文件和分层间隔换成基准测试用的，stack 退出时恢复。"""
+    overrides: Dict[str, object] = {}
+    for attr, value in list(vars(module).items()):
+        if isinstance(value, str) and value.startswith(BINANCE_PREFIX):
+            overrides[attr] = base_url + value[len(BINANCE_PREFIX):]
+        elif isinstance(value, str) and value.startswith(COINGECKO_PREFIX):
+            overrides[attr] = base_url + value[len(COINGECKO_PREFIX):]
+    files = {
+        "FEISHU_WEBHOOK": f"{base_url}{FEISHU_HOOK_PREFIX}bench",
+        "UNIVERSE_CACHE_FILE": str(Path(workdir) / f"universe_{name}.json"),
+        "COINGECKO_INDEX_FILE": str(Path(workdir) / "coingecko_index.json"),
+        "SNAPSHOT_DIR": str(Path(workdir) / "snapshots" / name),
+        "ALERT_STATE_FILE": "",
+        "STREAM_MODE": False,
+        "ORDER_BOOK_MODE": False,
+        "METRICS_PORT": 0,
+    }
+    overrides.update({k: v for k, v in files.items() if hasattr(module, k)})
+    if hasattr(module, "TIER_INTERVALS"):
+        overrides["TIER_INTERVALS"] = {tier: 0 for tier in module.TIER_INTERVALS}
+    overrides.update({k: 0 for k in ZERO_INTERVALS if hasattr(module, k)})
+    # 插件 setup 会改写这些模块变量（共享序列缓存、规则、告警状态），结束后恢复
+    overrides.update({k: getattr(module, k) for k in MODULE_STATE if hasattr(module, k) and k not in overrides})
+    if max_symbols is not None:
+        overrides["MAX_SYMBOLS"] = max_symbols
+    for attr, value in overrides.items():
+        stack.enter_context(patch.object(module, attr, value))
+
+
+def _unthrottle(stack: contextlib.ExitStack) -> None:
+    import scripts.binance_http as binance_http
+
+    for limiter in (binance_http.fapi_limiter, binance_http.futures_data_limiter):
+        stack.enter_context(patch.object(limiter, "budget", 10**9))
+
+
+def bench_monitor(
+    name: str,
+    base_url: str,
+    *,
+    rounds: int = 3,
+    gap: float = 1.0,
+    workdir: Optional[str] = None,
+    max_symbols: Optional[int] = None,
+    unthrottled: bool = False,
+    trace: bool = False,
+    quiet: bool = True,
+) -> List[Dict]:
+    """在当前进程里跑一个监控的前 rounds 轮，返回每轮的统计。模块常量用 patch 改，结束后恢复。"""
+    out = io.StringIO() if quiet else None
+    workdir = workdir or tempfile.mkdtemp(prefix="bench-")
+    with contextlib.ExitStack() as stack:
+        if out is not None:
+            stack.enter_context(contextlib.redirect_stdout(out))
+        module = importlib.import_module(MONITORS[name])
+        patch_module(stack, module, name, base_url, workdir, max_symbols)
+        if unthrottled:
+            _unthrottle(stack)
+        if trace:
+            tracemalloc.start()
+            stack.callback(tracemalloc.stop)
+        clock = _RoundClock(base_url, rounds, trace, gap)
+        stack.enter_context(patch.object(module, "time", clock))
+        try:
+            module.main()
+        except _BenchDone:
+            pass
+    return clock.records
+
+
+def bench_hub(
+    base_url: str,
+    *,
+    plugins: Sequence[str] = HUB_PLUGINS,
+    rounds: int = 3,
+    gap: float = 1.0,
+    workdir: Optional[str] = None,
+    max_symbols: Optional[int] = None,
+    unthrottled: bool = False,
+    trace: bool = False,
+    quiet: bool = True,
+) -> List[Dict]:
+    """
+    几个监控作为插件跑在同一个 MarketHub 上（scripts/market_hub.py），每轮所有插件各跑一次；
+    和分别跑 bench_monitor 的请求数加起来比，就是共享数据层省下的部分。
+    """
+    from scripts import market_hub
+    from scripts.universe import UniverseManager
+
+    out = io.StringIO() if quiet else None
+    workdir = workdir or tempfile.mkdtemp(prefix="bench-")
+    with contextlib.ExitStack() as stack:
+        if out is not None:
+            stack.enter_context(contextlib.redirect_stdout(out))
+        instances = []
+        for name in plugins:
+            module = importlib.import_module(MONITORS[name])
+            patch_module(stack, module, name, base_url, workdir, max_symbols)
+            instances.append(market_hub.load_plugin(name))
+        stack.enter_context(patch.object(market_hub, "FAPI_EXCHANGE_INFO", base_url + "/fapi/v1/exchangeInfo"))
+        if unthrottled:
+            _unthrottle(stack)
+        if trace:
+            tracemalloc.start()
+            stack.callback(tracemalloc.stop)
+
+        clock = _RoundClock(base_url, rounds, trace, gap)
+        universe = UniverseManager(market_hub.fetch_usdt_perpetuals, cache_path=str(Path(workdir) / "universe_hub.json"))
+        hub = market_hub.MarketHub(universe)
+        hub.start()
+        for plugin in instances:
+            plugin.setup(hub)
+        try:
+            while True:
+                for plugin in instances:
+                    plugin.run_round(hub.snapshot())
+                # 真实运行时两轮隔着轮询间隔，共享的数据早就过期了
+                hub.clear()
+                clock.sleep(0)
+        except _BenchDone:
+            pass
+        finally:
+            universe.stop()
+    return clock.records
+
+
+def _child(name: str, base_url: str, options: Dict, results: "multiprocessing.Queue") -> None:
+    try:
+        if name == "hub":
+            records = bench_hub(base_url, **options)
+        else:
+            records = bench_monitor(name, base_url, **options)
+        # 飞书是后台异步发送，结束前等队列清空再读消息数
+        from scripts.feishu_notifier import get_notifier
+
+        get_notifier(f"{base_url}{FEISHU_HOOK_PREFIX}bench").flush(5)
+        feishu = requests.get(base_url + STATS_PATH, timeout=10).json()["feishu_messages"]
+        results.put({"monitor": name, "rounds": records, "feishu_messages": feishu})
+    except Exception as exc:  # noqa: BLE001
+        results.put({"monitor": name, "error": f"{type(exc).__name__}: {exc}"})
+
+
+def _serve(options: Dict, ready: "multiprocessing.Queue") -> None:
+    server = FakeBinance(**options)
+    ready.put(server.base_url)
+    server.server.serve_forever(poll_interval=0.05)
+
+
+def run(
+    monitors: Sequence[str],
+    *,
+    server_options: Dict,
+    bench_options: Dict,
+    timeout: float = 900.0,
+) -> List[Dict]:
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    server = ctx.Process(target=_serve, args=(server_options, ready), daemon=True)
+    server.start()
+    results: List[Dict] = []
+    try:
+        base_url = ready.get(timeout=30)
+        for name in monitors:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_child, args=(name, base_url, bench_options, queue))
+            proc.start()
+            try:
+                results.append(queue.get(timeout=timeout))
+            finally:
+                proc.join(10)
+                if proc.is_alive():
+                    proc.terminate()
+    finally:
+        server.terminate()
+        server.join(5)
+    return results
+
+
+def print_report(results: Sequence[Dict], baseline: Optional[Sequence[Dict]] = None) -> None:
+    base = {
+        (r["monitor"], rec["round"]): rec for r in (baseline or []) for rec in r.get("rounds", [])
+    }
+    print(f"{'monitor':8} {'round':>5} {'wall_s':>8} {'requests':>8} {'KB':>9} {'errors':>6} {'rss_MB':>7} {'py_MB':>6}  vs baseline")
+    for result in results:
+        if "error" in result:
+            print(f"{result['monitor']:8} failed: {result['error']}")
+            continue
+        for rec in result["rounds"]:
+            diff = ""
+            old = base.get((result["monitor"], rec["round"]))
+            if old:
+                diff = (
+                    f"wall {(rec['wall_s'] / old['wall_s'] - 1) * 100:+.0f}% "
+                    f"req {rec['requests'] - old['requests']:+d}"
+                )
+            py_mb = f"{rec['py_peak_mb']:6.1f}" if "py_peak_mb" in rec else f"{'-':>6}"
+            print(
+                f"{result['monitor']:8} {rec['round']:>5} {rec['wall_s']:8.2f} {rec['requests']:8d} "
+                f"{rec['bytes'] / 1024:9.1f} {rec['errors']:6d} {rec['peak_rss_mb']:7.1f} {py_mb}  {diff}"
+            )
+        print(f"{'':8} feishu messages: {result['feishu_messages']}; last round by path: {result['rounds'][-1]['by_path']}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark monitor scan rounds against a local fake Binance.")
+    parser.add_argument(
+        "--monitors", default=",".join(MONITORS),
+        help=f"逗号分隔，可选 {', '.join(MONITORS)}；hub = {'+'.join(HUB_PLUGINS)} 跑在一个共享数据层上",
+    )
+    parser.add_argument("--symbols", type=int, default=500, help="假服务上的 USDT 永续数量（100–2000）")
+    parser.add_argument("--latency", type=float, default=0.02, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.01, help="额外随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="按比例返回 5xx")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--gap", type=float, default=1.0, help="轮间间隔（秒，不计入耗时）")
+    parser.add_argument("--max-symbols", type=int, help="覆盖监控的 MAX_SYMBOLS")
+    parser.add_argument("--unthrottled", action="store_true", help="放开本地权重限流，只测扫描本身")
+    parser.add_argument("--trace", action="store_true", help="用 tracemalloc 统计每轮 Python 堆峰值（会变慢）")
+    parser.add_argument("--json", help="结果写成 JSON，之后可以当 --baseline")
+    parser.add_argument("--baseline", help="之前 --json 的结果，打印对比")
+    args = parser.parse_args(argv)
+
+    monitors = [m for m in args.monitors.split(",") if m]
+    unknown = set(monitors) - set(MONITORS) - {"hub"}
+    if unknown:
+        parser.error(f"unknown monitors: {sorted(unknown)}")
+    results = run(
+        monitors,
+        server_options={
+            "symbols": args.symbols, "latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate,
+        },
+        bench_options={
+            "rounds": args.rounds, "gap": args.gap, "max_symbols": args.max_symbols,
+            "unthrottled": args.unthrottled, "trace": args.trace,
+        },
+    )
+    baseline = None
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    print(
+        f"{args.symbols} symbols, latency {args.latency}s + {args.jitter}s jitter, error rate {args.error_rate:.1%}"
+    )
+    print_report(results, baseline)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=1), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
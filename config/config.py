@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
 import os
+from pathlib import Path
 
 # 读取 .env
 load_dotenv()
@@ -8,31 +9,117 @@ load_dotenv()
 FEISHU_WEBHOOK = os.getenv("FEISHU_WEBHOOK")
 FEISHU_KEYWORD = os.getenv("FEISHU_KEYWORD_btc", "BTC")
 
+# 飞书后台发送队列长度和失败重试次数
+FEISHU_QUEUE_SIZE = int(os.getenv("FEISHU_QUEUE_SIZE", "200"))
+FEISHU_MAX_RETRIES = int(os.getenv("FEISHU_MAX_RETRIES", "3"))
+
 # 现货价格监控配置
 SYMBOL = "BTCUSDT"
 API_URL = "https://api.binance.com/api/v3/ticker/price"
 POLL_INTERVAL = 5
 ALERT_CHANGE_PCT = 1
+# 监控列表：逗号分隔，symbol 后面可以跟「:阈值%」，不写用 ALERT_CHANGE_PCT，例如 BTCUSDT:1,ETHUSDT:1.5,SOLUSDT:3
+# 整个列表每轮只发一次 ticker/price 请求（不带参数拉全市场再本地过滤，权重 4，和 symbol 数无关；
+# 拼错 / 下架的 symbol 只提示一次并跳过，不影响列表里其他 symbol）
+SPOT_WATCHLIST = os.getenv("SPOT_WATCHLIST", SYMBOL)
+# 窗口内急拉急跌（scripts/rolling_window.py）：「窗口:阈值%」，窗口内最高和最低相差超过阈值就报，留空不检测
+SPOT_SWING_WINDOWS = os.getenv("SPOT_SWING_WINDOWS", "1m:0.5,5m:1,15m:2")
+# 同一 (symbol, 窗口) 冷却期内只报一次，振幅再放大 SWING_ESCALATION_PCT% 才再报
+SWING_COOLDOWN_SECONDS = float(os.getenv("SWING_COOLDOWN_SECONDS", "900"))
+SWING_ESCALATION_PCT = float(os.getenv("SWING_ESCALATION_PCT", "50"))
 
 # 永续合约监控配置
 FAPI_BASE_URL = "https://fapi.binance.com"
 FAPI_EXCHANGE_INFO = f"{FAPI_BASE_URL}/fapi/v1/exchangeInfo"
 FAPI_PREMIUM_INDEX = f"{FAPI_BASE_URL}/fapi/v1/premiumIndex"
+FAPI_TICKER_24H = f"{FAPI_BASE_URL}/fapi/v1/ticker/24hr"
 FAPI_OI_HISTORY = f"{FAPI_BASE_URL}/futures/data/openInterestHist"
 FAPI_TAKER_RATIO = f"{FAPI_BASE_URL}/futures/data/takerlongshortRatio"
 FAPI_DEPTH = f"{FAPI_BASE_URL}/fapi/v1/depth"
 
+# Binance 每分钟权重上限（按 IP 统计），以及实际只用到上限的比例
+FAPI_WEIGHT_LIMIT_1M = int(os.getenv("FAPI_WEIGHT_LIMIT_1M", "2400"))
+SPOT_WEIGHT_LIMIT_1M = int(os.getenv("SPOT_WEIGHT_LIMIT_1M", "6000"))
+FUTURES_DATA_LIMIT_5M = int(os.getenv("FUTURES_DATA_LIMIT_5M", "1000"))  # /futures/data/* 每 5 分钟次数
+WEIGHT_SAFETY_RATIO = float(os.getenv("WEIGHT_SAFETY_RATIO", "0.9"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))  # 429/418/5xx 的重试次数
+
+# /futures/data/* 响应按周期边界缓存，grace 为边界后等待 Binance 出新数据的秒数
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "1") == "1"
+HTTP_CACHE_GRACE_SECONDS = float(os.getenv("HTTP_CACHE_GRACE_SECONDS", "15"))
+
 # 监控节奏
 FUTURES_POLL_INTERVAL = int(os.getenv("FUTURES_POLL_INTERVAL", "60"))
-MAX_SYMBOLS = int(os.getenv("MAX_SYMBOLS", "40"))  # 防止过多请求，可按需调整
+MAX_SYMBOLS = int(os.getenv("MAX_SYMBOLS", "40"))  # 按 24H 成交额 / 振幅排名后取前 N 个，防止过多请求
+# 分层调度：排名前 HOT_TIER_SIZE 个每轮都拉，其次 WARM_TIER_SIZE 个按 WARM_INTERVAL，其余按 COLD_INTERVAL（秒）
+HOT_TIER_SIZE = int(os.getenv("HOT_TIER_SIZE", "10"))
+WARM_TIER_SIZE = int(os.getenv("WARM_TIER_SIZE", "15"))
+WARM_INTERVAL = float(os.getenv("WARM_INTERVAL", "180"))
+COLD_INTERVAL = float(os.getenv("COLD_INTERVAL", "600"))
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "10"))  # 单轮并发拉取的线程数
+
+# 合约列表缓存文件和后台刷新间隔（秒），新上线 / 下架的合约不用重启
+UNIVERSE_CACHE_FILE = os.getenv(
+    "UNIVERSE_CACHE_FILE_fu", str(Path(__file__).resolve().parent.parent / "data" / "universe_fu.json")
+)
+UNIVERSE_REFRESH_SECONDS = float(os.getenv("UNIVERSE_REFRESH_SECONDS", "3600"))
+
+# 每轮指标快照目录（按天分区的列式文件，见 scripts/recorder.py），默认留空不记录；
+# 打开后分区不会自动清理，比如设成 data/snapshots/fu，按需自己删旧日期
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR_fu", "")
+
+# 本地 /metrics 端点（Prometheus 文本格式，见 scripts/metrics.py）的端口，0 = 不开
+METRICS_PORT = int(os.getenv("METRICS_PORT_fu", "9108"))
+
+# 共享数据层（scripts/market_hub.py）：一个进程里跑多个监控，全市场数据每轮只拉一次
+HUB_PLUGINS = os.getenv("HUB_PLUGINS", "oi1,oi,futures,btc")
+# 同一个全市场数据源 HUB_MAX_AGE 秒内复用（对齐到同一时刻开始的几个监控共用一份）
+HUB_MAX_AGE = float(os.getenv("HUB_MAX_AGE", "5"))
+HUB_UNIVERSE_CACHE_FILE = os.getenv(
+    "UNIVERSE_CACHE_FILE_hub", str(Path(__file__).resolve().parent.parent / "data" / "universe_hub.json")
+)
+HUB_METRICS_PORT = int(os.getenv("METRICS_PORT_hub", "9110"))
+
+# 分片（scripts/sharding.py）：协调进程按一致性哈希把 symbol 分给多个 worker 拉取
+# 协调进程监听 SHARD_ADDRESS，worker 连到同一个地址；跨机器时协调进程填 0.0.0.0:端口，worker 填协调进程的 IP
+SHARD_ADDRESS = os.getenv("SHARD_ADDRESS", "127.0.0.1:9120")
+SHARD_AUTHKEY = os.getenv("SHARD_AUTHKEY", "")  # 连接握手的共享密钥，协调进程和 worker 必须一致，不能留空
+SHARD_REPLICAS = int(os.getenv("SHARD_REPLICAS", "64"))  # 每个 worker 在哈希环上的虚拟节点数
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "45"))  # 等 worker 回报一轮结果的秒数，超时视为离开
+SHARD_METRICS_PORT = int(os.getenv("METRICS_PORT_shard", "9111"))
 
 # 告警阈值
 OI_CHANGE_PCT = float(os.getenv("OI_CHANGE_PCT", "10"))  # 5-15 分钟 OI 上涨幅度阈值
 PRICE_CHANGE_PCT = float(os.getenv("PRICE_CHANGE_PCT", "10"))  # 价格短时涨跌幅
+# 价格涨跌幅的回看秒数：和 PRICE_CHANGE_LOOKBACK 秒前的全市场标记价格比，不受 hot / warm / cold 拉取间隔影响
+PRICE_CHANGE_LOOKBACK = float(os.getenv("PRICE_CHANGE_LOOKBACK", str(FUTURES_POLL_INTERVAL)))
 DEPTH_IMBALANCE_RATIO = float(os.getenv("DEPTH_IMBALANCE_RATIO", "1.5"))  # 买卖盘深度差
 FUNDING_HIGH = float(os.getenv("FUNDING_HIGH", "0.01"))  # 0.1%
 FUNDING_WATCH = float(os.getenv("FUNDING_WATCH", "0.05"))  # 0.05%
 TAKER_RATIO_TREND = float(os.getenv("TAKER_RATIO_TREND", "0.5"))  # 多空比变化
+# 标记价格的窗口内振幅（每轮一个点，窗口要比 FUTURES_POLL_INTERVAL 长几倍），冷却沿用 ALERT_COOLDOWN_SECONDS
+FUTURES_SWING_WINDOWS = os.getenv("FUTURES_SWING_WINDOWS", "5m:3,15m:5")
+
+# 告警去重 / 冷却：同一 (symbol, 信号) 冷却期内只报一次，指标再放大 ALERT_ESCALATION_PCT% 才升级再报
+ALERT_COOLDOWN_SECONDS = float(os.getenv("ALERT_COOLDOWN_SECONDS", "1800"))
+ALERT_ESCALATION_PCT = float(os.getenv("ALERT_ESCALATION_PCT", "50"))
+ALERT_STATE_TTL = float(os.getenv("ALERT_STATE_TTL", "7200"))  # 条件消失多久后清掉状态
+ALERT_STATE_FILE = os.getenv("ALERT_STATE_FILE_fu", "")  # 留空只放内存
+
+# WebSocket 流式模式：STREAM_MODE=1 时标记价格 / funding 走 !markPrice@arr@1s 推送
+FSTREAM_BASE = "wss://fstream.binance.com"
+STREAM_MODE = os.getenv("STREAM_MODE", "0") == "1"
+# 推送超过这么多秒没更新的 symbol 不用（断线 / 推送卡住），整张表都过期时回退到 REST，默认两个轮询周期
+STREAM_MAX_AGE = float(os.getenv("STREAM_MAX_AGE", str(2 * FUTURES_POLL_INTERVAL)))
+
+# 本地订单簿（scripts/order_book.py）：ORDER_BOOK_MODE=1 时盘口买卖比读 @depth 增量流维护的订单簿，
+# 每个 symbol 只拉一次快照，不再每轮拉深度；还没同步好的 symbol 仍然走 REST
+ORDER_BOOK_MODE = os.getenv("ORDER_BOOK_MODE", "0") == "1"
+ORDER_BOOK_LEVELS = int(os.getenv("ORDER_BOOK_LEVELS", "50"))  # 买卖比统计前多少档（和 REST limit=50 同口径）
+# 快照要比统计档数深得多：价格走出快照覆盖的区间后本地簿会缺档，这时自动重拉快照
+ORDER_BOOK_SNAPSHOT_LIMIT = int(os.getenv("ORDER_BOOK_SNAPSHOT_LIMIT", "1000"))  # 快照档数（权重 20）
+ORDER_BOOK_MAX_LEVELS = int(os.getenv("ORDER_BOOK_MAX_LEVELS", "5000"))  # 本地每一侧最多保留的档数
+ORDER_BOOK_SPEED = os.getenv("ORDER_BOOK_SPEED", "100ms")  # 深度流推送间隔：100ms / 250ms / 500ms
 
 # Feishu 关键字用于永续监控
 FUTURES_KEYWORD = os.getenv("FUTURES_KEYWORD_fu", "Binance Futures")
\ No newline at end of file
@@ -5,6 +5,7 @@ Binance 永续合约 1H 异动监控配置
 """
 
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
 # 读取 .env
@@ -34,6 +35,9 @@ POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "300"))  # 默认 5 分钟跑一
 # 最多监控多少个 USDT 永续（想全市场就给个大数即可）
 MAX_SYMBOLS = int(os.getenv("MAX_SYMBOLS", "9999"))
 
+# 单轮并发拉取的线程数（不要超过脚本里连接池的 pool_maxsize=50）
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "20"))
+
 # 价格 1 小时变化阈值（百分比，取绝对值）
 PRICE_CHANGE_1H_PCT = float(os.getenv("PRICE_CHANGE_1H_PCT", "11.0"))
 
@@ -48,8 +52,67 @@ OI_POINTS = int(os.getenv("OI_POINTS", "13"))
 # 过滤太小的 24H 交易额（单位：USD），避免空气币乱报
 MIN_NOTIONAL_24H = float(os.getenv("MIN_NOTIONAL_24H", "1000000"))  # 比如 "1000000" 过滤日成交 < 100w 的
 
+# ---------- 合约列表（universe） ----------
+
+# 过滤后的永续合约列表缓存在本地，启动直接读；后台每 UNIVERSE_REFRESH_SECONDS 秒刷新一次，
+# 新上线 / 下架的合约不用重启就会加入 / 移出扫描
+UNIVERSE_CACHE_FILE = os.getenv(
+    "UNIVERSE_CACHE_FILE_oi", str(Path(__file__).resolve().parent.parent / "data" / "universe_oi.json")
+)
+UNIVERSE_REFRESH_SECONDS = float(os.getenv("UNIVERSE_REFRESH_SECONDS", "3600"))
+
+# CoinGecko ticker -> coin id 索引缓存（/coins/list 解析结果 + 已确认的 symbol 映射）
+COINGECKO_INDEX_FILE = os.getenv(
+    "COINGECKO_INDEX_FILE", str(Path(__file__).resolve().parent.parent / "data" / "coingecko_index.json")
+)
+
+# 每轮指标快照目录（按天分区的列式文件，见 scripts/recorder.py），默认留空不记录；
+# 打开后分区不会自动清理，比如设成 data/snapshots/oi，按需自己删旧日期
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR_oi", "")
+
+# 本地 /metrics 端点（Prometheus 文本格式，见 scripts/metrics.py）的端口，0 = 不开
+METRICS_PORT = int(os.getenv("METRICS_PORT_oi", "9109"))
+
+# ---------- WebSocket 流式模式 ----------
+
+FSTREAM_BASE = "wss://fstream.binance.com"
+
+# STREAM_MODE=1 时价格 / 24H ticker 走 WebSocket 推送，REST 只拉 OI
+STREAM_MODE = os.getenv("STREAM_MODE", "0") == "1"
+
+# 流式模式下条件判断的间隔（秒），价格是实时的，可以比 POLL_INTERVAL 短很多
+STREAM_POLL_INTERVAL = int(os.getenv("STREAM_POLL_INTERVAL", "10"))
+
+# 推送超过这么多秒没更新的 symbol 不用（断线 / 推送卡住），整张表都过期时回退到 REST，默认两个判断周期
+STREAM_MAX_AGE = float(os.getenv("STREAM_MAX_AGE", str(2 * STREAM_POLL_INTERVAL)))
+
+
+# ---------- 告警规则 ----------
+
+# 规则文件（JSON，语法见 scripts/rules.py），默认放在 config/config.json 旁边；
+# 文件不存在时用 binance_features_oi_1.py 里按阈值常量生成的默认规则
+RULES_FILE = os.getenv("RULES_FILE", str(Path(__file__).resolve().parent / "rules.json"))
+
+
+# ---------- 告警去重 / 冷却 ----------
+
+# 同一个 (symbol, 规则) 冷却时间（秒）内只告警一次
+ALERT_COOLDOWN_SECONDS = float(os.getenv("ALERT_COOLDOWN_SECONDS", "1800"))
+# 冷却期内指标比上次告警再放大多少（%）才升级再报，0 = 冷却期内不再报
+ALERT_ESCALATION_PCT = float(os.getenv("ALERT_ESCALATION_PCT", "50"))
+# 条件消失超过多少秒后清掉状态（下次命中按新告警处理）
+ALERT_STATE_TTL = float(os.getenv("ALERT_STATE_TTL", "7200"))
+# 状态持久化文件，留空只放内存（重启后冷却状态丢失）
+ALERT_STATE_FILE = os.getenv("ALERT_STATE_FILE_oi", "")
+# 窗口内急拉急跌（scripts/rolling_window.py）：过了成交额过滤的 symbol 每轮用 24H ticker 最新价记一个点，
+# 「窗口:阈值%」，窗口要比轮询间隔长几倍；冷却沿用 ALERT_COOLDOWN_SECONDS，留空不检测
+OI_SWING_WINDOWS = os.getenv("OI_SWING_WINDOWS", "15m:5,1h:10")
+
 
 # ---------- 飞书配置 ----------
 
 FEISHU_WEBHOOK = os.getenv("FEISHU_WEBHOOK")
-FEISHU_KEYWORD = os.getenv("FEISHU_KEYWORD_oi", "Binance Futures OI")
\ No newline at end of file
+FEISHU_KEYWORD = os.getenv("FEISHU_KEYWORD_oi", "Binance Futures OI")
+
+# 告警消息格式：text = 纯文本（完整告警块装箱发送），card = 交互卡片表格
+FEISHU_MSG_FORMAT = os.getenv("FEISHU_MSG_FORMAT", "text")
\ No newline at end of file
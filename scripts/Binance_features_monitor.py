@@ -9,12 +9,13 @@
 """
 
 import time
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Mapping, Tuple, Union
 
 from typing import Optional
 
-import requests
+import numpy as np
 
 
 from config.config import (
@@ -22,56 +23,88 @@ from config.config import (
     FUTURES_KEYWORD,
     FAPI_EXCHANGE_INFO,
     FAPI_PREMIUM_INDEX,
+    FAPI_TICKER_24H,
     FAPI_OI_HISTORY,
     FAPI_TAKER_RATIO,
     FAPI_DEPTH,
     FUTURES_POLL_INTERVAL,
     MAX_SYMBOLS,
+    HOT_TIER_SIZE,
+    WARM_TIER_SIZE,
+    WARM_INTERVAL,
+    COLD_INTERVAL,
+    FETCH_WORKERS,
     OI_CHANGE_PCT,
     PRICE_CHANGE_PCT,
+    PRICE_CHANGE_LOOKBACK,
     DEPTH_IMBALANCE_RATIO,
     FUNDING_HIGH,
     FUNDING_WATCH,
     TAKER_RATIO_TREND,
+    FUTURES_SWING_WINDOWS,
+    FSTREAM_BASE,
+    STREAM_MAX_AGE,
+    STREAM_MODE,
+    ORDER_BOOK_MODE,
+    ORDER_BOOK_LEVELS,
+    ORDER_BOOK_MAX_LEVELS,
+    ORDER_BOOK_SNAPSHOT_LIMIT,
+    ORDER_BOOK_SPEED,
+    UNIVERSE_CACHE_FILE,
+    UNIVERSE_REFRESH_SECONDS,
+    ALERT_COOLDOWN_SECONDS,
+    ALERT_ESCALATION_PCT,
+    ALERT_STATE_TTL,
+    ALERT_STATE_FILE,
+    SNAPSHOT_DIR,
+    METRICS_PORT,
 )
+from scripts.alert_state import AlertState
+from scripts.binance_http import http_get
+from scripts.feishu_notifier import get_notifier
+from scripts.fetch_engine import fetch_all
+from scripts.market_hub import MarketHub, MarketSnapshot, universe_changes
+from scripts.market_stream import MarketStream
+from scripts.metrics import REGISTRY, observe_round, start_metrics_server, timed
+from scripts.order_book import OrderBookStream
+from scripts.recorder import SnapshotRecorder
+from scripts.rolling_window import SwingDetector, format_swing, parse_windows
+from scripts.scheduler import TieredScheduler
+from scripts.signal_table import MetricTable
+from scripts.universe import UniverseManager, parse_usdt_perpetuals
 
 
 def send_feishu_text(content: str) -> None:
+    """放进后台发送队列后立即返回，不阻塞扫描（scripts/feishu_notifier.py）。"""
     if not FEISHU_WEBHOOK:
         print("FEISHU_WEBHOOK not set; skip sending")
         return
+    get_notifier(FEISHU_WEBHOOK).send_text(content, keyword=FUTURES_KEYWORD)
 
-    headers = {"Content-Type": "application/json; charset=utf-8"}
-    data = {
-        "msg_type": "text",
-        "content": {"text": f"{FUTURES_KEYWORD} {content}"},
-    }
-    try:
-        resp = requests.post(FEISHU_WEBHOOK, json=data, headers=headers, timeout=8)
-        print("Feishu status:", resp.status_code, resp.text)
-    except Exception as exc:  # noqa: BLE001
-        print("Feishu error:", exc)
+
+
+def send_feishu_alerts(header: str, alerts: List[str]) -> None:
+    """告警按完整的块装箱发送，一条告警不会被拆到两条消息里。"""
+    if not FEISHU_WEBHOOK:
+        print("FEISHU_WEBHOOK not set; skip sending")
+        return
+    get_notifier(FEISHU_WEBHOOK).send_blocks(alerts, header=header, keyword=FUTURES_KEYWORD)
 
 
 def fetch_usdt_perpetual_symbols() -> List[str]:
-    resp = requests.get(FAPI_EXCHANGE_INFO, timeout=10)
-    resp.raise_for_status()
-    data = resp.json()
-    symbols = []
-    for item in data.get("symbols", []):
-        if (
-            item.get("contractType") == "PERPETUAL"
-            and item.get("quoteAsset") == "USDT"
-            and item.get("status") == "TRADING"
-        ):
-            symbols.append(item["symbol"])
-    symbols.sort()
-    return symbols[:MAX_SYMBOLS]
+    """获取所有 USDT 永续合约 symbol 列表（不截断，交给调度 / 排名取前 MAX_SYMBOLS 个）。"""
+    resp = http_get(FAPI_EXCHANGE_INFO, timeout=10)
+    return parse_usdt_perpetuals(resp.json())
+
+
+def fetch_24h_ticker_map() -> Dict[str, Dict]:
+    """全市场 24hr ticker 一次拉完，用来给 symbol 排名分层。"""
+    resp = http_get(FAPI_TICKER_24H, timeout=10)
+    return {row["symbol"]: row for row in resp.json() if row.get("symbol")}
 
 
 def fetch_mark_and_funding(symbol: str) -> Tuple[float, float, int]:
-    resp = requests.get(FAPI_PREMIUM_INDEX, params={"symbol": symbol}, timeout=8)
-    resp.raise_for_status()
+    resp = http_get(FAPI_PREMIUM_INDEX, params={"symbol": symbol}, timeout=8)
     data = resp.json()
     mark_price = float(data.get("markPrice", 0))
     funding_rate = float(data.get("lastFundingRate", 0))
@@ -79,14 +112,71 @@ def fetch_mark_and_funding(symbol: str) -> Tuple[float, float, int]:
     return mark_price, funding_rate, next_funding_time
 
 
+def fetch_premium_fallback(symbols: List[str]) -> Dict[str, Dict[str, float]]:
+    """
+    全市场 premiumIndex 拉取失败时的兜底：只给这一轮到期的 symbol 逐个拉标记价格 / funding，
+    格式和 fetch_premium_index_map 相同；单个 symbol 的接口不带指数价格，这一轮没有基差。
+    """
+    results, errors = fetch_all(symbols, fetch_mark_and_funding, max_workers=FETCH_WORKERS)
+    for symbol, exc in errors.items():
+        print(f"{symbol} premiumIndex error: {exc}")
+    return {
+        symbol: {
+            "mark_price": mark_price,
+            "index_price": 0.0,
+            "funding_rate": funding_rate,
+            "next_funding_time": next_funding_time,
+        }
+        for symbol, (mark_price, funding_rate, next_funding_time) in results.items()
+        if mark_price > 0
+    }
+
+
+def fetch_premium_index_map() -> Dict[str, Dict[str, float]]:
+    """
+    不带 symbol 调用 premiumIndex，一次拿到全市场的
+    标记价格 / 指数价格 / funding / 下次 funding 时间，保证同一轮价格来自同一时刻。
+    """
+    resp = http_get(FAPI_PREMIUM_INDEX, timeout=8)
+    mapping: Dict[str, Dict[str, float]] = {}
+    for row in resp.json():
+        symbol = row.get("symbol")
+        if not symbol:
+            continue
+        mapping[symbol] = {
+            "mark_price": float(row.get("markPrice", 0) or 0),
+            "index_price": float(row.get("indexPrice", 0) or 0),
+            "funding_rate": float(row.get("lastFundingRate", 0) or 0),
+            "next_funding_time": int(row.get("nextFundingTime", 0) or 0),
+        }
+    return mapping
+
+
+def compute_basis_pct(symbols: List[str], premium_map: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    """
+    全市场一次性计算 (mark - index) / index * 100；
+    没有指数价格的 symbol 不返回。
+    """
+    names = [s for s in symbols if s in premium_map]
+    rows = [premium_map[s] for s in names]
+    if not rows:
+        return {}
+    marks = np.fromiter((r["mark_price"] for r in rows), dtype=np.float64, count=len(rows))
+    indexes = np.fromiter((r["index_price"] for r in rows), dtype=np.float64, count=len(rows))
+    valid = indexes > 0
+    basis = np.zeros_like(marks)
+    np.divide(marks - indexes, indexes, out=basis, where=valid)
+    basis *= 100
+    return {name: float(b) for name, b, ok in zip(names, basis, valid) if ok}
+
+
 def fetch_oi_change(symbol: str) -> Tuple[float, float]:
     params = {
         "symbol": symbol,
         "period": "5m",
         "limit": 3,
     }
-    resp = requests.get(FAPI_OI_HISTORY, params=params, timeout=8)
-    resp.raise_for_status()
+    resp = http_get(FAPI_OI_HISTORY, params=params, timeout=8)
     rows = resp.json()
     if len(rows) < 2:
         return 0.0, 0.0
@@ -105,8 +195,7 @@ def fetch_taker_trend(symbol: str) -> Tuple[float, float]:
         "limit": 2,
     }
 
-    resp = requests.get(FAPI_TAKER_RATIO, params=params, timeout=8)
-    resp.raise_for_status()
+    resp = http_get(FAPI_TAKER_RATIO, params=params, timeout=8)
     rows = resp.json()
     if len(rows) < 2:
         return 0.0, 0.0
@@ -120,8 +209,7 @@ def fetch_taker_trend(symbol: str) -> Tuple[float, float]:
 
 def fetch_depth_imbalance(symbol: str) -> Optional[float]:
     params = {"symbol": symbol, "limit": 50}
-    resp = requests.get(FAPI_DEPTH, params=params, timeout=8)
-    resp.raise_for_status()
+    resp = http_get(FAPI_DEPTH, params=params, timeout=8)
     data = resp.json()
 
     bids_val = sum(float(b[0]) * float(b[1]) for b in data.get("bids", []))
@@ -133,103 +221,439 @@ def fetch_depth_imbalance(symbol: str) -> Optional[float]:
     return bids_val / asks_val
 
 
-def format_time(ts_ms: int) -> str:
-    if not ts_ms:
-        return "N/A"
-    dt = datetime.utcfromtimestamp(ts_ms / 1000) + timedelta(hours=8)
-    return dt.strftime("%Y-%m-%d %H:%M:%S") + " UTC+8"
+def fetch_order_book_snapshot(symbol: str) -> Dict:
+    """本地订单簿的初始快照（带 lastUpdateId），每个 symbol 只在开始和断档时拉。"""
+    resp = http_get(FAPI_DEPTH, params={"symbol": symbol, "limit": ORDER_BOOK_SNAPSHOT_LIMIT}, timeout=8)
+    return resp.json()
 
 
-def main() -> None:
-    symbols = fetch_usdt_perpetual_symbols()
-    print(f"Loaded {len(symbols)} USDT perpetual symbols")
+# ORDER_BOOK_MODE 下由 FuturesMonitor.setup 创建；fetch_symbol_snapshot 从这里读盘口买卖比
+order_books: Optional[OrderBookStream] = None
 
-    send_feishu_text(" 监控已启动")
 
-    last_prices: Dict[str, float] = {}
+def fetch_symbol_snapshot(symbol: str) -> Tuple[float, float, float, float, Optional[float]]:
+    """
+    单个 symbol 一轮需要的逐个请求数据（标记价格 / funding 来自整轮的 premiumIndex 快照），
+    供 fetch_engine 并发调用：
+    - 返回 (OI 变化%, OI 总量, taker 多空比, taker 趋势, 盘口买卖比)
+    """
+    oi_change_pct, oi_total = fetch_oi_change(symbol)
+    taker_ratio, taker_trend = fetch_taker_trend(symbol)
+    if order_books is not None and order_books.synced(symbol):
+        depth_ratio = order_books.imbalance(symbol)
+    else:
+        depth_ratio = fetch_depth_imbalance(symbol)
+    return oi_change_pct, oi_total, taker_ratio, taker_trend, depth_ratio
 
-    while True:
-        start_ts = time.time()
-        alerts: List[str] = []
 
+def fetch_round_symbols(symbols: List[str]) -> Tuple[Dict[str, Tuple], Dict[str, Exception]]:
+    """本进程里并发拉一轮到期 symbol 的逐个数据；分片模式下 worker 也是调这个（scripts/sharding.py）。"""
+    return fetch_all(symbols, fetch_symbol_snapshot, max_workers=FETCH_WORKERS)
+
+
+class MarkHistory:
+    """
+    每轮全市场标记价格的短历史。price_change_pct 和固定 lookback 秒前的价格比，
+    而不是和这个 symbol 上一次被拉取时比（hot / warm / cold 的拉取间隔各不相同）。
+    """
+
+    def __init__(self, lookback: float) -> None:
+        self.lookback = lookback
+        self._series: Dict[str, deque] = {}  # symbol -> deque[(ts, 标记价格)]
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def reference(self, symbols: List[str], ts: float) -> Dict[str, float]:
+        """每个 symbol 至少 lookback 秒前（留 1 秒余量）最近的一个价格；历史还不够长的不返回。"""
+        cutoff = ts - self.lookback + 1
+        out: Dict[str, float] = {}
         for symbol in symbols:
-            try:
-                mark_price, funding_rate, next_funding_time = fetch_mark_and_funding(symbol)
-                oi_change_pct, oi_total = fetch_oi_change(symbol)
-                taker_ratio, taker_trend = fetch_taker_trend(symbol)
-                depth_ratio = fetch_depth_imbalance(symbol)
-
-                price_change_pct = 0.0
-                if symbol in last_prices and last_prices[symbol]:
-                    price_change_pct = (mark_price - last_prices[symbol]) / last_prices[symbol] * 100
-                last_prices[symbol] = mark_price
-
-                messages: List[str] = []
-
-                if oi_change_pct >= OI_CHANGE_PCT:
-                    messages.append(
-                        f"OI +{oi_change_pct:.2f}% 至 {oi_total:.2f}, 5-15 分钟资金涌入"
-                    )
+            series = self._series.get(symbol)
+            if not series:
+                continue
+            # 时间只会往后走，比参考点更早的以后也用不到了
+            while len(series) > 1 and series[1][0] <= cutoff:
+                series.popleft()
+            if series[0][0] <= cutoff:
+                out[symbol] = series[0][1]
+        return out
+
+    def record(self, ts: float, prices: Mapping[str, float]) -> None:
+        """记下这一轮的价格；只留下一轮还可能用到的点（队头是最近一个超出回看的点）。"""
+        cutoff = ts - self.lookback + 1
+        for symbol, price in prices.items():
+            series = self._series.get(symbol)
+            if series is None:
+                series = self._series[symbol] = deque()
+            series.append((ts, price))
+            while len(series) > 1 and series[1][0] <= cutoff:
+                series.popleft()
+
+    def remove(self, symbols: List[str]) -> None:
+        for symbol in symbols:
+            self._series.pop(symbol, None)
+
+
+# 列式快照里的指标列（price_change_pct 由 build_metric_table 按回看价格补上）
+TABLE_COLUMNS: List[str] = [
+    "mark_price",
+    "funding_rate",
+    "next_funding_time",
+    "basis_pct",
+    "oi_change_pct",
+    "oi_total",
+    "taker_ratio",
+    "taker_trend",
+    "depth_ratio",
+]
+
+
+def build_metric_table(
+    snapshots: Dict[str, Tuple[float, float, float, float, Optional[float]]],
+    premium_map: Dict[str, Dict[str, float]],
+    basis_map: Dict[str, float],
+    ref_prices: Dict[str, float],
+) -> MetricTable:
+    """把本轮 premiumIndex 快照和逐个 symbol 的 OI / taker / 盘口数据合成一张列式表。"""
+    rows: Dict[str, Dict[str, Optional[float]]] = {}
+    for symbol, (oi_change_pct, oi_total, taker_ratio, taker_trend, depth_ratio) in snapshots.items():
+        premium = premium_map[symbol]
+        rows[symbol] = {
+            "mark_price": premium["mark_price"],
+            "funding_rate": premium["funding_rate"],
+            "next_funding_time": premium["next_funding_time"],
+            "basis_pct": basis_map.get(symbol),
+            "oi_change_pct": oi_change_pct,
+            "oi_total": oi_total,
+            "taker_ratio": taker_ratio,
+            "taker_trend": taker_trend,
+            "depth_ratio": depth_ratio,
+        }
+    table = MetricTable.from_rows(rows, TABLE_COLUMNS)
+
+    # 相对回看价格（MarkHistory.reference）的变化，还没有回看价格时为 0
+    prev = np.array([ref_prices.get(s, np.nan) for s in table.symbols], dtype=np.float64)
+    change = np.zeros(len(table), dtype=np.float64)
+    np.divide(table["mark_price"] - prev, prev, out=change, where=prev > 0)
+    table.add_column("price_change_pct", change * 100)
+    return table
+
+
+def default_thresholds() -> Dict[str, float]:
+    """evaluate_signals 用到的阈值，键名和配置项一致（回测扫参数时按名字覆盖）。"""
+    return {
+        "PRICE_CHANGE_PCT": PRICE_CHANGE_PCT,
+        "OI_CHANGE_PCT": OI_CHANGE_PCT,
+        "FUNDING_HIGH": FUNDING_HIGH,
+        "FUNDING_WATCH": FUNDING_WATCH,
+        "TAKER_RATIO_TREND": TAKER_RATIO_TREND,
+        "DEPTH_IMBALANCE_RATIO": DEPTH_IMBALANCE_RATIO,
+    }
 
-                if abs(price_change_pct) >= PRICE_CHANGE_PCT:
-                    direction = "上涨" if price_change_pct > 0 else "下跌"
-                    messages.append(f"价格{direction} {price_change_pct:+.2f}% 至 {mark_price:.4f}")
 
-                if abs(funding_rate) >= FUNDING_HIGH:
-                    messages.append(
-                        f"Funding 极值 {funding_rate:+.4f}，情绪过热，下一次 {format_time(next_funding_time)}"
-                    )
-                elif abs(funding_rate) >= FUNDING_WATCH:
-                    messages.append(
-                        f"Funding 偏高 {funding_rate:+.4f}，注意多空极端持仓"
-                    )
+def evaluate_signals(
+    table: Union[MetricTable, Mapping[str, np.ndarray]],
+    thresholds: Optional[Mapping[str, float]] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    每种信号一个布尔掩码，顺序即告警里信号的展示顺序。
+    thresholds 只需给要覆盖的项，其余用配置值；table 也可以是 {列名: 数组}（回测）。
+    """
+    th = default_thresholds()
+    if thresholds:
+        th.update(thresholds)
+    price_move = np.abs(table["price_change_pct"]) >= th["PRICE_CHANGE_PCT"]
+    oi_up = table["oi_change_pct"] >= th["OI_CHANGE_PCT"]
+    funding_abs = np.abs(table["funding_rate"])
+    funding_high = funding_abs >= th["FUNDING_HIGH"]
+    taker = np.abs(table["taker_trend"]) >= th["TAKER_RATIO_TREND"]
+    depth = table["depth_ratio"]
+    return {
+        "oi_up": oi_up,
+        "price_move": price_move,
+        "funding_high": funding_high,
+        "funding_watch": ~funding_high & (funding_abs >= th["FUNDING_WATCH"]),
+        "taker": taker,
+        "depth_bid": depth >= th["DEPTH_IMBALANCE_RATIO"],
+        "depth_ask": depth <= 1 / th["DEPTH_IMBALANCE_RATIO"],
+        # 组合信号：价格横盘但 OI、taker 同向，提示埋伏
+        "sideways_build": ~price_move & oi_up & taker,
+    }
 
-                if abs(taker_trend) >= TAKER_RATIO_TREND:
-                    direction = "多头主动" if taker_trend > 0 else "空头主动"
-                    messages.append(
-                        f"Taker 多空比 {taker_ratio:.2f}（{direction} 连续放量）"
-                    )
 
-                if depth_ratio is not None:
-                    if depth_ratio >= DEPTH_IMBALANCE_RATIO:
-                        messages.append(f"买盘深度 {depth_ratio:.2f}x 卖盘，存在拉升动力")
-                    elif depth_ratio <= 1 / DEPTH_IMBALANCE_RATIO:
-                        messages.append(f"卖盘深度 {1/depth_ratio:.2f}x 买盘，抛压显著")
-
-                # 组合信号：价格横盘但 OI、taker 同向，提示埋伏
-                if (
-                    abs(price_change_pct) < PRICE_CHANGE_PCT
-                    and oi_change_pct >= OI_CHANGE_PCT
-                    and abs(taker_trend) >= TAKER_RATIO_TREND
-                ):
-                    messages.append("价格横盘 + OI&主动成交同向，关注突破")
-
-                if messages:
-                    now = datetime.utcnow() + timedelta(hours=8)
-                    stamp = now.strftime("%Y-%m-%d %H:%M:%S UTC+8")
-                    detail = "\n".join(messages)
-
-                    depth_str = "N/A" if depth_ratio is None else f"{depth_ratio:.2f}"
-
-                    alert = (
-                        f"[{stamp}] {symbol}\n"
-                        f"价格 {mark_price:.4f} USDT\n"
-                        f"Funding {funding_rate:+.4f}\n"
-                        f"盘口买卖比 {depth_str}\n"
-                        f"信号:\n{detail}"
+def signal_severity(table: MetricTable) -> Dict[str, np.ndarray]:
+    """每种信号的「严重程度」列，冷却期内只有它明显变大才再报。"""
+    depth = table["depth_ratio"]
+    with np.errstate(divide="ignore"):
+        depth_ask = 1 / depth
+    return {
+        "oi_up": table["oi_change_pct"],
+        "price_move": np.abs(table["price_change_pct"]),
+        "funding_high": np.abs(table["funding_rate"]),
+        "funding_watch": np.abs(table["funding_rate"]),
+        "taker": np.abs(table["taker_trend"]),
+        "depth_bid": depth,
+        "depth_ask": depth_ask,
+        "sideways_build": table["oi_change_pct"],
+    }
+
+
+def filter_cooldown(
+    state: AlertState,
+    symbol: str,
+    flags: Dict[str, bool],
+    severity: Dict[str, float],
+) -> Dict[str, bool]:
+    """去掉冷却期内已经报过、且没有明显恶化的信号。"""
+    out: Dict[str, bool] = {}
+    for name, flag in flags.items():
+        value = severity.get(name)
+        if value is not None and np.isnan(value):
+            value = None
+        out[name] = flag and state.should_alert(symbol, name, value)
+    return out
+
+
+def format_alert(row: Dict[str, Optional[float]], flags: Dict[str, bool], stamp: str) -> str:
+    """只对命中的 symbol 调用，拼出与原来一致的告警文本。"""
+    mark_price = row["mark_price"]
+    funding_rate = row["funding_rate"]
+    depth_ratio = row["depth_ratio"]
+    price_change_pct = row["price_change_pct"]
+    taker_trend = row["taker_trend"]
+
+    messages: List[str] = []
+    if flags["oi_up"]:
+        messages.append(
+            f"OI +{row['oi_change_pct']:.2f}% 至 {row['oi_total']:.2f}, 5-15 分钟资金涌入"
+        )
+    if flags["price_move"]:
+        direction = "上涨" if price_change_pct > 0 else "下跌"
+        messages.append(f"价格{direction} {price_change_pct:+.2f}% 至 {mark_price:.4f}")
+    if flags["funding_high"]:
+        messages.append(
+            f"Funding 极值 {funding_rate:+.4f}，情绪过热，下一次 {format_time(int(row['next_funding_time'] or 0))}"
+        )
+    elif flags["funding_watch"]:
+        messages.append(f"Funding 偏高 {funding_rate:+.4f}，注意多空极端持仓")
+    if flags["taker"]:
+        direction = "多头主动" if taker_trend > 0 else "空头主动"
+        messages.append(f"Taker 多空比 {row['taker_ratio']:.2f}（{direction} 连续放量）")
+    if flags["depth_bid"]:
+        messages.append(f"买盘深度 {depth_ratio:.2f}x 卖盘，存在拉升动力")
+    elif flags["depth_ask"]:
+        messages.append(f"卖盘深度 {1/depth_ratio:.2f}x 买盘，抛压显著")
+    if flags["sideways_build"]:
+        messages.append("价格横盘 + OI&主动成交同向，关注突破")
+
+    depth_str = "N/A" if depth_ratio is None else f"{depth_ratio:.2f}"
+    basis_str = "N/A" if row["basis_pct"] is None else f"{row['basis_pct']:+.3f}%"
+    detail = "\n".join(messages)
+    return (
+        f"[{stamp}] {row['symbol']}\n"
+        f"价格 {mark_price:.4f} USDT\n"
+        f"Funding {funding_rate:+.4f}\n"
+        f"基差(标记-指数) {basis_str}\n"
+        f"盘口买卖比 {depth_str}\n"
+        f"信号:\n{detail}"
+    )
+
+
+def format_time(ts_ms: int) -> str:
+    if not ts_ms:
+        return "N/A"
+    dt = datetime.utcfromtimestamp(ts_ms / 1000) + timedelta(hours=8)
+    return dt.strftime("%Y-%m-%d %H:%M:%S") + " UTC+8"
+
+
+# /metrics 里的 monitor 标签
+METRICS_NAME = "futures"
+
+
+class FuturesMonitor:
+    """
+    一轮：全市场标记价格 / funding → 分层挑出到期的 symbol → 逐个拉 OI / taker / 盘口 → 信号 → 飞书。
+    单独运行时由 main() 驱动，也可以作为 scripts/market_hub.py 的插件和别的监控共用数据。
+    """
+
+    name = METRICS_NAME
+
+    def __init__(self) -> None:
+        self.symbols: List[str] = []
+        self.mark_history = MarkHistory(PRICE_CHANGE_LOOKBACK)
+        self.alert_state: Optional[AlertState] = None
+        self.scheduler: Optional[TieredScheduler] = None
+        self.market_stream: Optional[MarketStream] = None
+        self.recorder: Optional[SnapshotRecorder] = None
+        # 全市场标记价格的窗口内最高 / 最低（每轮一个点，单调队列维护）
+        self.swings = SwingDetector(parse_windows(FUTURES_SWING_WINDOWS))
+        # 逐个 symbol 的拉取，分片模式下换成 Coordinator.fetch，由多个 worker 分担
+        self.fetch_symbols: Callable[[List[str]], Tuple[Dict[str, Tuple], Dict[str, Exception]]] = fetch_round_symbols
+
+    @property
+    def interval(self) -> float:
+        return FUTURES_POLL_INTERVAL
+
+    def setup(self, hub: MarketHub) -> None:
+        global order_books
+        hub.add_source("premium", fetch_premium_index_map)
+        hub.add_source("ticker", fetch_24h_ticker_map)
+        self.symbols = hub.symbols()
+        print(f"Loaded {len(self.symbols)} USDT perpetual symbols")
+
+        send_feishu_text(" 监控已启动")
+
+        self.alert_state = AlertState(
+            cooldown=ALERT_COOLDOWN_SECONDS,
+            escalation_pct=ALERT_ESCALATION_PCT,
+            ttl=ALERT_STATE_TTL,
+            path=ALERT_STATE_FILE or None,
+        )
+        REGISTRY.register_stats("alert_state", self.alert_state.stats, {"monitor": METRICS_NAME})
+
+        self.scheduler = TieredScheduler(
+            hot_size=HOT_TIER_SIZE,
+            warm_size=WARM_TIER_SIZE,
+            intervals={"hot": FUTURES_POLL_INTERVAL, "warm": WARM_INTERVAL, "cold": COLD_INTERVAL},
+            max_symbols=MAX_SYMBOLS,
+        )
+
+        # 流式模式：标记价格 / funding 直接读 !markPrice@arr@1s 推送的内存状态
+        if STREAM_MODE:
+            self.market_stream = MarketStream(self.symbols, base_url=FSTREAM_BASE, max_age=STREAM_MAX_AGE)
+            self.market_stream.start()
+
+        # 本地订单簿：盘口买卖比读 @depth 增量流，symbol 进入调度范围时才订阅
+        if ORDER_BOOK_MODE:
+            order_books = OrderBookStream(
+                [],
+                fetch_snapshot=fetch_order_book_snapshot,
+                depth=ORDER_BOOK_LEVELS,
+                max_levels=ORDER_BOOK_MAX_LEVELS,
+                snapshot_limit=ORDER_BOOK_SNAPSHOT_LIMIT,
+                speed=ORDER_BOOK_SPEED,
+                base_url=FSTREAM_BASE,
+            )
+            order_books.start()
+            REGISTRY.register_stats("order_books", order_books.stats, {"monitor": METRICS_NAME})
+
+        # 每轮的列式表追加到按天分区的快照文件，写盘在后台线程
+        if SNAPSHOT_DIR:
+            self.recorder = SnapshotRecorder(SNAPSHOT_DIR, TABLE_COLUMNS + ["price_change_pct"])
+            self.recorder.start()
+            REGISTRY.register_stats("recorder", self.recorder.stats, {"monitor": METRICS_NAME})
+
+    def run_round(self, snapshot: MarketSnapshot) -> None:
+        alert_state, scheduler, market_stream = self.alert_state, self.scheduler, self.market_stream
+        alerts: List[str] = []
+
+        added, removed = universe_changes(self.symbols, snapshot.symbols)
+        if added or removed:
+            self.symbols = snapshot.symbols
+            self.mark_history.remove(removed)
+            self.swings.remove(removed)
+            if market_stream is not None:
+                market_stream.remove_symbols(removed)
+                market_stream.add_symbols(added)
+            if order_books is not None:
+                order_books.remove_symbols(removed)
+            print(f"universe +{len(added)} -{len(removed)}: added {added} removed {removed}")
+
+        # 每轮开头一次性拿全市场标记价格 / funding，替代逐个 symbol 的 premiumIndex 请求；
+        # 流式模式下推送整张表都过期（断线 / 卡住）时同样回退到 REST 全市场快照
+        premium_map = market_stream.premium_map() if market_stream is not None else {}
+        if not premium_map:
+            with timed(METRICS_NAME, "premium_fetch"):
+                premium_map = snapshot.get("premium", {})
+        # 按 24H 成交额 / 振幅分层，只拉到了刷新时间的 symbol；ticker 拿不到时按原顺序
+        ticker_map = market_stream.ticker_map() if market_stream is not None else {}
+        if not ticker_map:
+            with timed(METRICS_NAME, "ticker_fetch"):
+                ticker_map = snapshot.get("ticker", {})
+        universe = [s for s in self.symbols if s in premium_map] if premium_map else self.symbols
+        scheduler.update(ticker_map, universe=universe)
+        round_symbols = scheduler.due()
+        if not premium_map and round_symbols:
+            # 全市场快照没拿到：到期的 symbol 逐个补标记价格，还拿不到的这一轮跳过、下一轮仍然到期
+            print("premiumIndex snapshot unavailable, falling back to per-symbol requests")
+            with timed(METRICS_NAME, "premium_fallback"):
+                premium_map = fetch_premium_fallback(round_symbols)
+            round_symbols = [s for s in round_symbols if s in premium_map]
+            if not round_symbols:
+                print("Round failed: no mark price for any due symbol")
+                return
+        if order_books is not None:
+            # 排名范围内的 symbol 都维护订单簿；掉出排名的不退订（之后多半还会回来），下架的上面已经去掉
+            order_books.add_symbols(list(scheduler.tiers))
+        basis_map = compute_basis_pct(round_symbols, premium_map)
+
+        with timed(METRICS_NAME, "symbol_fetch"):
+            snapshots, errors = self.fetch_symbols(round_symbols)
+        for symbol, exc in errors.items():
+            print(f"{symbol} fetch error: {exc}")
+        scheduler.mark_polled(snapshots)
+
+        # 所有 symbol 的指标放进一张列式表，信号一次性用布尔掩码算完，只格式化命中的行
+        marks = {s: premium_map[s]["mark_price"] for s in self.symbols if premium_map.get(s, {}).get("mark_price")}
+        ref_prices = self.mark_history.reference(list(snapshots), snapshot.ts)
+        self.mark_history.record(snapshot.ts, marks)
+        table = build_metric_table(snapshots, premium_map, basis_map, ref_prices)
+        if self.recorder is not None:
+            self.recorder.record(snapshot.ts, table.symbols, table.columns)
+        with timed(METRICS_NAME, "evaluation"):
+            signals = evaluate_signals(table)
+            any_signal = np.logical_or.reduce(list(signals.values()))
+            stamp = (datetime.utcnow() + timedelta(hours=8)).strftime("%Y-%m-%d %H:%M:%S UTC+8")
+            severity = signal_severity(table)
+            for i in table.indices(any_signal):
+                flags = {name: bool(mask[i]) for name, mask in signals.items()}
+                # 同一 (symbol, 信号) 冷却期内不重复告警，比如 Funding 偏高不会每轮都刷
+                flags = filter_cooldown(
+                    alert_state, table.symbols[i], flags, {name: float(col[i]) for name, col in severity.items()}
+                )
+                if any(flags.values()):
+                    alerts.append(format_alert(table.row(i), flags, stamp))
+            # 标记价格窗口内振幅：premiumIndex 本来就是全市场的，不受分层调度影响
+            for symbol, swings in self.swings.update_many(snapshot.ts, marks).items():
+                lines = [format_swing(s) for s in swings if alert_state.should_alert(symbol, f"swing_{s.window}", s.pct)]
+                if lines:
+                    alerts.append(
+                        f"[{stamp}] {symbol}\n标记价格 {marks[symbol]:.4f} USDT\n信号:\n" + "\n".join(lines)
                     )
-                    alerts.append(alert)
-            except Exception as exc:  # noqa: BLE001
-                print(f"{symbol} fetch error: {exc}")
-                continue
+            alert_state.save()
+        # 价格 / OI 异动的 symbol 临时提到 hot 层，后续几轮每轮都拉
+        scheduler.boost(table.symbols[i] for i in table.indices(signals["oi_up"] | signals["price_move"]))
 
         if alerts:
-            text = "\n\n".join(alerts)
-            send_feishu_text(text)
+            with timed(METRICS_NAME, "feishu_send"):
+                send_feishu_alerts("", alerts)
         else:
             print("No alert this round")
 
+
+def main() -> None:
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+
+    # 合约列表优先读本地缓存，后台定时刷新，新上线 / 下架的合约每轮开头合并进来
+    hub = MarketHub(
+        UniverseManager(
+            fetch_usdt_perpetual_symbols,
+            cache_path=UNIVERSE_CACHE_FILE or None,
+            refresh_seconds=UNIVERSE_REFRESH_SECONDS,
+        ),
+        max_age=0,
+    )
+    hub.start()
+    monitor = FuturesMonitor()
+    monitor.setup(hub)
+
+    while True:
+        start_ts = time.time()
+        monitor.run_round(hub.snapshot())
         duration = time.time() - start_ts
+        observe_round(METRICS_NAME, duration, FUTURES_POLL_INTERVAL)
         sleep_for = max(5, FUTURES_POLL_INTERVAL - int(duration))
         time.sleep(sleep_for)
 
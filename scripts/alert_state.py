@@ -0,0 +1,148 @@
+"""
+告警去重 / 冷却状态：按 (symbol, 规则) 记录上次告警。
+
+币一直在拉的时候，以前每轮（60 秒）都会对同一个 symbol 重复告警，
+「Funding 偏高」也会一直刷屏。这里：
+
+- 同一个 (symbol, 规则) 在 cooldown 秒内只告警一次；
+- 冷却期内指标继续恶化（比上次告警时再放大 escalation_pct%）才升级再报一次；
+- 条件消失超过 ttl 秒的条目自动清掉，条目总数也有上限，内存不会无限增长；
+- 可选 path：状态写成 JSON，重启后不会把冷却期内的告警再发一遍。
+
+    state = AlertState(cooldown=1800, escalation_pct=50, ttl=7200)
+    if state.should_alert("BTCUSDT", "条件1（1H）", abs(price_1h)):
+        ...
+    state.save()   # 每轮结束时调用一次（没配 path 时什么都不做）
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+StateKey = Tuple[str, str]
+
+# 条目数上限：超过时先淘汰最久没出现过的
+MAX_ENTRIES = 10_000
+
+
+class AlertState:
+    """(symbol, 规则) -> [上次告警时间, 上次告警时的指标值, 最近一次命中时间]。"""
+
+    def __init__(
+        self,
+        *,
+        cooldown: float,
+        escalation_pct: float = 0.0,
+        ttl: float = 7200.0,
+        max_entries: int = MAX_ENTRIES,
+        path: Optional[Union[str, Path]] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.cooldown = cooldown
+        self.escalation_pct = escalation_pct
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = Path(path) if path else None
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[StateKey, List[Optional[float]]]" = OrderedDict()
+        self.sent = 0
+        self.escalated = 0
+        self.suppressed = 0
+        if self.path is not None:
+            self.load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def should_alert(self, symbol: str, rule: str, value: Optional[float] = None) -> bool:
+        """
+        本轮命中 (symbol, rule) 时调用，返回这次要不要真的发出去。
+        value 是用来判断「恶化」的指标（越大越严重）；不给就只按冷却时间判断。
+        """
+        key = (symbol, rule)
+        with self._lock:
+            now = self._clock()
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [now, value, now]
+                self._trim()
+                self.sent += 1
+                return True
+
+            entry[2] = now
+            self._entries.move_to_end(key)
+            last_sent, last_value, _ = entry
+            if now - last_sent >= self.cooldown:
+                entry[0], entry[1] = now, value
+                self.sent += 1
+                return True
+            if self._escalates(last_value, value):
+                entry[0], entry[1] = now, value
+                self.escalated += 1
+                return True
+            self.suppressed += 1
+            return False
+
+    def _escalates(self, last_value: Optional[float], value: Optional[float]) -> bool:
+        if self.escalation_pct <= 0 or value is None or last_value is None:
+            return False
+        return abs(value) >= abs(last_value) * (1 + self.escalation_pct / 100)
+
+    def _evict(self, now: float) -> None:
+        """OrderedDict 按最近命中时间排序，从头往后删掉超过 ttl 没再命中的。"""
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry[2] <= self.ttl:
+                break
+            del self._entries[key]
+
+    def _trim(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "sent": self.sent,
+                "escalated": self.escalated,
+                "suppressed": self.suppressed,
+            }
+
+    # ---------- 持久化 ----------
+
+    def save(self) -> None:
+        """写到 path（先写临时文件再替换，写一半崩溃不会损坏旧文件）。"""
+        if self.path is None:
+            return
+        with self._lock:
+            self._evict(self._clock())
+            data = [[symbol, rule] + entry for (symbol, rule), entry in self._entries.items()]
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps({"entries": data}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def load(self) -> None:
+        """从 path 读回状态；文件不存在或损坏时从空状态开始。"""
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            rows = [(str(s), str(r), float(t), v, float(seen)) for s, r, t, v, seen in data["entries"]]
+        except (ValueError, KeyError, TypeError) as exc:
+            print(f"alert state {self.path} unreadable, starting fresh: {exc}")
+            return
+        with self._lock:
+            self._entries.clear()
+            for symbol, rule, last_sent, value, last_seen in sorted(rows, key=lambda r: r[4]):
+                self._entries[(symbol, rule)] = [last_sent, value, last_seen]
+            self._evict(self._clock())
+            self._trim()
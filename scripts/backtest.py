@@ -0,0 +1,505 @@
+"""
+离线回放 / 回测：用录下来的快照或下载的 K 线 / OI 历史，跑线上同一套条件逻辑，按参数组合统计告警数和告警后的收益。
+
+以前调 PRICE_CHANGE_15M_PCT、OI_CHANGE_1H_PCT、DEPTH_IMBALANCE_RATIO 只能改常量再等几天看实盘告警。这里：
+
+- 历史数据整理成 (时间, symbol) 的二维面板（Panel），每个指标一张 float32 矩阵，缺失为 NaN；
+- 一组参数的所有时间点、所有 symbol 一次性展平成一列求值：
+  OI 监控走 scripts/rules.py 的规则（规则模板里用 {PRICE_CHANGE_1H_PCT} 这样的占位符），
+  永续监控直接调 Binance_features_monitor.evaluate_signals(table, thresholds)；
+- 命中后按告警冷却时间去重（同一个 symbol 冷却期内只算一次），统计各个持有期的远期收益；
+- 参数网格用多进程并行跑，面板在每个工作进程里只初始化一次。
+
+    python -m scripts.backtest --monitor oi --snapshots data/snapshots/oi --direction price_1h_pct \\
+        --grid PRICE_CHANGE_1H_PCT=6:12:1 --grid OI_CHANGE_1H_PCT=5,8,10 --horizons 15m,1h,4h
+    python -m scripts.backtest --monitor oi --download-days 7 --symbols BTCUSDT,ETHUSDT --cache data/hist.npz ...
+    python -m scripts.backtest --monitor futures --snapshots data/snapshots/fu --grid DEPTH_IMBALANCE_RATIO=1.2:3:0.1
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import config, config_oi
+from scripts.binance_http import http_get
+from scripts.fetch_engine import fetch_all
+from scripts.recorder import list_days, read_day, split_partition
+from scripts.rules import fill_template, parse_rules, read_rules_spec
+from scripts.timeframes import interval_minutes
+
+Columns = Dict[str, np.ndarray]
+Params = Dict[str, float]
+Evaluator = Callable[[Columns, int, Mapping[str, float]], Dict[str, np.ndarray]]
+
+PANEL_DTYPE = np.float32
+
+
+
+class Panel:
+    """times: (T,) 毫秒时间戳升序；columns: {列名: (T, S) 矩阵}。"""
+
+    def __init__(self, times: np.ndarray, symbols: Sequence[str], columns: Mapping[str, np.ndarray]) -> None:
+        self.times = np.asarray(times, dtype=np.int64)
+        self.symbols: List[str] = list(symbols)
+        shape = (len(self.times), len(self.symbols))
+        self.columns: Columns = {}
+        for name, values in columns.items():
+            arr = np.asarray(values, dtype=PANEL_DTYPE)
+            if arr.shape != shape:
+                raise ValueError(f"column {name} has shape {arr.shape}, expected {shape}")
+            self.columns[name] = arr
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.times), len(self.symbols)
+
+    def save(self, path: str) -> None:
+        np.savez(path, __times__=self.times, __symbols__=np.array(self.symbols), **self.columns)
+
+    @classmethod
+    def load(cls, path: str) -> "Panel":
+        with np.load(path) as data:
+            columns = {k: data[k] for k in data.files if not k.startswith("__")}
+            return cls(data["__times__"], [str(s) for s in data["__symbols__"]], columns)
+
+
+# ---------- 数据来源 ----------
+
+
+def load_snapshots(root: str, days: Optional[Sequence[str]] = None) -> Panel:
+    """
+    把 scripts/recorder.py 录下的若干天快照拼成一个面板（没拉到的 symbol / 轮次为 NaN）。
+    days 写日期时包括当天列变更后另开的分区（2026-01-01.1 ……）。
+    """
+    partitions = list_days(root)
+    if days:
+        partitions = [p for p in partitions if p in days or split_partition(p)[0] in days]
+    if not partitions:
+        raise ValueError(f"no snapshots under {root}")
+    parts = [read_day(root, day) for day in partitions]
+    names = list(dict.fromkeys(name for p in parts for name in p.columns))
+    ts = np.concatenate([np.asarray(p.ts) for p in parts])
+    sid = np.concatenate([np.asarray(p.symbol_ids) for p in parts])
+    times, t_idx = np.unique(ts, return_inverse=True)
+    used, s_idx = np.unique(sid, return_inverse=True)
+    shape = (len(times), len(used))
+    columns: Columns = {}
+    for name in names:
+        grid = np.full(shape, np.nan, dtype=PANEL_DTYPE)
+        values = np.concatenate([
+            np.asarray(p.columns[name]) if name in p.columns else np.full(len(p), np.nan, dtype=PANEL_DTYPE)
+            for p in parts
+        ])
+        grid[t_idx, s_idx] = values
+        columns[name] = grid
+    return Panel(times, [parts[-1].symbols[i] for i in used], columns)
+
+
+def _page(fetch: Callable[[int], List], start_ms: int, end_ms: int, step_ms: int, ts_of: Callable) -> List:
+    """按 startTime 翻页拉到 end_ms 为止。"""
+    rows: List = []
+    cursor = start_ms
+    while cursor < end_ms:
+        page = fetch(cursor)
+        if not page:
+            break
+        rows.extend(r for r in page if ts_of(r) < end_ms)
+        last = ts_of(page[-1])
+        if last + step_ms <= cursor:
+            break
+        cursor = last + step_ms
+    return rows
+
+
+def download_history(
+    symbols: Sequence[str],
+    *,
+    start_ms: int,
+    end_ms: int,
+    interval: str = "5m",
+    windows: Optional[Mapping[str, int]] = None,
+    max_workers: int = 10,
+) -> Panel:
+    """
+    拉 K 线和 openInterestHist，按 OI 监控的口径算出每个时间点的指标（OI 历史 Binance 只保留最近 30 天）。
+    MC 没有历史数据，这一列为 NaN（命令行 --mc 可以填一个常数）。
+    """
+    windows = dict(windows or {"15m": 15, "1h": 60})
+    step = interval_minutes(interval) * 60_000
+    times = np.arange(start_ms - start_ms % step, end_ms, step, dtype=np.int64)
+
+    def fetch_symbol(symbol: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # 多拉 24H，让第一个时间点的 24H 指标也有数据
+        klines = _page(
+            lambda cursor: http_get(config_oi.FAPI_KLINES, params={
+                "symbol": symbol, "interval": interval, "startTime": cursor, "limit": 1500,
+            }).json(),
+            int(times[0]) - 86_400_000, end_ms, step, lambda r: int(r[0]),
+        )
+        oi_rows = _page(
+            lambda cursor: http_get(config_oi.FAPI_OI_HISTORY, params={
+                "symbol": symbol, "period": interval, "startTime": cursor, "limit": 500,
+            }).json(),
+            int(times[0]) - max(windows.values()) * 60_000, end_ms, step, lambda r: int(r["timestamp"]),
+        )
+        k_ts = np.array([int(r[0]) for r in klines], dtype=np.int64)
+        close = np.array([float(r[4]) for r in klines])
+        quote = np.array([float(r[7]) for r in klines])
+        o_ts = np.array([int(r["timestamp"]) for r in oi_rows], dtype=np.int64)
+        oi = np.array([float(r["sumOpenInterestValue"]) for r in oi_rows])
+        return _align(k_ts, close, times, step), _align(k_ts, quote, times, step, rolling=86_400_000 // step), \
+            _align(o_ts, oi, times, step)
+
+    results, errors = fetch_all(list(symbols), fetch_symbol, max_workers=max_workers)
+    for symbol, exc in errors.items():
+        print(f"{symbol} history error: {type(exc).__name__} - {exc}")
+    kept = [s for s in symbols if s in results]
+    close = np.stack([results[s][0] for s in kept], axis=1)
+    quote = np.stack([results[s][1] for s in kept], axis=1)
+    oi = np.stack([results[s][2] for s in kept], axis=1)
+
+    k24 = 86_400_000 // step
+    columns: Columns = {
+        "last_price": close[k24:],
+        "quote_volume": quote[k24:],
+        "price_24h_pct": _pct_change(close, k24)[k24:],
+        "oi_notional": oi[k24:],
+        "mc": np.full((len(times), len(kept)), np.nan),
+    }
+    for name, minutes in windows.items():
+        k = minutes * 60_000 // step
+        columns[f"price_{name}_pct"] = _pct_change(close, k)[k24:]
+        columns[f"oi_{name}_pct"] = _pct_change(oi, k)[k24:]
+    return Panel(times, kept, columns)
+
+
+def _align(ts: np.ndarray, values: np.ndarray, times: np.ndarray, step: int, rolling: int = 0) -> np.ndarray:
+    """
+    把一条序列对齐到 [times[0] - 24H, times[-1]] 的等间隔网格上（多出的 24H 用来算 24H 指标），
+    缺的点为 NaN；rolling > 0 时返回最近 rolling 个点的滚动和。
+    """
+    k24 = 86_400_000 // step
+    grid_start = int(times[0]) - k24 * step
+    out = np.full(len(times) + k24, np.nan)
+    idx = (ts - grid_start) // step
+    ok = (idx >= 0) & (idx < len(out))
+    out[idx[ok]] = values[ok]
+    if rolling:
+        filled = np.nan_to_num(out)
+        csum = np.concatenate([[0.0], np.cumsum(filled)])
+        summed = csum[rolling:] - csum[:-rolling]
+        out = np.concatenate([np.full(rolling - 1, np.nan), summed])
+    return out
+
+
+def _pct_change(values: np.ndarray, k: int) -> np.ndarray:
+    out = np.full(values.shape, np.nan)
+    if k < len(values):
+        prev = values[:-k]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[k:] = np.where(prev > 0, (values[k:] - prev) / prev * 100, np.nan)
+    return out
+
+
+# ---------- 条件逻辑 ----------
+
+
+class RuleEvaluator:
+    """
+    按参数把规则模板里的占位符换成阈值，再用 scripts/rules.py 求值。
+    参数里有 MIN_NOTIONAL_24H 且面板有 quote_volume 时，和线上一样先去掉 24H 成交额不够的。
+    """
+
+    def __init__(self, template: Mapping, metric_columns: Mapping[str, str]) -> None:
+        self.template = template
+        self.metric_columns = dict(metric_columns)
+
+    def __call__(self, columns: Columns, size: int, params: Mapping[str, float]) -> Dict[str, np.ndarray]:
+        rules = parse_rules(fill_template(self.template, params), self.metric_columns)
+        renamed = {
+            name: columns[column] for name, column in self.metric_columns.items() if column in columns
+        }
+        masks = rules.evaluate(renamed, size)
+        floor = params.get("MIN_NOTIONAL_24H")
+        if floor and "quote_volume" in columns:
+            # NaN（没有 ticker）的比较结果为 False，线上没有 ticker 的 symbol 也不扫
+            liquid = columns["quote_volume"] >= floor
+            masks = {name: np.asarray(mask, dtype=bool) & liquid for name, mask in masks.items()}
+        return masks
+
+
+class SignalEvaluator:
+    """永续监控的 evaluate_signals(table, thresholds)，只统计 signals 里列出的信号。"""
+
+    def __init__(self, evaluate: Callable, signals: Optional[Sequence[str]] = None) -> None:
+        self.evaluate = evaluate
+        self.signals = list(signals) if signals else None
+
+    def __call__(self, columns: Columns, size: int, params: Mapping[str, float]) -> Dict[str, np.ndarray]:
+        masks = self.evaluate(columns, params)
+        if self.signals is not None:
+            masks = {name: masks[name] for name in self.signals}
+        return masks
+
+
+def oi_evaluator(template: Optional[Mapping] = None) -> Tuple[RuleEvaluator, Params]:
+    """
+    OI 监控（binance_features_oi_1）的规则求值器和线上默认参数。
+    不指定 template 时和线上读同一份规则：RULES_FILE 存在用它，否则用按阈值常量生成的默认规则模板
+    （USE_ABS_PRICE_CHANGE 也一样生效）。RULES_FILE 里写死的阈值不受 --grid 影响，要扫的写成 {参数名}。
+    """
+    # 监控脚本导入时会建全局状态、读各自的配置，只在用到时才导入
+    import scripts.binance_features_oi_1 as oi_monitor
+
+    if template is None:
+        template = read_rules_spec(oi_monitor.RULES_FILE, oi_monitor.DEFAULT_RULE_TEMPLATE)
+    evaluator = RuleEvaluator(template, {name: col for name, (col, _) in oi_monitor.RULE_METRICS.items()})
+    defaults = dict(oi_monitor.DEFAULT_RULE_PARAMS)
+    defaults["MIN_NOTIONAL_24H"] = oi_monitor.MIN_NOTIONAL_24H
+    return evaluator, defaults
+
+
+def futures_evaluator(signals: Optional[Sequence[str]] = None) -> Tuple[SignalEvaluator, Params]:
+    """永续监控（Binance_features_monitor）的信号求值器和线上默认阈值。"""
+    import scripts.Binance_features_monitor as futures_monitor
+
+    return SignalEvaluator(futures_monitor.evaluate_signals, signals), futures_monitor.default_thresholds()
+
+
+# ---------- 回测 ----------
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    """沿时间轴（axis 0）用前一个有效值填 NaN。"""
+    valid = ~np.isnan(values)
+    idx = np.where(valid, np.arange(len(values))[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    # 第一个有效值之前 idx 停在 0，取到的仍是 NaN
+    return values[idx, np.arange(values.shape[1])]
+
+
+def forward_returns(times: np.ndarray, price: np.ndarray, horizon_ms: int) -> np.ndarray:
+    """每个 (时间, symbol) 持有 horizon 后的收益（%）；超出数据末尾的为 NaN。"""
+    filled = forward_fill(price.astype(np.float64))
+    target = np.searchsorted(times, times + horizon_ms, side="left")
+    out = np.full(price.shape, np.nan)
+    ok = target < len(times)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[ok] = (filled[target[ok]] - price[ok]) / price[ok] * 100
+    return out
+
+
+def apply_cooldown(mask: np.ndarray, times: np.ndarray, cooldown_ms: int) -> np.ndarray:
+    """同一个 symbol 在 cooldown 内只保留第一次命中（与线上 AlertState 不升级时的行为一致）。"""
+    if cooldown_ms <= 0:
+        return mask
+    out = np.zeros_like(mask)
+    for s in np.flatnonzero(mask.any(axis=0)):
+        last = None
+        for t in np.flatnonzero(mask[:, s]):
+            if last is None or times[t] - last >= cooldown_ms:
+                out[t, s] = True
+                last = times[t]
+    return out
+
+
+class Backtest:
+    """一个面板 + 一套条件逻辑；run(params) 返回这组参数的统计。"""
+
+    def __init__(
+        self,
+        panel: Panel,
+        evaluator: Evaluator,
+        *,
+        price_column: str,
+        horizons: Mapping[str, int],
+        defaults: Optional[Mapping[str, float]] = None,
+        cooldown_seconds: float = 0.0,
+        direction_column: Optional[str] = None,
+    ) -> None:
+        self.panel = panel
+        self.evaluator = evaluator
+        self.defaults = dict(defaults or {})
+        self.cooldown_ms = int(cooldown_seconds * 1000)
+        t, s = panel.shape
+        self.size = t * s
+        # 展平成一列，一组参数只需对每条规则做一次整列运算
+        self.flat: Columns = {name: values.reshape(-1) for name, values in panel.columns.items()}
+        price = panel.columns[price_column]
+        self.returns = {
+            name: forward_returns(panel.times, price, minutes * 60_000) for name, minutes in horizons.items()
+        }
+        if direction_column:
+            # 按告警方向算收益：价格是跌出来的告警，下跌记为正收益
+            sign = np.sign(panel.columns[direction_column])
+            self.returns = {name: r * sign for name, r in self.returns.items()}
+
+    def run(self, params: Mapping[str, float]) -> Dict[str, float]:
+        merged = dict(self.defaults)
+        merged.update(params)
+        masks = self.evaluator(self.flat, self.size, merged)
+        hit = np.zeros(self.size, dtype=bool)
+        for mask in masks.values():
+            hit |= np.asarray(mask, dtype=bool)
+        hit = apply_cooldown(hit.reshape(self.panel.shape), self.panel.times, self.cooldown_ms)
+
+        result: Dict[str, float] = dict(params)
+        result["alerts"] = int(hit.sum())
+        result["symbols"] = int(hit.any(axis=0).sum())
+        for name, returns in self.returns.items():
+            values = returns[hit]
+            values = values[~np.isnan(values)]
+            result[f"ret_{name}_mean"] = float(values.mean()) if len(values) else np.nan
+            result[f"ret_{name}_median"] = float(np.median(values)) if len(values) else np.nan
+            result[f"ret_{name}_win"] = float((values > 0).mean()) if len(values) else np.nan
+        return result
+
+
+def param_grid(grid: Mapping[str, Sequence[float]]) -> List[Params]:
+    names = list(grid)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(grid[n] for n in names))]
+
+
+_worker_backtest: Optional[Backtest] = None
+
+
+def _init_worker(backtest: Backtest) -> None:
+    global _worker_backtest
+    _worker_backtest = backtest
+
+
+def _run_worker(params: Params) -> Dict[str, float]:
+    assert _worker_backtest is not None
+    return _worker_backtest.run(params)
+
+
+def sweep(backtest: Backtest, grid: Mapping[str, Sequence[float]], *, workers: int = 1) -> List[Dict[str, float]]:
+    """
+    跑完整个参数网格，结果按网格顺序返回。workers > 1 时用多进程，
+    面板通过 initializer 交给每个工作进程一次，之后每个任务只传参数。
+    """
+    combos = param_grid(grid)
+    if workers <= 1 or len(combos) <= 1:
+        return [backtest.run(p) for p in combos]
+    chunksize = max(1, len(combos) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(backtest,)) as pool:
+        return list(pool.map(_run_worker, combos, chunksize=chunksize))
+
+
+# ---------- 命令行 ----------
+
+
+def parse_values(text: str) -> List[float]:
+    """"1,2,5" -> [1, 2, 5]；"6:12:2" -> [6, 8, 10, 12]（含终点）。"""
+    if ":" in text:
+        start, stop, step = (float(x) for x in text.split(":"))
+        count = int(round((stop - start) / step)) + 1
+        return [round(start + i * step, 10) for i in range(count)]
+    return [float(x) for x in text.split(",") if x]
+
+
+def write_csv(path: str, rows: Iterable[Mapping[str, float]]) -> None:
+    rows = list(rows)
+    if not rows:
+        return
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay monitor conditions over history and sweep thresholds.")
+    parser.add_argument("--monitor", choices=["oi", "futures"], default="oi")
+    parser.add_argument("--snapshots", help="recorder 快照目录（默认取对应配置的 SNAPSHOT_DIR）")
+    parser.add_argument("--days", help="只用这几天的快照，逗号分隔")
+    parser.add_argument("--download-days", type=float, help="不用快照，下载最近 N 天 K 线 / OI（仅 oi）")
+    parser.add_argument("--symbols", help="下载哪些 symbol，逗号分隔")
+    parser.add_argument("--cache", help="面板缓存 .npz：存在就直接读，否则生成后写入")
+    parser.add_argument("--mc", type=float, help="MC 列缺失时填的常数（下载的历史没有 MC）")
+    parser.add_argument("--rules", help="OI 规则模板 JSON（expr 里用 {参数名} 占位）")
+    parser.add_argument("--signals", help="futures：只统计这些信号，逗号分隔")
+    parser.add_argument("--grid", action="append", default=[], help="参数=取值，如 OI_CHANGE_1H_PCT=5,8,10 或 6:12:1")
+    parser.add_argument("--horizons", default="15m,1h,4h")
+    parser.add_argument("--direction", help="按这一列的正负号给收益定方向（如 price_1h_pct）")
+    parser.add_argument("--cooldown", type=float, help="告警冷却秒数（默认同线上 ALERT_COOLDOWN_SECONDS）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--out", help="结果写到 CSV")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    cfg = config_oi if args.monitor == "oi" else config
+    started = time.time()
+    if args.cache and os.path.exists(args.cache):
+        panel = Panel.load(args.cache)
+    elif args.download_days:
+        if args.monitor != "oi":
+            parser.error("--download-days only supports --monitor oi (depth / taker have no history)")
+        if not args.symbols:
+            parser.error("--download-days needs --symbols")
+        end_ms = int(time.time() * 1000)
+        panel = download_history(
+            args.symbols.split(","), start_ms=end_ms - int(args.download_days * 86_400_000), end_ms=end_ms
+        )
+    else:
+        root = args.snapshots or cfg.SNAPSHOT_DIR
+        if not root:
+            parser.error("no snapshot dir: pass --snapshots or set SNAPSHOT_DIR_oi / SNAPSHOT_DIR_fu")
+        panel = load_snapshots(root, args.days.split(",") if args.days else None)
+    if args.cache and not os.path.exists(args.cache):
+        panel.save(args.cache)
+    if args.mc is not None and "mc" in panel.columns:
+        panel.columns["mc"][np.isnan(panel.columns["mc"])] = args.mc
+    print(f"panel {panel.shape[0]} rounds x {panel.shape[1]} symbols loaded in {time.time() - started:.1f}s")
+
+    if args.monitor == "oi":
+        template = None
+        if args.rules:
+            with open(args.rules, encoding="utf-8") as fh:
+                template = json.load(fh)
+        evaluator, defaults = oi_evaluator(template)
+        price_column = "last_price"
+    else:
+        evaluator, defaults = futures_evaluator(args.signals.split(",") if args.signals else None)
+        price_column = "mark_price"
+
+    grid: Dict[str, List[float]] = {}
+    for item in args.grid:
+        name, _, values = item.partition("=")
+        if name not in defaults:
+            parser.error(f"unknown parameter {name}; available: {', '.join(defaults)}")
+        grid[name] = parse_values(values)
+
+    backtest = Backtest(
+        panel,
+        evaluator,
+        price_column=price_column,
+        horizons={h: interval_minutes(h) for h in args.horizons.split(",")},
+        defaults=defaults,
+        cooldown_seconds=cfg.ALERT_COOLDOWN_SECONDS if args.cooldown is None else args.cooldown,
+        direction_column=args.direction,
+    )
+    started = time.time()
+    results = sweep(backtest, grid, workers=args.workers)
+    print(f"{len(results)} parameter sets in {time.time() - started:.1f}s ({args.workers} workers)")
+
+    if args.out:
+        write_csv(args.out, results)
+    first = f"ret_{args.horizons.split(',')[0]}_mean"
+    ranked = sorted(results, key=lambda r: -np.nan_to_num(r[first], nan=-np.inf))
+    writer = csv.DictWriter(sys.stdout, fieldnames=list(results[0]) if results else [], delimiter="\t")
+    writer.writeheader()
+    for row in ranked[: args.top]:
+        writer.writerow({k: f"{v:.4g}" if isinstance(v, float) else v for k, v in row.items()})
+
+
+if __name__ == "__main__":
+    main()
@@ -18,9 +18,10 @@ OI/MC:<比值>
 
 import time
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
+
+import numpy as np
 
-import requests
 
 from config.config_oi import (
     BINANCE_FAPI_BASE,
@@ -30,14 +31,34 @@ from config.config_oi import (
     FAPI_OI_HISTORY,
     POLL_INTERVAL,
     MAX_SYMBOLS,
+    FETCH_WORKERS,
     PRICE_CHANGE_1H_PCT,
     OI_CHANGE_1H_PCT,
     OI_PERIOD,
     OI_POINTS,
     MIN_NOTIONAL_24H,
+    ALERT_COOLDOWN_SECONDS,
+    ALERT_ESCALATION_PCT,
+    ALERT_STATE_TTL,
+    OI_SWING_WINDOWS,
     FEISHU_WEBHOOK,
     FEISHU_KEYWORD,
+    UNIVERSE_CACHE_FILE,
+    UNIVERSE_REFRESH_SECONDS,
+    METRICS_PORT,
 )
+from scripts.alert_state import AlertState
+from scripts.binance_http import http_get
+from scripts.feishu_notifier import get_notifier
+from scripts.market_hub import MarketHub, MarketSnapshot, universe_changes
+from scripts.metrics import REGISTRY, STAGE_SECONDS, observe_round, start_metrics_server, timed
+from scripts.pipeline import Stage, StagedPipeline
+from scripts.rolling_window import SwingDetector, format_swing, parse_windows
+from scripts.scheduler import rank_symbols
+from scripts.series_cache import SeriesStore
+from scripts.signal_table import MetricTable
+from scripts.timeframes import interval_minutes
+from scripts.universe import UniverseManager, parse_usdt_perpetuals
 
 print("DEBUG FEISHU_WEBHOOK =", repr(FEISHU_WEBHOOK))
 print("DEBUG FEISHU_KEYWORD =", repr(FEISHU_KEYWORD))
@@ -45,42 +66,20 @@ print("DEBUG FEISHU_KEYWORD =", repr(FEISHU_KEYWORD))
 
 # ========= 工具函数 =========
 
-session = requests.Session()
-adapter = requests.adapters.HTTPAdapter(max_retries=2, pool_connections=50, pool_maxsize=50)
-session.mount("https://", adapter)
-session.mount("http://", adapter)
-
-
-def http_get(url: str, *, params: Optional[Dict] = None, timeout: int = 10) -> requests.Response:
-    """带简单重试的 GET 请求。"""
-    resp = session.get(url, params=params, timeout=timeout)
-    resp.raise_for_status()
-    return resp
-
-
 def send_feishu_text(content: str) -> None:
+    """放进后台发送队列后立即返回，不阻塞扫描（scripts/feishu_notifier.py）。"""
     if not FEISHU_WEBHOOK:
         print("FEISHU_WEBHOOK not set; skip sending")
         return
+    get_notifier(FEISHU_WEBHOOK).send_text(content, keyword=FEISHU_KEYWORD)
 
-    headers = {"Content-Type": "application/json; charset=utf-8"}
-
-    # 飞书文本消息大约 4000 字符以内比较稳，这里保守一点 3500
-    MAX_LEN = 3500
-
-    # 按长度切块发送
-    for i in range(0, len(content), MAX_LEN):
-        part = content[i : i + MAX_LEN]
-        data = {
-            "msg_type": "text",
-            "content": {"text": f"{FEISHU_KEYWORD} {part}"},
-        }
-        try:
-            resp = requests.post(FEISHU_WEBHOOK, json=data, headers=headers, timeout=8)
-            print("Feishu status:", resp.status_code, resp.text)
-        except Exception as exc:
-            print("Feishu error:", exc)
-            break
+
+def send_feishu_alerts(header: str, alerts: List[str]) -> None:
+    """告警按完整的块装箱发送，一条告警不会被拆到两条消息里。"""
+    if not FEISHU_WEBHOOK:
+        print("FEISHU_WEBHOOK not set; skip sending")
+        return
+    get_notifier(FEISHU_WEBHOOK).send_blocks(alerts, header=header, keyword=FEISHU_KEYWORD)
 
 def now_utc8_str() -> str:
     dt = datetime.now(timezone.utc) + timedelta(hours=8)
@@ -90,19 +89,9 @@ def now_utc8_str() -> str:
 # ========= Binance 数据获取 =========
 
 def fetch_usdt_perp_symbols() -> List[str]:
-    """获取所有 USDT 永续合约 symbol 列表。"""
+    """获取所有 USDT 永续合约 symbol 列表（不截断，交给调度 / 排名取前 MAX_SYMBOLS 个）。"""
     resp = http_get(FAPI_EXCHANGE_INFO)
-    data = resp.json()
-    symbols: List[str] = []
-    for item in data.get("symbols", []):
-        if (
-            item.get("contractType") == "PERPETUAL"
-            and item.get("quoteAsset") == "USDT"
-            and item.get("status") == "TRADING"
-        ):
-            symbols.append(item["symbol"])
-    symbols.sort()
-    return symbols[:MAX_SYMBOLS]
+    return parse_usdt_perpetuals(resp.json())
 
 
 def fetch_24h_ticker_map() -> Dict[str, Dict]:
@@ -145,119 +134,236 @@ def fetch_1h_price_change(symbol: str) -> Tuple[float, float]:
     return change_pct, last_close
 
 
-def fetch_1h_oi_change(symbol: str) -> Tuple[float, float]:
+def fetch_oi_series(
+    symbol: str, start_time: Optional[int], limit: int
+) -> List[Tuple[int, float]]:
     """
-    使用 openInterestHist 估算 1 小时 OI 变化：
-    - period: OI_PERIOD（默认 5m）
-    - limit: OI_POINTS（默认 13，约 1h）
-    - 返回 (1H OI 变化%, 最新 OI 名义价值 USDT)
+    拉 OI_PERIOD 粒度的 openInterestHist，返回 [(时间戳 ms, sumOpenInterestValue), ...]。
+    start_time 不为空时只拉这之后的点（增量）。
     """
     params = {
         "symbol": symbol,
         "period": OI_PERIOD,
-        "limit": OI_POINTS,
+        "limit": limit,
     }
+    if start_time is not None:
+        params["startTime"] = start_time
     resp = http_get(FAPI_OI_HISTORY, params=params)
-    rows = resp.json()
-    if len(rows) < 2:
-        return 0.0, 0.0
+    return [
+        (int(row.get("timestamp", 0)), float(row.get("sumOpenInterestValue", 0.0)))
+        for row in resp.json()
+    ]
+
 
-    first = rows[0]
-    last = rows[-1]
+# OI 序列增量缓存：预热后每轮只拉上一轮之后的新点，而不是每次 OI_POINTS 条
+oi_store = SeriesStore(OI_POINTS, interval_minutes(OI_PERIOD) * 60_000)
+
+
+def fetch_1h_oi_change(symbol: str) -> Tuple[float, float]:
+    """
+    使用 openInterestHist 估算 1 小时 OI 变化：
+    - period: OI_PERIOD（默认 5m）
+    - 缓存最近 OI_POINTS（默认 13，约 1h）个点
+    - 返回 (1H OI 变化%, 最新 OI 名义价值 USDT)
+    """
+    # 和 oi_1 共用缓存时缓冲区可能更长，只看最近 OI_POINTS 个点
+    values = oi_store.refresh(symbol, "oi", fetch_oi_series)[-OI_POINTS:]
+    if len(values) < 2:
+        return 0.0, 0.0
 
     # sumOpenInterestValue 是名义价值（USDT），更直观
-    first_val = float(first.get("sumOpenInterestValue", 0.0))
-    last_val = float(last.get("sumOpenInterestValue", 0.0))
+    first_val = float(values[0])
+    last_val = float(values[-1])
 
     change_pct = (last_val - first_val) / first_val * 100 if first_val else 0.0
     return change_pct, last_val
 
 
+def fetch_price_stage(symbol: str) -> Dict[str, float]:
+    """kline 阶段：1H 价格变化。"""
+    price_1h_pct, last_price = fetch_1h_price_change(symbol)
+    return {"price_1h_pct": price_1h_pct, "last_price": last_price}
+
+
+def fetch_oi_stage(symbol: str) -> Dict[str, float]:
+    """oi 阶段：只给价格条件已满足的 symbol 调用。"""
+    oi_1h_pct, oi_notional = fetch_1h_oi_change(symbol)
+    return {"oi_1h_pct": oi_1h_pct, "oi_notional": oi_notional}
+
+
+def screen_column(column: str, passes: Callable[[np.ndarray], np.ndarray]):
+    """把 {symbol: 指标} 拼成一列，用数组条件一次筛完。"""
+
+    def screen(rows: Dict[str, Dict[str, float]]) -> List[str]:
+        table = MetricTable.from_rows(rows, [column])
+        return [table.symbols[i] for i in table.indices(passes(table[column]))]
+
+    return screen
+
+
+def build_pipeline(ticker_map: Dict[str, Dict]) -> StagedPipeline:
+    """
+    bulk（24H 成交额过滤 + 按成交额 / 振幅取前 MAX_SYMBOLS）→ 1H 价格 → 1H OI。
+    大部分 symbol 在价格条件上就被刷掉，不再拉 OI。
+    """
+
+    def screen_bulk(rows: Dict[str, Dict[str, float]]) -> List[str]:
+        liquid = [
+            s for s in rows
+            if float(ticker_map.get(s, {}).get("quoteVolume", 0.0)) >= MIN_NOTIONAL_24H
+        ]
+        return rank_symbols(liquid, ticker_map)[:MAX_SYMBOLS]
+
+    return StagedPipeline(
+        [
+            Stage("bulk", screen=screen_bulk),
+            # 只关心：|1H 价格变化| >= 阈值 且 OI 1H 增长 >= 阈值
+            Stage("kline", fetch=fetch_price_stage,
+                  screen=screen_column("price_1h_pct", lambda v: np.abs(v) >= PRICE_CHANGE_1H_PCT)),
+            Stage("oi", fetch=fetch_oi_stage,
+                  screen=screen_column("oi_1h_pct", lambda v: v >= OI_CHANGE_1H_PCT)),
+        ],
+        max_workers=FETCH_WORKERS,
+    )
+
+
 # ========= 主逻辑 =========
 
 def format_millions(value: float) -> str:
     return f"{value/1_000_000:.2f}M"
 
 
-def main() -> None:
+# /metrics 里的 monitor 标签
+METRICS_NAME = "oi"
 
-    # 先拿币种列表
-    symbols = fetch_usdt_perp_symbols()
-    print(f"[{now_utc8_str()}] Loaded {len(symbols)} USDT perpetual symbols")
-
-    # 再发启动提示
-    start_msg = (
-        f"脚本已启动:\n"
-        f"启动时间：{now_utc8_str()}\n"
-        f"监控上限：{len(symbols)} 合约\n"
-        f"条件：1H价格变化 ≥ {PRICE_CHANGE_1H_PCT}% 且 "
-        f"1H OI 增长 ≥ {OI_CHANGE_1H_PCT}%"
-    )
-    send_feishu_text(start_msg)
-    # ===========================
 
+class OiMonitor:
+    """
+    一轮：24H ticker 筛成交额 → 1H K 线 → 1H OI → 飞书。
+    单独运行时由 main() 驱动，也可以作为 scripts/market_hub.py 的插件和别的监控共用数据。
+    """
 
-    while True:
-        started = time.time()
+    name = METRICS_NAME
+
+    def __init__(self) -> None:
+        self.symbols: List[str] = []
+        # 24H ticker 最新价的窗口内振幅；冷却状态只用于振幅告警（1H 条件告警照旧每轮都报）
+        self.swings = SwingDetector(parse_windows(OI_SWING_WINDOWS))
+        self.swing_state = AlertState(
+            cooldown=ALERT_COOLDOWN_SECONDS, escalation_pct=ALERT_ESCALATION_PCT, ttl=ALERT_STATE_TTL
+        )
+
+    @property
+    def interval(self) -> float:
+        return POLL_INTERVAL
+
+    def setup(self, hub: MarketHub) -> None:
+        global oi_store
+        hub.add_source("ticker", fetch_24h_ticker_map)
+        # OI 序列和 oi_1 的同粒度序列共用一份缓存（一起跑时只拉一次）
+        oi_store = hub.series_store(f"fapi_{OI_PERIOD}", OI_POINTS, interval_minutes(OI_PERIOD) * 60_000)
+        REGISTRY.register_stats("series_cache", oi_store.stats, {"monitor": METRICS_NAME})
+        self.symbols = hub.symbols()
+        print(f"[{now_utc8_str()}] Loaded {len(self.symbols)} USDT perpetual symbols")
+
+        # 再发启动提示
+        start_msg = (
+            f"脚本已启动:\n"
+            f"启动时间：{now_utc8_str()}\n"
+            f"监控上限：{min(len(self.symbols), MAX_SYMBOLS)} 合约\n"
+            f"条件：1H价格变化 ≥ {PRICE_CHANGE_1H_PCT}% 且 "
+            f"1H OI 增长 ≥ {OI_CHANGE_1H_PCT}%"
+        )
+        send_feishu_text(start_msg)
+
+    def run_round(self, snapshot: MarketSnapshot) -> None:
         alerts: List[str] = []
 
-        try:
-            ticker_map = fetch_24h_ticker_map()
-        except Exception as exc:
-            print("fetch_24h_ticker_map error:", exc)
-            ticker_map = {}
-
-        for symbol in symbols:
-            try:
-                t24 = ticker_map.get(symbol)
-                if not t24:
-                    continue
-
-                # 过滤日成交额太低的
-                quote_volume = float(t24.get("quoteVolume", 0.0))
-                if quote_volume < MIN_NOTIONAL_24H:
-                    continue
-
-                price_24h_pct = float(t24.get("priceChangePercent", 0.0))
-
-                price_1h_pct, last_price = fetch_1h_price_change(symbol)
-                oi_1h_pct, oi_notional = fetch_1h_oi_change(symbol)
-
-                # 只关心：|1H 价格变化| >= 阈值 且 OI 1H 增长 >= 阈值
-                if abs(price_1h_pct) < PRICE_CHANGE_1H_PCT:
-                    continue
-                if oi_1h_pct < OI_CHANGE_1H_PCT:
-                    continue
-
-                # MC 用 24H notional 近似（quoteVolume），你可以理解为流动性规模
-                mc_notional = quote_volume
-
-                oi_mc_ratio = oi_notional / mc_notional if mc_notional > 0 else 0.0
-
-                line = (
-                    f"{symbol}  MC:${format_millions(mc_notional)}\n\n"
-                    f"Price: {last_price:.4f}\n"
-                    f"OI:${format_millions(oi_notional)}\n"
-                    f"OI/MC:{oi_mc_ratio:.2f}\n"
-                    f"1H price change:{price_1h_pct:+.2f}%\n"
-                    f"1H OI change:{oi_1h_pct:+.2f}%\n"
-                    f"24H Price change:{price_24h_pct:+.2f}%"
-                )
-                alerts.append(line)
-
-            except Exception as exc:
-                # print(f"{symbol} fetch error: {exc}")  # 调试时用
-                print(f"{now_utc8_str()} {symbol} fetch error: {type(exc).__name__}")
-                continue
+        # 新上线 / 下架的合约不用重启
+        added, removed = universe_changes(self.symbols, snapshot.symbols)
+        if added or removed:
+            self.symbols = snapshot.symbols
+            for symbol in removed:
+                oi_store.discard(symbol)
+            self.swings.remove(removed)
+            print(f"[{now_utc8_str()}] universe +{len(added)} -{len(removed)}: added {added} removed {removed}")
+
+        with timed(METRICS_NAME, "ticker_fetch"):
+            ticker_map = snapshot.get("ticker", {})
+
+        # 分阶段：24H ticker 先筛成交额，K 线只拉幸存者，OI 只拉价格条件已满足的
+        pipeline = build_pipeline(ticker_map)
+        metrics_map = pipeline.run([s for s in self.symbols if s in ticker_map])
+        for symbol, exc in pipeline.errors.items():
+            print(f"{now_utc8_str()} {symbol} fetch error: {type(exc).__name__} - {exc}")
+        print(f"[{now_utc8_str()}] pipeline {pipeline.describe()}")
+        for st in pipeline.stats:
+            STAGE_SECONDS.observe(st.seconds, monitor=METRICS_NAME, stage=f"pipeline_{st.name}")
+
+        for symbol, metrics in metrics_map.items():
+            t24 = ticker_map[symbol]
+            quote_volume = float(t24.get("quoteVolume", 0.0))
+            price_24h_pct = float(t24.get("priceChangePercent", 0.0))
+            price_1h_pct, last_price = metrics["price_1h_pct"], metrics["last_price"]
+            oi_1h_pct, oi_notional = metrics["oi_1h_pct"], metrics["oi_notional"]
+
+            # MC 用 24H notional 近似（quoteVolume），你可以理解为流动性规模
+            mc_notional = quote_volume
+
+            oi_mc_ratio = oi_notional / mc_notional if mc_notional > 0 else 0.0
+
+            line = (
+                f"{symbol}  MC:${format_millions(mc_notional)}\n\n"
+                f"Price: {last_price:.4f}\n"
+                f"OI:${format_millions(oi_notional)}\n"
+                f"OI/MC:{oi_mc_ratio:.2f}\n"
+                f"1H price change:{price_1h_pct:+.2f}%\n"
+                f"1H OI change:{oi_1h_pct:+.2f}%\n"
+                f"24H Price change:{price_24h_pct:+.2f}%"
+            )
+            alerts.append(line)
+
+        # 窗口内振幅：过了成交额过滤的 symbol 每轮都有最新价，和 1H 条件互不影响
+        prices: Dict[str, float] = {}
+        for symbol in self.symbols:
+            t24 = ticker_map.get(symbol)
+            if t24 and float(t24.get("quoteVolume", 0.0)) >= MIN_NOTIONAL_24H and float(t24.get("lastPrice", 0.0)) > 0:
+                prices[symbol] = float(t24["lastPrice"])
+        for symbol, swings in self.swings.update_many(snapshot.ts, prices).items():
+            lines = [format_swing(s) for s in swings if self.swing_state.should_alert(symbol, f"swing_{s.window}", s.pct)]
+            if lines:
+                alerts.append(f"{symbol}\n\nPrice: {prices[symbol]:.4f}\n" + "\n".join(lines))
 
         if alerts:
             header = f"[{now_utc8_str()}] 1H 异动合约（价格≥{PRICE_CHANGE_1H_PCT}%, OI≥{OI_CHANGE_1H_PCT}%，绝对值）\n\n"
-            text = header + "\n\n".join(alerts)
-            send_feishu_text(text)
+            with timed(METRICS_NAME, "feishu_send"):
+                send_feishu_alerts(header, alerts)
         else:
             print(f"[{now_utc8_str()}] No symbols matched conditions this round")
 
+
+def main() -> None:
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+
+    # 先拿币种列表：优先读本地缓存，后台定时刷新
+    hub = MarketHub(
+        UniverseManager(
+            fetch_usdt_perp_symbols,
+            cache_path=UNIVERSE_CACHE_FILE or None,
+            refresh_seconds=UNIVERSE_REFRESH_SECONDS,
+        ),
+        max_age=0,
+    )
+    hub.start()
+    monitor = OiMonitor()
+    monitor.setup(hub)
+
+    while True:
+        started = time.time()
+        monitor.run_round(hub.snapshot())
         elapsed = time.time() - started
+        observe_round(METRICS_NAME, elapsed, POLL_INTERVAL)
         sleep_for = max(5, POLL_INTERVAL - int(elapsed))
         time.sleep(sleep_for)
 
@@ -1,7 +1,7 @@
 """
 监控 Binance 所有 USDT 永续合约 + CoinGecko 实时流通市值 MC：
 
-触发条件（满足其一）：
+触发条件（满足其一；没有 config/rules.json 时用下面两条默认规则，阈值来自脚本头部的常量）：
 
 条件1（1小时级别）：
 1. 价格在过去 1 小时变化 >= PRICE_CHANGE_1H_PCT（取绝对值）；
@@ -26,9 +26,9 @@ OI/MC:<比值>
 
 import time
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, FrozenSet, List, Tuple, Optional
 
-import requests
+import numpy as np
 
 from config.config_oi import (
     BINANCE_FAPI_BASE,
@@ -38,7 +38,40 @@ from config.config_oi import (
     FAPI_OI_HISTORY,
     FEISHU_WEBHOOK,
     FEISHU_KEYWORD,
+    FEISHU_MSG_FORMAT,
+    FSTREAM_BASE,
+    STREAM_MAX_AGE,
+    STREAM_MODE,
+    STREAM_POLL_INTERVAL,
+    RULES_FILE,
+    UNIVERSE_CACHE_FILE,
+    UNIVERSE_REFRESH_SECONDS,
+    ALERT_COOLDOWN_SECONDS,
+    ALERT_ESCALATION_PCT,
+    ALERT_STATE_TTL,
+    ALERT_STATE_FILE,
+    OI_SWING_WINDOWS,
+    COINGECKO_INDEX_FILE,
+    SNAPSHOT_DIR,
+    METRICS_PORT,
 )
+from scripts.alert_state import AlertState
+from scripts.binance_http import http_get
+from scripts.coingecko import CoinGeckoIndex, McCache
+from scripts.feishu_notifier import get_notifier
+from scripts.fetch_engine import fetch_all
+from scripts.market_hub import MarketHub, MarketSnapshot, universe_changes
+from scripts.market_stream import MarketStream
+from scripts.metrics import REGISTRY, STAGE_SECONDS, observe_round, start_metrics_server, timed
+from scripts.pipeline import Stage, StagedPipeline
+from scripts.recorder import SnapshotRecorder
+from scripts.rolling_window import SwingDetector, format_swing, parse_windows
+from scripts.rules import RuleSet, fill_template, load_rules, parse_rules
+from scripts.scheduler import TieredScheduler
+from scripts.series_cache import SeriesStore
+from scripts.signal_table import MetricTable
+from scripts.universe import UniverseManager, parse_usdt_perpetuals
+from scripts.timeframes import interval_minutes, points_needed, window_changes
 
 print("DEBUG FEISHU_WEBHOOK =", repr(FEISHU_WEBHOOK))
 print("DEBUG FEISHU_KEYWORD =", repr(FEISHU_KEYWORD))
@@ -49,9 +82,22 @@ print("DEBUG FEISHU_KEYWORD =", repr(FEISHU_KEYWORD))
 # 轮询间隔（秒）
 POLL_INTERVAL: int = 60
 
-# 最多监控多少个 USDT 永续合约（按 exchangeInfo 返回顺序截断）
+# 最多监控多少个 USDT 永续合约（按成交额 / 振幅排名截断，见下面的分层调度）
 MAX_SYMBOLS: int = 500
 
+# 分层调度（scripts/scheduler.py）：按 24H 成交额和振幅排名，
+# 前 HOT_TIER_SIZE 个每 hot 间隔刷新一次，其次 WARM_TIER_SIZE 个按 warm 间隔，其余按 cold 间隔
+HOT_TIER_SIZE: int = 60
+WARM_TIER_SIZE: int = 140
+TIER_INTERVALS: Dict[str, float] = {
+    "hot": 60,
+    "warm": 180,
+    "cold": 600,
+}
+
+# 单轮并发拉取的线程数（不要超过下面连接池的 pool_maxsize=50）
+FETCH_WORKERS: int = 20
+
 # 24H 成交额过滤下限（USDT），小于这个就不监控，避免垃圾币
 MIN_NOTIONAL_24H: float = 5_000_000.0
 
@@ -66,20 +112,44 @@ OI_CHANGE_15M_PCT: float = 8.0     # 15m OI 增长 >= 8%
 # 价格波动是否取绝对值（True = 涨跌都算，False = 只看上涨）
 USE_ABS_PRICE_CHANGE: bool = True
 
-# 价格 K 线配置
-PRICE_1H_INTERVAL: str = "1h"
-PRICE_1H_LIMIT: int = 2           # 取最近两根 1h K 线
-
-PRICE_15M_INTERVAL: str = "15m"
-PRICE_15M_LIMIT: int = 2          # 取最近两根 15m K 线
-
-# OI 历史配置（Binance openInterestHist）
-# 说明：period 支持 "5m", "15m", "1h", "4h" 等
-OI_1H_PERIOD: str = "1h"
-OI_1H_POINTS: int = 2             # 最近两条 1h OI 数据
+# 多时间窗口配置：价格（K 线收盘价）和 OI（openInterestHist）都只拉一条 BASE_INTERVAL 序列，
+# 15m / 1H 等窗口在本地聚合（scripts/timeframes.py）。
+# 想加 30m / 4H 只需在 WINDOWS 里加一项，不会多一次请求。
+BASE_INTERVAL: str = "5m"
+WINDOWS: Dict[str, int] = {
+    "15m": 15,
+    "1h": 60,
+}
 
-OI_15M_PERIOD: str = "15m"
-OI_15M_POINTS: int = 2            # 最近两条 15m OI 数据
+# 告警规则：RULES_FILE（默认 config/rules.json，语法见 scripts/rules.py）存在时读它，
+# 否则用下面的默认规则模板。仓库里不带 rules.json，只带 config/rules.example.json，
+# 改阈值常量就能生效；要自定义规则时再复制一份。
+# 模板里的阈值写成 {常量名} 占位，加载时按 DEFAULT_RULE_PARAMS 填（rules.json 里也可以这样引用）；
+# 回测（scripts/backtest.py）用同一份规则按参数网格扫阈值。
+_PRICE_EXPR = "abs(price_{})" if USE_ABS_PRICE_CHANGE else "price_{}"
+DEFAULT_RULE_TEMPLATE: Dict = {
+    "rules": [
+        {
+            "name": "条件1（1H）",
+            "expr": f"{_PRICE_EXPR.format('1h')} >= {{PRICE_CHANGE_1H_PCT}} "
+                    "and oi_1h >= {OI_CHANGE_1H_PCT} and mc > 0",
+            "severity": _PRICE_EXPR.format("1h"),
+        },
+        {
+            "name": "条件2（15m）",
+            "expr": f"{_PRICE_EXPR.format('15m')} >= {{PRICE_CHANGE_15M_PCT}} "
+                    "and oi_15m >= {OI_CHANGE_15M_PCT} and mc > 0",
+            "severity": _PRICE_EXPR.format("15m"),
+        },
+    ]
+}
+DEFAULT_RULE_PARAMS: Dict[str, float] = {
+    "PRICE_CHANGE_1H_PCT": PRICE_CHANGE_1H_PCT,
+    "OI_CHANGE_1H_PCT": OI_CHANGE_1H_PCT,
+    "PRICE_CHANGE_15M_PCT": PRICE_CHANGE_15M_PCT,
+    "OI_CHANGE_15M_PCT": OI_CHANGE_15M_PCT,
+}
+DEFAULT_RULES: Dict = fill_template(DEFAULT_RULE_TEMPLATE, DEFAULT_RULE_PARAMS)
 
 # ========= CoinGecko 相关配置 =========
 
@@ -88,8 +158,9 @@ COINGECKO_API_BASE: str = "https://api.coingecko.com/api/v3"
 # MC 刷新间隔（秒），不要太频繁避免被限流
 COINGECKO_REFRESH_SECONDS: int = 300
 
-# Binance symbol -> CoinGecko id 映射（只手动维护对不上号的币，主流都在这里写好）
-# 比如：BTCUSDT -> bitcoin，ETHUSDT -> ethereum
+# Binance symbol -> CoinGecko id 手动映射，优先级最高。
+# 其余 symbol 按 /coins/list 索引自动解析（scripts/coingecko.py），同名币用价格比对挑选，
+# 只有自动解析挑错的才需要在这里补。
 SYMBOL_TO_COINGECKO_ID: Dict[str, str] = {
     "BTCUSDT": "bitcoin",
     "ETHUSDT": "ethereum",
@@ -106,42 +177,28 @@ SYMBOL_TO_COINGECKO_ID: Dict[str, str] = {
 
 # ========= 工具函数 =========
 
-session = requests.Session()
-adapter = requests.adapters.HTTPAdapter(max_retries=2, pool_connections=50, pool_maxsize=50)
-session.mount("https://", adapter)
-session.mount("http://", adapter)
-
-
-def http_get(url: str, *, params: Optional[Dict] = None, timeout: int = 10) -> requests.Response:
-    """带简单重试的 GET 请求。"""
-    resp = session.get(url, params=params, timeout=timeout)
-    resp.raise_for_status()
-    return resp
-
-
 def send_feishu_text(content: str) -> None:
+    """放进后台发送队列后立即返回，不阻塞扫描（scripts/feishu_notifier.py）。"""
     if not FEISHU_WEBHOOK:
         print("FEISHU_WEBHOOK not set; skip sending")
         return
+    get_notifier(FEISHU_WEBHOOK).send_text(content, keyword=FEISHU_KEYWORD)
 
-    headers = {"Content-Type": "application/json; charset=utf-8"}
 
-    # 飞书文本消息大约 4000 字符以内比较稳，这里保守一点 3500
-    MAX_LEN = 3500
+def send_feishu_alerts(header: str, alerts: List[str]) -> None:
+    """告警按完整的块装箱发送，一条告警不会被拆到两条消息里。"""
+    if not FEISHU_WEBHOOK:
+        print("FEISHU_WEBHOOK not set; skip sending")
+        return
+    get_notifier(FEISHU_WEBHOOK).send_blocks(alerts, header=header, keyword=FEISHU_KEYWORD)
 
-    # 按长度切块发送
-    for i in range(0, len(content), MAX_LEN):
-        part = content[i: i + MAX_LEN]
-        data = {
-            "msg_type": "text",
-            "content": {"text": f"{FEISHU_KEYWORD} {part}"},
-        }
-        try:
-            resp = requests.post(FEISHU_WEBHOOK, json=data, headers=headers, timeout=8)
-            print("Feishu status:", resp.status_code, resp.text)
-        except Exception as exc:
-            print("Feishu error:", exc)
-            break
+
+def send_feishu_table(title: str, rows: List[Dict[str, str]]) -> None:
+    """告警以交互卡片表格发送（FEISHU_MSG_FORMAT=card）。"""
+    if not FEISHU_WEBHOOK:
+        print("FEISHU_WEBHOOK not set; skip sending")
+        return
+    get_notifier(FEISHU_WEBHOOK).send_table(title, CARD_COLUMNS, rows, keyword=FEISHU_KEYWORD)
 
 
 def now_utc8_str() -> str:
@@ -152,19 +209,9 @@ def now_utc8_str() -> str:
 # ========= Binance 数据获取 =========
 
 def fetch_usdt_perp_symbols() -> List[str]:
-    """获取所有 USDT 永续合约 symbol 列表。"""
+    """获取所有 USDT 永续合约 symbol 列表（不截断，交给调度 / 排名取前 MAX_SYMBOLS 个）。"""
     resp = http_get(FAPI_EXCHANGE_INFO)
-    data = resp.json()
-    symbols: List[str] = []
-    for item in data.get("symbols", []):
-        if (
-            item.get("contractType") == "PERPETUAL"
-            and item.get("quoteAsset") == "USDT"
-            and item.get("status") == "TRADING"
-        ):
-            symbols.append(item["symbol"])
-    symbols.sort()
-    return symbols[:MAX_SYMBOLS]
+    return parse_usdt_perpetuals(resp.json())
 
 
 def fetch_24h_ticker_map() -> Dict[str, Dict]:
@@ -185,127 +232,182 @@ def fetch_24h_ticker_map() -> Dict[str, Dict]:
     return mapping
 
 
-def fetch_price_change(symbol: str, interval: str, limit: int) -> Tuple[float, float]:
+def fetch_kline_series(
+    symbol: str, start_time: Optional[int], limit: int
+) -> List[Tuple[int, float]]:
     """
-    通用价格变化计算：
-    - interval: "1h" / "15m" 等
-    - limit: 至少 2
-    - 返回 (涨跌幅%, 最新收盘价)
+    拉 BASE_INTERVAL K 线，返回 [(开盘时间 ms, 收盘价), ...]（时间升序，最后一根未收盘）。
+    start_time 不为空时只拉这之后的 K 线（增量）。
     """
     params = {
         "symbol": symbol,
-        "interval": interval,
+        "interval": BASE_INTERVAL,
         "limit": limit,
     }
+    if start_time is not None:
+        params["startTime"] = start_time
     resp = http_get(FAPI_KLINES, params=params)
-    rows = resp.json()
-    if len(rows) < 2:
-        return 0.0, 0.0
+    return [(int(row[0]), float(row[4])) for row in resp.json()]
 
-    prev_close = float(rows[-2][4])
-    last_close = float(rows[-1][4])
 
-    change_pct = (last_close - prev_close) / prev_close * 100 if prev_close else 0.0
-    return change_pct, last_close
-
-
-def fetch_oi_change(symbol: str, period: str, points: int) -> Tuple[float, float]:
+def fetch_oi_series(
+    symbol: str, start_time: Optional[int], limit: int
+) -> List[Tuple[int, float]]:
     """
-    使用 openInterestHist 估算一段时间 OI 变化：
-    - period: "15m" / "1h" 等
-    - points: 至少 2
-    - 返回 (OI 变化%, 最新 OI 名义价值 USDT)
+    拉 BASE_INTERVAL 的 openInterestHist，返回 [(时间戳 ms, sumOpenInterestValue), ...]。
+    sumOpenInterestValue 是名义价值（USDT）。
     """
     params = {
         "symbol": symbol,
-        "period": period,
-        "limit": points,
+        "period": BASE_INTERVAL,
+        "limit": limit,
     }
+    if start_time is not None:
+        params["startTime"] = start_time
     resp = http_get(FAPI_OI_HISTORY, params=params)
+    return [
+        (int(row.get("timestamp", 0)), float(row.get("sumOpenInterestValue", 0.0)))
+        for row in resp.json()
+    ]
+
+
+# 本地聚合需要的基础粒度分钟数和序列长度
+BASE_MINUTES: int = interval_minutes(BASE_INTERVAL)
+SERIES_POINTS: int = points_needed(BASE_MINUTES, WINDOWS)
+
+# K 线收盘价 / OI 的增量缓存：预热后每轮每个 symbol 只拉最新一两个点
+series_store = SeriesStore(SERIES_POINTS, BASE_MINUTES * 60_000)
+
+# 流式模式下由 main() 创建；为 None 时所有价格都走 REST
+market_stream: Optional[MarketStream] = None
+
+
+def seed_stream_klines(symbol: str) -> None:
+    """用 REST K 线给 WebSocket 状态预热历史收盘价，启动后马上就能算各窗口变化。"""
+    resp = http_get(
+        FAPI_KLINES, params={"symbol": symbol, "interval": BASE_INTERVAL, "limit": SERIES_POINTS}
+    )
     rows = resp.json()
-    if len(rows) < 2:
-        return 0.0, 0.0
+    if rows:
+        market_stream.seed_kline(
+            symbol, BASE_INTERVAL, int(rows[-1][0]), [float(row[4]) for row in rows]
+        )
+
+
+def fetch_live_closes(symbol: str) -> List[float]:
+    """流式模式优先读 WebSocket K 线状态，历史不够覆盖最长窗口时回退到 REST。"""
+    if market_stream is not None:
+        closes = market_stream.closes(symbol, BASE_INTERVAL)
+        if len(closes) >= SERIES_POINTS:
+            return closes
+    return series_store.refresh(symbol, "close", fetch_kline_series).tolist()
+
+
+# 规则里能用的指标名 -> (指标表里的列名, 数据来源)
+# 数据来源：kline = 5m K 线，oi = 5m OI 历史，ticker = 24H ticker，mc = CoinGecko
+RULE_METRICS: Dict[str, Tuple[str, str]] = {
+    "last_price": ("last_price", "kline"),
+    "oi_notional": ("oi_notional", "oi"),
+    "price_24h": ("price_24h_pct", "ticker"),
+    "quote_volume": ("quote_volume", "ticker"),
+    "mc": ("mc", "mc"),
+}
+for _name in WINDOWS:
+    RULE_METRICS[f"price_{_name}"] = (f"price_{_name}_pct", "kline")
+    RULE_METRICS[f"oi_{_name}"] = (f"oi_{_name}_pct", "oi")
 
-    first = rows[-2]
-    last = rows[-1]
+# 生效的规则集，main() 启动时从 RULES_FILE 重新加载
+rule_set: RuleSet = parse_rules(DEFAULT_RULES, RULE_METRICS)
 
-    # sumOpenInterestValue 是名义价值（USDT）
-    first_val = float(first.get("sumOpenInterestValue", 0.0))
-    last_val = float(last.get("sumOpenInterestValue", 0.0))
 
-    change_pct = (last_val - first_val) / first_val * 100 if first_val else 0.0
-    return change_pct, last_val
+def required_sources(rules: RuleSet) -> FrozenSet[str]:
+    """规则实际引用到的数据来源；没有规则用到的数据整轮都不拉。"""
+    return frozenset(RULE_METRICS[name][1] for name in rules.metrics)
 
 
-# ========= CoinGecko 相关逻辑 =========
+def rule_columns(table: MetricTable) -> Dict[str, np.ndarray]:
+    """把指标表的列按规则里的指标名重新命名。"""
+    return {
+        name: table[column]
+        for name, (column, _) in RULE_METRICS.items()
+        if column in table
+    }
+
 
-def build_symbol_id_map(symbols: List[str]) -> Dict[str, str]:
+def fetch_kline_metrics(symbol: str) -> Dict[str, float]:
     """
-    构建 symbol -> coingecko_id 映射：
-    1. 如果在 SYMBOL_TO_COINGECKO_ID 中有显式配置，则用配置；
-    2. 否则用一个简单 heuristic：base = symbol[:-4].lower()（如 BTCUSDT -> btc）。
-       很多山寨币可能对不上，需要你后期在 SYMBOL_TO_COINGECKO_ID 里补。
+    kline 阶段：一条 BASE_INTERVAL K 线，本地聚合出 WINDOWS 里每个窗口的 price_<窗口>_pct 和 last_price。
+    流式模式下直接读 WebSocket 状态，不发请求。
     """
-    mapping: Dict[str, str] = {}
-    for s in symbols:
-        if s in SYMBOL_TO_COINGECKO_ID:
-            mapping[s] = SYMBOL_TO_COINGECKO_ID[s]
-        else:
-            # 假设都是 XXXUSDT 结构，截掉 USDT
-            if s.endswith("USDT"):
-                base = s[:-4].lower()
-            else:
-                base = s.lower()
-            mapping[s] = base
-    return mapping
+    closes = fetch_live_closes(symbol)
+    metrics: Dict[str, float] = {"last_price": closes[-1] if len(closes) >= 2 else 0.0}
+    for name, change in window_changes(closes, BASE_MINUTES, WINDOWS).items():
+        metrics[f"price_{name}_pct"] = change
+    return metrics
+
 
+def fetch_oi_metrics(symbol: str) -> Dict[str, float]:
+    """oi 阶段：一条 BASE_INTERVAL OI 历史，聚合出 oi_<窗口>_pct 和 oi_notional。"""
+    oi_values = series_store.refresh(symbol, "oi", fetch_oi_series).tolist()
+    metrics: Dict[str, float] = {"oi_notional": oi_values[-1] if len(oi_values) >= 2 else 0.0}
+    for name, change in window_changes(oi_values, BASE_MINUTES, WINDOWS).items():
+        metrics[f"oi_{name}_pct"] = change
+    return metrics
 
-def chunk_list(items: List[str], size: int) -> List[List[str]]:
-    return [items[i: i + size] for i in range(0, len(items), size)]
 
+# 全市场一次请求就能拿到的数据来源，在 bulk 阶段直接用来筛
+BULK_SOURCES: FrozenSet[str] = frozenset({"ticker", "mc"})
 
-def fetch_mc_map_from_coingecko(symbol_id_map: Dict[str, str]) -> Dict[str, float]:
+
+def rule_screen(
+    done_sources: FrozenSet[str],
+    ticker_map: Dict[str, Dict],
+    mc_map: Dict[str, float],
+) -> Callable[[Dict[str, Dict[str, float]]], List[str]]:
     """
-    使用 CoinGecko simple/price 接口获取 MC：
-    - 对每个 coingecko_id 请求 usd_market_cap
-    - 返回 {symbol: mc_usd}
-    注意：CoinGecko 的 market_cap 定义就是 circulating_supply * current_price，
-    符合你要的 MC 定义。
+    用已经拿到的数据来源做规则预筛：顶层 and 里只引用这些来源指标的项必须为真，
+    其余项当作可能为真（scripts/rules.py 的 prefilter）。
     """
-    # 去重后的 id 列表
-    ids = sorted(set(symbol_id_map.values()))
-    if not ids:
-        return {}
-
-    id_to_mc: Dict[str, float] = {}
-
-    # simple/price 单次最多支持 ~250 个 id，这里保守用 200 一批
-    for batch in chunk_list(ids, 200):
-        params = {
-            "ids": ",".join(batch),
-            "vs_currencies": "usd",
-            "include_market_cap": "true",
-        }
-        try:
-            resp = http_get(f"{COINGECKO_API_BASE}/simple/price", params=params, timeout=10)
-            data = resp.json()
-            for cid, val in data.items():
-                mc = float(val.get("usd_market_cap") or 0.0)
-                if mc > 0:
-                    id_to_mc[cid] = mc
-        except Exception as exc:
-            print(f"{now_utc8_str()} CoinGecko batch fetch error: {type(exc).__name__} - {exc}")
-            continue
+    available = {name for name, (_, source) in RULE_METRICS.items() if source in done_sources}
+
+    def screen(rows: Dict[str, Dict[str, float]]) -> List[str]:
+        table = build_metric_table(rows, ticker_map, mc_map)
+        mask = rule_set.prefilter(rule_columns(table), len(table), available)
+        return [table.symbols[i] for i in table.indices(mask)]
+
+    return screen
 
-    # 映射回 symbol
-    symbol_mc: Dict[str, float] = {}
-    for symbol, cid in symbol_id_map.items():
-        mc = id_to_mc.get(cid, 0.0)
-        if mc > 0:
-            symbol_mc[symbol] = mc
 
-    print(f"{now_utc8_str()} CoinGecko MC loaded for {len(symbol_mc)} symbols")
-    return symbol_mc
+def build_pipeline(
+    sources: FrozenSet[str],
+    ticker_map: Dict[str, Dict],
+    mc_map: Dict[str, float],
+) -> StagedPipeline:
+    """
+    bulk（24H ticker + MC）→ kline → oi，每一阶段只处理上一阶段的幸存者；
+    没有规则用到的来源整段跳过。大部分 symbol 在价格条件上就被刷掉，不会再拉 OI。
+    """
+    done = BULK_SOURCES
+    stages = [Stage("bulk", screen=rule_screen(done, ticker_map, mc_map))]
+    if "kline" in sources:
+        done = done | {"kline"}
+        stages.append(Stage("kline", fetch=fetch_kline_metrics, screen=rule_screen(done, ticker_map, mc_map)))
+    if "oi" in sources:
+        stages.append(Stage("oi", fetch=fetch_oi_metrics))
+    return StagedPipeline(stages, max_workers=FETCH_WORKERS)
+
+
+# ========= CoinGecko 相关逻辑 =========
+
+def last_price_map(ticker_map: Dict[str, Dict]) -> Dict[str, float]:
+    """24H ticker 里的最新价，交给 McCache 确认 CoinGecko id（价格 × 倍数要对得上）。"""
+    prices: Dict[str, float] = {}
+    for symbol, t24 in ticker_map.items():
+        try:
+            prices[symbol] = float(t24.get("lastPrice") or 0.0)
+        except (TypeError, ValueError):
+            continue
+    return prices
 
 
 # ========= 主逻辑 =========
@@ -314,135 +416,364 @@ def format_millions(value: float) -> str:
     return f"{value / 1_000_000:.2f}M"
 
 
-def main() -> None:
-    # 先拿币种列表
-    symbols = fetch_usdt_perp_symbols()
-    print(f"[{now_utc8_str()}] Loaded {len(symbols)} USDT perpetual symbols")
-
-    # 构建 symbol -> coingecko_id 映射
-    symbol_id_map = build_symbol_id_map(symbols)
-    print(f"[{now_utc8_str()}] Built symbol-id map for {len(symbol_id_map)} symbols")
-
-    # 初次拉 MC
-    last_mc_update = 0.0
-    mc_map: Dict[str, float] = {}
-
-    # 脚本启动提示
-    start_msg = (
-        f"脚本已启动:\n"
-        f"启动时间：{now_utc8_str()}\n"
-        f"监控上限：{len(symbols)} 合约\n"
-        f"条件1（1H）：|1H 价格变化| ≥ {PRICE_CHANGE_1H_PCT}% 且 "
-        f"1H OI 增长 ≥ {OI_CHANGE_1H_PCT}%\n"
-        f"条件2（15m）：|15m 价格变化| ≥ {PRICE_CHANGE_15M_PCT}% 且 "
-        f"15m OI 增长 ≥ {OI_CHANGE_15M_PCT}%\n\n"
-        f"MC 来源：CoinGecko market_cap(USD)，定义等价于 circulating_supply × price。\n"
-        f"MC 刷新间隔：{COINGECKO_REFRESH_SECONDS}s；"
-        f"部分新币/屎币可能获取不到 MC，会自动跳过。"
+# 列式快照里的指标列
+TABLE_COLUMNS: List[str] = (
+    ["last_price", "oi_notional", "price_24h_pct", "quote_volume", "mc"]
+    + [f"price_{name}_pct" for name in WINDOWS]
+    + [f"oi_{name}_pct" for name in WINDOWS]
+)
+
+
+def build_metric_table(
+    metrics_map: Dict[str, Dict[str, float]],
+    ticker_map: Dict[str, Dict],
+    mc_map: Dict[str, float],
+) -> MetricTable:
+    """把本轮每个 symbol 的 K 线 / OI 指标、24H ticker 和 MC 合成一张列式表。"""
+    rows: Dict[str, Dict[str, float]] = {}
+    for symbol, metrics in metrics_map.items():
+        t24 = ticker_map.get(symbol, {})
+        row = dict(metrics)
+        row["price_24h_pct"] = float(t24.get("priceChangePercent", 0.0))
+        row["quote_volume"] = float(t24.get("quoteVolume", 0.0))
+        # MC 从 CoinGecko 来（USD），没拿到就是 NaN
+        row["mc"] = mc_map.get(symbol)
+        rows[symbol] = row
+    return MetricTable.from_rows(rows, TABLE_COLUMNS)
+
+
+def evaluate_rules(table: MetricTable) -> Dict[str, np.ndarray]:
+    """所有规则对整张表一次求值，返回 {规则名: 命中掩码}。"""
+    return rule_set.evaluate(rule_columns(table), len(table))
+
+
+# 告警冷却状态，main() 启动时按配置重建（带持久化文件）
+alert_state = AlertState(
+    cooldown=ALERT_COOLDOWN_SECONDS,
+    escalation_pct=ALERT_ESCALATION_PCT,
+    ttl=ALERT_STATE_TTL,
+)
+
+
+def select_new_alerts(table: MetricTable, matches: Dict[str, np.ndarray]) -> List[Tuple[int, List[str]]]:
+    """
+    命中的行里去掉冷却期内已经报过、且没有明显恶化的 (symbol, 规则)，
+    返回 [(行号, 需要告警的规则名), ...]。
+    """
+    severities = rule_set.severities(rule_columns(table), len(table))
+    any_match = np.zeros(len(table), dtype=bool)
+    for mask in matches.values():
+        any_match |= mask
+    selected: List[Tuple[int, List[str]]] = []
+    for i in table.indices(any_match):
+        symbol = table.symbols[i]
+        fresh = []
+        for name, mask in matches.items():
+            if not mask[i]:
+                continue
+            values = severities.get(name)
+            value = None if values is None or np.isnan(values[i]) else float(values[i])
+            if alert_state.should_alert(symbol, name, value):
+                fresh.append(name)
+        if fresh:
+            selected.append((i, fresh))
+    return selected
+
+
+def _fmt_millions(value: Optional[float]) -> str:
+    return "N/A" if value is None else format_millions(value)
+
+
+def _fmt_pct(value: Optional[float]) -> str:
+    return "N/A" if value is None else f"{value:+.2f}%"
+
+
+def format_alert(row: Dict[str, Optional[float]], matched: List[str]) -> str:
+    """只对命中的行调用；没有规则需要、因而没拉的指标显示 N/A。"""
+    mc_notional = row["mc"]
+    oi_notional = row["oi_notional"]
+    if mc_notional and oi_notional is not None:
+        oi_mc_str = f"{oi_notional / mc_notional:.4f}"
+    else:
+        oi_mc_str = "N/A"
+    price_str = "N/A" if row["last_price"] is None else f"{row['last_price']:.4f}"
+    return (
+        f"{row['symbol']}  MC:${_fmt_millions(mc_notional)}\n\n"
+        f"Price: {price_str}\n"
+        f"OI:${_fmt_millions(oi_notional)}\n"
+        f"OI/MC:{oi_mc_str}\n"
+        f"15min price change:{_fmt_pct(row['price_15m_pct'])}\n"
+        f"15min OI change:{_fmt_pct(row['oi_15m_pct'])}\n"
+        f"1H price change:{_fmt_pct(row['price_1h_pct'])}\n"
+        f"1H OI change:{_fmt_pct(row['oi_1h_pct'])}\n"
+        f"24H Price change:{_fmt_pct(row['price_24h_pct'])}\n"
+        f"Rules: {', '.join(matched)}"
     )
-    send_feishu_text(start_msg)
 
-    while True:
-        started = time.time()
-        alerts: List[str] = []
 
-        # 按周期刷新 CoinGecko MC
-        now_ts = time.time()
-        if now_ts - last_mc_update > COINGECKO_REFRESH_SECONDS:
-            try:
-                mc_map = fetch_mc_map_from_coingecko(symbol_id_map)
-                last_mc_update = now_ts
-            except Exception as exc:
-                print(f"{now_utc8_str()} refresh MC error: {type(exc).__name__} - {exc}")
+# 卡片表格的列：(字段名, 表头)
+CARD_COLUMNS: List[Tuple[str, str]] = [
+    ("symbol", "Symbol"),
+    ("price", "Price"),
+    ("oi", "OI"),
+    ("price_15m", "ΔP 15m"),
+    ("price_1h", "ΔP 1H"),
+    ("oi_15m", "ΔOI 15m"),
+    ("oi_1h", "ΔOI 1H"),
+    ("rules", "Rules"),
+]
+
+
+def format_card_row(row: Dict[str, Optional[float]], matched: List[str]) -> Dict[str, str]:
+    """命中行 -> 卡片表格的一行（值都是格式化好的字符串）。"""
+    return {
+        "symbol": row["symbol"],
+        "price": "N/A" if row["last_price"] is None else f"{row['last_price']:.4f}",
+        "oi": f"${_fmt_millions(row['oi_notional'])}",
+        "price_15m": _fmt_pct(row["price_15m_pct"]),
+        "price_1h": _fmt_pct(row["price_1h_pct"]),
+        "oi_15m": _fmt_pct(row["oi_15m_pct"]),
+        "oi_1h": _fmt_pct(row["oi_1h_pct"]),
+        "rules": ", ".join(matched),
+    }
 
-        try:
-            ticker_map = fetch_24h_ticker_map()
-        except Exception as exc:
-            print("fetch_24h_ticker_map error:", exc)
-            ticker_map = {}
 
-        for symbol in symbols:
-            try:
-                t24 = ticker_map.get(symbol)
-                if not t24:
-                    continue
+def apply_universe_changes(added: List[str], removed: List[str]) -> None:
+    """新上线的合约补上 K 线订阅，下架的清掉缓存和订阅状态（MC 由 McCache 按 universe 自己跟进）。"""
+    for symbol in removed:
+        series_store.discard(symbol)
+    if market_stream is not None:
+        market_stream.remove_symbols(removed)
+        market_stream.add_symbols(added)
+        fetch_all(added, seed_stream_klines, max_workers=FETCH_WORKERS)
+    print(f"[{now_utc8_str()}] universe +{len(added)} -{len(removed)}: added {added} removed {removed}")
 
-                # 过滤日成交额太低的（只是流动性过滤）
-                quote_volume = float(t24.get("quoteVolume", 0.0))
-                if quote_volume < MIN_NOTIONAL_24H:
-                    continue
 
-                price_24h_pct = float(t24.get("priceChangePercent", 0.0))
+def describe_rules() -> str:
+    return "\n".join(f"{rule.name}：{rule.expr}" for rule in rule_set.rules)
 
-                # 价格变化（1H & 15m）
-                price_1h_pct, last_price = fetch_price_change(
-                    symbol, PRICE_1H_INTERVAL, PRICE_1H_LIMIT
-                )
-                price_15m_pct, _ = fetch_price_change(
-                    symbol, PRICE_15M_INTERVAL, PRICE_15M_LIMIT
-                )
 
-                # OI 变化（1H & 15m）
-                oi_1h_pct, oi_notional = fetch_oi_change(
-                    symbol, OI_1H_PERIOD, OI_1H_POINTS
-                )
-                oi_15m_pct, _ = fetch_oi_change(
-                    symbol, OI_15M_PERIOD, OI_15M_POINTS
-                )
+# /metrics 里的 monitor 标签
+METRICS_NAME = "oi1"
 
-                # MC 从 CoinGecko 来（USD）
-                mc_notional = mc_map.get(symbol, 0.0)
-                if mc_notional <= 0:
-                    # 没拿到 MC 的直接跳过
-                    continue
 
-                # 条件判断
-                if USE_ABS_PRICE_CHANGE:
-                    cond_1h_price_ok = abs(price_1h_pct) >= PRICE_CHANGE_1H_PCT
-                    cond_15m_price_ok = abs(price_15m_pct) >= PRICE_CHANGE_15M_PCT
+class OiRulesMonitor:
+    """
+    一轮：24H ticker + MC 预筛 → 分层挑出到期的 symbol → 5m K 线 → 5m OI → 规则 → 飞书。
+    单独运行时由 main() 驱动，也可以作为 scripts/market_hub.py 的插件和别的监控共用数据。
+    规则、告警状态、流式连接和序列缓存仍是模块变量（模块里的函数直接用），所以一个进程只跑一个实例。
+    """
+
+    name = METRICS_NAME
+
+    def __init__(self) -> None:
+        self.symbols: List[str] = []
+        self.sources: FrozenSet[str] = frozenset()
+        self.poll_interval: float = POLL_INTERVAL
+        self.scheduler: Optional[TieredScheduler] = None
+        self.mc_cache: Optional[McCache] = None
+        self.mc_map: Dict[str, float] = {}
+        self.recorder: Optional[SnapshotRecorder] = None
+        self.swings = SwingDetector(parse_windows(OI_SWING_WINDOWS))
+
+    @property
+    def interval(self) -> float:
+        return self.poll_interval
+
+    def setup(self, hub: MarketHub) -> None:
+        global market_stream, rule_set, alert_state, series_store
+
+        hub.add_source("ticker", fetch_24h_ticker_map)
+        # 5m K 线 / OI 的增量缓存按粒度共享（OI 基础版同粒度的 OI 序列也用这一份）
+        series_store = hub.series_store(f"fapi_{BASE_INTERVAL}", SERIES_POINTS, BASE_MINUTES * 60_000)
+        REGISTRY.register_stats("series_cache", series_store.stats, {"monitor": METRICS_NAME})
+
+        # 规则只在启动时解析一次；没有规则引用到的数据来源整轮都不拉
+        rule_set = load_rules(RULES_FILE, RULE_METRICS, DEFAULT_RULE_TEMPLATE, params=DEFAULT_RULE_PARAMS)
+        alert_state = AlertState(
+            cooldown=ALERT_COOLDOWN_SECONDS,
+            escalation_pct=ALERT_ESCALATION_PCT,
+            ttl=ALERT_STATE_TTL,
+            path=ALERT_STATE_FILE or None,
+        )
+        REGISTRY.register_stats("alert_state", alert_state.stats, {"monitor": METRICS_NAME})
+        self.sources = sources = required_sources(rule_set)
+        print(f"[{now_utc8_str()}] Loaded {len(rule_set)} rules, data sources: {sorted(sources)}")
+
+        # 币种列表由 hub 管：优先读本地缓存，后台定时刷新，新上线 / 下架的合约每轮开头合并进来
+        self.symbols = symbols = hub.symbols()
+        print(f"[{now_utc8_str()}] Loaded {len(symbols)} USDT perpetual symbols")
+        self.scheduler = TieredScheduler(
+            hot_size=HOT_TIER_SIZE,
+            warm_size=WARM_TIER_SIZE,
+            intervals=TIER_INTERVALS,
+            max_symbols=MAX_SYMBOLS,
+        )
+
+        # 流式模式：价格 / 24H ticker 走 WebSocket，启动时用 REST K 线预热一次
+        if STREAM_MODE:
+            market_stream = MarketStream(
+                symbols,
+                kline_intervals=[BASE_INTERVAL],
+                base_url=FSTREAM_BASE,
+                max_age=STREAM_MAX_AGE,
+            )
+            market_stream.start()
+            _, errors = fetch_all(symbols, seed_stream_klines, max_workers=FETCH_WORKERS)
+            print(f"[{now_utc8_str()}] Stream mode on, seeded klines ({len(errors)} errors)")
+            self.poll_interval = STREAM_POLL_INTERVAL
+
+        # MC 在后台线程刷新，扫描随时读最近一次成功的结果，不会被 CoinGecko 卡住
+        self.mc_cache = McCache(
+            CoinGeckoIndex(
+                COINGECKO_API_BASE,
+                cache_path=COINGECKO_INDEX_FILE or None,
+                overrides=SYMBOL_TO_COINGECKO_ID,
+            ),
+            refresh_seconds=COINGECKO_REFRESH_SECONDS,
+        )
+        if "mc" in sources:
+            self.mc_cache.start()
+
+        # 每轮所有拉过的 symbol 的指标追加到按天分区的列式文件，写盘在后台线程
+        if SNAPSHOT_DIR:
+            self.recorder = SnapshotRecorder(SNAPSHOT_DIR, TABLE_COLUMNS)
+            self.recorder.start()
+            REGISTRY.register_stats("recorder", self.recorder.stats, {"monitor": METRICS_NAME})
+
+        # 脚本启动提示
+        start_msg = (
+            f"脚本已启动:\n"
+            f"启动时间：{now_utc8_str()}\n"
+            f"监控上限：{min(len(symbols), MAX_SYMBOLS)} 合约"
+            f"（hot {HOT_TIER_SIZE} / warm {WARM_TIER_SIZE}，"
+            f"刷新间隔 {TIER_INTERVALS['hot']:.0f}s / {TIER_INTERVALS['warm']:.0f}s / {TIER_INTERVALS['cold']:.0f}s）\n"
+            f"规则（满足任一即告警）：\n{describe_rules()}\n\n"
+            f"MC 来源：CoinGecko market_cap(USD)，定义等价于 circulating_supply × price。\n"
+            f"MC 刷新间隔：{COINGECKO_REFRESH_SECONDS}s；"
+            f"部分新币/屎币可能获取不到 MC，会自动跳过。"
+        )
+        send_feishu_text(start_msg)
+
+    def run_round(self, snapshot: MarketSnapshot) -> None:
+        sources, scheduler, recorder = self.sources, self.scheduler, self.recorder
+        alerts: List[str] = []
+        card_rows: List[Dict[str, str]] = []
+
+        added, removed = universe_changes(self.symbols, snapshot.symbols)
+        if added or removed:
+            self.symbols = snapshot.symbols
+            apply_universe_changes(added, removed)
+            self.swings.remove(removed)
+        symbols = self.symbols
+
+        if market_stream is not None:
+            # 断线重连漏了 K 线的 symbol 用 REST 重新预热；失败的下一轮再试，这期间 fetch_live_closes 走 REST
+            gaps = sorted({s for s, _ in market_stream.kline_gaps()})
+            if gaps:
+                _, errors = fetch_all(gaps, seed_stream_klines, max_workers=FETCH_WORKERS)
+                print(f"[{now_utc8_str()}] Reseeded klines after stream gap: {len(gaps)} symbols ({len(errors)} errors)")
+
+        # 流式模式下推送过期的 symbol 不返回，整张表都过期（断线 / 卡住）时回退到 REST
+        ticker_map = market_stream.ticker_map() if market_stream is not None else {}
+        if not ticker_map:
+            with timed(METRICS_NAME, "ticker_fetch"):
+                ticker_map = snapshot.get("ticker", {})
+
+        # 新 symbol 会让 McCache 提前刷新一次；这里只读缓存，不等待
+        if "mc" in sources:
+            self.mc_cache.update(symbols, last_price_map(ticker_map))
+            self.mc_map = self.mc_cache.snapshot()
+        mc_map = self.mc_map
+
+        # 先用 24H ticker 做流动性过滤，剩下的按成交额 / 振幅分层，只拉到了刷新时间的 symbol
+        liquid: List[str] = []
+        for symbol in symbols:
+            t24 = ticker_map.get(symbol)
+            if not t24:
+                continue
+            # 过滤日成交额太低的（只是流动性过滤）
+            if float(t24.get("quoteVolume", 0.0)) < MIN_NOTIONAL_24H:
+                continue
+            liquid.append(symbol)
+        tier_counts = scheduler.update(ticker_map, universe=liquid)
+        candidates = scheduler.due()
+        print(f"[{now_utc8_str()}] tiers {tier_counts}, polling {len(candidates)} symbols")
+
+        # 分阶段拉取：bulk 数据先筛，K 线只拉幸存者，OI 只拉价格条件已满足的
+        pipeline = build_pipeline(sources, ticker_map, mc_map)
+        metrics_map = pipeline.run(candidates)
+        for symbol, exc in pipeline.errors.items():
+            print(f"{now_utc8_str()} {symbol} fetch error: {type(exc).__name__} - {exc}")
+        scheduler.mark_polled(s for s in candidates if s not in pipeline.errors)
+        print(f"[{now_utc8_str()}] pipeline {pipeline.describe()}")
+        for st in pipeline.stats:
+            STAGE_SECONDS.observe(st.seconds, monitor=METRICS_NAME, stage=f"pipeline_{st.name}")
+        if recorder is not None:
+            # 被中途筛掉的 symbol 也记下来（后面阶段的指标为 NaN），回测调阈值要用
+            recorded = build_metric_table(pipeline.rows, ticker_map, mc_map)
+            recorder.record(snapshot.ts, recorded.symbols, recorded.columns)
+
+        # 幸存者的指标放进一张列式表，规则一次性用布尔掩码算完，只格式化命中的行
+        with timed(METRICS_NAME, "evaluation"):
+            table = build_metric_table(metrics_map, ticker_map, mc_map)
+            matches = evaluate_rules(table)
+            # 命中过规则的 symbol 临时提到 hot 层，后续几轮按最短间隔跟踪
+            any_match = np.zeros(len(table), dtype=bool)
+            for mask in matches.values():
+                any_match |= mask
+            scheduler.boost(table.symbols[i] for i in table.indices(any_match))
+            # 同一 (symbol, 规则) 冷却期内不重复告警，除非指标明显恶化
+            for i, matched in select_new_alerts(table, matches):
+                row = table.row(i)
+                if FEISHU_MSG_FORMAT == "card":
+                    card_rows.append(format_card_row(row, matched))
                 else:
-                    cond_1h_price_ok = price_1h_pct >= PRICE_CHANGE_1H_PCT
-                    cond_15m_price_ok = price_15m_pct >= PRICE_CHANGE_15M_PCT
-
-                cond_1h = cond_1h_price_ok and (oi_1h_pct >= OI_CHANGE_1H_PCT)
-                cond_15m = cond_15m_price_ok and (oi_15m_pct >= OI_CHANGE_15M_PCT)
-
-                # 没有任何一个条件满足就跳过
-                if not (cond_1h or cond_15m):
-                    continue
-
-                oi_mc_ratio = oi_notional / mc_notional if mc_notional > 0 else 0.0
-
-                line = (
-                    f"{symbol}  MC:${format_millions(mc_notional)}\n\n"
-                    f"Price: {last_price:.4f}\n"
-                    f"OI:${format_millions(oi_notional)}\n"
-                    f"OI/MC:{oi_mc_ratio:.4f}\n"
-                    f"15min price change:{price_15m_pct:+.2f}%\n"
-                    f"15min OI change:{oi_15m_pct:+.2f}%\n"
-                    f"1H price change:{price_1h_pct:+.2f}%\n"
-                    f"1H OI change:{oi_1h_pct:+.2f}%\n"
-                    f"24H Price change:{price_24h_pct:+.2f}%"
+                    alerts.append(format_alert(row, matched))
+            # 窗口内振幅：过了成交额过滤的 symbol 每轮都有最新价，不受分层调度影响
+            prices = {s: p for s, p in last_price_map({s: ticker_map[s] for s in liquid}).items() if p > 0}
+            for symbol, swings in self.swings.update_many(snapshot.ts, prices).items():
+                lines = [format_swing(s) for s in swings if alert_state.should_alert(symbol, f"swing_{s.window}", s.pct)]
+                if lines:
+                    alerts.append(f"{symbol}\n\nPrice: {prices[symbol]:.4f}\n" + "\n".join(lines))
+            alert_state.save()
+
+        # 这里只是入队，真正的 POST 耗时见 feishu_send_seconds；卡片模式下振幅告警仍是文本
+        with timed(METRICS_NAME, "feishu_send"):
+            if card_rows:
+                send_feishu_table(f"[{now_utc8_str()}] 价格/OI 异动合约", card_rows)
+            if alerts:
+                header = (
+                    f"[{now_utc8_str()}] 价格/OI 异动合约\n"
+                    f"{describe_rules()}\n\n"
                 )
-                alerts.append(line)
+                send_feishu_alerts(header, alerts)
+            if not card_rows and not alerts:
+                print(f"[{now_utc8_str()}] No symbols matched conditions this round")
 
-            except Exception as exc:
-                print(f"{now_utc8_str()} {symbol} fetch error: {type(exc).__name__} - {exc}")
-                continue
 
-        if alerts:
-            header = (
-                f"[{now_utc8_str()}] 价格/OI 异动合约\n"
-                f"条件1（1H）：|ΔP_1H|≥{PRICE_CHANGE_1H_PCT}%, ΔOI_1H≥{OI_CHANGE_1H_PCT}%\n"
-                f"条件2（15m）：|ΔP_15m|≥{PRICE_CHANGE_15M_PCT}%, ΔOI_15m≥{OI_CHANGE_15M_PCT}%\n\n"
-            )
-            text = header + "\n\n".join(alerts)
-            send_feishu_text(text)
-        else:
-            print(f"[{now_utc8_str()}] No symbols matched conditions this round")
+def main() -> None:
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+
+    hub = MarketHub(
+        UniverseManager(
+            fetch_usdt_perp_symbols,
+            cache_path=UNIVERSE_CACHE_FILE or None,
+            refresh_seconds=UNIVERSE_REFRESH_SECONDS,
+        ),
+        max_age=0,
+    )
+    hub.start()
+    monitor = OiRulesMonitor()
+    monitor.setup(hub)
 
+    while True:
+        started = time.time()
+        monitor.run_round(hub.snapshot())
         elapsed = time.time() - started
-        sleep_for = max(5, POLL_INTERVAL - int(elapsed))
+        observe_round(METRICS_NAME, elapsed, monitor.interval)
+        sleep_for = max(5, monitor.interval - int(elapsed))
         time.sleep(sleep_for)
 
 
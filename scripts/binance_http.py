@@ -0,0 +1,162 @@
+"""
+共享的 Binance HTTP 客户端：连接池 + 请求权重限流 + 429/418 退避 + 周期缓存。
+
+所有监控脚本都通过这里的 http_get 发请求，这样同一进程内所有线程
+共用一套权重计数，并发拉取时也不会超出 Binance 的分钟权重上限；
+/futures/data/* 的响应按数据周期缓存；所有 GET 相同请求并发时都只发一次（scripts/http_cache.py）。
+每个请求的耗时 / 状态码 / 异常类型 / 权重记在 scripts/metrics.py 里，/metrics 端点可以看。
+"""
+
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from config.config import (
+    FAPI_WEIGHT_LIMIT_1M,
+    SPOT_WEIGHT_LIMIT_1M,
+    FUTURES_DATA_LIMIT_5M,
+    WEIGHT_SAFETY_RATIO,
+    HTTP_MAX_RETRIES,
+    HTTP_CACHE_ENABLED,
+    HTTP_CACHE_GRACE_SECONDS,
+)
+from scripts.http_cache import ResponseCache, make_key, period_expiry
+from scripts.metrics import REGISTRY
+from scripts.rate_limiter import USED_WEIGHT_HEADER, WeightLimiter, request_weight
+
+session = requests.Session()
+adapter = requests.adapters.HTTPAdapter(max_retries=2, pool_connections=50, pool_maxsize=50)
+session.mount("https://", adapter)
+session.mount("http://", adapter)
+
+# 每分钟权重：合约和现货分开统计
+fapi_limiter = WeightLimiter(FAPI_WEIGHT_LIMIT_1M, safety_ratio=WEIGHT_SAFETY_RATIO)
+spot_limiter = WeightLimiter(SPOT_WEIGHT_LIMIT_1M, safety_ratio=WEIGHT_SAFETY_RATIO)
+# /futures/data/*：每 5 分钟 1000 次
+futures_data_limiter = WeightLimiter(
+    FUTURES_DATA_LIMIT_5M, window_seconds=300, safety_ratio=WEIGHT_SAFETY_RATIO
+)
+
+# 进程内共享的响应缓存
+response_cache = ResponseCache()
+
+# 429 / 418 没带 Retry-After 时的默认暂停秒数
+DEFAULT_RETRY_AFTER = 60
+
+LIMITER_NAMES = ("fapi", "futures_data", "spot")
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "binance_request_seconds", "HTTP request latency by endpoint path", ("endpoint",)
+)
+REQUESTS = REGISTRY.counter("binance_requests_total", "HTTP responses by endpoint and status", ("endpoint", "status"))
+REQUEST_ERRORS = REGISTRY.counter(
+    "binance_request_errors_total", "Requests that raised before a response, by exception type", ("endpoint", "error")
+)
+WEIGHT_USED = REGISTRY.counter("binance_request_weight_total", "Request weight acquired", ("limiter",))
+LIMITER_WAIT = REGISTRY.counter(
+    "binance_limiter_wait_seconds_total", "Time spent waiting for the weight limiter", ("limiter",)
+)
+
+
+def _limiters() -> Dict[str, WeightLimiter]:
+    # 每次现取模块变量，测试 / 基准里替换掉的限流器也能对上名字
+    return {"fapi": fapi_limiter, "futures_data": futures_data_limiter, "spot": spot_limiter}
+
+
+def _limiter_stats(name: str) -> Dict[str, int]:
+    limiter = _limiters()[name]
+    return {"used": limiter.used, "budget": limiter.budget, "limit": limiter.limit}
+
+
+for _name in LIMITER_NAMES:
+    REGISTRY.register_stats("binance_weight", lambda name=_name: _limiter_stats(name), {"limiter": _name})
+REGISTRY.register_stats("binance_cache", lambda: response_cache.stats())
+
+
+def limiter_for(url: str) -> Optional[WeightLimiter]:
+    """按 URL 选择对应的限流器；非 Binance 请求（飞书 / CoinGecko）返回 None。"""
+    parsed = urlparse(url)
+    if parsed.path.startswith("/futures/data/"):
+        return futures_data_limiter
+    if parsed.path.startswith("/fapi/"):
+        return fapi_limiter
+    if parsed.path.startswith("/api/v3/"):
+        return spot_limiter
+    return None
+
+
+def _retry_after_seconds(resp: requests.Response) -> float:
+    value = resp.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else DEFAULT_RETRY_AFTER
+    except ValueError:
+        return DEFAULT_RETRY_AFTER
+
+
+def http_get(url: str, *, params: Optional[Dict] = None, timeout: int = 10) -> requests.Response:
+    """
+    带权重限流和 429/418/5xx 退避重试的 GET 请求；
+    周期性数据命中缓存时直接返回上一次的响应，不消耗权重。
+    其它 GET 不缓存，但同一个请求已经在途时等它的结果，不再另发一次。
+    """
+    if HTTP_CACHE_ENABLED:
+        expires_at = period_expiry(url, params, time.time(), HTTP_CACHE_GRACE_SECONDS)
+        return response_cache.get_or_fetch(
+            make_key(url, params),
+            expires_at,
+            lambda: _get_with_limits(url, params, timeout),
+        )
+    return _get_with_limits(url, params, timeout)
+
+
+def _limiter_name(limiter: WeightLimiter) -> str:
+    for name, candidate in _limiters().items():
+        if candidate is limiter:
+            return name
+    return "other"
+
+
+def _get_with_limits(url: str, params: Optional[Dict], timeout: int) -> requests.Response:
+    limiter = limiter_for(url)
+    weight = request_weight(url, params)
+    endpoint = urlparse(url).path
+    limiter_name = _limiter_name(limiter) if limiter is not None else ""
+
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        if limiter is not None:
+            waited = time.perf_counter()
+            limiter.acquire(weight)
+            LIMITER_WAIT.inc(time.perf_counter() - waited, limiter=limiter_name)
+            WEIGHT_USED.inc(weight, limiter=limiter_name)
+        started = time.perf_counter()
+        try:
+            resp = session.get(url, params=params, timeout=timeout)
+        except Exception as exc:
+            REQUEST_ERRORS.inc(endpoint=endpoint, error=type(exc).__name__)
+            raise
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, status=resp.status_code)
+
+        # 这个头是整个 IP 一分钟的权重，只能校准按分钟计权重的限流器；
+        # /futures/data/* 的限流器数的是 5 分钟内的次数，口径不同，不能拿它校准
+        used = resp.headers.get(USED_WEIGHT_HEADER)
+        if limiter is not None and limiter is not futures_data_limiter and used and used.isdigit():
+            limiter.sync_used(int(used))
+
+        if resp.status_code in (418, 429) and limiter is not None:
+            wait = _retry_after_seconds(resp)
+            print(f"Binance rate limited ({resp.status_code}), pause {wait:.0f}s: {url}")
+            # 暂停对所有线程生效，下一次 acquire 会一直等到 Retry-After 之后
+            limiter.pause(wait)
+            if attempt < HTTP_MAX_RETRIES:
+                continue
+        elif resp.status_code >= 500 and attempt < HTTP_MAX_RETRIES:
+            time.sleep(min(2 ** attempt, 10))
+            continue
+
+        break
+
+    resp.raise_for_status()
+    return resp
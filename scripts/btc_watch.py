@@ -1,70 +1,193 @@
 import time
-import requests
 from datetime import datetime,timedelta
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
 from config.config import (
     FEISHU_WEBHOOK,
     FEISHU_KEYWORD,
-    SYMBOL,
     API_URL,
     POLL_INTERVAL,
     ALERT_CHANGE_PCT,
+    SPOT_WATCHLIST,
+    SPOT_SWING_WINDOWS,
+    SWING_COOLDOWN_SECONDS,
+    SWING_ESCALATION_PCT,
 )
+from scripts.alert_state import AlertState
+from scripts.binance_http import http_get
+from scripts.feishu_notifier import get_notifier
+from scripts.market_hub import MarketHub, MarketSnapshot
+from scripts.rolling_window import SwingDetector, format_swing, parse_windows
 
 
 
-def send_feishu_text(content: str):
-    headers = {"Content-Type": "application/json; charset=utf-8"}
-    data = {
-        "msg_type": "text",
-        "content": {
-            "text": f"{FEISHU_KEYWORD} {content}"
-        }
-    }
-    try:
-        resp = requests.post(FEISHU_WEBHOOK, json=data, headers=headers, timeout=5)
-        print("Feishu status:", resp.status_code, resp.text)
-    except Exception as e:
-        print("Feishu error:", e)
+def send_feishu_text(content: str) -> None:
+    """放进后台发送队列后立即返回，不阻塞扫描（scripts/feishu_notifier.py）。"""
+    if not FEISHU_WEBHOOK:
+        print("FEISHU_WEBHOOK not set; skip sending")
+        return
+    get_notifier(FEISHU_WEBHOOK).send_text(content, keyword=FEISHU_KEYWORD)
 
 
-def get_price() -> float:
-    resp = requests.get(API_URL, params={"symbol": SYMBOL}, timeout=5)
-    resp.raise_for_status()
-    data = resp.json()
-    return float(data["price"])
+def send_feishu_alerts(alerts: List[str]) -> None:
+    """一轮的告警装箱成尽量少的消息，一条告警不会被拆开。"""
+    if not FEISHU_WEBHOOK:
+        print("FEISHU_WEBHOOK not set; skip sending")
+        return
+    get_notifier(FEISHU_WEBHOOK).send_blocks(alerts, keyword=FEISHU_KEYWORD)
 
 
-def main():
-    last_notify_price = None
+def parse_watchlist(text: str, default_pct: float = ALERT_CHANGE_PCT) -> Dict[str, float]:
+    """
+    "BTCUSDT:1,ETHUSDT:1.5,SOLUSDT" -> {"BTCUSDT": 1.0, "ETHUSDT": 1.5, "SOLUSDT": default_pct}；
+    symbol 转大写，重复的保留第一次出现的。
+    """
+    watchlist: Dict[str, float] = {}
+    for item in text.split(","):
+        symbol, _, pct = item.strip().partition(":")
+        symbol = symbol.strip().upper()
+        if not symbol or symbol in watchlist:
+            continue
+        watchlist[symbol] = float(pct) if pct.strip() else float(default_pct)
+    return watchlist
 
-    while True:
+
+WATCHLIST: Dict[str, float] = parse_watchlist(SPOT_WATCHLIST)
+
+
+# 已经提示过「交易所没有这个 symbol」的，只提示一次
+_unknown_symbols: set = set()
+
+
+def fetch_price_map(symbols: Iterable[str]) -> Dict[str, float]:
+    """
+    一次 ticker/price 请求拿整个列表的最新价：不带参数拉全市场（权重 4，和 symbol 数无关），本地按列表过滤。
+    不用 symbols / symbol 参数：列表里只要有一个 symbol 拼错或下架，整个请求就是 400（-1121），整张列表都拿不到价格；
+    只有一个 symbol 也一样，否则拼错的那个每轮都抛错，而不是提示一次后跳过。
+    """
+    symbols = list(symbols)
+    resp = http_get(API_URL, timeout=5)
+    rows = resp.json()
+    prices = {row["symbol"]: float(row["price"]) for row in rows if row.get("symbol")}
+    unknown = [s for s in symbols if s not in prices and s not in _unknown_symbols]
+    if unknown:
+        _unknown_symbols.update(unknown)
+        print(f"Spot watchlist symbols not on the exchange, skipped: {', '.join(unknown)}")
+    return {s: prices[s] for s in symbols if s in prices}
+
+
+def fetch_spot_prices() -> Dict[str, float]:
+    """scripts/market_hub.py 的 spot_prices 数据源：{symbol: 现货最新价}，覆盖整个 WATCHLIST。"""
+    return fetch_price_map(WATCHLIST)
+
+
+def price_change_alerts(
+    prices: np.ndarray,
+    last_notify: np.ndarray,
+    thresholds: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    整个列表一次算完：返回 (相对上次通知价的变动%, 是否超过各自阈值)。
+    没有上次通知价（NaN）或这轮没拿到价格（NaN）的不算命中。
+    """
+    valid = np.isfinite(prices) & (last_notify > 0)
+    change = np.zeros(len(prices), dtype=np.float64)
+    np.divide(prices - last_notify, last_notify, out=change, where=valid)
+    change *= 100
+    return change, valid & (np.abs(change) >= thresholds)
+
+
+def format_price(price: float) -> str:
+    return f"{price:.2f}" if price >= 1 else f"{price:.6g}"
+
+
+class BtcWatch:
+    """
+    现货监控列表里每个 symbol 相对各自上次通知价的变动超过各自阈值就告警；
+    另外按 SPOT_SWING_WINDOWS 的每个窗口看窗口内最高 / 最低价，抓冲高回落和急拉急跌。
+    一轮整个列表一次请求、一次向量化判断，告警合成一条飞书消息。可以作为 scripts/market_hub.py 的插件跑。
+    """
+
+    name = "btc"
+    interval = POLL_INTERVAL
+
+    def __init__(
+        self,
+        watchlist: Optional[Mapping[str, float]] = None,
+        swing_windows: Optional[Mapping[str, Tuple[float, float]]] = None,
+    ) -> None:
+        watchlist = WATCHLIST if watchlist is None else watchlist
+        swing_windows = parse_windows(SPOT_SWING_WINDOWS) if swing_windows is None else swing_windows
+        self.symbols: List[str] = list(watchlist)
+        self.thresholds = np.array([watchlist[s] for s in self.symbols], dtype=np.float64)
+        self.last_notify = np.full(len(self.symbols), np.nan)
+        self.swings = SwingDetector(swing_windows)
+        self.swing_state = AlertState(cooldown=SWING_COOLDOWN_SECONDS, escalation_pct=SWING_ESCALATION_PCT)
+
+    def setup(self, hub: MarketHub) -> None:
+        hub.add_source("spot_prices", fetch_spot_prices)
+
+    def run_round(self, snapshot: MarketSnapshot) -> None:
         try:
-            price = get_price()
+            price_map = snapshot.get("spot_prices", {})
+            if not price_map:
+                # 拉取失败，hub 已经打印过错误，下一轮再试
+                return
+            prices = np.array([price_map.get(s, np.nan) for s in self.symbols], dtype=np.float64)
             now = (datetime.utcnow() + timedelta(hours=8)).strftime("%Y-%m-%d %H:%M:%S UTC+8")
-            print(f"[{now}] {SYMBOL} price = {price}")
-
-            if last_notify_price is None:
-                # 第一次直接发一条当前价
-                msg = f"价格监控启动：当前价格 {price:.2f} USDT（时间：{now}）"
-                send_feishu_text(msg)
-                last_notify_price = price
-            else:
-                change_pct = (price - last_notify_price) / last_notify_price * 100
-                if abs(change_pct) >= ALERT_CHANGE_PCT:
-                    direction = "上涨" if change_pct > 0 else "下跌"
-                    msg = (
-                        f"价格{direction}预警：\n"
-                        f"当前价格：{price:.2f} USDT\n"
-                        f"上次通知价：{last_notify_price:.2f} USDT\n"
-                        f"变动：{change_pct:+.2f}%\n"
-                        f"时间：{now}"
+            print(f"[{now}] " + ", ".join(f"{s} = {p}" for s, p in zip(self.symbols, prices.tolist())))
+
+            # 第一次拿到价格的 symbol 发一条当前价
+            fresh = np.isnan(self.last_notify) & np.isfinite(prices)
+            if fresh.any():
+                lines = [f"{self.symbols[i]} 当前价格 {format_price(prices[i])} USDT" for i in np.flatnonzero(fresh)]
+                send_feishu_text("价格监控启动：\n" + "\n".join(lines) + f"\n时间：{now}")
+                self.last_notify[fresh] = prices[fresh]
+
+            change, hit = price_change_alerts(prices, self.last_notify, self.thresholds)
+            alerts = []
+            for i in np.flatnonzero(hit):
+                direction = "上涨" if change[i] > 0 else "下跌"
+                alerts.append(
+                    f"{self.symbols[i]} 价格{direction}预警：\n"
+                    f"当前价格：{format_price(prices[i])} USDT\n"
+                    f"上次通知价：{format_price(self.last_notify[i])} USDT\n"
+                    f"变动：{change[i]:+.2f}%\n"
+                    f"时间：{now}"
+                )
+            if hit.any():
+                self.last_notify[hit] = prices[hit]
+
+            # 每个窗口内最高和最低相差超过阈值：同一 (symbol, 窗口) 冷却期内振幅明显变大才再报
+            live = {self.symbols[i]: float(prices[i]) for i in np.flatnonzero(np.isfinite(prices))}
+            for symbol, swings in self.swings.update_many(snapshot.ts, live).items():
+                lines = [
+                    format_swing(s) for s in swings if self.swing_state.should_alert(symbol, f"swing_{s.window}", s.pct)
+                ]
+                if lines:
+                    alerts.append(
+                        f"{symbol} 区间波动预警：\n"
+                        + "\n".join(lines)
+                        + f"\n当前价格：{format_price(live[symbol])} USDT\n时间：{now}"
                     )
-                    send_feishu_text(msg)
-                    last_notify_price = price
+
+            if alerts:
+                send_feishu_alerts(alerts)
 
         except Exception as e:
             print("Loop error:", e)
 
+
+def main():
+    hub = MarketHub(max_age=0)
+    watch = BtcWatch()
+    watch.setup(hub)
+    print(f"watching {len(watch.symbols)} spot symbols: {', '.join(watch.symbols)}")
+
+    while True:
+        watch.run_round(hub.snapshot())
         time.sleep(POLL_INTERVAL)
 
 
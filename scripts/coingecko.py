@@ -0,0 +1,301 @@
+"""
+CoinGecko 市值（MC）：symbol -> coin id 索引 + 后台刷新的 MC 缓存。
+
+以前 coin id 直接猜成 symbol[:-4].lower()（BTCUSDT -> btc，实际是 bitcoin），
+大部分 MC 查不到，simple/price 的批次里塞满了不存在的 id；刷新还在 main() 里同步执行，会卡住扫描。这里：
+
+- 用 /coins/list 建 ticker -> [coin id, ...] 的索引，写到本地 JSON，一天刷新一次；
+- 1000PEPE / 1000000MOG / 1MBABYDOGE 这类合约先拆出倍数，再按底层 ticker 查；
+- 同一个 ticker 对应多个 coin 时，用 CoinGecko 价格 × 倍数 和 Binance 最新价比对挑出正确的那个，
+  挑中后记住（同样写盘），之后只查这一个 id；对不上的 symbol 不再浪费批次；
+- McCache 在后台线程按间隔刷新，扫描线程随时拿到的是最近一次成功的结果（stale-while-revalidate）。
+
+    index = CoinGeckoIndex(api_base, cache_path="data/coingecko_index.json", overrides=SYMBOL_TO_COINGECKO_ID)
+    mc_cache = McCache(index, refresh_seconds=300)
+    mc_cache.update(symbols, prices)   # 每轮把当前 universe 和 Binance 最新价交给它
+    mc_cache.start()
+    mc_map = mc_cache.snapshot()       # {symbol: mc_usd}，不阻塞
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+from scripts.binance_http import http_get
+
+# 合约名前面的倍数前缀，长的在前（1000000 要先于 1000 匹配）
+MULTIPLIER_PREFIXES: Tuple[Tuple[str, int], ...] = (
+    ("1000000", 1_000_000),
+    ("1M", 1_000_000),
+    ("10000", 10_000),
+    ("1000", 1_000),
+)
+
+# CoinGecko 价格 × 倍数 与 Binance 价格的比值在这个范围内才认为是同一个币
+PRICE_MATCH_RATIO = (0.67, 1.5)
+
+# simple/price 单次最多 ~250 个 id，保守用 200 一批
+SIMPLE_PRICE_BATCH = 200
+
+# 索引（coins/list）刷新间隔
+INDEX_REFRESH_SECONDS = 86_400
+
+
+def split_symbol(symbol: str, quote: str = "USDT") -> Tuple[str, int]:
+    """1000PEPEUSDT -> ("pepe", 1000)，BTCUSDT -> ("btc", 1)。"""
+    base = symbol[: -len(quote)] if symbol.endswith(quote) else symbol
+    for prefix, multiplier in MULTIPLIER_PREFIXES:
+        rest = base[len(prefix):]
+        # 前缀后面必须还是字母开头，避免把 1INCH 之类的真名字拆掉
+        if base.startswith(prefix) and rest[:1].isalpha():
+            return rest.lower(), multiplier
+    return base.lower(), 1
+
+
+def build_ticker_index(coin_list: Iterable[Mapping]) -> Dict[str, List[str]]:
+    """/coins/list 的 [{"id", "symbol", "name"}, ...] -> {ticker: [coin id, ...]}。"""
+    index: Dict[str, List[str]] = {}
+    for coin in coin_list:
+        cid, ticker = coin.get("id"), coin.get("symbol")
+        if cid and ticker:
+            index.setdefault(str(ticker).lower(), []).append(str(cid))
+    for ids in index.values():
+        ids.sort()
+    return index
+
+
+def chunk_list(items: List[str], size: int) -> List[List[str]]:
+    return [items[i: i + size] for i in range(0, len(items), size)]
+
+
+class CoinGeckoIndex:
+    """ticker -> 候选 coin id 的索引，以及已经确认过的 symbol -> (coin id, 倍数)。"""
+
+    def __init__(
+        self,
+        api_base: str,
+        *,
+        cache_path: Optional[Union[str, Path]] = None,
+        overrides: Optional[Mapping[str, str]] = None,
+        refresh_seconds: float = INDEX_REFRESH_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.api_base = api_base.rstrip("/")
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.overrides = dict(overrides or {})
+        self.refresh_seconds = refresh_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tickers: Dict[str, List[str]] = {}
+        self._resolved: Dict[str, Tuple[str, int]] = {}
+        # 所有候选都对不上价格的 symbol，索引刷新前不再查
+        self._unmatched: Dict[str, float] = {}
+        self.updated_at = 0.0
+        self._load()
+
+    # ---------- 索引 ----------
+
+    def ensure_fresh(self) -> None:
+        """索引为空或过期时重新拉 /coins/list（在后台线程里调用）。"""
+        if self._tickers and self._clock() - self.updated_at < self.refresh_seconds:
+            return
+        resp = http_get(f"{self.api_base}/coins/list", timeout=30)
+        tickers = build_ticker_index(resp.json())
+        with self._lock:
+            self._tickers = tickers
+            self.updated_at = self._clock()
+            self._unmatched.clear()
+        self.save()
+
+    def candidates(self, symbol: str) -> List[Tuple[str, int]]:
+        """symbol 可能对应的 (coin id, 倍数)：手动配置 > 已确认 > 索引里同 ticker 的所有 coin。"""
+        base, multiplier = split_symbol(symbol)
+        with self._lock:
+            if symbol in self.overrides:
+                return [(self.overrides[symbol], multiplier)]
+            if symbol in self._resolved:
+                return [self._resolved[symbol]]
+            if symbol in self._unmatched:
+                return []
+            return [(cid, multiplier) for cid in self._tickers.get(base, [])]
+
+    def choose(
+        self,
+        symbol: str,
+        usd_prices: Mapping[str, float],
+        binance_price: Optional[float],
+    ) -> Optional[Tuple[str, int]]:
+        """
+        从候选里挑出价格对得上的那个并记住。只有一个候选且没有 Binance 价格时直接用它。
+        """
+        options = [(cid, m) for cid, m in self.candidates(symbol) if cid in usd_prices]
+        if not options:
+            return None
+        with self._lock:
+            if symbol in self.overrides or symbol in self._resolved:
+                return options[0]
+
+        best: Optional[Tuple[str, int]] = None
+        if binance_price:
+            low, high = PRICE_MATCH_RATIO
+            best_err = None
+            for cid, multiplier in options:
+                ratio = usd_prices[cid] * multiplier / binance_price
+                if low <= ratio <= high:
+                    err = abs(ratio - 1)
+                    if best_err is None or err < best_err:
+                        best, best_err = (cid, multiplier), err
+        elif len(options) == 1:
+            best = options[0]
+
+        with self._lock:
+            if best is not None:
+                self._resolved[symbol] = best
+            elif binance_price:
+                self._unmatched[symbol] = self._clock()
+        return best
+
+    # ---------- 持久化 ----------
+
+    def _load(self) -> None:
+        if self.cache_path is None or not self.cache_path.exists():
+            return
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            tickers = {str(k): [str(i) for i in v] for k, v in data["tickers"].items()}
+            resolved = {str(k): (str(v[0]), int(v[1])) for k, v in data.get("resolved", {}).items()}
+            updated_at = float(data.get("updated_at", 0.0))
+        except (ValueError, KeyError, TypeError, IndexError) as exc:
+            print(f"coingecko index {self.cache_path} unreadable, rebuilding: {exc}")
+            return
+        self._tickers, self._resolved, self.updated_at = tickers, resolved, updated_at
+
+    def save(self) -> None:
+        if self.cache_path is None:
+            return
+        with self._lock:
+            data = {
+                "updated_at": self.updated_at,
+                "tickers": self._tickers,
+                "resolved": {k: list(v) for k, v in self._resolved.items()},
+            }
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_suffix(self.cache_path.suffix + ".tmp")
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp, self.cache_path)
+        except OSError as exc:
+            print(f"coingecko index write error: {exc}")
+
+
+class McCache:
+    """
+    后台刷新的 {symbol: MC(USD)}。刷新失败或进行中时，snapshot() 返回上一次成功的结果。
+    """
+
+    def __init__(
+        self,
+        index: CoinGeckoIndex,
+        *,
+        refresh_seconds: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.index = index
+        self.refresh_seconds = refresh_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._symbols: List[str] = []
+        self._prices: Dict[str, float] = {}
+        self._values: Dict[str, float] = {}
+        self.updated_at = 0.0
+        self.refresh_count = 0
+        self.refresh_errors = 0
+        self.requests = 0
+
+    def update(self, symbols: Iterable[str], prices: Optional[Mapping[str, float]] = None) -> None:
+        """交给后台线程当前 universe 和 Binance 最新价（用来确认 coin id）；出现新 symbol 时提前刷新。"""
+        symbols = list(symbols)
+        with self._lock:
+            new = bool(set(symbols) - set(self._symbols))
+            self._symbols = symbols
+            if prices is not None:
+                self._prices = dict(prices)
+        if new:
+            self._wake.set()
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def age(self) -> float:
+        return self._clock() - self.updated_at if self.updated_at else float("inf")
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="mc-cache", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as exc:  # noqa: BLE001
+                self.refresh_errors += 1
+                print(f"MC refresh error: {type(exc).__name__} - {exc}")
+            self._wake.wait(self.refresh_seconds)
+            self._wake.clear()
+
+    def refresh(self) -> Dict[str, float]:
+        """同步刷新一次（后台线程调用；测试里也可以直接调）。"""
+        self.index.ensure_fresh()
+        with self._lock:
+            symbols, prices = list(self._symbols), dict(self._prices)
+
+        wanted = {symbol: self.index.candidates(symbol) for symbol in symbols}
+        ids = sorted({cid for options in wanted.values() for cid, _ in options})
+        usd_prices: Dict[str, float] = {}
+        id_to_mc: Dict[str, float] = {}
+        for batch in chunk_list(ids, SIMPLE_PRICE_BATCH):
+            params = {"ids": ",".join(batch), "vs_currencies": "usd", "include_market_cap": "true"}
+            self.requests += 1
+            try:
+                resp = http_get(f"{self.index.api_base}/simple/price", params=params, timeout=10)
+                for cid, val in resp.json().items():
+                    if val.get("usd"):
+                        usd_prices[cid] = float(val["usd"])
+                    mc = float(val.get("usd_market_cap") or 0.0)
+                    if mc > 0:
+                        id_to_mc[cid] = mc
+            except Exception as exc:  # noqa: BLE001
+                print(f"CoinGecko batch fetch error: {type(exc).__name__} - {exc}")
+
+        values: Dict[str, float] = {}
+        for symbol in symbols:
+            chosen = self.index.choose(symbol, usd_prices, prices.get(symbol))
+            if chosen is not None and chosen[0] in id_to_mc:
+                values[symbol] = id_to_mc[chosen[0]]
+        self.index.save()
+
+        wanted = set(symbols)
+        with self._lock:
+            # 这一轮整批失败时保留旧值，单个 symbol 没拿到时也沿用旧值
+            merged = {s: v for s, v in self._values.items() if s in wanted}
+            merged.update(values)
+            self._values = merged
+            self.updated_at = self._clock()
+            self.refresh_count += 1
+        print(f"CoinGecko MC loaded for {len(values)}/{len(symbols)} symbols ({len(ids)} ids)")
+        return values
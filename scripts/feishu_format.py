@@ -0,0 +1,141 @@
+"""
+飞书消息排版：按大小装箱 + 交互卡片表格。
+
+以前按 3500 字符硬切（content[i:i+MAX_LEN]），一条告警经常被切成两半，
+发几条消息取决于排版而不是内容。这里：
+
+- pack_blocks：把完整的告警块装进尽量少的消息，每条都不超过飞书的请求体上限，
+  告警块永远不会被拆开（单块本身超限时才退化为硬切）；
+- build_table_card：生成交互卡片（表格：symbol / 价格 / OI / ΔP / ΔOI），作为纯文本之外的另一种输出；
+- pack_table_rows：表格行同样按大小装进若干张卡片。
+
+大小按 requests 实际发送的 JSON（ensure_ascii，中文按 \\uXXXX 6 字节）估算。
+"""
+
+import json
+from typing import Dict, List, Sequence, Tuple
+
+# 飞书自定义机器人请求体上限 20 KB，留出消息外壳和关键字的余量
+FEISHU_MAX_PAYLOAD_BYTES = 18_000
+
+# 告警块之间的分隔
+BLOCK_SEPARATOR = "\n\n"
+
+
+def payload_size(value) -> int:
+    """按 requests(json=...) 的编码方式估算字节数。"""
+    return len(json.dumps(value))
+
+
+def _hard_split(text: str, max_bytes: int) -> List[str]:
+    """单个块本身就超限时的兜底：按编码后大小切成若干段。"""
+    parts: List[str] = []
+    current = ""
+    for ch in text:
+        if current and payload_size(current + ch) > max_bytes:
+            parts.append(current)
+            current = ""
+        current += ch
+    if current:
+        parts.append(current)
+    return parts
+
+
+def pack_blocks(
+    blocks: Sequence[str],
+    *,
+    header: str = "",
+    max_bytes: int = FEISHU_MAX_PAYLOAD_BYTES,
+    sep: str = BLOCK_SEPARATOR,
+) -> List[str]:
+    """
+    First-fit decreasing 装箱：大块先放，每块放进第一条还装得下的消息；
+    每条消息开头带 header，消息内的块保持原来的先后顺序。
+    """
+    budget = max_bytes - payload_size(header)
+    sep_size = payload_size(sep) - 2  # 去掉 JSON 字符串两端引号
+
+    items: List[Tuple[int, str]] = []
+    for idx, block in enumerate(blocks):
+        if payload_size(block) - 2 > budget:
+            for j, part in enumerate(_hard_split(block, budget)):
+                items.append((idx * 10_000 + j, part))
+        else:
+            items.append((idx * 10_000, block))
+
+    bins: List[List[Tuple[int, str]]] = []
+    sizes: List[int] = []
+    for order, block in sorted(items, key=lambda it: payload_size(it[1]), reverse=True):
+        size = payload_size(block) - 2
+        for i, used in enumerate(sizes):
+            if used + sep_size + size <= budget:
+                bins[i].append((order, block))
+                sizes[i] = used + sep_size + size
+                break
+        else:
+            bins.append([(order, block)])
+            sizes.append(size)
+
+    # 按每条消息里最早的块排序，读起来仍然大致按原顺序
+    bins.sort(key=lambda b: min(order for order, _ in b))
+    return [header + sep.join(block for _, block in sorted(b)) for b in bins]
+
+
+def build_table_card(
+    title: str,
+    columns: Sequence[Tuple[str, str]],
+    rows: Sequence[Dict[str, str]],
+    *,
+    template: str = "red",
+) -> Dict:
+    """
+    交互卡片：标题 + 表格。columns 是 [(字段名, 表头显示名), ...]，rows 里的值都是已格式化的字符串。
+    自定义机器人开了关键字校验时，关键字要出现在 title 里。
+    """
+    return {
+        "msg_type": "interactive",
+        "card": {
+            "config": {"wide_screen_mode": True},
+            "header": {
+                "title": {"tag": "plain_text", "content": title},
+                "template": template,
+            },
+            "elements": [
+                {
+                    "tag": "table",
+                    "page_size": 10,
+                    "row_height": "low",
+                    "header_style": {"bold": True, "background_style": "grey"},
+                    "columns": [
+                        {"name": name, "display_name": display, "data_type": "text"}
+                        for name, display in columns
+                    ],
+                    "rows": [dict(row) for row in rows],
+                }
+            ],
+        },
+    }
+
+
+def pack_table_rows(
+    title: str,
+    columns: Sequence[Tuple[str, str]],
+    rows: Sequence[Dict[str, str]],
+    *,
+    max_bytes: int = FEISHU_MAX_PAYLOAD_BYTES,
+) -> List[Dict]:
+    """表格行按顺序装进若干张卡片，每张不超过 max_bytes。"""
+    cards: List[Dict] = []
+    current: List[Dict[str, str]] = []
+    base = payload_size(build_table_card(title, columns, []))
+    used = base
+    for row in rows:
+        size = payload_size(row) + 2
+        if current and used + size > max_bytes:
+            cards.append(build_table_card(title, columns, current))
+            current, used = [], base
+        current.append(row)
+        used += size
+    if current:
+        cards.append(build_table_card(title, columns, current))
+    return cards
@@ -0,0 +1,263 @@
+"""
+飞书机器人异步发送队列。
+
+以前 send_feishu_text 在扫描线程里直接 requests.post，每段最多阻塞 8 秒，
+而且第一段失败后后面的段全部丢掉。这里改成：
+
+- 扫描线程只把消息放进有界队列（满了丢最旧的一条并计数），立刻返回；
+- 后台线程用持久连接（requests.Session）逐条发送；
+- 按飞书自定义机器人限频（每秒 5 次、每分钟 100 次）控制节奏；
+- 网络错误 / 5xx / 429 / 飞书限频错误码按指数退避重试，单条失败不影响后面的消息；
+- stats() 给出发送成功 / 失败 / 重试 / 丢弃计数（所有 notifier 汇总后也在 /metrics 里）；
+- 文本按完整告警块装箱（scripts/feishu_format.py），告警不会被切成两半；
+  也可以发交互卡片表格（send_table）。
+
+同一个 webhook（同一个机器人）在进程内共用一个 notifier，限频才准确：
+
+    notifier = get_notifier(FEISHU_WEBHOOK)
+    notifier.send_text("...", keyword=FEISHU_KEYWORD)
+    notifier.send_blocks(alerts, header="[时间] 异动合约\n\n", keyword=FEISHU_KEYWORD)
+"""
+
+import atexit
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Sequence, Tuple
+
+import requests
+
+from config.config import FEISHU_QUEUE_SIZE, FEISHU_MAX_RETRIES
+from scripts.feishu_format import (
+    BLOCK_SEPARATOR,
+    FEISHU_MAX_PAYLOAD_BYTES,
+    pack_blocks,
+    pack_table_rows,
+    payload_size,
+)
+from scripts.metrics import REGISTRY
+
+# 飞书自定义机器人限频
+FEISHU_MAX_PER_SECOND = 5
+FEISHU_MAX_PER_MINUTE = 100
+
+# 飞书返回这些错误码表示被限频，需要等一会再发
+FEISHU_RATE_LIMIT_CODES = {9499, 11232}
+
+# 进程退出时最多等多久把队列里的消息发完
+FLUSH_ON_EXIT_SECONDS = 10.0
+
+SEND_SECONDS = REGISTRY.histogram("feishu_send_seconds", "Latency of one webhook POST", ("status",))
+
+
+class FeishuNotifier:
+    """单个 webhook 的后台发送队列。"""
+
+    def __init__(
+        self,
+        webhook: str,
+        *,
+        max_queue: int = FEISHU_QUEUE_SIZE,
+        max_retries: int = FEISHU_MAX_RETRIES,
+        timeout: float = 8.0,
+        backoff_base: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.webhook = webhook
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self._clock = clock
+        self._sleep = sleep
+        self._queue: "queue.Queue[Tuple[dict, float]]" = queue.Queue(maxsize=max_queue)
+        self._session = requests.Session()
+        self._session.headers["Content-Type"] = "application/json; charset=utf-8"
+        self._sent_at: Deque[float] = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+        self.total_latency = 0.0
+
+    # ---------- 入队（扫描线程调用） ----------
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="feishu-notifier", daemon=True)
+                self._thread.start()
+
+    def send_payload(self, payload: dict) -> bool:
+        """把一条完整的飞书消息体放进队列；队列满时丢掉最旧的一条。"""
+        self.start()
+        item = (payload, self._clock())
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    with self._stats_lock:
+                        self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def send_text(self, content: str, *, keyword: str = "") -> int:
+        """
+        文本消息入队，返回消息条数。放得下就整条发；
+        放不下时按空行分段（一条告警一段）装箱，段不会被拆开。
+        """
+        prefix = f"{keyword} " if keyword else ""
+        if payload_size(prefix + content) <= FEISHU_MAX_PAYLOAD_BYTES:
+            self.send_payload({"msg_type": "text", "content": {"text": prefix + content}})
+            return 1
+        return self.send_blocks(content.split(BLOCK_SEPARATOR), keyword=keyword)
+
+    def send_blocks(self, blocks: Sequence[str], *, header: str = "", keyword: str = "") -> int:
+        """把若干条完整的告警块装进尽量少的文本消息，每条都带 header，返回消息条数。"""
+        prefix = f"{keyword} " if keyword else ""
+        messages = pack_blocks(blocks, header=prefix + header)
+        for text in messages:
+            self.send_payload({"msg_type": "text", "content": {"text": text}})
+        return len(messages)
+
+    def send_table(
+        self,
+        title: str,
+        columns: Sequence[Tuple[str, str]],
+        rows: Sequence[Dict[str, str]],
+        *,
+        keyword: str = "",
+    ) -> int:
+        """交互卡片表格，行太多时拆成几张卡片；关键字放在标题里。返回卡片张数。"""
+        full_title = f"{keyword} {title}" if keyword else title
+        cards = pack_table_rows(full_title, columns, rows)
+        for card in cards:
+            self.send_payload(card)
+        return len(cards)
+
+    def flush(self, timeout: float = FLUSH_ON_EXIT_SECONDS) -> bool:
+        """等待队列发完（测试 / 退出前用），超时返回 False。"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            delivered = self.sent + self.failed
+            return {
+                "sent": self.sent,
+                "failed": self.failed,
+                "retried": self.retried,
+                "dropped": self.dropped,
+                "queued": self._queue.qsize(),
+                "success_rate": self.sent / delivered if delivered else 1.0,
+                "avg_latency": self.total_latency / self.sent if self.sent else 0.0,
+            }
+
+    # ---------- 后台发送 ----------
+
+    def _run(self) -> None:
+        while True:
+            payload, enqueued_at = self._queue.get()
+            try:
+                ok = self._deliver(payload)
+                with self._stats_lock:
+                    if ok:
+                        self.sent += 1
+                        self.total_latency += self._clock() - enqueued_at
+                    else:
+                        self.failed += 1
+            except Exception as exc:  # noqa: BLE001
+                print("Feishu notifier error:", exc)
+                with self._stats_lock:
+                    self.failed += 1
+            finally:
+                self._queue.task_done()
+
+    def _wait_for_slot(self) -> None:
+        """滑动窗口限频：1 秒内不超过 5 次，60 秒内不超过 100 次。"""
+        while True:
+            now = self._clock()
+            while self._sent_at and now - self._sent_at[0] >= 60:
+                self._sent_at.popleft()
+            recent = sum(1 for t in self._sent_at if now - t < 1)
+            if len(self._sent_at) < FEISHU_MAX_PER_MINUTE and recent < FEISHU_MAX_PER_SECOND:
+                self._sent_at.append(now)
+                return
+            if len(self._sent_at) >= FEISHU_MAX_PER_MINUTE:
+                wait = 60 - (now - self._sent_at[0])
+            else:
+                wait = 1 - (now - self._sent_at[-FEISHU_MAX_PER_SECOND])
+            self._sleep(max(wait, 0.01))
+
+    def _deliver(self, payload: dict) -> bool:
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_slot()
+            retryable = False
+            started = time.perf_counter()
+            try:
+                resp = self._session.post(self.webhook, json=payload, timeout=self.timeout)
+                SEND_SECONDS.observe(time.perf_counter() - started, status=resp.status_code)
+                print("Feishu status:", resp.status_code, resp.text)
+                if resp.status_code == 429 or resp.status_code >= 500:
+                    retryable = True
+                elif resp.status_code == 200:
+                    try:
+                        code = resp.json().get("code", 0)
+                    except ValueError:
+                        code = 0
+                    if not code:
+                        return True
+                    retryable = code in FEISHU_RATE_LIMIT_CODES
+            except requests.RequestException as exc:
+                SEND_SECONDS.observe(time.perf_counter() - started, status=type(exc).__name__)
+                print("Feishu error:", exc)
+                retryable = True
+
+            if not retryable or attempt >= self.max_retries:
+                return False
+            with self._stats_lock:
+                self.retried += 1
+            self._sleep(self.backoff_base * (2 ** attempt))
+        return False
+
+
+_notifiers: Dict[str, FeishuNotifier] = {}
+_notifiers_lock = threading.Lock()
+
+
+def get_notifier(webhook: str) -> FeishuNotifier:
+    """同一个 webhook 在进程内共用一个 notifier（限频按机器人算）。"""
+    with _notifiers_lock:
+        notifier = _notifiers.get(webhook)
+        if notifier is None:
+            notifier = FeishuNotifier(webhook)
+            _notifiers[webhook] = notifier
+            atexit.register(notifier.flush)
+        return notifier
+
+
+def _all_stats() -> Dict[str, float]:
+    """所有 webhook 的计数加总（/metrics 里的 feishu_*）。"""
+    with _notifiers_lock:
+        notifiers = list(_notifiers.values())
+    totals = {"sent": 0, "failed": 0, "retried": 0, "dropped": 0, "queued": 0}
+    for notifier in notifiers:
+        stats = notifier.stats()
+        for key in totals:
+            totals[key] += stats[key]
+    return totals
+
+
+REGISTRY.register_stats("feishu", _all_stats)
@@ -0,0 +1,130 @@
+"""
+http_get 下面的响应缓存：按周期边界过期 + 相同请求在途合并。
+
+openInterestHist(period=5m)、takerlongshortRatio 这类 /futures/data/* 统计数据
+每个周期才更新一次，周期内重复请求拿到的都是同一份数据，只会白白消耗限额和延迟。
+
+- key = (url, 排序后的 params)；
+- 过期时间对齐到数据周期的下一个边界（再加 grace 秒，等 Binance 把新点算出来）；
+- 同一个 key 的并发请求只发一次，其它线程等第一次的结果；不按周期缓存的 GET
+  （K 线、深度、ticker……）也一样合并在途请求，只是结果不留到下一次；
+- hits / misses / coalesced 计数，方便看命中率。
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+from urllib.parse import urlparse
+
+from scripts.timeframes import interval_minutes
+
+CacheKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# 按周期缓存的接口前缀：数据在周期内不变
+PERIOD_CACHED_PREFIXES = ("/futures/data/",)
+
+# 缓存条目超过这个数量时顺手清理已过期的
+PRUNE_THRESHOLD = 4096
+
+
+def make_key(url: str, params: Optional[Mapping]) -> CacheKey:
+    items = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+    return url, items
+
+
+def period_expiry(url: str, params: Optional[Mapping], now: float, grace: float) -> Optional[float]:
+    """
+    返回这个请求的缓存过期时间戳；不可缓存时返回 None。
+    只有 /futures/data/* 且带 period 参数的请求才缓存，过期时间 = 下一个周期边界 + grace。
+    """
+    path = urlparse(url).path
+    if not path.startswith(PERIOD_CACHED_PREFIXES):
+        return None
+    period = (params or {}).get("period")
+    if not period:
+        return None
+    try:
+        seconds = interval_minutes(str(period)) * 60
+    except ValueError:
+        return None
+    boundary = (now // seconds + 1) * seconds
+    # 刚过边界还没到 grace 的这几秒，数据可能还是上一周期的，只缓存到 grace 结束
+    if now < boundary - seconds + grace:
+        return boundary - seconds + grace
+    return boundary + grace
+
+
+class ResponseCache:
+    """线程安全的过期缓存 + 在途请求合并。"""
+
+    def __init__(self, *, clock: Callable[[], float] = time.time) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[CacheKey, Tuple[float, Any]] = {}
+        self._inflight: Dict[CacheKey, Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+                "hit_rate": (self.hits + self.coalesced) / total if total else 0.0,
+            }
+
+    def get_or_fetch(self, key: CacheKey, expires_at: Optional[float], fetch: Callable[[], Any]) -> Any:
+        """expires_at 为 None 时只合并在途请求，结果不缓存。"""
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+                owner = True
+
+        if not owner:
+            # 等第一个线程的结果（异常也一并抛出）
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as exc:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(exc)
+            raise
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            if expires_at is not None:
+                self._entries[key] = (expires_at, value)
+                if len(self._entries) > PRUNE_THRESHOLD:
+                    self._prune(self._clock())
+        future.set_result(value)
+        return value
+
+    def _prune(self, now: float) -> None:
+        for key in [k for k, (exp, _) in self._entries.items() if exp <= now]:
+            del self._entries[key]
@@ -0,0 +1,251 @@
+"""
+共享行情数据层：一个进程里跑所有监控，每份数据每轮只拉一次。
+
+以前 btc_watch / Binance_features_monitor / binance_features_OI / binance_features_oi_1 各自一个进程，
+exchangeInfo、24hr ticker、5m OI 历史各拉各的，总权重是实际需要的 3–4 倍。这里：
+
+- MarketHub 持有唯一一份合约列表（UniverseManager），所有监控共用；
+- 全市场数据（ticker / premiumIndex / 现货价格……）按名字注册成数据源，每轮第一次用到时才拉，
+  max_age 秒内重复要同一个源直接复用，几个监控同时要时只发一次请求（scripts/http_cache.py 的在途合并）；
+- 逐 symbol 的增量序列（SeriesStore）按名字共享：oi_1 和 OI 基础版的 5m OI 只拉一份；
+- 每个监控是一个插件，自己的阈值、飞书关键字、告警冷却都不变，只是数据从快照里拿。
+
+插件约定（各监控模块里的 *Monitor 类）：
+
+    name: str                  # /metrics 里的 monitor 标签
+    interval: float            # 两轮之间的秒数
+    setup(hub)                 # 注册数据源、拿共享序列缓存、发启动消息
+    run_round(snapshot)        # 跑一轮：snapshot.symbols、snapshot.get("ticker") ……
+
+单独运行某个监控（python -m scripts.binance_features_oi_1）时，模块的 main() 自己建一个 max_age=0 的 hub；
+一起跑：
+
+    python -m scripts.market_hub --plugins oi1,futures,btc
+"""
+
+import argparse
+import importlib
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config.config import (
+    FAPI_EXCHANGE_INFO,
+    HUB_MAX_AGE,
+    HUB_PLUGINS,
+    HUB_METRICS_PORT,
+    HUB_UNIVERSE_CACHE_FILE,
+    UNIVERSE_REFRESH_SECONDS,
+)
+from scripts.binance_http import http_get
+from scripts.http_cache import ResponseCache
+from scripts.metrics import REGISTRY, observe_round, start_metrics_server
+from scripts.series_cache import SeriesStore
+from scripts.universe import UniverseManager, parse_usdt_perpetuals
+
+# 插件名 -> (模块, 类名)，按需 import
+PLUGINS: Dict[str, Sequence[str]] = {
+    "oi1": ("scripts.binance_features_oi_1", "OiRulesMonitor"),
+    "oi": ("scripts.binance_features_OI", "OiMonitor"),
+    "futures": ("scripts.Binance_features_monitor", "FuturesMonitor"),
+    "btc": ("scripts.btc_watch", "BtcWatch"),
+}
+
+SOURCE_FETCHES = REGISTRY.counter("market_hub_fetches_total", "Bulk source fetches actually sent", ("source",))
+SOURCE_ERRORS = REGISTRY.counter("market_hub_fetch_errors_total", "Bulk source fetch failures", ("source", "error"))
+
+
+class MarketSnapshot:
+    """
+    一个插件一轮看到的数据：symbols 是当前合约列表，全市场数据源第一次 get() 时才拉
+    （流式模式下 WebSocket 有数据就不用拉），同一轮内重复 get() 不再请求。
+    """
+
+    def __init__(self, hub: "MarketHub", ts: float, symbols: List[str]) -> None:
+        self.hub = hub
+        self.ts = ts
+        self.symbols = symbols
+        self.errors: Dict[str, BaseException] = {}
+        self._data: Dict[str, Any] = {}
+
+    def get(self, source: str, default: Any = None) -> Any:
+        """拉失败返回 default，异常放在 errors 里（已经打印过）。"""
+        if source not in self._data and source not in self.errors:
+            try:
+                self._data[source] = self.hub.fetch(source)
+            except Exception as exc:  # noqa: BLE001
+                SOURCE_ERRORS.inc(source=source, error=type(exc).__name__)
+                print(f"market hub {source} fetch error: {type(exc).__name__} - {exc}")
+                self.errors[source] = exc
+        return self._data.get(source, default)
+
+
+class MarketHub:
+    """所有监控共用的合约列表、全市场数据源和增量序列缓存。"""
+
+    def __init__(
+        self,
+        universe: Optional[UniverseManager] = None,
+        *,
+        max_age: float = HUB_MAX_AGE,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.universe = universe
+        self.max_age = max_age
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sources: Dict[str, Callable[[], Any]] = {}
+        self._stores: Dict[str, SeriesStore] = {}
+        self._cache = ResponseCache(clock=clock)
+        self._started = False
+
+    def start(self) -> List[str]:
+        """读合约列表（优先磁盘缓存）并启动后台刷新，返回当前列表；重复调用只生效一次。"""
+        with self._lock:
+            if self._started or self.universe is None:
+                return self.symbols()
+            self._started = True
+        symbols = self.universe.load()
+        self.universe.start()
+        return symbols
+
+    def symbols(self) -> List[str]:
+        return self.universe.symbols() if self.universe is not None else []
+
+    def clear(self) -> None:
+        """丢掉复用中的全市场数据，下一次 get 重新拉。"""
+        self._cache.clear()
+
+    # ---------- 数据源 ----------
+
+    def add_source(self, name: str, fetch: Callable[[], Any]) -> None:
+        """注册全市场数据源；同名的源先注册的生效（同一个名字必须是同一份数据、同一种格式）。"""
+        with self._lock:
+            self._sources.setdefault(name, fetch)
+
+    def fetch(self, source: str) -> Any:
+        """拉一个数据源；max_age 秒内的结果直接复用，并发请求合并成一次。"""
+        with self._lock:
+            fetch = self._sources.get(source)
+        if fetch is None:
+            raise KeyError(f"unknown market data source: {source}")
+
+        def counted() -> Any:
+            SOURCE_FETCHES.inc(source=source)
+            return fetch()
+
+        if self.max_age <= 0:
+            return counted()
+        return self._cache.get_or_fetch((source, ()), self._clock() + self.max_age, counted)
+
+    def snapshot(self) -> MarketSnapshot:
+        """开始一轮：当前合约列表 + 按需拉取的数据源。"""
+        if self.universe is not None:
+            # 变更由各插件自己和上一轮的 symbols 对比（universe_changes），这里只是清空累积
+            self.universe.drain_changes()
+        return MarketSnapshot(self, self._clock(), self.symbols())
+
+    # ---------- 共享序列缓存 ----------
+
+    def series_store(self, name: str, capacity: int, step_ms: int) -> SeriesStore:
+        """
+        按名字共享的 SeriesStore（名字里要带上粒度，比如 "fapi_5m"），容量取各插件要求的最大值。
+        只在 setup 阶段调用：缓冲区建好之后就不能再扩容了。
+        """
+        with self._lock:
+            store = self._stores.get(name)
+            if store is None:
+                store = self._stores[name] = SeriesStore(capacity, step_ms)
+            elif store.step_ms != step_ms:
+                raise ValueError(f"series store {name}: step {step_ms} != {store.step_ms}")
+            elif store.capacity < capacity:
+                if store.stats()["series"]:
+                    raise ValueError(f"series store {name} already in use, cannot grow to {capacity}")
+                store.capacity = capacity
+            return store
+
+    def stats(self) -> Dict[str, float]:
+        stats = dict(self._cache.stats())
+        stats["sources"] = len(self._sources)
+        stats["series_stores"] = len(self._stores)
+        return stats
+
+
+def universe_changes(previous: Sequence[str], current: Sequence[str]) -> Tuple[List[str], List[str]]:
+    """插件用：和上一轮的 symbols 比较，返回 (新增, 下架)，都按字母排序。"""
+    old, new = set(previous), set(current)
+    return sorted(new - old), sorted(old - new)
+
+
+# ========= 一起跑 =========
+
+def fetch_usdt_perpetuals() -> List[str]:
+    resp = http_get(FAPI_EXCHANGE_INFO, timeout=10)
+    return parse_usdt_perpetuals(resp.json())
+
+
+def load_plugin(name: str):
+    module_name, class_name = PLUGINS[name]
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def next_tick(now: float, interval: float) -> float:
+    """对齐到 interval 的整数倍：间隔相同的插件同一时刻开始，数据源正好共用。"""
+    if interval <= 0:
+        return now
+    return (now // interval + 1) * interval
+
+
+def run_plugin(hub: MarketHub, plugin, stop: threading.Event) -> None:
+    """一个插件的循环：到点取快照、跑一轮、记耗时，再等下一个对齐的时刻。"""
+    while not stop.is_set():
+        started = time.time()
+        try:
+            plugin.run_round(hub.snapshot())
+        except Exception as exc:  # noqa: BLE001
+            print(f"[{plugin.name}] round error: {type(exc).__name__} - {exc}")
+        elapsed = time.time() - started
+        observe_round(plugin.name, elapsed, plugin.interval)
+        stop.wait(max(next_tick(time.time(), plugin.interval) - time.time(), 0.0))
+
+
+def run_plugins(hub: MarketHub, plugins: Sequence, stop: Optional[threading.Event] = None) -> List[threading.Thread]:
+    """先按顺序 setup，再每个插件一个线程；返回线程列表（stop.set() 后各自退出）。"""
+    stop = stop or threading.Event()
+    hub.start()
+    for plugin in plugins:
+        plugin.setup(hub)
+    threads = []
+    for plugin in plugins:
+        thread = threading.Thread(target=run_plugin, args=(hub, plugin, stop), name=f"plugin-{plugin.name}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run several monitors on one shared market data layer.")
+    parser.add_argument("--plugins", default=HUB_PLUGINS, help=f"逗号分隔，可选 {', '.join(PLUGINS)}")
+    args = parser.parse_args(argv)
+    names = [n.strip() for n in args.plugins.split(",") if n.strip()]
+    unknown = set(names) - set(PLUGINS)
+    if unknown:
+        parser.error(f"unknown plugins: {sorted(unknown)}")
+
+    if HUB_METRICS_PORT:
+        start_metrics_server(HUB_METRICS_PORT)
+    universe = UniverseManager(
+        fetch_usdt_perpetuals,
+        cache_path=HUB_UNIVERSE_CACHE_FILE or None,
+        refresh_seconds=UNIVERSE_REFRESH_SECONDS,
+    )
+    hub = MarketHub(universe)
+    REGISTRY.register_stats("market_hub", hub.stats)
+    threads = run_plugins(hub, [load_plugin(name) for name in names])
+    print(f"market hub running plugins: {', '.join(names)}")
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
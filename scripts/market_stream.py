@@ -0,0 +1,355 @@
+"""
+Binance U 本位合约 WebSocket 行情订阅（可选的「流式模式」）。
+
+订阅组合流：
+- !markPrice@arr@1s：全市场标记价格 / 指数价格 / funding，每秒推一次；
+- !ticker@arr：全市场 24H ticker（最新价、24H 涨跌幅、24H 成交额）；
+- <symbol>@kline_<interval>：逐个 symbol 的 K 线（用来算 15m / 1H 价格变化）。
+
+收到的数据合并进每个 symbol 的内存状态，监控脚本的条件判断直接读状态，
+不用再每轮 REST 拉价格，告警延迟从一个轮询周期降到秒级。
+
+Binance 单条连接最多 200 个 stream，这里按 STREAMS_PER_CONNECTION 拆成多条连接，
+每条连接一个后台线程；断线（包括 Binance 每 24 小时的主动断开）后自动重连并重新订阅。
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from websockets.sync.client import connect
+
+from scripts.timeframes import interval_minutes
+
+# 单条连接最多订阅的 stream 数（Binance 上限 200）
+STREAMS_PER_CONNECTION = 200
+
+# 一条 SUBSCRIBE 消息里带多少个 stream（Binance 限制每秒 10 条上行消息）
+SUBSCRIBE_BATCH = 50
+
+# 重连退避（秒）
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+
+# 每个 symbol / interval 保留多少根已收盘 K 线的收盘价（本地聚合多窗口用）
+KLINE_HISTORY = 64
+
+# 全市场组合流
+ALL_MARK_PRICE_STREAM = "!markPrice@arr@1s"
+ALL_TICKER_STREAM = "!ticker@arr"
+
+
+def kline_stream_name(symbol: str, interval: str) -> str:
+    return f"{symbol.lower()}@kline_{interval}"
+
+
+class MarketStream:
+    """
+    维护每个 symbol 的行情状态：
+
+        stream = MarketStream(symbols, kline_intervals=["15m", "1h"])
+        stream.start()
+        stream.price_change("BTCUSDT", "15m")  # -> (涨跌幅%, 最新价) 或 None
+
+    状态字段（get(symbol) 返回的 dict）：
+    mark_price / index_price / funding_rate / next_funding_time /
+    last_price / price_24h_pct / quote_volume / updated_at，
+    mark_updated_at / ticker_updated_at（两条全市场流各自最后一次推到这个 symbol 的时间），
+    以及 klines[interval] = {"open_time", "close", "history"}，
+    history 是已收盘 K 线的收盘价（时间升序，最多 KLINE_HISTORY 根）。
+    断线期间漏了 K 线时 history 接不上，会被清空并记进 kline_gaps()，等调用方用 seed_kline 重新预热。
+
+    max_age（秒）不为 None 时，ticker_map / premium_map 不返回超过 max_age 没更新的 symbol：
+    断线重连期间或推送卡住时不会拿旧价格当最新价，整张表都过期时返回空，调用方回退到 REST。
+    """
+
+    def __init__(
+        self,
+        symbols: Iterable[str],
+        *,
+        kline_intervals: Iterable[str] = (),
+        base_url: str = "wss://fstream.binance.com",
+        max_age: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.symbols = sorted(set(symbols))
+        self.kline_intervals = list(kline_intervals)
+        self.base_url = base_url.rstrip("/")
+        self.max_age = max_age
+        self._clock = clock
+        self._state: Dict[str, Dict] = {}
+        # 漏了 K 线、history 已清空、等着 seed_kline 重新预热的 (symbol, interval)
+        self._gaps: set = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._started = False
+        # 统计：连接次数（含重连）和收到的消息数
+        self.connect_count = 0
+        self.message_count = 0
+
+    # ---------- 订阅 ----------
+
+    def streams(self) -> List[str]:
+        names = [ALL_MARK_PRICE_STREAM, ALL_TICKER_STREAM]
+        for symbol in self.symbols:
+            names.extend(self._symbol_streams(symbol))
+        return names
+
+    def _symbol_streams(self, symbol: str) -> List[str]:
+        """单个 symbol 要订阅的 stream（子类按需改写，比如 scripts/order_book.py 的深度流）。"""
+        return [kline_stream_name(symbol, interval) for interval in self.kline_intervals]
+
+    def _connection_groups(self) -> List[List[str]]:
+        names = self.streams()
+        return [
+            names[i: i + STREAMS_PER_CONNECTION]
+            for i in range(0, len(names), STREAMS_PER_CONNECTION)
+        ]
+
+    def start(self) -> None:
+        self._started = True
+        for idx, group in enumerate(self._connection_groups()):
+            thread = threading.Thread(
+                target=self._run_connection,
+                args=(group,),
+                name=f"market-stream-{idx}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def add_symbols(self, symbols: Iterable[str]) -> None:
+        """
+        运行中新增 symbol（新上线合约）：新的 K 线 stream 另开连接订阅，
+        已有连接不动；全市场 arr 流本来就包含新合约。
+        """
+        added = sorted(set(symbols) - set(self.symbols))
+        if not added:
+            return
+        self.symbols = sorted(set(self.symbols) | set(added))
+        names = [name for s in added for name in self._symbol_streams(s)]
+        if not self._started:
+            return  # 还没 start()，start 时会按完整列表订阅
+        for i in range(0, len(names), STREAMS_PER_CONNECTION):
+            thread = threading.Thread(
+                target=self._run_connection,
+                args=(names[i: i + STREAMS_PER_CONNECTION],),
+                name=f"market-stream-{len(self._threads)}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def remove_symbols(self, symbols: Iterable[str]) -> None:
+        """下架的 symbol 清掉状态；已下架合约不会再推送，订阅留着也没有流量。"""
+        removed = set(symbols)
+        self.symbols = [s for s in self.symbols if s not in removed]
+        with self._lock:
+            for symbol in removed:
+                self._state.pop(symbol, None)
+            self._gaps = {(s, i) for s, i in self._gaps if s not in removed}
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def _subscribe(self, ws, streams: List[str]) -> None:
+        for i in range(0, len(streams), SUBSCRIBE_BATCH):
+            batch = streams[i: i + SUBSCRIBE_BATCH]
+            ws.send(json.dumps({"method": "SUBSCRIBE", "params": batch, "id": i // SUBSCRIBE_BATCH + 1}))
+
+    def _run_connection(self, streams: List[str]) -> None:
+        delay = RECONNECT_MIN_DELAY
+        url = f"{self.base_url}/stream"
+        while not self._stop.is_set():
+            try:
+                with connect(url, open_timeout=10, max_size=None) as ws:
+                    self.connect_count += 1
+                    # 每次（重新）连上都完整订阅一遍
+                    self._subscribe(ws, streams)
+                    delay = RECONNECT_MIN_DELAY
+                    while not self._stop.is_set():
+                        try:
+                            raw = ws.recv(timeout=1.0)
+                        except TimeoutError:
+                            continue
+                        self.handle_message(raw)
+            except Exception as exc:  # noqa: BLE001
+                if self._stop.is_set():
+                    break
+                print(f"market stream disconnected: {type(exc).__name__} - {exc}; reconnect in {delay:.0f}s")
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    # ---------- 消息处理 ----------
+
+    def handle_message(self, raw) -> None:
+        msg = json.loads(raw)
+        # SUBSCRIBE 的回执：{"result": null, "id": 1}
+        if "stream" not in msg:
+            return
+        self.message_count += 1
+        stream = msg["stream"]
+        data = msg.get("data")
+        now = self._clock()
+        with self._lock:
+            if stream.startswith("!markPrice@arr"):
+                for row in data or []:
+                    state = self._state_for(row.get("s"))
+                    if state is None:
+                        continue
+                    state["mark_price"] = float(row.get("p") or 0)
+                    state["index_price"] = float(row.get("i") or 0)
+                    state["funding_rate"] = float(row.get("r") or 0)
+                    state["next_funding_time"] = int(row.get("T") or 0)
+                    state["mark_updated_at"] = state["updated_at"] = now
+            elif stream.startswith("!ticker@arr"):
+                for row in data or []:
+                    state = self._state_for(row.get("s"))
+                    if state is None:
+                        continue
+                    state["last_price"] = float(row.get("c") or 0)
+                    state["price_24h_pct"] = float(row.get("P") or 0)
+                    state["quote_volume"] = float(row.get("q") or 0)
+                    state["high_price"] = float(row.get("h") or 0)
+                    state["low_price"] = float(row.get("l") or 0)
+                    state["ticker_updated_at"] = state["updated_at"] = now
+            elif "@kline_" in stream:
+                self._apply_kline(data or {}, now)
+
+    def _state_for(self, symbol: Optional[str]) -> Optional[Dict]:
+        if not symbol:
+            return None
+        state = self._state.get(symbol)
+        if state is None:
+            state = {"klines": {}}
+            self._state[symbol] = state
+        return state
+
+    def _apply_kline(self, data: Dict, now: float) -> None:
+        symbol = data.get("s")
+        state = self._state_for(symbol)
+        k = data.get("k") or {}
+        if state is None or not k:
+            return
+        interval = k.get("i")
+        open_time = int(k.get("t") or 0)
+        close = float(k.get("c") or 0)
+        kline = state["klines"].get(interval)
+        if kline is None:
+            kline = {"open_time": open_time, "close": close, "history": deque(maxlen=KLINE_HISTORY)}
+            state["klines"][interval] = kline
+        elif open_time > kline["open_time"]:
+            if open_time - kline["open_time"] > interval_minutes(interval) * 60_000:
+                # 断线重连期间漏了 K 线：上一根的收盘价和新 K 线接不上，history 作废，等重新预热
+                kline["history"].clear()
+                self._gaps.add((symbol, interval))
+            else:
+                # 新 K 线开始：上一根的最后收盘价进入 history
+                kline["history"].append(kline["close"])
+            kline["open_time"] = open_time
+        elif open_time < kline["open_time"]:
+            return
+        kline["close"] = close
+        state["updated_at"] = now
+
+    # ---------- 读取 ----------
+
+    def seed_kline(self, symbol: str, interval: str, open_time: int, closes: List[float]) -> None:
+        """
+        用 REST K 线预热 history，避免刚启动时要等 K 线走完才有历史：
+        closes 为时间升序的收盘价，最后一个是 open_time 这根（未收盘）K 线。
+        """
+        if not closes:
+            return
+        with self._lock:
+            state = self._state_for(symbol)
+            kline = state["klines"].get(interval)
+            if kline is None or open_time > kline["open_time"]:
+                state["klines"][interval] = {
+                    "open_time": open_time,
+                    "close": closes[-1],
+                    "history": deque(closes[:-1], maxlen=KLINE_HISTORY),
+                }
+            elif open_time == kline["open_time"] and not kline["history"]:
+                kline["history"].extend(closes[:-1])
+            else:
+                return
+            self._gaps.discard((symbol, interval))
+
+    def kline_gaps(self) -> List[Tuple[str, str]]:
+        """漏了 K 线、等着 seed_kline 重新预热的 (symbol, interval)；预热之前 history 为空，price_change 返回 None。"""
+        with self._lock:
+            return sorted(self._gaps)
+
+    def get(self, symbol: str) -> Optional[Dict]:
+        with self._lock:
+            state = self._state.get(symbol)
+            if state is None:
+                return None
+            snapshot = dict(state)
+            snapshot["klines"] = {
+                k: dict(v, history=list(v["history"])) for k, v in state["klines"].items()
+            }
+            return snapshot
+
+    def closes(self, symbol: str, interval: str) -> List[float]:
+        """已收盘 K 线收盘价 + 当前 K 线最新价（时间升序）；没有数据时返回空列表。"""
+        with self._lock:
+            kline = self._state.get(symbol, {}).get("klines", {}).get(interval)
+            if not kline:
+                return []
+            return list(kline["history"]) + [kline["close"]]
+
+    def price_change(self, symbol: str, interval: str) -> Optional[Tuple[float, float]]:
+        """
+        与 REST 版 fetch_price_change 同口径：最新收盘价 vs 上一根 K 线收盘价。
+        还没有上一根 K 线时返回 None，调用方回退到 REST。
+        """
+        closes = self.closes(symbol, interval)
+        if len(closes) < 2 or not closes[-2]:
+            return None
+        prev_close, last_close = closes[-2], closes[-1]
+        return (last_close - prev_close) / prev_close * 100, last_close
+
+    def _oldest_fresh(self) -> float:
+        """updated_at 早于这个时间的算过期；没设 max_age 时都不过期。"""
+        return self._clock() - self.max_age if self.max_age is not None else float("-inf")
+
+    def ticker_map(self) -> Dict[str, Dict]:
+        """返回与 REST /ticker/24hr 同字段名的映射，方便脚本直接替换；过期的 symbol 不返回。"""
+        oldest = self._oldest_fresh()
+        with self._lock:
+            return {
+                symbol: {
+                    "symbol": symbol,
+                    "lastPrice": state["last_price"],
+                    "priceChangePercent": state.get("price_24h_pct", 0.0),
+                    "quoteVolume": state.get("quote_volume", 0.0),
+                    "highPrice": state.get("high_price", 0.0),
+                    "lowPrice": state.get("low_price", 0.0),
+                }
+                for symbol, state in self._state.items()
+                if "last_price" in state and state["ticker_updated_at"] >= oldest
+            }
+
+    def premium_map(self) -> Dict[str, Dict[str, float]]:
+        """返回与 fetch_premium_index_map 同结构的映射；过期的 symbol 不返回。"""
+        oldest = self._oldest_fresh()
+        with self._lock:
+            return {
+                symbol: {
+                    "mark_price": state["mark_price"],
+                    "index_price": state.get("index_price", 0.0),
+                    "funding_rate": state.get("funding_rate", 0.0),
+                    "next_funding_time": state.get("next_funding_time", 0),
+                }
+                for symbol, state in self._state.items()
+                if "mark_price" in state and state["mark_updated_at"] >= oldest
+            }
@@ -0,0 +1,343 @@
+"""
+进程内指标 + 本地 /metrics 端点（Prometheus 文本格式），只用标准库。
+
+各模块在 import 时声明自己的指标，扫描线程里直接累加，开销就是一把锁 + 一次字典查找：
+
+    REQUEST_SECONDS = REGISTRY.histogram("binance_request_seconds", "...", ("endpoint",))
+    REQUEST_SECONDS.observe(0.12, endpoint="/fapi/v1/klines")
+
+    with timed("oi1", "ticker_fetch"):          # 监控主循环里的分阶段耗时
+        ticker_map = fetch_24h_ticker_map()
+    observe_round("oi1", elapsed, poll_interval)  # 一轮耗时 / 超出轮询间隔
+
+已经自带计数的对象（响应缓存、飞书队列、告警状态……）不用改，注册一个 stats 回调，
+抓取时读一次、每个数值键输出成一个 gauge：
+
+    REGISTRY.register_stats("binance_cache", response_cache.stats)
+
+监控启动时 start_metrics_server(METRICS_PORT)，之后 curl http://127.0.0.1:<port>/metrics。
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# 默认的耗时分桶（秒）：覆盖单个请求的几十毫秒到一整轮的几十秒
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+METRICS_PATH = "/metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.label_names: Tuple[str, ...] = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Mapping[str, object]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name}: expected labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def samples(self) -> List[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """[(指标名, 标签名, 标签值, 数值)]"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, label_names, label_values, value in self.samples():
+            lines.append(f"{name}{_format_labels(label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数。"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, self.label_names, key, value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """可增可减的当前值。"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, self.label_names, key, value) for key, value in items]
+
+
+class Histogram(_Metric):
+    """分桶计数 + 总和 + 次数（累计桶，le 为上界）。"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        # 每组标签：[各桶计数（非累计）..., +Inf 桶, 总和]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: object) -> int:
+        with self._lock:
+            row = self._values.get(self._key(labels))
+            return int(sum(row[:-1])) if row else 0
+
+    def total(self, **labels: object) -> float:
+        with self._lock:
+            row = self._values.get(self._key(labels))
+            return row[-1] if row else 0.0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(row)) for key, row in self._values.items())
+        out = []
+        names = self.label_names + ("le",)
+        for key, row in items:
+            cumulative = 0.0
+            for bound, n in zip(self.buckets + (math.inf,), row[:-1]):
+                cumulative += n
+                out.append((f"{self.name}_bucket", names, key + (_format_value(bound),), cumulative))
+            out.append((f"{self.name}_sum", self.label_names, key, row[-1]))
+            out.append((f"{self.name}_count", self.label_names, key, cumulative))
+        return out
+
+
+class Registry:
+    """一个进程一份：声明过的指标 + 抓取时才读的 stats 回调。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._stats: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Callable[[], Mapping[str, float]]] = {}
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labels)
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labels, buckets)
+
+    def register_stats(
+        self,
+        prefix: str,
+        stats: Callable[[], Mapping[str, float]],
+        labels: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        """抓取时调用 stats()，每个数值键输出成 gauge <prefix>_<key>；同一 (prefix, labels) 重复注册会覆盖。"""
+        key = (prefix, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._stats[key] = stats
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            stats = list(self._stats.items())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        # stats 回调：同名 gauge 的多组标签要放在同一个 TYPE 下面
+        grouped: Dict[str, List[str]] = {}
+        for (prefix, labels), fn in stats:
+            try:
+                values = fn()
+            except Exception as exc:  # noqa: BLE001
+                print(f"metrics stats {prefix} error: {exc}")
+                continue
+            names = [n for n, _ in labels]
+            label_values = [v for _, v in labels]
+            for field, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{field}"
+                grouped.setdefault(name, []).append(
+                    f"{name}{_format_labels(names, label_values)} {_format_value(value)}"
+                )
+        for name in sorted(grouped):
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(grouped[name])
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---------- 监控主循环共用的指标 ----------
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "monitor_stage_seconds", "Time spent in one stage of a scan round", ("monitor", "stage")
+)
+ROUND_SECONDS = REGISTRY.histogram("monitor_round_seconds", "Duration of a full scan round", ("monitor",))
+ROUND_INTERVAL = REGISTRY.gauge("monitor_round_interval_seconds", "Configured poll interval", ("monitor",))
+ROUND_OVERRUNS = REGISTRY.counter(
+    "monitor_round_overruns_total", "Rounds that took longer than the poll interval", ("monitor",)
+)
+ROUND_OVERRUN_SECONDS = REGISTRY.counter(
+    "monitor_round_overrun_seconds_total", "Seconds by which rounds exceeded the poll interval", ("monitor",)
+)
+LAST_ROUND_TIMESTAMP = REGISTRY.gauge(
+    "monitor_last_round_timestamp_seconds", "Unix time the last round finished", ("monitor",)
+)
+
+
+@contextmanager
+def timed(monitor: str, stage: str) -> Iterator[None]:
+    """统计一个阶段的耗时（monitor_stage_seconds）。"""
+    with STAGE_SECONDS.time(monitor=monitor, stage=stage):
+        yield
+
+
+def observe_round(monitor: str, duration: float, interval: float) -> None:
+    """一轮结束时调用：记录耗时，超出轮询间隔的部分单独计数。"""
+    ROUND_SECONDS.observe(duration, monitor=monitor)
+    ROUND_INTERVAL.set(interval, monitor=monitor)
+    LAST_ROUND_TIMESTAMP.set(time.time(), monitor=monitor)
+    if duration > interval:
+        ROUND_OVERRUNS.inc(monitor=monitor)
+        ROUND_OVERRUN_SECONDS.inc(duration - interval, monitor=monitor)
+
+
+# ---------- HTTP 端点 ----------
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.split("?", 1)[0] != METRICS_PATH:
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        pass
+
+
+def start_metrics_server(
+    port: int,
+    host: str = "127.0.0.1",
+    registry: Registry = REGISTRY,
+) -> Optional[ThreadingHTTPServer]:
+    """
+    后台线程里起 /metrics 端点，返回 server（.server_address 拿实际端口，port=0 时系统分配）；
+    端口被占用时打印一行并返回 None，监控照常跑。
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as exc:
+        print(f"metrics server on {host}:{port} failed: {exc}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,368 @@
+"""
+本地维护的合约订单簿：每个 symbol 拉一次 REST 快照，之后用 <symbol>@depth@100ms 增量推送更新，
+盘口买卖比（前 N 档买盘名义金额 / 卖盘名义金额）随时 O(1) 读取，不用再每轮逐个 symbol 拉 50 档深度。
+
+同步规则（Binance U 本位合约文档「如何正确在本地维护一个 order book 副本」）：
+1. 订阅深度流，先把推送缓存起来；
+2. 拉 REST 快照（/fapi/v1/depth），记下 lastUpdateId；
+3. 丢掉 u < lastUpdateId 的推送；
+4. 第一条用到的推送必须满足 U <= lastUpdateId <= u；
+5. 之后每条推送的 pu 必须等于上一条的 u，否则说明丢了数据，清空重新拉快照；
+6. 推送里的数量是该价位的最新总量，0 表示删掉该价位。
+
+快照只有 snapshot_limit 档，比它更远、之后又没变过的价位本地不知道。价格一路走出快照覆盖的区间后，
+前 N 档里会混进这样的空洞，所以每一侧记下「可信边界」（快照里最差的价位，档数被截断时随之收紧）：
+前 N 档一旦越过边界，或者一侧不足 N 档而快照本来没拉全，就和断档一样清空重新拉快照。
+
+每一侧按价格排好序，另外维护前 N 档的名义金额之和：每次改一个价位只调整受影响的那一两档，
+读的时候直接返回。累加的浮点误差每 RECOMPUTE_EVERY 次改动按前 N 档重算一次清零。
+"""
+
+import bisect
+import json
+import queue
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+
+from scripts.market_stream import MarketStream
+
+# 订单簿没同步时最多缓存多少条推送（等快照期间）
+BUFFER_LIMIT = 1000
+
+# 每一侧改动多少次后按前 N 档重算一遍名义金额，防止浮点误差累积
+RECOMPUTE_EVERY = 10_000
+
+
+def depth_stream_name(symbol: str, speed: str = "100ms") -> str:
+    return f"{symbol.lower()}@depth@{speed}"
+
+
+class _BookSide:
+    """
+    一侧盘口：价格 -> 数量，价格按「从好到差」排序（买盘降序、卖盘升序），
+    notional 是前 depth 档的 价格 × 数量 之和。
+    """
+
+    def __init__(self, descending: bool, depth: int, max_levels: int) -> None:
+        self._sign = -1.0 if descending else 1.0
+        self.depth = depth
+        self.max_levels = max(max_levels, depth)
+        self.levels: Dict[float, float] = {}
+        self._keys: List[float] = []  # sign * price，升序即从好到差
+        self.notional = 0.0
+        self._changes = 0
+        self._frontier = float("inf")  # 本地完整覆盖到的最差 key；快照拉全时为 inf
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self) -> None:
+        self.levels.clear()
+        self._keys.clear()
+        self.notional = 0.0
+        self._changes = 0
+        self._frontier = float("inf")
+
+    def _price_at(self, rank: int) -> float:
+        return self._sign * self._keys[rank]
+
+    def set(self, price: float, qty: float) -> None:
+        """把 price 档的数量设为 qty（0 = 删除），顺带调整前 depth 档的名义金额。"""
+        keys, levels, depth = self._keys, self.levels, self.depth
+        key = self._sign * price
+        old = levels.get(price)
+        if old is None:
+            if qty <= 0:
+                return
+            rank = bisect.bisect_left(keys, key)
+            keys.insert(rank, key)
+            levels[price] = qty
+            if rank < depth:
+                self.notional += price * qty
+                # 原来的第 depth 档被挤出前 depth 档
+                if len(keys) > depth:
+                    out = self._price_at(depth)
+                    self.notional -= out * levels[out]
+            if len(keys) > self.max_levels:
+                worst = self._sign * keys.pop()
+                del levels[worst]
+                self._frontier = min(self._frontier, keys[-1])
+        elif qty <= 0:
+            rank = bisect.bisect_left(keys, key)
+            del keys[rank]
+            del levels[price]
+            if rank < depth:
+                self.notional -= price * old
+                # 原来的第 depth+1 档补进前 depth 档
+                if len(keys) >= depth:
+                    inn = self._price_at(depth - 1)
+                    self.notional += inn * levels[inn]
+        else:
+            levels[price] = qty
+            if bisect.bisect_left(keys, key) < depth:
+                self.notional += price * (qty - old)
+        self._changes += 1
+        if self._changes >= RECOMPUTE_EVERY:
+            self.recompute()
+
+    def recompute(self) -> None:
+        prices = (self._price_at(i) for i in range(min(self.depth, len(self._keys))))
+        self.notional = sum(price * self.levels[price] for price in prices)
+        self._changes = 0
+
+    def load(self, rows: Iterable, complete: bool = True) -> None:
+        """载入快照的一侧；complete=False 表示快照被 limit 截断，更远的价位本地不知道。"""
+        self.clear()
+        for price, qty in rows:
+            qty = float(qty)
+            if qty > 0:
+                self.levels[float(price)] = qty
+        self._keys = sorted(self._sign * p for p in self.levels)
+        for key in self._keys[self.max_levels:]:
+            del self.levels[self._sign * key]
+        if len(self._keys) > self.max_levels:
+            complete = False
+        del self._keys[self.max_levels:]
+        if not complete and self._keys:
+            self._frontier = self._keys[-1]
+        self.recompute()
+
+    def covered(self) -> bool:
+        """前 depth 档是否都落在本地完整覆盖的区间里（否则中间可能缺档，买卖比不可信）。"""
+        if len(self._keys) < self.depth:
+            return self._frontier == float("inf")
+        return self._keys[self.depth - 1] <= self._frontier
+
+    def best(self) -> Optional[float]:
+        return self._price_at(0) if self._keys else None
+
+
+class OrderBook:
+    """
+    单个 symbol 的订单簿。last_update_id 为 None 表示还没同步（在等快照），期间的推送先缓存。
+    apply_diff 返回 False 表示发现断档或前 N 档走出了快照覆盖的区间（out_of_range 为 True），
+    订单簿已清空，需要重新拉快照。snapshot_limit 是快照请求的 limit，快照某一侧拿满这么多档就认为被截断了。
+    """
+
+    def __init__(
+        self, symbol: str, *, depth: int = 50, max_levels: int = 5000, snapshot_limit: int = 1000
+    ) -> None:
+        self.symbol = symbol
+        self.snapshot_limit = snapshot_limit
+        self.bids = _BookSide(True, depth, max_levels)
+        self.asks = _BookSide(False, depth, max_levels)
+        self.last_update_id: Optional[int] = None
+        self.out_of_range = False
+        self._bridged = False
+        self._buffer: deque = deque(maxlen=BUFFER_LIMIT)
+
+    @property
+    def synced(self) -> bool:
+        return self.last_update_id is not None and self._bridged
+
+    def reset(self) -> None:
+        self.bids.clear()
+        self.asks.clear()
+        self.last_update_id = None
+        self._bridged = False
+
+    def apply_snapshot(self, snapshot: Dict) -> bool:
+        """载入 REST 快照并重放缓存的推送；返回 False 表示缓存的推送已经断档，要再拉一次快照。"""
+        bids, asks = snapshot.get("bids", []), snapshot.get("asks", [])
+        self.bids.load(bids, complete=len(bids) < self.snapshot_limit)
+        self.asks.load(asks, complete=len(asks) < self.snapshot_limit)
+        self.last_update_id = int(snapshot["lastUpdateId"])
+        self.out_of_range = False
+        self._bridged = False
+        buffered = list(self._buffer)
+        self._buffer.clear()
+        for i, event in enumerate(buffered):
+            if not self.apply_diff(event):
+                # 断档那条已经放回缓存，后面的也留给下一次快照
+                self._buffer.extend(buffered[i + 1:])
+                return False
+        return True
+
+    def apply_diff(self, event: Dict) -> bool:
+        if self.last_update_id is None:
+            self._buffer.append(event)
+            return True
+        first, last = int(event["U"]), int(event["u"])
+        if last < self.last_update_id:
+            return True  # 快照之前的旧推送
+        if not self._bridged:
+            if first > self.last_update_id:
+                return self._gap(event)
+            self._bridged = True
+        elif int(event.get("pu", -1)) != self.last_update_id:
+            return self._gap(event)
+        for price, qty in event.get("b", []):
+            self.bids.set(float(price), float(qty))
+        for price, qty in event.get("a", []):
+            self.asks.set(float(price), float(qty))
+        self.last_update_id = last
+        if not (self.bids.covered() and self.asks.covered()):
+            return self._gap(event, out_of_range=True)
+        return True
+
+    def _gap(self, event: Dict, out_of_range: bool = False) -> bool:
+        self.reset()
+        self.out_of_range = out_of_range
+        # 这条推送对下一次快照仍然有用
+        self._buffer.append(event)
+        return False
+
+    def imbalance(self) -> Optional[float]:
+        """前 N 档买盘名义金额 / 卖盘名义金额；没同步或一侧为空时 None（和 fetch_depth_imbalance 同口径）。"""
+        if not self.synced or self.bids.notional <= 0 or self.asks.notional <= 0:
+            return None
+        return self.bids.notional / self.asks.notional
+
+
+class OrderBookStream(MarketStream):
+    """
+    订阅一组 symbol 的深度增量流，维护各自的 OrderBook；需要快照时交给后台线程拉，
+    不阻塞 WebSocket 接收。连接 / 分组 / 重连 / 增删 symbol 沿用 MarketStream。
+
+        books = OrderBookStream(symbols, fetch_snapshot=lambda s: http_get(...).json())
+        books.start()
+        books.imbalance("BTCUSDT")  # 没同步好时 None
+    """
+
+    def __init__(
+        self,
+        symbols: Iterable[str],
+        *,
+        fetch_snapshot: Callable[[str], Dict],
+        depth: int = 50,
+        max_levels: int = 5000,
+        snapshot_limit: int = 1000,
+        speed: str = "100ms",
+        base_url: str = "wss://fstream.binance.com",
+    ) -> None:
+        super().__init__(symbols, base_url=base_url)
+        self.fetch_snapshot = fetch_snapshot
+        self.depth = depth
+        self.max_levels = max_levels
+        self.snapshot_limit = snapshot_limit
+        self.speed = speed
+        self._books: Dict[str, OrderBook] = {}
+        self._resync: "queue.Queue[str]" = queue.Queue()
+        self._resync_pending: set = set()
+        self.snapshot_count = 0
+        self.gap_count = 0
+        self.out_of_range_count = 0
+        for symbol in self.symbols:
+            self._book(symbol)
+
+    def streams(self) -> List[str]:
+        return [name for symbol in self.symbols for name in self._symbol_streams(symbol)]
+
+    def _symbol_streams(self, symbol: str) -> List[str]:
+        return [depth_stream_name(symbol, self.speed)]
+
+    def _book(self, symbol: str) -> OrderBook:
+        book = self._books.get(symbol)
+        if book is None:
+            book = self._books[symbol] = OrderBook(
+                symbol, depth=self.depth, max_levels=self.max_levels, snapshot_limit=self.snapshot_limit
+            )
+        return book
+
+    def start(self) -> None:
+        threading.Thread(target=self._resync_loop, name="order-book-resync", daemon=True).start()
+        super().start()
+
+    def add_symbols(self, symbols: Iterable[str]) -> None:
+        added = set(symbols) - set(self.symbols)
+        with self._lock:
+            for symbol in added:
+                self._book(symbol)
+        super().add_symbols(added)
+
+    def remove_symbols(self, symbols: Iterable[str]) -> None:
+        symbols = list(symbols)
+        super().remove_symbols(symbols)
+        with self._lock:
+            for symbol in symbols:
+                self._books.pop(symbol, None)
+
+    def handle_message(self, raw) -> None:
+        msg = json.loads(raw)
+        if "stream" not in msg or "@depth" not in msg["stream"]:
+            return
+        self.message_count += 1
+        data = msg.get("data") or {}
+        symbol = data.get("s")
+        with self._lock:
+            book = self._books.get(symbol)
+            if book is None:
+                return
+            ok = book.apply_diff(data)
+            if ok and book.last_update_id is not None:
+                return
+            if not ok:
+                self._count_resync(book)
+        # 还没同步（推送先缓存着）或者断档了：排队拉快照，同一个 symbol 只排一次
+        self._request_snapshot(symbol)
+
+    def _request_snapshot(self, symbol: str) -> None:
+        with self._lock:
+            if symbol in self._resync_pending:
+                return
+            self._resync_pending.add(symbol)
+        self._resync.put(symbol)
+
+    def _resync_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                symbol = self._resync.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                snapshot = self.fetch_snapshot(symbol)
+            except Exception as exc:  # noqa: BLE001
+                print(f"order book {symbol} snapshot error: {type(exc).__name__} - {exc}")
+                snapshot = None
+            with self._lock:
+                self._resync_pending.discard(symbol)
+                book = self._books.get(symbol)
+                if book is None or snapshot is None:
+                    continue
+                self.snapshot_count += 1
+                ok = book.apply_snapshot(snapshot)
+                if not ok:
+                    self._count_resync(book)
+            if not ok:
+                self._request_snapshot(symbol)
+
+    def _count_resync(self, book: OrderBook) -> None:
+        if book.out_of_range:
+            self.out_of_range_count += 1
+        else:
+            self.gap_count += 1
+
+    def imbalance(self, symbol: str) -> Optional[float]:
+        with self._lock:
+            book = self._books.get(symbol)
+            return book.imbalance() if book is not None else None
+
+    def synced(self, symbol: str) -> bool:
+        with self._lock:
+            book = self._books.get(symbol)
+            return book is not None and book.synced
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            synced = sum(1 for book in self._books.values() if book.synced)
+            books = len(self._books)
+        return {
+            "books": books,
+            "synced": synced,
+            "snapshots": self.snapshot_count,
+            "gaps": self.gap_count,
+            "out_of_range": self.out_of_range_count,
+            "messages": self.message_count,
+            "connects": self.connect_count,
+        }
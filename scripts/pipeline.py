@@ -0,0 +1,98 @@
+"""
+分阶段的惰性筛选：便宜的数据先筛，贵的逐 symbol 请求只给幸存者。
+
+以前每个 symbol 的 K 线和 OI 都拉完才判断阈值，而大部分 symbol 在价格条件上就被刷掉，
+OI 请求（/futures/data/*，限额最紧）大多是白拉的。这里把一轮拆成几个阶段：
+
+    bulk   ：24hr ticker / premiumIndex / MC 这类一次请求拿全市场的数据，直接筛；
+    kline  ：只给 bulk 幸存者拉 K 线，算价格变化后再筛；
+    oi     ：只给价格条件已经满足的 symbol 拉 OI 历史。
+
+    pipeline = StagedPipeline([
+        Stage("bulk", screen=screen_bulk),
+        Stage("kline", fetch=fetch_kline_metrics, screen=screen_price),
+        Stage("oi", fetch=fetch_oi_metrics),
+    ], max_workers=20)
+    rows = pipeline.run(symbols)       # {symbol: 各阶段拉到的指标}
+    print(pipeline.stats)              # 每个阶段进 / 出多少个 symbol、耗时多少秒
+
+screen 拿到「当前幸存者 -> 已有指标」的映射，返回下一阶段继续处理的 symbol；
+通常是先拼成 MetricTable 再用布尔掩码一次算完。
+"""
+
+import time
+from typing import Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence
+
+from scripts.fetch_engine import fetch_all
+
+Rows = Dict[str, Dict[str, float]]
+
+
+class Stage(NamedTuple):
+    """一个阶段：可选的逐 symbol 拉取 + 可选的筛选。"""
+
+    name: str
+    fetch: Optional[Callable[[str], Mapping[str, float]]] = None
+    screen: Optional[Callable[[Rows], Iterable[str]]] = None
+
+
+class StageStats(NamedTuple):
+    name: str
+    entered: int
+    fetched: int
+    errors: int
+    passed: int
+    seconds: float = 0.0
+
+
+class StagedPipeline:
+    """按顺序跑各阶段，每一阶段只处理上一阶段的幸存者。"""
+
+    def __init__(self, stages: Sequence[Stage], *, max_workers: int = 20) -> None:
+        self.stages = list(stages)
+        self.max_workers = max_workers
+        self.stats: List[StageStats] = []
+        self.errors: Dict[str, BaseException] = {}
+        # 上一轮所有进过 pipeline 的 symbol 拿到的指标（含被筛掉的，没拉到的指标就没有）
+        self.rows: Rows = {}
+
+    def run(self, symbols: Iterable[str], rows: Optional[Rows] = None) -> Rows:
+        """
+        返回最后一个阶段幸存者的指标（按输入顺序）。rows 可以预先放 bulk 数据。
+        拉取出错的 symbol 从这一阶段起淘汰，异常放在 self.errors 里。
+        """
+        survivors = list(symbols)
+        data: Rows = {symbol: dict((rows or {}).get(symbol, {})) for symbol in survivors}
+        self.stats = []
+        self.errors = {}
+        self.rows = data
+
+        for stage in self.stages:
+            started = time.perf_counter()
+            entered = len(survivors)
+            fetched = errors = 0
+            if stage.fetch is not None and survivors:
+                results, failed = fetch_all(survivors, stage.fetch, max_workers=self.max_workers)
+                for symbol, metrics in results.items():
+                    data[symbol].update(metrics)
+                self.errors.update(failed)
+                fetched, errors = len(results), len(failed)
+                survivors = [s for s in survivors if s in results]
+            if stage.screen is not None and survivors:
+                keep = set(stage.screen({s: data[s] for s in survivors}))
+                survivors = [s for s in survivors if s in keep]
+            self.stats.append(
+                StageStats(stage.name, entered, fetched, errors, len(survivors), time.perf_counter() - started)
+            )
+
+        return {symbol: data[symbol] for symbol in survivors}
+
+    def describe(self) -> str:
+        """一行汇总：bulk 500→120 | kline 120→9 (err 1) | oi 9→9"""
+        parts = []
+        for st in self.stats:
+            text = f"{st.name} {st.entered}→{st.passed}"
+            if st.errors:
+                text += f" (err {st.errors})"
+            parts.append(text)
+        return " | ".join(parts)
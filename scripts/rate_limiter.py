@@ -0,0 +1,145 @@
+"""
+Binance 请求权重限流器。
+
+Binance 按 IP 统计每分钟已用权重（响应头 X-MBX-USED-WEIGHT-1M），
+超过上限会先返回 429，继续请求会被 418 封 IP。这里做三件事：
+
+1. request_weight(url, params)：按官方文档给每个接口算权重；
+2. WeightLimiter：所有线程共享，按自然分钟窗口累计权重，快到上限就等到下一个窗口；
+3. 用响应头里的真实已用权重校准本地计数，遇到 429/418 按 Retry-After 整体暂停。
+
+/futures/data/* 这类统计接口不算进分钟权重，而是单独限制「每 5 分钟 1000 次」，
+所以单独用一个 300 秒窗口的 WeightLimiter。
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Mapping, Optional
+from urllib.parse import urlparse
+
+# 自然分钟窗口长度（秒）
+WEIGHT_WINDOW_SECONDS = 60
+
+# Binance 返回的已用权重响应头
+USED_WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+
+
+def _klines_weight(params: Mapping) -> int:
+    limit = int(params.get("limit", 500))
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def _depth_weight(params: Mapping) -> int:
+    limit = int(params.get("limit", 500))
+    if limit <= 50:
+        return 2
+    if limit <= 100:
+        return 5
+    if limit <= 500:
+        return 10
+    return 20
+
+
+# path -> 权重计算函数（参数是请求 params）
+ENDPOINT_WEIGHTS: Dict[str, Callable[[Mapping], int]] = {
+    # U 本位合约
+    "/fapi/v1/exchangeInfo": lambda p: 1,
+    "/fapi/v1/klines": _klines_weight,
+    "/fapi/v1/depth": _depth_weight,
+    "/fapi/v1/ticker/24hr": lambda p: 1 if p.get("symbol") else 40,
+    "/fapi/v1/ticker/price": lambda p: 1 if p.get("symbol") else 2,
+    "/fapi/v1/premiumIndex": lambda p: 1 if p.get("symbol") else 10,
+    # /futures/data/* 单独限频，每次请求算 1
+    "/futures/data/openInterestHist": lambda p: 1,
+    "/futures/data/takerlongshortRatio": lambda p: 1,
+    # 现货
+    "/api/v3/ticker/price": lambda p: 2 if p.get("symbol") else 4,
+    "/api/v3/ticker/bookTicker": lambda p: 2 if p.get("symbol") else 4,
+}
+
+
+def request_weight(url: str, params: Optional[Mapping] = None) -> int:
+    """返回一次请求的权重；未登记的 Binance 接口按 1 算，非 Binance 域名返回 0。"""
+    parsed = urlparse(url)
+    if not parsed.netloc.endswith("binance.com") and parsed.path not in ENDPOINT_WEIGHTS:
+        return 0
+    func = ENDPOINT_WEIGHTS.get(parsed.path)
+    if func is None:
+        return 1
+    return func(params or {})
+
+
+class WeightLimiter:
+    """
+    线程安全的固定窗口权重限流：
+    - acquire(weight)：当前窗口剩余额度不够就阻塞到下一个窗口；
+    - sync_used(used)：用服务端返回的已用权重校准（只会往大了调）；
+    - pause(seconds)：429/418 时按 Retry-After 整体暂停，所有线程都等。
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        *,
+        window_seconds: int = WEIGHT_WINDOW_SECONDS,
+        safety_ratio: float = 0.9,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.limit = limit
+        self.window_seconds = window_seconds
+        # 留一点余量给别的进程 / 手动请求，默认只用到上限的 90%
+        self.budget = max(1, int(limit * safety_ratio))
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._window_start = 0.0
+        self._used = 0
+        self._paused_until = 0.0
+
+    def _roll_window(self, now: float) -> None:
+        window_start = now - (now % self.window_seconds)
+        if window_start != self._window_start:
+            self._window_start = window_start
+            self._used = 0
+
+    @property
+    def used(self) -> int:
+        with self._lock:
+            self._roll_window(self._clock())
+            return self._used
+
+    def acquire(self, weight: int) -> None:
+        if weight <= 0:
+            return
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._roll_window(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._used + weight <= self.budget or self._used == 0:
+                    # 单个请求权重超过整个预算时，也要在空窗口里放行，避免死等
+                    self._used += weight
+                    return
+                else:
+                    wait = self._window_start + self.window_seconds - now
+            self._sleep(max(wait, 0.01))
+
+    def sync_used(self, used: int) -> None:
+        with self._lock:
+            self._roll_window(self._clock())
+            if used > self._used:
+                self._used = used
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            until = self._clock() + max(seconds, 0.0)
+            if until > self._paused_until:
+                self._paused_until = until
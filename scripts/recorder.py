@@ -0,0 +1,276 @@
+"""
+每轮指标快照的列式记录：按天分区、只追加、可用 memmap 直接读。
+
+以前监控算出来的指标除了告警全部丢掉，想调阈值没有数据。这里每轮把列式表
+（MetricTable 的各列）追加到磁盘：
+
+    <root>/symbols.json              symbol 字典（只追加，行里存的是 uint16 编号）
+    <root>/<YYYY-MM-DD>/schema.json  这一天的列名
+    <root>/<YYYY-MM-DD>/ts.i8        每行的轮次时间戳（int64 毫秒）
+    <root>/<YYYY-MM-DD>/symbol.u2    每行的 symbol 编号（uint16）
+    <root>/<YYYY-MM-DD>/<列名>.f4    每列一个 float32 文件，缺失为 NaN
+    <root>/<YYYY-MM-DD>.1/           同一天里列变了（升级后重启）就另开一个分区，.2、.3 依次类推
+
+每个 symbol 每轮 = 8 + 2 + 4 × 列数 字节。写盘在后台线程做，扫描线程只把数组拷一份放进队列。
+进程写到一半崩溃时各文件行数会不一样，重启后第一次打开这个分区时按最短的截断，后面追加的行才对得上。
+
+    recorder = SnapshotRecorder("data/snapshots/oi", TABLE_COLUMNS)
+    recorder.start()
+    recorder.record(time.time(), table.symbols, table.columns)
+
+    day = read_day("data/snapshots/oi", "2026-01-01")
+    day.columns["price_1h_pct"][day.symbol_mask("BTCUSDT")]
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+TS_FILE = "ts.i8"
+SYMBOL_FILE = "symbol.u2"
+SCHEMA_FILE = "schema.json"
+SYMBOLS_FILE = "symbols.json"
+COLUMN_SUFFIX = ".f4"
+
+TS_DTYPE = np.dtype("<i8")
+SYMBOL_DTYPE = np.dtype("<u2")
+VALUE_DTYPE = np.dtype("<f4")
+
+# 后台队列最多积压多少轮，满了丢最旧的一轮（不阻塞扫描）
+DEFAULT_QUEUE_SIZE = 64
+
+Batch = Tuple[int, List[str], Dict[str, np.ndarray]]
+
+
+def day_of(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def split_partition(name: str) -> Tuple[str, int]:
+    """"2026-01-01" -> ("2026-01-01", 0)；"2026-01-01.2" -> ("2026-01-01", 2)。"""
+    day, _, seq = name.partition(".")
+    return day, int(seq) if seq.isdigit() else 0
+
+
+def _partition_files(columns: Sequence[str]) -> List[Tuple[str, np.dtype]]:
+    files = [(TS_FILE, TS_DTYPE), (SYMBOL_FILE, SYMBOL_DTYPE)]
+    return files + [(name + COLUMN_SUFFIX, VALUE_DTYPE) for name in columns]
+
+
+def _row_count(path: Path, files: Sequence[Tuple[str, np.dtype]]) -> int:
+    """各文件都完整写到的行数（缺文件算 0 行）。"""
+    sizes = [(path / f).stat().st_size // dtype.itemsize if (path / f).exists() else 0 for f, dtype in files]
+    return int(min(sizes))
+
+
+class SnapshotRecorder:
+    """后台线程把每轮的列追加到按天分区的列文件里。"""
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        columns: Sequence[str],
+        *,
+        max_queue: int = DEFAULT_QUEUE_SIZE,
+    ) -> None:
+        self.root = Path(root)
+        self.columns = list(columns)
+        self._queue: "queue.Queue[Optional[Batch]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._symbol_ids: Dict[str, int] = {}
+        self._symbols: List[str] = []
+        self._partitions: Dict[str, Path] = {}  # 日期 -> 正在追加的分区目录
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.rounds_written = 0
+        self.dropped = 0
+        self.errors = 0
+
+    # ---------- 扫描线程 ----------
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._load_symbols()
+            self._thread = threading.Thread(target=self._run, name="snapshot-recorder", daemon=True)
+            self._thread.start()
+
+    def record(self, ts: float, symbols: Sequence[str], columns: Mapping[str, np.ndarray]) -> bool:
+        """拷贝本轮数据放进队列后立即返回；队列满时丢掉最旧的一轮。"""
+        if not symbols:
+            return False
+        n = len(symbols)
+        batch_columns: Dict[str, np.ndarray] = {}
+        for name in self.columns:
+            values = columns.get(name)
+            if values is None:
+                batch_columns[name] = np.full(n, np.nan, dtype=VALUE_DTYPE)
+            else:
+                batch_columns[name] = np.asarray(values, dtype=VALUE_DTYPE).copy()
+        item = (int(ts * 1000), list(symbols), batch_columns)
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "rows_written": self.rows_written,
+            "bytes_written": self.bytes_written,
+            "rounds_written": self.rounds_written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "queued": self._queue.qsize(),
+        }
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    # ---------- 后台写盘 ----------
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception as exc:  # noqa: BLE001
+                self.errors += 1
+                print(f"snapshot recorder error: {type(exc).__name__} - {exc}")
+            finally:
+                self._queue.task_done()
+
+    def _load_symbols(self) -> None:
+        path = self.root / SYMBOLS_FILE
+        if path.exists():
+            self._symbols = [str(s) for s in json.loads(path.read_text(encoding="utf-8"))]
+            self._symbol_ids = {s: i for i, s in enumerate(self._symbols)}
+
+    def _ids_for(self, symbols: List[str]) -> np.ndarray:
+        new = [s for s in dict.fromkeys(symbols) if s not in self._symbol_ids]
+        if new:
+            if len(self._symbols) + len(new) > np.iinfo(SYMBOL_DTYPE).max:
+                raise ValueError("symbol dictionary full")
+            for symbol in new:
+                self._symbol_ids[symbol] = len(self._symbols)
+                self._symbols.append(symbol)
+            # 字典先落盘，再写引用新编号的行
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = self.root / (SYMBOLS_FILE + ".tmp")
+            tmp.write_text(json.dumps(self._symbols), encoding="utf-8")
+            os.replace(tmp, self.root / SYMBOLS_FILE)
+        return np.array([self._symbol_ids[s] for s in symbols], dtype=SYMBOL_DTYPE)
+
+    def _day_dir(self, day: str) -> Path:
+        """这一天正在追加的分区；每天第一次打开时修好崩溃留下的半行，列变了就另开一个分区。"""
+        path = self._partitions.get(day)
+        if path is not None:
+            return path
+        existing = [name for name in list_days(self.root) if split_partition(name)[0] == day]
+        path = self.root / existing[-1] if existing else self.root / day
+        if existing and json.loads((path / SCHEMA_FILE).read_text(encoding="utf-8"))["columns"] != self.columns:
+            path = self.root / f"{day}.{split_partition(existing[-1])[1] + 1}"
+        schema = path / SCHEMA_FILE
+        if not schema.exists():
+            path.mkdir(parents=True, exist_ok=True)
+            schema.write_text(json.dumps({"columns": self.columns}), encoding="utf-8")
+        else:
+            self._repair(path)
+        self._partitions = {day: path}  # 只留当天的，跨天后旧的不会再写
+        return path
+
+    def _repair(self, path: Path) -> None:
+        files = _partition_files(self.columns)
+        n = _row_count(path, files)
+        for filename, dtype in files:
+            target = path / filename
+            if target.exists() and target.stat().st_size > n * dtype.itemsize:
+                os.truncate(target, n * dtype.itemsize)
+                print(f"snapshot recorder: truncated {target} to {n} rows")
+
+    def _write(self, ts_ms: int, symbols: List[str], columns: Dict[str, np.ndarray]) -> None:
+        path = self._day_dir(day_of(ts_ms))
+        ids = self._ids_for(symbols)
+        arrays = [(TS_FILE, np.full(len(symbols), ts_ms, dtype=TS_DTYPE)), (SYMBOL_FILE, ids)]
+        arrays += [(name + COLUMN_SUFFIX, columns[name]) for name in self.columns]
+        for filename, values in arrays:
+            with open(path / filename, "ab") as fh:
+                fh.write(values.tobytes())
+            self.bytes_written += values.nbytes
+        self.rows_written += len(symbols)
+        self.rounds_written += 1
+
+
+class SnapshotDay:
+    """一天的快照：各列都是只读 memmap，长度一致。"""
+
+    def __init__(self, path: Path, symbols: List[str]) -> None:
+        self.path = path
+        self.symbols = symbols
+        schema = json.loads((path / SCHEMA_FILE).read_text(encoding="utf-8"))
+        names = list(schema["columns"])
+        # 写到一半崩溃、还没重启修复时各列长度可能不同，按最短的读
+        self.size = _row_count(path, _partition_files(names))
+        self.ts = self._map(TS_FILE, TS_DTYPE)
+        self.symbol_ids = self._map(SYMBOL_FILE, SYMBOL_DTYPE)
+        self.columns: Dict[str, np.ndarray] = {
+            name: self._map(name + COLUMN_SUFFIX, VALUE_DTYPE) for name in names
+        }
+
+    def _map(self, filename: str, dtype: np.dtype) -> np.ndarray:
+        if self.size == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.path / filename, dtype=dtype, mode="r", shape=(self.size,))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def symbol_mask(self, symbol: str) -> np.ndarray:
+        try:
+            sid = self.symbols.index(symbol)
+        except ValueError:
+            return np.zeros(self.size, dtype=bool)
+        return self.symbol_ids == sid
+
+    def rounds(self) -> np.ndarray:
+        """这一天所有轮次的时间戳（去重、升序）。"""
+        return np.unique(self.ts)
+
+
+def list_days(root: Union[str, Path]) -> List[str]:
+    """所有分区目录名，按日期和同一天里的先后排序。"""
+    root = Path(root)
+    if not root.exists():
+        return []
+    return sorted((p.name for p in root.iterdir() if (p / SCHEMA_FILE).exists()), key=split_partition)
+
+
+def read_day(root: Union[str, Path], day: str) -> SnapshotDay:
+    root = Path(root)
+    symbols_path = root / SYMBOLS_FILE
+    symbols = json.loads(symbols_path.read_text(encoding="utf-8")) if symbols_path.exists() else []
+    return SnapshotDay(root / day, [str(s) for s in symbols])
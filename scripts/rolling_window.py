@@ -0,0 +1,136 @@
+"""
+滑动窗口内的最高 / 最低价（单调队列），用来抓窗口内的急拉急跌。
+
+只和上次通知价比较时，慢慢涨上去又跌回来的、或者几十秒内冲高回落的都看不到；
+每次把整个窗口的价格扫一遍又是 O(窗口长度)。这里每个 (symbol, 窗口) 维护两条单调队列：
+
+- 最大值队列里的价格从队头到队尾单调递减，新价格进来先把队尾比它小的弹掉；
+- 最小值队列反过来；
+- 队头超出窗口的出队。
+
+每个价格最多进出队一次，更新均摊 O(1)，窗口最高 / 最低价直接读队头。
+几千个 symbol × 几个窗口每轮也只是几万次 deque 操作。
+
+    detector = SwingDetector(parse_windows("1m:0.5,5m:1,15m:2"))
+    for symbol, swings in detector.update_many(time.time(), prices).items():
+        for s in swings:   # 窗口内最高和最低相差超过该窗口的阈值
+            print(symbol, format_swing(s))
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Tuple
+
+from scripts.timeframes import interval_minutes
+
+
+class Swing(NamedTuple):
+    window: str
+    pct: float  # 拉升：(最高 - 最低) / 最低 * 100；下跌：(最高 - 最低) / 最高 * 100
+    low: float
+    high: float
+    rising: bool  # 最低在前、最高在后（先跌后拉算拉升）
+
+
+def parse_windows(text: str) -> Dict[str, Tuple[float, float]]:
+    """"1m:0.5,5m:1" -> {"1m": (60 秒, 0.5%), "5m": (300 秒, 1%)}；空字符串 = 不检测。"""
+    windows: Dict[str, Tuple[float, float]] = {}
+    for item in text.split(","):
+        label, _, pct = item.strip().partition(":")
+        label = label.strip()
+        if not label:
+            continue
+        if not pct.strip():
+            raise ValueError(f"window {label!r} needs a threshold, e.g. {label}:1")
+        windows[label] = (interval_minutes(label) * 60.0, float(pct))
+    return windows
+
+
+class RollingMinMax:
+    """单个序列在最近 window 秒内的最高 / 最低值，push 均摊 O(1)。"""
+
+    __slots__ = ("window", "_max", "_min")
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self._max: deque = deque()  # (ts, value)，value 单调递减
+        self._min: deque = deque()  # (ts, value)，value 单调递增
+
+    def __len__(self) -> int:
+        return max(len(self._max), len(self._min))
+
+    def push(self, ts: float, value: float) -> None:
+        maxq, minq = self._max, self._min
+        while maxq and maxq[-1][1] <= value:
+            maxq.pop()
+        maxq.append((ts, value))
+        while minq and minq[-1][1] >= value:
+            minq.pop()
+        minq.append((ts, value))
+        cutoff = ts - self.window
+        # 刚 push 的这个点一定在窗口内，两条队列都不会被清空
+        while maxq[0][0] < cutoff:
+            maxq.popleft()
+        while minq[0][0] < cutoff:
+            minq.popleft()
+
+    def high(self) -> Tuple[float, float]:
+        """(时间, 最高值)；空的时候 IndexError。"""
+        return self._max[0]
+
+    def low(self) -> Tuple[float, float]:
+        return self._min[0]
+
+
+class SwingDetector:
+    """每个 symbol 每个窗口一个 RollingMinMax；windows 为 {标签: (秒数, 阈值%)}。"""
+
+    def __init__(self, windows: Mapping[str, Tuple[float, float]]) -> None:
+        self.windows = dict(windows)
+        self._series: Dict[str, List[RollingMinMax]] = {}
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def update(self, symbol: str, ts: float, price: float) -> List[Swing]:
+        """加一个价格，返回窗口内振幅超过阈值的窗口（按 windows 的顺序）。"""
+        series = self._series.get(symbol)
+        if series is None:
+            series = self._series[symbol] = [RollingMinMax(seconds) for seconds, _ in self.windows.values()]
+        hits: List[Swing] = []
+        for (label, (_, threshold)), rolling in zip(self.windows.items(), series):
+            rolling.push(ts, price)
+            (high_ts, high), (low_ts, low) = rolling.high(), rolling.low()
+            if low <= 0:
+                continue
+            rising = high_ts >= low_ts
+            pct = (high - low) / (low if rising else high) * 100
+            if pct >= threshold:
+                hits.append(Swing(label, pct, low, high, rising))
+        return hits
+
+    def update_many(self, ts: float, prices: Mapping[str, float]) -> Dict[str, List[Swing]]:
+        """一轮所有 symbol 的价格（同一个时间戳），只返回有命中的 symbol。"""
+        out: Dict[str, List[Swing]] = {}
+        if not self.windows:
+            return out
+        for symbol, price in prices.items():
+            hits = self.update(symbol, ts, price)
+            if hits:
+                out[symbol] = hits
+        return out
+
+    def remove(self, symbols: Iterable[str]) -> None:
+        for symbol in symbols:
+            self._series.pop(symbol, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "symbols": len(self._series),
+            "samples": sum(len(r) for series in self._series.values() for r in series),
+        }
+
+
+def format_swing(swing: Swing) -> str:
+    direction = "拉升" if swing.rising else "下跌"
+    start, end = (swing.low, swing.high) if swing.rising else (swing.high, swing.low)
+    return f"{swing.window} 内{direction} {swing.pct:.2f}%（{start:.6g} → {end:.6g}）"
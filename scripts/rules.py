@@ -0,0 +1,313 @@
+"""
+声明式告警规则：规则写在 config/rules.json（可以从 config/rules.example.json 复制），启动时解析一次，
+编译成对整列 NumPy 数组求值的谓词。
+
+rules.json 格式：
+
+    {
+      "rules": [
+        {"name": "15m 放量", "expr": "abs(price_15m) >= 8 and oi_15m >= 8 and quote_volume >= 5e6"},
+        {"name": "示例", "expr": "price_1h >= 5", "enabled": false},
+        {"name": "1H", "expr": "abs(price_1h) >= 11 and oi_1h >= 10", "severity": "abs(price_1h)"}
+      ]
+    }
+
+severity（可选）是同样语法的数值表达式，表示这条告警的「严重程度」：
+冷却期内只有它比上次告警时明显变大才会再报（见 scripts/alert_state.py）。
+
+表达式语法（Python 表达式的一个安全子集，不会 eval）：
+- 指标名：由调用方给出的可用指标（比如 price_15m、oi_1h、quote_volume、mc）；
+- 数字常量、True / False；
+- 算术 + - * /，比较 < <= > >= == !=（支持 1 < x < 2 连写）；
+- 逻辑 and / or / not；
+- 函数 abs(x)、min(a, b)、max(a, b)。
+
+所有规则在同一轮里对同一张指标表求值，RuleSet.metrics 给出规则实际引用到的指标，
+调用方据此跳过没有规则需要的数据拉取。
+"""
+
+import ast
+import json
+import operator
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Union
+
+import numpy as np
+
+Columns = Mapping[str, np.ndarray]
+Value = Union[np.ndarray, float, bool]
+Compiled = Callable[[Columns], Value]
+
+
+class RuleError(ValueError):
+    """规则文件或表达式不合法。"""
+
+
+_COMPARE_OPS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+
+_BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+_FUNCS = {
+    "abs": (1, np.abs),
+    "min": (2, np.minimum),
+    "max": (2, np.maximum),
+}
+
+
+def _compile(node: ast.AST, allowed: FrozenSet[str], used: set) -> Compiled:
+    if isinstance(node, ast.Expression):
+        return _compile(node.body, allowed, used)
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, bool)):
+        value = node.value
+        return lambda cols: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name not in allowed:
+            raise RuleError(f"unknown metric {name!r}; available: {', '.join(sorted(allowed))}")
+        used.add(name)
+        return lambda cols: cols[name]
+
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(v, allowed, used) for v in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+        def bool_op(cols: Columns) -> Value:
+            result = parts[0](cols)
+            for part in parts[1:]:
+                result = combine(result, part(cols))
+            return result
+
+        return bool_op
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile(node.operand, allowed, used)
+        if isinstance(node.op, ast.Not):
+            return lambda cols: np.logical_not(operand(cols))
+        if isinstance(node.op, ast.USub):
+            return lambda cols: -operand(cols)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        left = _compile(node.left, allowed, used)
+        right = _compile(node.right, allowed, used)
+        func = _BIN_OPS[type(node.op)]
+
+        def bin_op(cols: Columns) -> Value:
+            # 除以 0 得到 inf / NaN，比较结果自然为 False，不额外报错
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return func(left(cols), right(cols))
+
+        return bin_op
+
+    if isinstance(node, ast.Compare):
+        operands = [_compile(node.left, allowed, used)] + [
+            _compile(c, allowed, used) for c in node.comparators
+        ]
+        funcs = []
+        for op in node.ops:
+            if type(op) not in _COMPARE_OPS:
+                raise RuleError(f"unsupported comparison {type(op).__name__}")
+            funcs.append(_COMPARE_OPS[type(op)])
+
+        def compare(cols: Columns) -> Value:
+            values = [o(cols) for o in operands]
+            result = funcs[0](values[0], values[1])
+            for i, func in enumerate(funcs[1:], start=1):
+                result = np.logical_and(result, func(values[i], values[i + 1]))
+            return result
+
+        return compare
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCS:
+        arity, func = _FUNCS[node.func.id]
+        if len(node.args) != arity or node.keywords:
+            raise RuleError(f"{node.func.id}() takes {arity} argument(s)")
+        args = [_compile(a, allowed, used) for a in node.args]
+        return lambda cols: func(*(a(cols) for a in args))
+
+    raise RuleError(f"unsupported syntax: {ast.dump(node)}")
+
+
+def _parse(expr: str) -> ast.Expression:
+    try:
+        return ast.parse(expr, mode="eval")
+    except SyntaxError as exc:
+        raise RuleError(f"invalid expression {expr!r}: {exc.msg}") from None
+
+
+def _conjuncts(node: ast.AST) -> List[ast.AST]:
+    """把顶层的 and 拆成若干项：a and (b and c) -> [a, b, c]。"""
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+        out: List[ast.AST] = []
+        for value in node.values:
+            out.extend(_conjuncts(value))
+        return out
+    return [node]
+
+
+class Rule:
+    """一条编译好的规则。"""
+
+    def __init__(
+        self, name: str, expr: str, allowed: Iterable[str], severity: Optional[str] = None
+    ) -> None:
+        self.name = name
+        self.expr = expr
+        self.severity_expr = severity
+        allowed_set = frozenset(allowed)
+        used: set = set()
+        try:
+            tree = _parse(expr)
+            self._predicate = _compile(tree, allowed_set, used)
+            # 顶层 and 的每一项单独编译，用于「只看部分指标」的预筛
+            self._conjuncts = []
+            for part in _conjuncts(tree.body):
+                part_used: set = set()
+                self._conjuncts.append((_compile(part, allowed_set, part_used), frozenset(part_used)))
+            self._severity = _compile(_parse(severity), allowed_set, used) if severity else None
+        except RuleError as exc:
+            raise RuleError(f"rule {name!r}: {exc}") from None
+        self.metrics: FrozenSet[str] = frozenset(used)
+
+    def __repr__(self) -> str:
+        return f"Rule({self.name!r}, {self.expr!r})"
+
+    def evaluate(self, columns: Columns, size: int) -> np.ndarray:
+        return np.broadcast_to(np.asarray(self._predicate(columns), dtype=bool), (size,))
+
+    def severity(self, columns: Columns, size: int) -> Optional[np.ndarray]:
+        """severity 表达式的整列数值；规则没配 severity 时返回 None。"""
+        if self._severity is None:
+            return None
+        values = np.asarray(self._severity(columns), dtype=np.float64)
+        return np.broadcast_to(values, (size,))
+
+    def prefilter(self, columns: Columns, size: int, available: Iterable[str]) -> np.ndarray:
+        """
+        只用 available 里的指标做必要条件判断：顶层 and 里只引用已有指标的项必须为真。
+        引用了还没拉的指标的项一律当作「可能为真」。
+        """
+        available_set = frozenset(available)
+        mask = np.ones(size, dtype=bool)
+        for predicate, used in self._conjuncts:
+            if used <= available_set:
+                mask &= np.broadcast_to(np.asarray(predicate(columns), dtype=bool), (size,))
+        return mask
+
+
+class RuleSet:
+    """一组规则，对同一张指标表一次性求值。"""
+
+    def __init__(self, rules: Iterable[Rule]) -> None:
+        self.rules: List[Rule] = list(rules)
+        names = [r.name for r in self.rules]
+        if len(names) != len(set(names)):
+            raise RuleError("duplicate rule names")
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    @property
+    def metrics(self) -> FrozenSet[str]:
+        """所有规则引用到的指标并集。"""
+        out: FrozenSet[str] = frozenset()
+        for rule in self.rules:
+            out |= rule.metrics
+        return out
+
+    def evaluate(self, columns: Columns, size: int) -> Dict[str, np.ndarray]:
+        return {rule.name: rule.evaluate(columns, size) for rule in self.rules}
+
+    def severities(self, columns: Columns, size: int) -> Dict[str, Optional[np.ndarray]]:
+        return {rule.name: rule.severity(columns, size) for rule in self.rules}
+
+    def prefilter(self, columns: Columns, size: int, available: Iterable[str]) -> np.ndarray:
+        """至少有一条规则还可能命中的行。"""
+        mask = np.zeros(size, dtype=bool)
+        for rule in self.rules:
+            mask |= rule.prefilter(columns, size, available)
+        return mask
+
+
+def parse_rules(spec: Mapping, allowed: Iterable[str]) -> RuleSet:
+    """解析 {"rules": [...]} 结构，跳过 enabled=false 的规则。"""
+    allowed = frozenset(allowed)
+    items = spec.get("rules")
+    if not isinstance(items, list):
+        raise RuleError('rules file must contain a "rules" list')
+    rules: List[Rule] = []
+    for idx, item in enumerate(items):
+        if not isinstance(item, dict) or "expr" not in item:
+            raise RuleError(f"rule #{idx} must be an object with an \"expr\" field")
+        if not item.get("enabled", True):
+            continue
+        severity = item.get("severity")
+        rules.append(
+            Rule(
+                str(item.get("name") or f"rule_{idx}"),
+                str(item["expr"]),
+                allowed,
+                severity=str(severity) if severity else None,
+            )
+        )
+    return RuleSet(rules)
+
+
+def fill_template(spec: Mapping, params: Mapping[str, float]) -> Dict:
+    """
+    把 expr 里的 {参数名} 占位换成数值，比如 "oi_1h >= {OI_CHANGE_1H_PCT}"；
+    默认规则按阈值常量生成、回测按参数网格扫阈值都走这里。没有占位的 expr 原样保留。
+    """
+    items = spec.get("rules")
+    if not isinstance(items, list):
+        return dict(spec)
+    rules: List = []
+    for item in items:
+        if isinstance(item, dict) and "expr" in item:
+            try:
+                item = dict(item, expr=str(item["expr"]).format(**params))
+            except KeyError as exc:
+                raise RuleError(f"rule {item.get('name')!r}: unknown parameter {exc}") from None
+        rules.append(item)
+    return dict(spec, rules=rules)
+
+
+def read_rules_spec(path: Union[str, Path], default: Optional[Mapping] = None) -> Mapping:
+    """规则文件的原始内容（占位符还没填）；文件不存在时用 default。"""
+    path = Path(path)
+    if not path.exists():
+        if default is None:
+            raise RuleError(f"rules file not found: {path}")
+        return default
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError as exc:
+        raise RuleError(f"{path}: invalid JSON: {exc}") from None
+
+
+def load_rules(
+    path: Union[str, Path],
+    allowed: Iterable[str],
+    default: Optional[Mapping] = None,
+    params: Optional[Mapping[str, float]] = None,
+) -> RuleSet:
+    """从 JSON 文件加载规则；文件不存在时用 default。给了 params 时先填 {参数名} 占位。"""
+    spec = read_rules_spec(path, default)
+    if params is not None:
+        spec = fill_template(spec, params)
+    return parse_rules(spec, allowed)
@@ -0,0 +1,200 @@
+"""
+按流动性 / 波动率分层的轮询调度。
+
+以前 symbol 按字母排序后截断到 MAX_SYMBOLS，流动性最好的合约可能被截掉，
+死币反而每轮都在拉，而且所有 symbol 的刷新频率一样。这里：
+
+- 用全市场 24hr ticker（一次请求）给 symbol 打分：quoteVolume 排名和 24H 振幅
+  （(high - low) / last）排名加权；
+- 排名靠前的进 hot 层、其次 warm、其余 cold，各层刷新间隔不同；
+- 每轮按新 ticker 增量重排，层级边界带滞回，排名在边界附近抖动不会来回换层；
+- 规则命中 / 接近命中的 symbol 可以 boost 到 hot 层一段时间。
+
+    scheduler = TieredScheduler(hot_size=50, warm_size=150, intervals={"hot": 60, "warm": 180, "cold": 600})
+    scheduler.update(ticker_map, universe=symbols)
+    for symbol in scheduler.due():
+        ...
+    scheduler.mark_polled(fetched_symbols)
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+HOT, WARM, COLD = "hot", "warm", "cold"
+TIERS = (HOT, WARM, COLD)
+
+DEFAULT_INTERVALS: Dict[str, float] = {HOT: 60.0, WARM: 180.0, COLD: 600.0}
+
+
+def _rank_pct(values: np.ndarray) -> np.ndarray:
+    """从小到大的名次换算成 0~1，NaN 排最后（记 0）。"""
+    out = np.zeros(len(values), dtype=np.float64)
+    valid = ~np.isnan(values)
+    count = int(valid.sum())
+    if count:
+        order = np.argsort(np.argsort(values[valid], kind="stable"), kind="stable")
+        out[valid] = (order + 1) / count
+    return out
+
+
+def liquidity_scores(
+    symbols: Sequence[str],
+    ticker_map: Mapping[str, Mapping],
+    *,
+    volume_weight: float = 0.6,
+) -> np.ndarray:
+    """quoteVolume 名次和 24H 振幅名次加权，越大越值得频繁刷新。缺 ticker 的得 0 分。"""
+    n = len(symbols)
+    volume = np.full(n, np.nan)
+    amplitude = np.full(n, np.nan)
+    for i, symbol in enumerate(symbols):
+        t24 = ticker_map.get(symbol)
+        if not t24:
+            continue
+        try:
+            volume[i] = float(t24.get("quoteVolume", 0.0))
+            last = float(t24.get("lastPrice", 0.0))
+            high = float(t24.get("highPrice", 0.0))
+            low = float(t24.get("lowPrice", 0.0))
+        except (TypeError, ValueError):
+            continue
+        if last > 0:
+            amplitude[i] = (high - low) / last * 100
+    return volume_weight * _rank_pct(volume) + (1 - volume_weight) * _rank_pct(amplitude)
+
+
+def rank_symbols(
+    symbols: Sequence[str],
+    ticker_map: Mapping[str, Mapping],
+    *,
+    volume_weight: float = 0.6,
+) -> List[str]:
+    """按得分从高到低排列（得分相同保持原顺序）。"""
+    scores = liquidity_scores(symbols, ticker_map, volume_weight=volume_weight)
+    order = np.argsort(-scores, kind="stable")
+    return [symbols[i] for i in order]
+
+
+class TieredScheduler:
+    """hot / warm / cold 三层，每层自己的刷新间隔。"""
+
+    def __init__(
+        self,
+        *,
+        hot_size: int,
+        warm_size: int,
+        intervals: Optional[Mapping[str, float]] = None,
+        max_symbols: Optional[int] = None,
+        volume_weight: float = 0.6,
+        hysteresis: float = 0.1,
+        boost_seconds: float = 900.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.hot_size = hot_size
+        self.warm_size = warm_size
+        self.intervals: Dict[str, float] = dict(DEFAULT_INTERVALS)
+        if intervals:
+            self.intervals.update(intervals)
+        self.max_symbols = max_symbols
+        self.volume_weight = volume_weight
+        self.hysteresis = hysteresis
+        self.boost_seconds = boost_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.tiers: Dict[str, str] = {}
+        self._last_polled: Dict[str, float] = {}
+        self._boosted_until: Dict[str, float] = {}
+        self.moves = 0
+
+    def _tier_for(self, rank: int, current: Optional[str]) -> str:
+        """
+        名次 -> 层级。已有层级时每条边界带 hysteresis 比例的余量：
+        在边界上方的要跌过 边界+余量 才降层，在下方的要升过 边界-余量 才升层。
+        """
+        bounds = [
+            (self.hot_size, int(self.hot_size * self.hysteresis)),
+            (self.hot_size + self.warm_size, int(self.warm_size * self.hysteresis)),
+        ]
+        cur_idx = TIERS.index(current) if current is not None else None
+        for k, (bound, margin) in enumerate(bounds):
+            if cur_idx is not None:
+                bound = bound + margin if cur_idx <= k else bound - margin
+            if rank < bound:
+                return TIERS[k]
+        return COLD
+
+    def update(self, ticker_map: Mapping[str, Mapping], universe: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        按本轮 ticker 重新排名、调整层级，返回各层数量。
+        universe 不给时用 ticker_map 里的所有 symbol；超出 max_symbols 的直接不再调度。
+        """
+        symbols = list(universe) if universe is not None else list(ticker_map)
+        ranked = rank_symbols(symbols, ticker_map, volume_weight=self.volume_weight)
+        if self.max_symbols is not None:
+            ranked = ranked[: self.max_symbols]
+
+        with self._lock:
+            now = self._clock()
+            new_tiers: Dict[str, str] = {}
+            for rank, symbol in enumerate(ranked):
+                current = self.tiers.get(symbol)
+                tier = self._tier_for(rank, current)
+                if self._boosted_until.get(symbol, 0.0) > now:
+                    tier = HOT
+                if current is not None and tier != current:
+                    self.moves += 1
+                new_tiers[symbol] = tier
+            self.tiers = new_tiers
+            # 被移出调度的 symbol 不再保留状态
+            for symbol in list(self._last_polled):
+                if symbol not in new_tiers:
+                    del self._last_polled[symbol]
+            for symbol, until in list(self._boosted_until.items()):
+                if until <= now or symbol not in new_tiers:
+                    del self._boosted_until[symbol]
+            return self._counts()
+
+    def _counts(self) -> Dict[str, int]:
+        counts = {tier: 0 for tier in TIERS}
+        for tier in self.tiers.values():
+            counts[tier] += 1
+        return counts
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return self._counts()
+
+    def boost(self, symbols: Iterable[str]) -> None:
+        """把这些 symbol 提到 hot 层 boost_seconds 秒（比如刚命中或接近命中规则）。"""
+        with self._lock:
+            now = self._clock()
+            for symbol in symbols:
+                if symbol in self.tiers:
+                    self._boosted_until[symbol] = now + self.boost_seconds
+                    if self.tiers[symbol] != HOT:
+                        self.tiers[symbol] = HOT
+                        self.moves += 1
+
+    def due(self) -> List[str]:
+        """到了刷新时间的 symbol（从没拉过的也算），hot 层排在前面。"""
+        with self._lock:
+            now = self._clock()
+            out: List[str] = []
+            for tier in TIERS:
+                interval = self.intervals[tier]
+                for symbol, t in self.tiers.items():
+                    if t != tier:
+                        continue
+                    # 留 1 秒余量，避免轮询间隔和刷新间隔刚好相等时因为执行耗时被推迟一整轮
+                    if now - self._last_polled.get(symbol, float("-inf")) >= interval - 1:
+                        out.append(symbol)
+            return out
+
+    def mark_polled(self, symbols: Iterable[str]) -> None:
+        with self._lock:
+            now = self._clock()
+            for symbol in symbols:
+                self._last_polled[symbol] = now
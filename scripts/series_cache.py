@@ -0,0 +1,185 @@
+"""
+每个 symbol 的 K 线 / OI 序列增量缓存（定长环形缓冲区）。
+
+以前每轮都把窗口内的全部历史重新下载一遍（比如每 300 秒拉 13 条 OI，其中最多一两条是新的）。
+SeriesStore 在内存里按 (symbol, 序列名) 保存最近 capacity 个点：
+
+- 第一次（或断档超过缓冲区长度）时全量拉取；
+- 之后只带 startTime = 最后一个缓存时间戳 拉新数据，limit 按经过的时间算，通常是 2；
+- 时间戳相同的点覆盖旧值（当前未收盘 K 线会不断更新）；
+- 同一条序列的 refresh 串行执行（scripts/market_hub.py 里几个插件共用一个 SeriesStore，
+  间隔相同的插件会在同一时刻刷新同一条 OI 序列）。等锁期间别的线程刚刷新过的，直接用它的结果，不再请求。
+
+窗口计算直接读缓冲区里的数组。
+"""
+
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# fetch(symbol, start_time, limit) -> [(时间戳 ms, 数值), ...]，时间升序；start_time 为 None 表示全量
+SeriesFetcher = Callable[[str, Optional[int], int], List[Tuple[int, float]]]
+
+
+class RingBuffer:
+    """定长环形缓冲区，按时间戳升序保存 (ts, value)。"""
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity = capacity
+        self._ts = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros(capacity, dtype=np.float64)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        if not self._size:
+            return None
+        return int(self._ts[(self._start + self._size - 1) % self.capacity])
+
+    def append(self, ts: int, value: float) -> None:
+        last = self.last_ts
+        if last is not None:
+            if ts < last:
+                return
+            if ts == last:
+                self._values[(self._start + self._size - 1) % self.capacity] = value
+                return
+        if self._size < self.capacity:
+            idx = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            # 满了：覆盖最旧的点
+            idx = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._ts[idx] = ts
+        self._values[idx] = value
+
+    def extend(self, rows: List[Tuple[int, float]]) -> None:
+        for ts, value in rows:
+            self.append(ts, value)
+
+    def clear(self) -> None:
+        self._start = 0
+        self._size = 0
+
+    def _ordered(self, arr: np.ndarray) -> np.ndarray:
+        end = self._start + self._size
+        if end <= self.capacity:
+            return arr[self._start:end].copy()
+        return np.concatenate((arr[self._start:], arr[: end - self.capacity]))
+
+    def timestamps(self) -> np.ndarray:
+        return self._ordered(self._ts)
+
+    def values(self) -> np.ndarray:
+        return self._ordered(self._values)
+
+
+class SeriesStore:
+    """
+    按 (symbol, key) 管理 RingBuffer 的增量缓存：
+    - capacity：每条序列保留的点数（覆盖最长窗口即可）；
+    - step_ms：序列粒度（5m = 300_000），用来估算增量请求的 limit。
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        step_ms: int,
+        *,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.capacity = capacity
+        self.step_ms = step_ms
+        self._clock = clock
+        self._buffers: Dict[Tuple[str, str], RingBuffer] = {}
+        self._lock = threading.Lock()
+        # 每条序列一把锁 + 刷新次数（等锁期间被别人刷新过就直接返回）
+        self._series_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._generations: Dict[Tuple[str, str], int] = {}
+        # 统计：全量 / 增量请求次数、累计拉到的数据点、并发刷新时合并掉的请求
+        self.full_fetches = 0
+        self.incremental_fetches = 0
+        self.rows_fetched = 0
+        self.coalesced = 0
+
+    def buffer(self, symbol: str, key: str) -> RingBuffer:
+        with self._lock:
+            return self._series(symbol, key)[0]
+
+    def _series(self, symbol: str, key: str) -> Tuple[RingBuffer, threading.Lock]:
+        # 调用方持有 self._lock
+        cache_key = (symbol, key)
+        buf = self._buffers.get(cache_key)
+        if buf is None:
+            buf = self._buffers[cache_key] = RingBuffer(self.capacity)
+            self._series_locks[cache_key] = threading.Lock()
+            self._generations[cache_key] = 0
+        return buf, self._series_locks[cache_key]
+
+    def discard(self, symbol: str) -> None:
+        """symbol 下架后释放它的所有序列。"""
+        with self._lock:
+            for cache_key in [k for k in self._buffers if k[0] == symbol]:
+                del self._buffers[cache_key]
+                del self._series_locks[cache_key]
+                del self._generations[cache_key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "series": len(self._buffers),
+                "full_fetches": self.full_fetches,
+                "incremental_fetches": self.incremental_fetches,
+                "rows_fetched": self.rows_fetched,
+                "coalesced": self.coalesced,
+            }
+
+    def refresh(self, symbol: str, key: str, fetch: SeriesFetcher) -> np.ndarray:
+        """拉增量数据写入缓冲区，返回按时间升序的数值数组。"""
+        cache_key = (symbol, key)
+        with self._lock:
+            buf, series_lock = self._series(symbol, key)
+            generation = self._generations[cache_key]
+
+        with series_lock:
+            with self._lock:
+                if self._generations.get(cache_key, generation) != generation:
+                    # 等锁的时候另一个插件刚刷新完这条序列
+                    self.coalesced += 1
+                    return buf.values()
+            last_ts = buf.last_ts
+            now_ms = int(self._clock() * 1000)
+
+            full = True
+            if last_ts is not None:
+                # 从最后一个缓存点开始（含该点，未收盘 K 线会被覆盖更新）
+                missing = math.ceil(max(now_ms - last_ts, 0) / self.step_ms) + 1
+                if missing <= self.capacity:
+                    rows = fetch(symbol, last_ts, missing)
+                    full = False
+                else:
+                    # 断档太久，缓存里的点已经全部过期
+                    buf.clear()
+            if full:
+                rows = fetch(symbol, None, self.capacity)
+            buf.extend(rows)
+
+            with self._lock:
+                if full:
+                    self.full_fetches += 1
+                else:
+                    self.incremental_fetches += 1
+                self.rows_fetched += len(rows)
+                if cache_key in self._generations:
+                    self._generations[cache_key] += 1
+            return buf.values()
@@ -0,0 +1,472 @@
+"""
+分片：一个协调进程 + N 个 worker 进程（可以在不同机器上），分担永续监控逐个 symbol 的拉取。
+
+单个进程一轮能扫的 symbol 数受两件事限制：逐个 symbol 的 OI / taker / 盘口请求的耗时，
+以及 Binance 按 IP 计算的权重上限。这里把这部分拆出去：
+
+- 协调进程照常跑 FuturesMonitor：合约列表、全市场 premiumIndex / ticker、分层调度、
+  信号、告警冷却、飞书发送都只在这里做，一轮只发一条飞书消息；
+- 每轮到期的 symbol 按一致性哈希（HashRing）分给当前在线的 worker，worker 用自己的
+  连接池和限速器拉完后把每个 symbol 的结果回报给协调进程；
+- worker 加入 / 离开时哈希环只挪动约 1/N 的 symbol，其余 symbol 仍由原来的 worker 负责；
+  一轮里掉线或超时的 worker，它那份 symbol 当场在剩下的 worker 里重新分一次；
+- 一个 worker 都没有时协调进程自己拉（和单进程模式一样）。
+
+不同机器上的 worker 各有各的 IP 权重额度，吞吐随 worker 数线性增加。
+
+通信用标准库 multiprocessing.connection（TCP + pickle，握手用 SHARD_AUTHKEY 校验），
+消息都是 dict：
+
+    worker -> 协调: {"op": "hello", "worker": 名字}
+    协调 -> worker: {"op": "fetch", "round": n, "symbols": [...]}
+    worker -> 协调: {"op": "result", "round": n, "results": {symbol: 元组}, "errors": {symbol: 文本}}
+    协调 -> worker: {"op": "stop"}
+
+用法：
+
+    SHARD_AUTHKEY=xxx python -m scripts.sharding coordinator --local-workers 3
+    SHARD_AUTHKEY=xxx SHARD_ADDRESS=10.0.0.5:9120 python -m scripts.sharding worker --name node-b
+"""
+
+import argparse
+import bisect
+import hashlib
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from multiprocessing.connection import (
+    Client,
+    Connection,
+    Listener,
+    answer_challenge,
+    deliver_challenge,
+    wait,
+)
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from config.config import (
+    FUTURES_POLL_INTERVAL,
+    SHARD_ADDRESS,
+    SHARD_AUTHKEY,
+    SHARD_METRICS_PORT,
+    SHARD_REPLICAS,
+    SHARD_TIMEOUT,
+    UNIVERSE_CACHE_FILE,
+    UNIVERSE_REFRESH_SECONDS,
+)
+from scripts.Binance_features_monitor import (
+    METRICS_NAME,
+    FuturesMonitor,
+    fetch_round_symbols,
+    fetch_usdt_perpetual_symbols,
+)
+from scripts.market_hub import MarketHub
+from scripts.metrics import REGISTRY, observe_round, start_metrics_server
+from scripts.universe import UniverseManager
+
+Address = Tuple[str, int]
+FetchFn = Callable[[List[str]], Tuple[Dict[str, Any], Dict[str, Exception]]]
+
+WORKER_EVENTS = REGISTRY.counter("shard_worker_events_total", "Shard workers joining / leaving", ("event",))
+
+# worker 连不上协调进程时的重试间隔（秒）
+RECONNECT_SECONDS = 5.0
+
+
+class RemoteFetchError(RuntimeError):
+    """worker 那边拉取失败，或者没有 worker 能拉；消息里带 worker 名字和原始异常文本。"""
+
+
+def parse_address(text: str) -> Address:
+    """"host:port" -> (host, port)。"""
+    host, _, port = text.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"bad shard address: {text!r}, expected host:port")
+    return host, int(port)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    一致性哈希环：每个节点在环上放 replicas 个虚拟节点，key 归顺时针方向的第一个虚拟节点。
+    节点增减时只有落在它附近区间的 key 换主人。
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), *, replicas: int = SHARD_REPLICAS) -> None:
+        self.replicas = max(1, replicas)
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        self._nodes: set = set()
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodes
+
+    def nodes(self) -> List[str]:
+        return sorted(self._nodes)
+
+    def add(self, node: str) -> None:
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            # 64 位哈希撞车几乎不可能，撞了就让先来的占着
+            if point not in self._owners:
+                self._owners[point] = node
+                bisect.insort(self._points, point)
+
+    def remove(self, node: str) -> None:
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        self._points = [p for p in self._points if self._owners[p] != node]
+        self._owners = {p: self._owners[p] for p in self._points}
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        i = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[i]]
+
+    def assign(self, keys: Iterable[str]) -> Dict[str, List[str]]:
+        """{节点: [key, ...]}，每个节点内部保持传入顺序；环为空时返回 {}。"""
+        out: Dict[str, List[str]] = {}
+        if not self._points:
+            return out
+        for key in keys:
+            out.setdefault(self.node_for(key), []).append(key)
+        return out
+
+
+class Coordinator:
+    """
+    接受 worker 连接，维护哈希环；fetch(symbols) 把一轮的 symbol 分给 worker 并收齐结果，
+    签名和 Binance_features_monitor.fetch_round_symbols 一样，可以直接替换 FuturesMonitor.fetch_symbols。
+    """
+
+    def __init__(
+        self,
+        address: Address,
+        authkey: Union[str, bytes],
+        *,
+        replicas: int = SHARD_REPLICAS,
+        timeout: float = SHARD_TIMEOUT,
+        fallback: Optional[FetchFn] = None,
+    ) -> None:
+        if not authkey:
+            raise ValueError("shard authkey must not be empty")
+        self.address = address
+        self.authkey = authkey.encode("utf-8") if isinstance(authkey, str) else authkey
+        self.timeout = timeout
+        self.fallback = fallback
+        self._ring = HashRing(replicas=replicas)
+        self._conns: Dict[str, Connection] = {}
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._listener: Optional[Listener] = None
+        self._closed = threading.Event()
+        self._round = 0
+        self._owners: Dict[str, str] = {}
+        self._stats = {"rounds": 0, "dispatched": 0, "reassigned": 0, "moved": 0, "fallback": 0, "joins": 0, "leaves": 0}
+
+    def start(self) -> "Coordinator":
+        """开始监听（端口 0 时 self.address 换成实际端口），后台线程接受 worker。"""
+        # 密钥校验不交给 Listener.accept 做，放到每个连接自己的握手线程里（见 _handshake）
+        self._listener = Listener(self.address)
+        self.address = self._listener.address
+        threading.Thread(target=self._accept_loop, name="shard-accept", daemon=True).start()
+        return self
+
+    def _accept_loop(self) -> None:
+        while not self._closed.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception as exc:  # noqa: BLE001
+                if self._closed.is_set():
+                    return
+                print(f"shard accept error: {type(exc).__name__} - {exc}")
+                continue
+            # 握手放到单独线程：连上了却迟迟不答密钥 / 不发 hello 的连接不能挡住后面的 worker 加入
+            threading.Thread(target=self._handshake, args=(conn,), name="shard-handshake", daemon=True).start()
+
+    def _handshake(self, conn: Connection) -> None:
+        """校验密钥（和 Listener.accept 里的一样）并等 hello；失败只关掉这一个连接。"""
+        try:
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+            if not conn.poll(self.timeout):
+                raise TimeoutError("no hello")
+            hello = conn.recv()
+            name = str(hello["worker"])
+        except Exception as exc:  # noqa: BLE001
+            print(f"shard handshake error: {type(exc).__name__} - {exc}")
+            conn.close()
+            return
+        with self._lock:
+            if self._closed.is_set():
+                conn.close()
+                return
+            old = self._conns.pop(name, None)
+            self._conns[name] = conn
+            self._ring.add(name)
+            self._stats["joins"] += 1
+        if old is not None:
+            # 同名 worker 重连：旧连接作废，环上的位置不变
+            old.close()
+        WORKER_EVENTS.inc(event="join")
+        print(f"shard worker joined: {name} ({len(self._ring)} online)")
+
+    def workers(self) -> List[str]:
+        with self._lock:
+            return self._ring.nodes()
+
+    def _drop(self, name: str, conn: Connection, reason: str) -> None:
+        conn.close()
+        with self._lock:
+            # 这期间同名 worker 已经重连的话，新连接不动
+            if self._conns.get(name) is not conn:
+                return
+            del self._conns[name]
+            self._ring.remove(name)
+            self._stats["leaves"] += 1
+        WORKER_EVENTS.inc(event="leave")
+        print(f"shard worker left: {name} ({reason})")
+
+    def fetch(self, symbols: Iterable[str]) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        """
+        把 symbols 按哈希环分给在线 worker 拉取，返回 (results, errors)，顺序与传入一致。
+        掉线 / 超时的 worker 那份在剩下的 worker 里再分一次；还是没人拉的交给 fallback，没有 fallback 记为错误。
+        """
+        ordered = list(symbols)
+        results: Dict[str, Any] = {}
+        errors: Dict[str, Exception] = {}
+        with self._fetch_lock:
+            pending = ordered
+            for attempt in range(2):
+                with self._lock:
+                    assignment = self._ring.assign(pending)
+                    conns = {name: self._conns[name] for name in assignment}
+                if not assignment:
+                    break
+                if attempt == 0:
+                    self._count_moves(assignment)
+                else:
+                    self._stats["reassigned"] += len(pending)
+                pending = self._dispatch(assignment, conns, results, errors)
+                if not pending:
+                    break
+            self._stats["rounds"] += 1
+
+        if pending:
+            if self.fallback is not None:
+                self._stats["fallback"] += len(pending)
+                local_results, local_errors = self.fallback(pending)
+                results.update(local_results)
+                errors.update(local_errors)
+            else:
+                for symbol in pending:
+                    errors[symbol] = RemoteFetchError("no shard worker available")
+        return (
+            {s: results[s] for s in ordered if s in results},
+            {s: errors[s] for s in ordered if s in errors},
+        )
+
+    def _count_moves(self, assignment: Dict[str, List[str]]) -> None:
+        for name, chunk in assignment.items():
+            for symbol in chunk:
+                previous = self._owners.get(symbol)
+                if previous is not None and previous != name:
+                    self._stats["moved"] += 1
+                self._owners[symbol] = name
+
+    def _dispatch(
+        self,
+        assignment: Dict[str, List[str]],
+        conns: Dict[str, Connection],
+        results: Dict[str, Any],
+        errors: Dict[str, Exception],
+    ) -> List[str]:
+        """发出一轮请求并等结果，返回没拿到结果（worker 掉线 / 超时）的 symbol。"""
+        self._round += 1
+        round_id = self._round
+        failed: List[str] = []
+        waiting: Dict[Connection, str] = {}
+        for name, chunk in assignment.items():
+            try:
+                conns[name].send({"op": "fetch", "round": round_id, "symbols": chunk})
+            except (OSError, EOFError, ValueError) as exc:
+                self._drop(name, conns[name], f"send failed: {type(exc).__name__}")
+                failed.extend(chunk)
+                continue
+            waiting[conns[name]] = name
+            self._stats["dispatched"] += len(chunk)
+
+        deadline = time.monotonic() + self.timeout
+        while waiting:
+            ready = wait(list(waiting), timeout=max(deadline - time.monotonic(), 0.0))
+            if not ready:
+                break
+            for conn in ready:
+                name = waiting[conn]
+                try:
+                    msg = conn.recv()
+                except (OSError, EOFError) as exc:
+                    self._drop(name, conn, f"disconnected: {type(exc).__name__}")
+                    failed.extend(assignment[name])
+                    del waiting[conn]
+                    continue
+                if msg.get("op") != "result" or msg.get("round") != round_id:
+                    # 上一轮超时之后才到的旧结果
+                    continue
+                results.update(msg["results"])
+                for symbol, text in msg["errors"].items():
+                    errors[symbol] = RemoteFetchError(f"{name}: {text}")
+                del waiting[conn]
+
+        for conn, name in waiting.items():
+            self._drop(name, conn, f"no result within {self.timeout:g}s")
+            failed.extend(assignment[name])
+        return failed
+
+    def stop(self) -> None:
+        """通知所有 worker 退出，关掉监听。"""
+        self._closed.set()
+        with self._lock:
+            conns = list(self._conns.values())
+            self._conns.clear()
+            for name in self._ring.nodes():
+                self._ring.remove(name)
+        for conn in conns:
+            try:
+                conn.send({"op": "stop"})
+            except (OSError, EOFError, ValueError):
+                pass
+            conn.close()
+        if self._listener is not None:
+            # accept() 阻塞时关监听套接字不一定能唤醒它，先连一下
+            try:
+                socket.create_connection(self.address, timeout=1).close()
+            except OSError:
+                pass
+            self._listener.close()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["workers"] = len(self._ring)
+        return stats
+
+
+def run_worker(
+    address: Address,
+    authkey: Union[str, bytes],
+    name: Optional[str] = None,
+    *,
+    fetch: Optional[FetchFn] = None,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """
+    连上协调进程，处理 fetch 请求直到收到 stop、连接断开或 stop 事件被置位。
+    fetch 默认是 Binance_features_monitor.fetch_round_symbols（本进程的连接池和限速器）。
+    """
+    fetch = fetch or fetch_round_symbols
+    if isinstance(authkey, str):
+        authkey = authkey.encode("utf-8")
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    conn = Client(address, authkey=authkey)
+    try:
+        conn.send({"op": "hello", "worker": name})
+        while stop is None or not stop.is_set():
+            if not conn.poll(0.2):
+                continue
+            try:
+                msg = conn.recv()
+            except EOFError:
+                break
+            if msg.get("op") == "stop":
+                break
+            if msg.get("op") != "fetch":
+                continue
+            results, errors = fetch(msg["symbols"])
+            conn.send(
+                {
+                    "op": "result",
+                    "round": msg["round"],
+                    "results": results,
+                    "errors": {symbol: f"{type(exc).__name__} - {exc}" for symbol, exc in errors.items()},
+                }
+            )
+    finally:
+        conn.close()
+
+
+def worker_main(address: Address, authkey: str, name: Optional[str] = None) -> None:
+    """worker 进程入口：协调进程没起来或者重启了就隔几秒重连。"""
+    while True:
+        try:
+            run_worker(address, authkey, name)
+        except (OSError, EOFError) as exc:
+            print(f"shard worker {name or os.getpid()}: {type(exc).__name__} - {exc}, retry in {RECONNECT_SECONDS:g}s")
+        time.sleep(RECONNECT_SECONDS)
+
+
+def coordinator_main(address: Address, authkey: str, local_workers: int) -> None:
+    if SHARD_METRICS_PORT:
+        start_metrics_server(SHARD_METRICS_PORT)
+    coordinator = Coordinator(address, authkey, fallback=fetch_round_symbols).start()
+    REGISTRY.register_stats("shard", coordinator.stats)
+    print(f"shard coordinator listening on {coordinator.address[0]}:{coordinator.address[1]}")
+    for i in range(local_workers):
+        multiprocessing.Process(
+            target=worker_main, args=(coordinator.address, authkey, f"local-{i}"), daemon=True
+        ).start()
+
+    hub = MarketHub(
+        UniverseManager(
+            fetch_usdt_perpetual_symbols,
+            cache_path=UNIVERSE_CACHE_FILE or None,
+            refresh_seconds=UNIVERSE_REFRESH_SECONDS,
+        ),
+        max_age=0,
+    )
+    hub.start()
+    monitor = FuturesMonitor()
+    monitor.fetch_symbols = coordinator.fetch
+    monitor.setup(hub)
+
+    while True:
+        start_ts = time.time()
+        monitor.run_round(hub.snapshot())
+        duration = time.time() - start_ts
+        observe_round(METRICS_NAME, duration, FUTURES_POLL_INTERVAL)
+        time.sleep(max(5, FUTURES_POLL_INTERVAL - int(duration)))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Shard the futures monitor's per-symbol fetches across workers.")
+    parser.add_argument("role", choices=("coordinator", "worker"))
+    parser.add_argument("--address", default=SHARD_ADDRESS, help="host:port，默认 SHARD_ADDRESS")
+    parser.add_argument("--name", default=None, help="worker 名字，默认 主机名-pid；重启后用同一个名字负责的 symbol 不变")
+    parser.add_argument("--local-workers", type=int, default=0, help="协调进程顺便在本机起几个 worker 进程")
+    args = parser.parse_args(argv)
+    if not SHARD_AUTHKEY:
+        parser.error("SHARD_AUTHKEY is not set")
+    address = parse_address(args.address)
+    if args.role == "coordinator":
+        coordinator_main(address, SHARD_AUTHKEY, args.local_workers)
+    else:
+        worker_main(address, SHARD_AUTHKEY, args.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+列式指标快照：把一轮里所有 symbol 的指标放进 NumPy 数组，条件判断变成布尔掩码。
+
+    table = MetricTable.from_rows(rows, ["price_1h_pct", "oi_1h_pct", ...])
+    mask = (np.abs(table["price_1h_pct"]) >= 11) & (table["oi_1h_pct"] >= 10)
+    for i in table.indices(mask):
+        row = table.row(i)   # 只有命中的行才回到 Python 做字符串格式化
+
+缺失值统一是 NaN，NaN 参与的比较结果都是 False，天然等价于「数据不全就不触发」。
+加条件 / 窗口只是多一次数组运算，评估开销不随规则数量按 symbol 线性增长。
+"""
+
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+
+class MetricTable:
+    """symbol 列表 + 同长度的 float64 指标列。"""
+
+    def __init__(self, symbols: Sequence[str], columns: Mapping[str, np.ndarray]) -> None:
+        self.symbols: List[str] = list(symbols)
+        self.columns: Dict[str, np.ndarray] = {}
+        for name, values in columns.items():
+            arr = np.asarray(values, dtype=np.float64)
+            if arr.shape != (len(self.symbols),):
+                raise ValueError(f"column {name} has shape {arr.shape}, expected ({len(self.symbols)},)")
+            self.columns[name] = arr
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Mapping[str, Mapping[str, Optional[float]]],
+        columns: Iterable[str],
+    ) -> "MetricTable":
+        """
+        rows: {symbol: {指标名: 数值}}，按 rows 的顺序生成表；
+        缺失或为 None 的指标填 NaN。
+        """
+        symbols = list(rows)
+        names = list(columns)
+        data = np.full((len(names), len(symbols)), np.nan, dtype=np.float64)
+        for j, symbol in enumerate(symbols):
+            row = rows[symbol]
+            for i, name in enumerate(names):
+                value = row.get(name)
+                if value is not None:
+                    data[i, j] = value
+        return cls(symbols, {name: data[i] for i, name in enumerate(names)})
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def add_column(self, name: str, values: Sequence[float]) -> None:
+        arr = np.asarray(values, dtype=np.float64)
+        if arr.shape != (len(self.symbols),):
+            raise ValueError(f"column {name} has shape {arr.shape}, expected ({len(self.symbols)},)")
+        self.columns[name] = arr
+
+    def indices(self, mask: np.ndarray) -> List[int]:
+        return np.flatnonzero(mask).tolist()
+
+    def row(self, i: int) -> Dict[str, float]:
+        """第 i 行还原成 dict（NaN 还原为 None），只对命中的行调用。"""
+        out: Dict[str, float] = {"symbol": self.symbols[i]}
+        for name, values in self.columns.items():
+            value = float(values[i])
+            out[name] = None if np.isnan(value) else value
+        return out
@@ -0,0 +1,50 @@
+"""
+多时间窗口聚合：只拉一条细粒度序列（比如 5m K 线收盘价 / 5m OI），
+在本地算出 15m、30m、1H、4H 等任意窗口的变化。
+
+    closes = [...]                       # 5m 收盘价，时间升序
+    window_changes(closes, 5, {"15m": 15, "1h": 60})
+    # -> {"15m": 最新 vs 15 分钟前的涨跌幅%, "1h": 最新 vs 60 分钟前的涨跌幅%}
+
+加一个窗口只是在 dict 里多一项，不会多一次请求（序列只需要覆盖最长的窗口）。
+"""
+
+from typing import Dict, Mapping, Sequence
+
+_UNIT_MINUTES = {"m": 1, "h": 60, "d": 1440}
+
+
+def interval_minutes(interval: str) -> int:
+    """把 Binance 的 interval / period（"5m"、"1h"、"4h"、"1d"）换算成分钟数。"""
+    unit = interval[-1:]
+    if unit not in _UNIT_MINUTES or not interval[:-1].isdigit():
+        raise ValueError(f"unsupported interval: {interval!r}")
+    return int(interval[:-1]) * _UNIT_MINUTES[unit]
+
+
+def points_needed(base_minutes: int, windows: Mapping[str, int]) -> int:
+    """覆盖最长窗口需要的数据点数（含最新一个点）。"""
+    longest = max(windows.values(), default=base_minutes)
+    for name, minutes in windows.items():
+        if minutes % base_minutes:
+            raise ValueError(f"window {name} ({minutes}m) is not a multiple of {base_minutes}m")
+    return longest // base_minutes + 1
+
+
+def window_changes(
+    values: Sequence[float], base_minutes: int, windows: Mapping[str, int]
+) -> Dict[str, float]:
+    """
+    对每个窗口计算 (最新值 - 窗口起点值) / 窗口起点值 * 100。
+    数据点不够覆盖某个窗口时，用最早的那个点（与原来「少于 2 个点返回 0」的口径一致）。
+    """
+    changes: Dict[str, float] = {}
+    if len(values) < 2:
+        return {name: 0.0 for name in windows}
+
+    last = float(values[-1])
+    for name, minutes in windows.items():
+        steps = minutes // base_minutes
+        start = float(values[max(0, len(values) - 1 - steps)])
+        changes[name] = (last - start) / start * 100 if start else 0.0
+    return changes
@@ -0,0 +1,176 @@
+"""
+合约列表（universe）管理：磁盘缓存 + 后台定时刷新 + 增量变更。
+
+以前 symbol 列表只在启动时拉一次：长时间运行会漏掉新上线的合约，
+已下架的合约每次请求都报错；每次启动还要重新下载、解析完整的 exchangeInfo（几 MB）。这里：
+
+- 过滤后的永续合约列表写到本地 JSON，启动时直接读缓存，不等 exchangeInfo；
+- 后台线程每 refresh_seconds 秒重新拉一次，缓存过期时启动后马上刷新；
+- 新增 / 下架的 symbol 累积起来，扫描循环每轮 drain_changes() 取走，不用重启。
+
+    universe = UniverseManager(fetch_usdt_perp_symbols, cache_path="data/universe_oi.json")
+    symbols = universe.load()
+    universe.start()
+    while True:
+        added, removed = universe.drain_changes()
+        if added or removed:
+            symbols = universe.symbols()
+        ...
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+
+def parse_usdt_perpetuals(payload: Mapping) -> List[str]:
+    """从 exchangeInfo 里挑出正在交易的 USDT 永续合约，按字母排序。"""
+    symbols: List[str] = []
+    for item in payload.get("symbols", []):
+        if (
+            item.get("contractType") == "PERPETUAL"
+            and item.get("quoteAsset") == "USDT"
+            and item.get("status") == "TRADING"
+        ):
+            symbols.append(item["symbol"])
+    symbols.sort()
+    return symbols
+
+
+class UniverseManager:
+    """线程安全的合约列表，后台刷新，变更通过 drain_changes() 交给扫描循环。"""
+
+    def __init__(
+        self,
+        fetch: Callable[[], Iterable[str]],
+        *,
+        cache_path: Optional[Union[str, Path]] = None,
+        refresh_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._fetch = fetch
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.refresh_seconds = refresh_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._symbols: List[str] = []
+        self._added: Set[str] = set()
+        self._removed: Set[str] = set()
+        self.updated_at = 0.0
+        self.refresh_count = 0
+        self.refresh_errors = 0
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return list(self._symbols)
+
+    # ---------- 启动 ----------
+
+    def load(self) -> List[str]:
+        """
+        优先读磁盘缓存（秒级启动）；没有缓存时同步拉一次 exchangeInfo。
+        缓存已过期的，start() 之后后台线程会立刻刷新。
+        """
+        cached = self._read_cache()
+        if cached is not None:
+            symbols, updated_at = cached
+            with self._lock:
+                self._symbols = symbols
+                self.updated_at = updated_at
+            return list(symbols)
+        self.refresh()
+        return self.symbols()
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="universe-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            wait = self.updated_at + self.refresh_seconds - self._clock()
+            if wait > 0 and self._stop.wait(wait):
+                break
+            try:
+                self.refresh()
+            except Exception as exc:  # noqa: BLE001
+                # 刷新失败继续用旧列表，过一会再试
+                self.refresh_errors += 1
+                print(f"universe refresh error: {type(exc).__name__} - {exc}")
+                if self._stop.wait(min(60.0, self.refresh_seconds)):
+                    break
+
+    # ---------- 刷新 ----------
+
+    def refresh(self) -> Tuple[List[str], List[str]]:
+        """拉一次最新列表，返回 (新增, 下架)，同时累积到待取走的变更里并写缓存。"""
+        fresh = sorted(set(self._fetch()))
+        with self._lock:
+            old = set(self._symbols)
+            added = [s for s in fresh if s not in old]
+            removed = sorted(old - set(fresh))
+            # 第一次加载（之前是空列表）不算变更
+            if old:
+                for symbol in added:
+                    if symbol in self._removed:
+                        self._removed.discard(symbol)
+                    else:
+                        self._added.add(symbol)
+                for symbol in removed:
+                    if symbol in self._added:
+                        self._added.discard(symbol)
+                    else:
+                        self._removed.add(symbol)
+            self._symbols = fresh
+            self.updated_at = self._clock()
+            self.refresh_count += 1
+        self._write_cache(fresh)
+        if old and (added or removed):
+            print(f"universe changed: +{len(added)} {added[:10]} -{len(removed)} {removed[:10]}")
+        return (added, removed) if old else ([], [])
+
+    def drain_changes(self) -> Tuple[List[str], List[str]]:
+        """取走上次调用以来累积的 (新增, 下架)。"""
+        with self._lock:
+            added, removed = sorted(self._added), sorted(self._removed)
+            self._added.clear()
+            self._removed.clear()
+            return added, removed
+
+    # ---------- 磁盘缓存 ----------
+
+    def _read_cache(self) -> Optional[Tuple[List[str], float]]:
+        if self.cache_path is None or not self.cache_path.exists():
+            return None
+        try:
+            data: Dict = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            symbols = [str(s) for s in data["symbols"]]
+            updated_at = float(data.get("updated_at", 0.0))
+        except (ValueError, KeyError, TypeError) as exc:
+            print(f"universe cache {self.cache_path} unreadable, refetching: {exc}")
+            return None
+        if not symbols:
+            return None
+        return symbols, updated_at
+
+    def _write_cache(self, symbols: List[str]) -> None:
+        if self.cache_path is None:
+            return
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_suffix(self.cache_path.suffix + ".tmp")
+            tmp.write_text(json.dumps({"updated_at": self.updated_at, "symbols": symbols}), encoding="utf-8")
+            os.replace(tmp, self.cache_path)
+        except OSError as exc:
+            print(f"universe cache write error: {exc}")
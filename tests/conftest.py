@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+from typing import List
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class FakeClock:
+    """
+    测试用的假时钟：clock() / clock.time() 返回 now，clock.sleep(s) 不真睡，只把 now 往后拨并记下来。
+    被测代码的 clock / sleep 参数直接传它（或它的方法），测试里改 clock.now 推进时间。
+    """
+
+    def __init__(self, now: float = 1_000.0) -> None:
+        self.now = now
+        self.sleeps: List[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
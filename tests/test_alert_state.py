@@ -0,0 +1,83 @@
+from scripts.alert_state import AlertState
+
+
+def make_state(clock, **kwargs):
+    params = dict(cooldown=600, escalation_pct=50, ttl=1800)
+    params.update(kwargs)
+    return AlertState(clock=clock, **params)
+
+
+def test_cooldown_suppresses_repeats_per_symbol_and_rule(clock):
+    state = make_state(clock)
+    assert state.should_alert("AAAUSDT", "r1", 12.0)
+    clock.now += 60
+    assert not state.should_alert("AAAUSDT", "r1", 12.5)
+    # 不同规则 / 不同 symbol 互不影响
+    assert state.should_alert("AAAUSDT", "r2", 12.0)
+    assert state.should_alert("BBBUSDT", "r1", 12.0)
+    clock.now += 600
+    assert state.should_alert("AAAUSDT", "r1", 12.0)
+    assert state.stats()["suppressed"] == 1
+
+
+def test_escalation_realerts_when_metric_worsens(clock):
+    state = make_state(clock)
+    assert state.should_alert("AAAUSDT", "r1", -12.0)
+    clock.now += 60
+    assert not state.should_alert("AAAUSDT", "r1", -15.0)
+    assert state.should_alert("AAAUSDT", "r1", -18.0)
+    # 升级后以新的值为基准
+    clock.now += 60
+    assert not state.should_alert("AAAUSDT", "r1", -20.0)
+    assert state.stats()["escalated"] == 1
+
+
+def test_entries_expire_after_ttl_and_size_is_bounded(clock):
+    state = make_state(clock, max_entries=3)
+    for i in range(5):
+        state.should_alert(f"S{i}USDT", "r1")
+    assert len(state) == 3
+    clock.now += 1801
+    state.should_alert("NEWUSDT", "r1")
+    assert len(state) == 1
+
+
+def test_state_survives_restart(tmp_path, clock):
+    path = tmp_path / "alerts.json"
+    state = make_state(clock, path=path)
+    assert state.should_alert("AAAUSDT", "条件1", 12.0)
+    state.save()
+
+    restarted = AlertState(cooldown=600, escalation_pct=50, ttl=1800, path=path, clock=clock)
+    clock.now += 60
+    assert not restarted.should_alert("AAAUSDT", "条件1", 12.0)
+    assert restarted.should_alert("AAAUSDT", "条件1", 20.0)
+
+
+def test_corrupt_state_file_starts_fresh(tmp_path, clock):
+    path = tmp_path / "alerts.json"
+    path.write_text("{not json", encoding="utf-8")
+    state = make_state(clock, path=path)
+    assert len(state) == 0
+    assert state.should_alert("AAAUSDT", "r1")
+
+
+def test_oi_monitor_skips_repeat_alerts_until_escalation(monkeypatch, clock):
+    import scripts.binance_features_oi_1 as oi_monitor
+
+    state = make_state(clock)
+    monkeypatch.setattr(oi_monitor, "alert_state", state)
+    metrics = {"AAAUSDT": {"price_1h_pct": -12.0, "oi_1h_pct": 11.0, "price_15m_pct": 0.0, "oi_15m_pct": 0.0,
+                           "last_price": 1.0, "oi_notional": 5e6}}
+    ticker = {"AAAUSDT": {"priceChangePercent": "0", "quoteVolume": "1e7"}}
+
+    def run_round(price_1h):
+        metrics["AAAUSDT"]["price_1h_pct"] = price_1h
+        table = oi_monitor.build_metric_table(metrics, ticker, {"AAAUSDT": 1e8})
+        return oi_monitor.select_new_alerts(table, oi_monitor.evaluate_rules(table))
+
+    assert run_round(-12.0) == [(0, ["条件1（1H）"])]
+    clock.now += 60
+    assert run_round(-13.0) == []
+    clock.now += 60
+    assert run_round(-19.0) == [(0, ["条件1（1H）"])]
@@ -0,0 +1,195 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+import scripts.backtest as backtest
+from scripts.backtest import Backtest, Panel, apply_cooldown, forward_returns, parse_values, sweep
+from scripts.recorder import SnapshotRecorder
+
+DAY = 1_767_225_600.0  # 2026-01-01 00:00:00 UTC
+MIN = 60_000
+
+
+def oi_panel() -> Panel:
+    # 两个 symbol、6 轮（间隔 15 分钟）；AAA 在第 1 轮 1H 涨 12% 且 OI 涨 11%，之后价格继续涨
+    times = DAY * 1000 + np.arange(6) * 15 * MIN
+    price = np.array([[100, 50], [110, 50], [121, 50], [121, 50], [110, 50], [110, 50]], dtype=float)
+    p1h = np.array([[0, 0], [12, 0], [12, 1], [9, 0], [0, 0], [0, 0]], dtype=float)
+    oi1h = np.array([[0, 0], [11, 20], [11, 20], [11, 0], [0, 0], [0, 0]], dtype=float)
+    zeros = np.zeros_like(price)
+    return Panel(times, ["AAAUSDT", "BBBUSDT"], {
+        "last_price": price,
+        "price_1h_pct": p1h,
+        "oi_1h_pct": oi1h,
+        "price_15m_pct": zeros,
+        "oi_15m_pct": zeros,
+        "mc": np.ones_like(price),
+    })
+
+
+@pytest.fixture(autouse=True)
+def default_rules(tmp_path):
+    # 回测和线上读同一份 RULES_FILE；测试里固定用按阈值常量生成的默认规则
+    import scripts.binance_features_oi_1 as oi_monitor
+
+    with patch.object(oi_monitor, "RULES_FILE", str(tmp_path / "missing_rules.json")):
+        yield
+
+
+def test_oi_rules_replay_counts_alerts_with_cooldown_and_forward_returns():
+    evaluator, defaults = backtest.oi_evaluator()
+    bt = Backtest(oi_panel(), evaluator, price_column="last_price", horizons={"15m": 15, "30m": 30},
+                  defaults=defaults, cooldown_seconds=1800)
+
+    result = bt.run({"PRICE_CHANGE_1H_PCT": 11, "OI_CHANGE_1H_PCT": 10})
+    # AAA 在第 1、2 轮都满足，冷却 30 分钟内只算第 1 轮
+    assert result["alerts"] == 1
+    assert result["symbols"] == 1
+    assert result["ret_15m_mean"] == pytest.approx(10.0)
+    assert result["ret_30m_mean"] == pytest.approx(10.0)
+    assert result["ret_15m_win"] == 1.0
+
+    # 阈值放低：BBB（1H 涨 1%、OI 涨 20%）也会命中；AAA 第 3 轮已过冷却期
+    loose = bt.run({"PRICE_CHANGE_1H_PCT": 1, "OI_CHANGE_1H_PCT": 10})
+    assert loose["alerts"] == 3
+    assert loose["symbols"] == 2
+
+
+def test_sweep_in_processes_matches_inline_and_keeps_grid_order():
+    evaluator, defaults = backtest.oi_evaluator()
+    bt = Backtest(oi_panel(), evaluator, price_column="last_price", horizons={"15m": 15}, defaults=defaults)
+    grid = {"PRICE_CHANGE_1H_PCT": [1, 11, 13], "OI_CHANGE_1H_PCT": [5, 15]}
+
+    inline = sweep(bt, grid, workers=1)
+    parallel = sweep(bt, grid, workers=2)
+    assert [r["alerts"] for r in inline] == [r["alerts"] for r in parallel] == [4, 1, 2, 0, 0, 0]
+    assert inline[1] == pytest.approx(parallel[1], nan_ok=True)
+    assert [(r["PRICE_CHANGE_1H_PCT"], r["OI_CHANGE_1H_PCT"]) for r in inline][:2] == [(1, 5), (1, 15)]
+
+
+def test_futures_signals_replay_from_recorded_snapshots(tmp_path):
+    import scripts.Binance_features_monitor as monitor
+
+    columns = monitor.TABLE_COLUMNS + ["price_change_pct"]
+    recorder = SnapshotRecorder(tmp_path, columns)
+    recorder.start()
+    for k, depth in enumerate([1.0, 1.6, 2.5, 1.0]):
+        row = {name: np.array([0.0]) for name in columns}
+        row["mark_price"] = np.array([100.0 + k])
+        row["depth_ratio"] = np.array([depth])
+        recorder.record(DAY + k * 60, ["BTCUSDT"], row)
+    recorder.flush()
+    recorder.stop()
+
+    panel = backtest.load_snapshots(str(tmp_path))
+    assert panel.shape == (4, 1)
+    evaluator, defaults = backtest.futures_evaluator(["depth_bid"])
+    bt = Backtest(panel, evaluator, price_column="mark_price", horizons={"1m": 1}, defaults=defaults)
+    results = sweep(bt, {"DEPTH_IMBALANCE_RATIO": [1.5, 2.0, 3.0]})
+    assert [r["alerts"] for r in results] == [2, 1, 0]
+    assert results[1]["ret_1m_mean"] == pytest.approx(1 / 102 * 100)
+
+
+def test_forward_returns_fill_gaps_and_stop_at_end():
+    times = np.arange(4) * MIN
+    price = np.array([[100.0], [np.nan], [120.0], [90.0]])
+    out = forward_returns(times, price, 1 * MIN)
+    # 第 0 行的下一个点缺失，用前一个有效值（还是 100）
+    assert out[:, 0].tolist()[:3] == pytest.approx([0.0, np.nan, -25.0], nan_ok=True)
+    assert np.isnan(out[3, 0])
+
+
+def test_apply_cooldown_is_per_symbol():
+    times = np.arange(5) * MIN
+    mask = np.array([[1, 1], [1, 0], [1, 1], [0, 0], [1, 0]], dtype=bool)
+    out = apply_cooldown(mask, times, 2 * MIN)
+    assert out[:, 0].tolist() == [True, False, True, False, True]
+    assert out[:, 1].tolist() == [True, False, True, False, False]
+
+
+def test_download_history_builds_oi_monitor_columns():
+    step = 5 * MIN
+    start = int(DAY * 1000)
+    end = start + 3 * step
+    k24 = 288
+
+    def fake_get(url, params=None, **kwargs):
+        cursor = params["startTime"]
+        if "klines" in url:
+            rows = [[t, "0", "0", "0", str(100 + i), "0", "0", "10"]
+                    for i, t in enumerate(range(start - k24 * step, end, step)) if t >= cursor]
+        else:
+            rows = [{"timestamp": t, "sumOpenInterestValue": str(1000 + (t - start) // step * 100)}
+                    for t in range(start - 12 * step, end, step) if t >= cursor]
+        return SimpleNamespace(json=lambda: rows[:params["limit"]])
+
+    with patch.object(backtest, "http_get", side_effect=fake_get):
+        panel = backtest.download_history(["AAAUSDT"], start_ms=start, end_ms=end, max_workers=1)
+
+    assert panel.shape == (3, 1)
+    assert panel.columns["last_price"][:, 0].tolist() == [388.0, 389.0, 390.0]
+    assert panel.columns["price_15m_pct"][0, 0] == pytest.approx((388 - 385) / 385 * 100)
+    assert panel.columns["oi_15m_pct"][0, 0] == pytest.approx((1000 - 700) / 700 * 100)
+    # 24H 成交额是最近 288 根 K 线的 quote volume 之和
+    assert panel.columns["quote_volume"][0, 0] == pytest.approx(2880.0)
+    assert np.isnan(panel.columns["mc"]).all()
+
+
+def test_panel_round_trips_through_npz(tmp_path):
+    panel = oi_panel()
+    path = str(tmp_path / "panel.npz")
+    panel.save(path)
+    loaded = Panel.load(path)
+    assert loaded.symbols == panel.symbols
+    assert loaded.times.tolist() == panel.times.tolist()
+    np.testing.assert_array_equal(loaded.columns["last_price"], panel.columns["last_price"])
+
+
+def test_parse_values_ranges_and_lists():
+    assert parse_values("6:12:2") == [6.0, 8.0, 10.0, 12.0]
+    assert parse_values("1.2:1.5:0.1") == [1.2, 1.3, 1.4, 1.5]
+    assert parse_values("5,8,10") == [5.0, 8.0, 10.0]
+
+
+def test_load_snapshots_merges_partitions_split_by_a_schema_change(tmp_path):
+    for k, columns in enumerate([["mark_price"], ["mark_price", "depth_ratio"]]):
+        recorder = SnapshotRecorder(tmp_path, columns)
+        recorder.start()
+        recorder.record(DAY + k * 60, ["BTCUSDT"], {"mark_price": np.array([100.0 + k]), "depth_ratio": np.array([2.0])})
+        recorder.flush()
+        recorder.stop()
+
+    # 写日期时同一天的两个分区都读进来，新加的列在旧分区里为 NaN
+    panel = backtest.load_snapshots(str(tmp_path), ["2026-01-01"])
+    assert panel.shape == (2, 1)
+    assert panel.columns["mark_price"][:, 0].tolist() == [100.0, 101.0]
+    assert np.isnan(panel.columns["depth_ratio"][0, 0]) and panel.columns["depth_ratio"][1, 0] == 2.0
+
+
+def test_oi_replay_uses_live_rules_file_and_liquidity_filter(tmp_path):
+    import scripts.binance_features_oi_1 as oi_monitor
+
+    panel = oi_panel()
+    # AAA 日成交额够，BBB 不够：线上根本不会扫 BBB
+    panel.columns["quote_volume"] = np.tile([1e7, 1e5], (6, 1))
+    rules = tmp_path / "rules.json"
+    rules.write_text(json.dumps({"rules": [{"name": "oi", "expr": "oi_1h >= {OI_CHANGE_1H_PCT}"}]}))
+    with patch.object(oi_monitor, "RULES_FILE", str(rules)):
+        evaluator, defaults = backtest.oi_evaluator()
+    assert defaults["MIN_NOTIONAL_24H"] == oi_monitor.MIN_NOTIONAL_24H
+    bt = Backtest(panel, evaluator, price_column="last_price", horizons={"15m": 15}, defaults=defaults)
+    # 规则文件里只有 OI 条件；BBB 的 OI 涨了 20% 也被成交额过滤掉
+    assert bt.run({"OI_CHANGE_1H_PCT": 10})["symbols"] == 1
+    assert bt.run({"OI_CHANGE_1H_PCT": 10, "MIN_NOTIONAL_24H": 0})["symbols"] == 2
+
+
+def test_oi_replay_follows_use_abs_price_change():
+    import scripts.binance_features_oi_1 as oi_monitor
+
+    template = oi_monitor.DEFAULT_RULE_TEMPLATE
+    expected = "abs(price_1h)" if oi_monitor.USE_ABS_PRICE_CHANGE else "price_1h "
+    assert backtest.oi_evaluator()[0].template is template
+    assert template["rules"][0]["expr"].startswith(expected)
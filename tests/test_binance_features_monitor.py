@@ -0,0 +1,141 @@
+import contextlib
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+import scripts.Binance_features_monitor as monitor
+from bench.fake_binance import FakeBinance
+from bench.run_bench import patch_module
+from scripts.market_hub import MarketHub
+from scripts.universe import UniverseManager
+
+
+class MockResponse(SimpleNamespace):
+    status_code: int = 200
+    text: str = "ok"
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise ValueError(f"status {self.status_code}")
+
+    def json(self):
+        return self.payload
+
+
+def test_fetch_premium_index_map_parses_bulk_snapshot():
+    payload = [
+        {
+            "symbol": "BTCUSDT",
+            "markPrice": "101.0",
+            "indexPrice": "100.0",
+            "lastFundingRate": "0.0001",
+            "nextFundingTime": 1609459200000,
+        },
+        {"symbol": "ETHUSDT", "markPrice": "10", "indexPrice": "", "lastFundingRate": "-0.0002"},
+    ]
+    with patch.object(monitor, "http_get", return_value=MockResponse(payload=payload)) as get:
+        mapping = monitor.fetch_premium_index_map()
+    # 不带 symbol，一次请求拿全市场
+    assert "params" not in get.call_args.kwargs
+    assert mapping["BTCUSDT"]["mark_price"] == 101.0
+    assert mapping["BTCUSDT"]["next_funding_time"] == 1609459200000
+    assert mapping["ETHUSDT"]["index_price"] == 0.0
+    assert mapping["ETHUSDT"]["funding_rate"] == -0.0002
+
+
+def test_compute_basis_pct_skips_missing_index():
+    premium_map = {
+        "BTCUSDT": {"mark_price": 101.0, "index_price": 100.0},
+        "ETHUSDT": {"mark_price": 10.0, "index_price": 0.0},
+        "SOLUSDT": {"mark_price": 49.0, "index_price": 50.0},
+    }
+    basis = monitor.compute_basis_pct(["BTCUSDT", "ETHUSDT", "SOLUSDT", "XRPUSDT"], premium_map)
+    assert basis["BTCUSDT"] == pytest.approx(1.0)
+    assert basis["SOLUSDT"] == pytest.approx(-2.0)
+    assert "ETHUSDT" not in basis and "XRPUSDT" not in basis
+
+
+def test_evaluate_signals_vectorized_over_universe():
+    snapshots = {
+        "BTCUSDT": (12.0, 1000.0, 1.1, 0.6, 2.0),
+        "ETHUSDT": (0.0, 500.0, 1.0, 0.0, None),
+        "SOLUSDT": (0.0, 10.0, 1.0, 0.0, 0.5),
+    }
+    premium_map = {
+        "BTCUSDT": {"mark_price": 100.0, "funding_rate": 0.02, "next_funding_time": 0},
+        "ETHUSDT": {"mark_price": 120.0, "funding_rate": 0.0, "next_funding_time": 0},
+        "SOLUSDT": {"mark_price": 10.0, "funding_rate": 0.0, "next_funding_time": 0},
+    }
+    ref_prices = {"BTCUSDT": 100.0, "ETHUSDT": 100.0}
+
+    table = monitor.build_metric_table(snapshots, premium_map, {"BTCUSDT": 0.5}, ref_prices)
+    assert table["price_change_pct"].tolist() == pytest.approx([0.0, 20.0, 0.0])
+
+    signals = monitor.evaluate_signals(table)
+    assert signals["oi_up"].tolist() == [True, False, False]
+    assert signals["price_move"].tolist() == [False, True, False]
+    assert signals["funding_high"].tolist() == [True, False, False]
+    assert signals["depth_bid"].tolist() == [True, False, False]
+    assert signals["depth_ask"].tolist() == [False, False, True]
+    assert signals["sideways_build"].tolist() == [True, False, False]
+
+    flags = {name: bool(mask[0]) for name, mask in signals.items()}
+    text = monitor.format_alert(table.row(0), flags, "2024-01-01 00:00:00 UTC+8")
+    assert "基差(标记-指数) +0.500%" in text
+    assert "价格横盘 + OI&主动成交同向，关注突破" in text
+    assert text.index("OI +12.00%") < text.index("Funding 极值")
+
+
+def test_round_falls_back_to_per_symbol_premium_when_bulk_fetch_fails(tmp_path, capsys):
+    server = FakeBinance(symbols=12).start()
+    try:
+        with contextlib.ExitStack() as stack:
+            patch_module(stack, monitor, "futures", server.base_url, str(tmp_path), max_symbols=12)
+            stack.enter_context(patch.object(monitor, "HOT_TIER_SIZE", 12))
+            stack.enter_context(patch.object(monitor, "send_feishu_text", lambda content: None))
+            stack.enter_context(patch.object(monitor, "send_feishu_alerts", lambda header, alerts: None))
+            universe = UniverseManager(monitor.fetch_usdt_perpetual_symbols)
+            hub = MarketHub(universe, max_age=0)
+            hub.start()
+
+            def broken():
+                raise ConnectionError("premiumIndex down")
+
+            # 先注册的同名数据源生效：全市场 premiumIndex 一直失败
+            hub.add_source("premium", broken)
+            plugin = monitor.FuturesMonitor()
+            plugin.setup(hub)
+            try:
+                plugin.run_round(hub.snapshot())
+                # 到期的 symbol 逐个补了标记价格，照常扫描
+                assert len(plugin.mark_history) == 12
+                assert "falling back to per-symbol requests" in capsys.readouterr().out
+
+                # 逐个也拿不到：这一轮直接算失败，不去拉 OI / taker / 盘口
+                plugin.fetch_symbols = lambda symbols: pytest.fail("fetched without mark prices")
+                with patch.object(monitor, "fetch_mark_and_funding", side_effect=ConnectionError("down")):
+                    plugin.run_round(hub.snapshot())
+            finally:
+                universe.stop()
+                if plugin.recorder is not None:
+                    plugin.recorder.stop()
+    finally:
+        server.stop()
+    assert "Round failed" in capsys.readouterr().out
+
+
+def test_price_change_uses_fixed_lookback_not_last_poll():
+    history = monitor.MarkHistory(lookback=300)
+    for k in range(11):
+        ts = 1_000.0 + k * 60
+        # 价格每轮都记（全市场 premiumIndex），和这个 symbol 多久被拉一次无关
+        if k == 10:
+            assert history.reference(["HOTUSDT", "COLDUSDT", "NEWUSDT"], ts) == {"HOTUSDT": 105.0, "COLDUSDT": 10.5}
+        history.record(ts, {"HOTUSDT": 100.0 + k, "COLDUSDT": 10.0 + k / 10})
+        if k == 8:
+            # 2 轮前才上线，回看不到 300 秒：不给参考价（price_change_pct 为 0）
+            history.record(ts, {"NEWUSDT": 1.0})
+    assert history.reference(["NEWUSDT"], 1_000.0 + 14 * 60) == {"NEWUSDT": 1.0}
+    history.remove(["HOTUSDT"])
+    assert len(history) == 2
@@ -0,0 +1,125 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+import scripts.btc_watch as btc_watch
+from scripts.btc_watch import BtcWatch, fetch_price_map, parse_watchlist, price_change_alerts
+from scripts.market_hub import MarketHub
+
+
+def test_parse_watchlist_with_per_symbol_thresholds():
+    assert parse_watchlist(" btcusdt:1, ETHUSDT:1.5,SOLUSDT,,BTCUSDT:9", default_pct=2) == {
+        "BTCUSDT": 1.0,
+        "ETHUSDT": 1.5,
+        "SOLUSDT": 2.0,
+    }
+
+
+class MockResponse(SimpleNamespace):
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise ValueError(f"status {self.status_code}: {self.payload}")
+
+    def json(self):
+        return self.payload
+
+
+MARKET = {"BTCUSDT": "100.5", "ETHUSDT": "10.2", "SOLUSDT": "1.5", "BNBUSDT": "600"}
+
+
+def fake_ticker(calls):
+    """模拟现货 ticker/price：symbols 参数里有一个不存在的 symbol 就整体 400 / -1121。"""
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(params)
+        if params and "symbols" in params:
+            requested = json.loads(params["symbols"])
+            if any(s not in MARKET for s in requested):
+                resp = MockResponse(status_code=400, payload={"code": -1121, "msg": "Invalid symbol."})
+            else:
+                resp = MockResponse(status_code=200, payload=[{"symbol": s, "price": MARKET[s]} for s in requested])
+        elif params and "symbol" in params:
+            if params["symbol"] not in MARKET:
+                resp = MockResponse(status_code=400, payload={"code": -1121, "msg": "Invalid symbol."})
+            else:
+                resp = MockResponse(status_code=200, payload={"symbol": params["symbol"], "price": MARKET[params["symbol"]]})
+        else:
+            resp = MockResponse(status_code=200, payload=[{"symbol": s, "price": p} for s, p in MARKET.items()])
+        resp.raise_for_status()
+        return resp
+
+    return fake_get
+
+
+def test_whole_watchlist_is_one_request():
+    calls = []
+    with patch.object(btc_watch, "http_get", fake_ticker(calls)):
+        assert fetch_price_map(["BTCUSDT", "ETHUSDT", "SOLUSDT"]) == {"BTCUSDT": 100.5, "ETHUSDT": 10.2, "SOLUSDT": 1.5}
+        assert fetch_price_map(["BTCUSDT"]) == {"BTCUSDT": 100.5}
+    # 不管几个 symbol 都不带参数拉全市场（权重 4），本地过滤
+    assert calls == [None, None]
+
+
+def test_unknown_watchlist_symbol_does_not_break_the_rest(capsys):
+    calls = []
+    watchlist = ["BTCUSDT", "ETHUSDT", "ETHUSDTT"]
+    with patch.object(btc_watch, "http_get", fake_ticker(calls)):
+        # 带 symbols 参数的话交易所整体返回 400（-1121），一个 symbol 拼错整张列表都拿不到价格
+        with pytest.raises(ValueError, match="-1121"):
+            btc_watch.http_get(btc_watch.API_URL, params={"symbols": json.dumps(watchlist)})
+        assert fetch_price_map(watchlist) == {"BTCUSDT": 100.5, "ETHUSDT": 10.2}
+        assert fetch_price_map(watchlist) == {"BTCUSDT": 100.5, "ETHUSDT": 10.2}
+    # 拼错的 symbol 只提示一次
+    assert capsys.readouterr().out.count("ETHUSDTT") == 1
+
+
+def test_single_unknown_symbol_is_skipped_not_raised(capsys):
+    calls = []
+    with patch.object(btc_watch, "http_get", fake_ticker(calls)):
+        # 带 symbol 参数的话一个拼错的 symbol 每轮都是 400（-1121）
+        with pytest.raises(ValueError, match="-1121"):
+            btc_watch.http_get(btc_watch.API_URL, params={"symbol": "BTCUSDTT"})
+        assert fetch_price_map(["BTCUSDTT"]) == {}
+        assert fetch_price_map(["BTCUSDTT"]) == {}
+    assert capsys.readouterr().out.count("BTCUSDTT") == 1
+
+
+def test_price_change_alerts_vectorized():
+    prices = np.array([101.0, 98.0, np.nan, 10.0])
+    last = np.array([100.0, 100.0, 100.0, np.nan])
+    change, hit = price_change_alerts(prices, last, np.array([1.0, 3.0, 1.0, 1.0]))
+    assert change[:2].tolist() == [1.0, -2.0]
+    assert hit.tolist() == [True, False, False, False]
+
+
+def test_watch_alerts_each_symbol_against_its_own_threshold():
+    feed = {"BTCUSDT": 100.0, "ETHUSDT": 10.0, "SOLUSDT": 1.0}
+    texts, batches = [], []
+    hub = MarketHub(max_age=0)
+    hub.add_source("spot_prices", lambda: dict(feed))
+    watch = BtcWatch({"BTCUSDT": 1.0, "ETHUSDT": 1.5, "SOLUSDT": 5.0, "MISSINGUSDT": 1.0}, swing_windows={})
+    watch.setup(hub)
+
+    with patch.object(btc_watch, "send_feishu_text", texts.append), \
+            patch.object(btc_watch, "send_feishu_alerts", batches.append):
+        watch.run_round(hub.snapshot())
+        assert len(texts) == 1 and "ETHUSDT 当前价格 10.00 USDT" in texts[0]
+        assert batches == []
+
+        feed.update(BTCUSDT=100.5, ETHUSDT=10.2, SOLUSDT=0.9)
+        watch.run_round(hub.snapshot())
+        # BTC 0.5% < 1%，ETH 2% >= 1.5%，SOL -10% >= 5%，一轮合成一批
+        assert len(batches) == 1 and len(batches[0]) == 2
+        assert batches[0][0].startswith("ETHUSDT 价格上涨预警")
+        assert "SOLUSDT 价格下跌预警" in batches[0][1] and "-10.00%" in batches[0][1]
+
+        feed.update(BTCUSDT=101.2)
+        watch.run_round(hub.snapshot())
+    # BTC 相对上次通知价（100）累计 1.2% 才报；命中的 symbol 更新通知价
+    assert len(batches) == 2 and batches[1][0].startswith("BTCUSDT 价格上涨预警")
+    assert watch.last_notify.tolist()[:3] == [101.2, 10.2, 0.9]
+    assert np.isnan(watch.last_notify[3])
+    assert len(texts) == 1
@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from scripts.coingecko import CoinGeckoIndex, McCache, build_ticker_index, split_symbol
+
+COINS = [
+    {"id": "bitcoin", "symbol": "btc", "name": "Bitcoin"},
+    {"id": "bitcoin-wormhole", "symbol": "btc", "name": "Bitcoin (Wormhole)"},
+    {"id": "pepe", "symbol": "pepe", "name": "Pepe"},
+    {"id": "pepe-classic", "symbol": "pepe", "name": "Pepe Classic"},
+    {"id": "1inch", "symbol": "1inch", "name": "1inch"},
+]
+PRICES = {
+    "bitcoin": {"usd": 60000.0, "usd_market_cap": 1.2e12},
+    "bitcoin-wormhole": {"usd": 3.0, "usd_market_cap": 1e5},
+    "pepe": {"usd": 0.00001, "usd_market_cap": 4e9},
+    "pepe-classic": {"usd": 0.5, "usd_market_cap": 1e6},
+    "1inch": {"usd": 0.4, "usd_market_cap": 5e8},
+}
+
+
+class FakeCoinGecko:
+    """本地 HTTP 服务，模拟 CoinGecko 的 /coins/list 和 /simple/price。"""
+
+    def __init__(self):
+        self.requests = []
+        self.fail = False
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+                outer.requests.append((parsed.path, query))
+                if outer.fail:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                if parsed.path == "/api/v3/coins/list":
+                    body = COINS
+                elif parsed.path == "/api/v3/simple/price":
+                    ids = query["ids"][0].split(",")
+                    body = {cid: PRICES[cid] for cid in ids if cid in PRICES}
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.api_base = f"http://127.0.0.1:{self._server.server_address[1]}/api/v3"
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def price_requests(self):
+        return [q["ids"][0].split(",") for path, q in self.requests if path.endswith("/simple/price")]
+
+    def close(self):
+        self._server.shutdown()
+
+
+@pytest.fixture
+def coingecko():
+    server = FakeCoinGecko()
+    yield server
+    server.close()
+
+
+@pytest.mark.parametrize(
+    "symbol, expected",
+    [
+        ("BTCUSDT", ("btc", 1)),
+        ("1000PEPEUSDT", ("pepe", 1000)),
+        ("1000000MOGUSDT", ("mog", 1_000_000)),
+        ("1MBABYDOGEUSDT", ("babydoge", 1_000_000)),
+        ("1INCHUSDT", ("1inch", 1)),
+        ("10000SATSUSDT", ("sats", 10_000)),
+    ],
+)
+def test_split_symbol_handles_multipliers(symbol, expected):
+    assert split_symbol(symbol) == expected
+
+
+def test_build_ticker_index_groups_ids():
+    assert build_ticker_index(COINS)["btc"] == ["bitcoin", "bitcoin-wormhole"]
+
+
+def test_resolves_ids_by_price_and_remembers_them(coingecko, tmp_path):
+    path = tmp_path / "index.json"
+    index = CoinGeckoIndex(coingecko.api_base, cache_path=path)
+    cache = McCache(index)
+    cache.update(
+        ["BTCUSDT", "1000PEPEUSDT", "1INCHUSDT", "NOPEUSDT"],
+        {"BTCUSDT": 60100.0, "1000PEPEUSDT": 0.0101, "1INCHUSDT": 0.41, "NOPEUSDT": 1.0},
+    )
+    values = cache.refresh()
+    assert values == {"BTCUSDT": 1.2e12, "1000PEPEUSDT": 4e9, "1INCHUSDT": 5e8}
+
+    # 确认后的映射写盘；下一次只查确认过的 id，不存在的 symbol 不再占批次
+    cache.refresh()
+    assert sorted(coingecko.price_requests()[-1]) == ["1inch", "bitcoin", "pepe"]
+
+    reloaded = CoinGeckoIndex(coingecko.api_base, cache_path=path)
+    assert reloaded.candidates("1000PEPEUSDT") == [("pepe", 1000)]
+
+
+def test_overrides_win(coingecko):
+    index = CoinGeckoIndex(coingecko.api_base, overrides={"BTCUSDT": "bitcoin-wormhole"})
+    assert index.candidates("BTCUSDT") == [("bitcoin-wormhole", 1)]
+
+
+def test_background_refresh_serves_last_good_values(coingecko, monkeypatch):
+    monkeypatch.setattr("scripts.binance_http.HTTP_MAX_RETRIES", 0)
+    cache = McCache(CoinGeckoIndex(coingecko.api_base), refresh_seconds=0.05)
+    cache.update(["BTCUSDT"], {"BTCUSDT": 60000.0})
+    cache.start()
+    try:
+        deadline = time.time() + 5
+        while not cache.snapshot() and time.time() < deadline:
+            time.sleep(0.01)
+        assert cache.snapshot() == {"BTCUSDT": 1.2e12}
+
+        # CoinGecko 挂掉：后台刷新失败，读到的仍是上一次成功的值
+        coingecko.fail = True
+        count = cache.refresh_count
+        while cache.refresh_count < count + 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert cache.snapshot() == {"BTCUSDT": 1.2e12}
+    finally:
+        cache.stop()
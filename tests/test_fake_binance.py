@@ -0,0 +1,67 @@
+from unittest.mock import patch
+
+import pytest
+import requests
+
+import scripts.Binance_features_monitor as monitor
+import scripts.binance_features_oi_1 as oi_monitor
+from bench.fake_binance import FakeBinance
+from bench.run_bench import bench_monitor
+
+
+@pytest.fixture
+def server():
+    fake = FakeBinance(symbols=30, movers=0.2).start()
+    yield fake
+    fake.stop()
+
+
+def test_fake_endpoints_parse_with_monitor_helpers(server):
+    base = server.base_url
+    with patch.object(monitor, "FAPI_EXCHANGE_INFO", base + "/fapi/v1/exchangeInfo"), \
+            patch.object(monitor, "FAPI_PREMIUM_INDEX", base + "/fapi/v1/premiumIndex"), \
+            patch.object(monitor, "FAPI_DEPTH", base + "/fapi/v1/depth"):
+        symbols = monitor.fetch_usdt_perpetual_symbols()
+        premium = monitor.fetch_premium_index_map()
+        depth_ratio = monitor.fetch_depth_imbalance("BTCUSDT")
+    # 交割合约和非交易状态的不算
+    assert len(symbols) == 30 and "BTCUSDT_261225" not in symbols
+    assert set(premium) == set(symbols)
+    assert premium["BTCUSDT"]["mark_price"] > 0
+    assert depth_ratio is not None and depth_ratio > 0
+
+    with patch.object(oi_monitor, "FAPI_KLINES", base + "/fapi/v1/klines"), \
+            patch.object(oi_monitor, "FAPI_OI_HISTORY", base + "/futures/data/openInterestHist"):
+        closes = oi_monitor.fetch_kline_series("ETHUSDT", None, 13)
+        oi = oi_monitor.fetch_oi_series("ETHUSDT", None, 13)
+    assert len(closes) == 13 and len(oi) == 13
+    assert closes[1][0] - closes[0][0] == 300_000
+
+    stats = server.stats()
+    assert stats["requests"]["/fapi/v1/klines"] == 1
+    assert stats["bytes"]["/fapi/v1/exchangeInfo"] > 0
+
+
+def test_injected_errors_and_feishu_webhook(server):
+    base = server.base_url
+    resp = requests.post(base + "/open-apis/bot/v2/hook/x", json={"msg_type": "text"}, timeout=5)
+    assert resp.json()["code"] == 0
+    assert server.stats()["feishu_messages"] == 1
+
+    server.error_rate = 1.0
+    resp = requests.get(base + "/fapi/v1/ticker/24hr", timeout=5)
+    assert resp.status_code == 503
+    assert server.stats()["errors"] == 1
+
+
+def test_bench_monitor_reports_each_round(server, tmp_path):
+    records = bench_monitor("futures", server.base_url, rounds=2, gap=0, workdir=str(tmp_path))
+    assert [r["round"] for r in records] == [1, 2]
+    first = records[0]
+    # 第 1 轮：exchangeInfo + ticker + premiumIndex + 每个 symbol 的 OI / taker / depth
+    assert first["by_path"]["/fapi/v1/exchangeInfo"] == 1
+    assert first["by_path"]["/fapi/v1/depth"] == 30
+    assert first["requests"] >= 30 * 3
+    assert first["bytes"] > 0 and first["wall_s"] > 0
+    # 模块常量在结束后恢复
+    assert monitor.FAPI_DEPTH.startswith("https://fapi.binance.com")
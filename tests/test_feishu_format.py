@@ -0,0 +1,56 @@
+import json
+
+from scripts.feishu_format import (
+    build_table_card,
+    pack_blocks,
+    pack_table_rows,
+    payload_size,
+)
+
+
+def test_pack_blocks_fits_everything_in_one_message_when_small():
+    assert pack_blocks(["a", "b", "c"], header="H\n") == ["H\na\n\nb\n\nc"]
+
+
+def test_pack_blocks_first_fit_decreasing_and_keeps_order():
+    # 预算 102：60 + 40 放一条，50 + 30 放一条（逐条接着装、满了就换下一条会用 3 条）
+    blocks = ["a" * 50, "b" * 60, "c" * 40, "d" * 30]
+    messages = pack_blocks(blocks, max_bytes=104, sep="")
+    assert len(messages) == 2
+    assert messages == ["a" * 50 + "d" * 30, "b" * 60 + "c" * 40]
+    for message in messages:
+        assert payload_size(message) <= 104
+
+
+def test_pack_blocks_counts_escaped_unicode():
+    # 中文按 \uXXXX 编码，每个字 6 字节
+    blocks = ["中" * 10, "文" * 10]
+    messages = pack_blocks(blocks, max_bytes=100, sep="")
+    assert len(messages) == 2
+
+
+def test_pack_blocks_hard_splits_only_oversized_block():
+    messages = pack_blocks(["x" * 250, "small"], max_bytes=102, sep="")
+    assert "small" in messages[-1] or any(m.endswith("small") for m in messages)
+    assert "".join(m.replace("small", "") for m in messages) == "x" * 250
+    for message in messages:
+        assert payload_size(message) <= 102
+
+
+def test_build_table_card_structure():
+    card = build_table_card("KW 异动", [("symbol", "Symbol")], [{"symbol": "AAAUSDT"}])
+    table = card["card"]["elements"][0]
+    assert card["msg_type"] == "interactive"
+    assert table["tag"] == "table"
+    assert table["columns"][0]["name"] == "symbol"
+    assert table["rows"] == [{"symbol": "AAAUSDT"}]
+
+
+def test_pack_table_rows_splits_by_size():
+    columns = [("symbol", "Symbol"), ("note", "Note")]
+    rows = [{"symbol": f"S{i}USDT", "note": "n" * 500} for i in range(20)]
+    cards = pack_table_rows("T", columns, rows, max_bytes=3000)
+    assert len(cards) > 1
+    assert [r for c in cards for r in c["card"]["elements"][0]["rows"]] == rows
+    for card in cards:
+        assert len(json.dumps(card)) <= 3000
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import requests
+
+from scripts.feishu_format import FEISHU_MAX_PAYLOAD_BYTES
+from scripts.feishu_notifier import FeishuNotifier
+
+
+def ok_response(code=0):
+    return SimpleNamespace(status_code=200, text="ok", json=lambda: {"code": code})
+
+
+def make_notifier(clock, **kwargs):
+    return FeishuNotifier("http://feishu.local/hook", clock=clock.time, sleep=clock.sleep, **kwargs)
+
+
+def test_send_text_returns_immediately_and_delivers_in_background(clock):
+    notifier = make_notifier(clock)
+    with patch.object(notifier._session, "post", return_value=ok_response()) as post:
+        assert notifier.send_text("hello", keyword="KW") == 1
+        assert notifier.flush(2)
+    assert post.call_args.kwargs["json"] == {"msg_type": "text", "content": {"text": "KW hello"}}
+    assert notifier.stats()["sent"] == 1
+
+
+def test_failed_chunk_does_not_stop_later_chunks(clock):
+    notifier = make_notifier(clock, max_retries=0)
+    responses = [requests.ConnectionError("down"), ok_response()]
+    block = "x" * (FEISHU_MAX_PAYLOAD_BYTES // 2 + 10)
+    with patch.object(notifier._session, "post", side_effect=responses) as post:
+        assert notifier.send_text(block + "\n\n" + block) == 2
+        assert notifier.flush(2)
+    assert post.call_count == 2
+    stats = notifier.stats()
+    assert stats["sent"] == 1 and stats["failed"] == 1
+
+
+def test_retries_with_backoff_on_rate_limit_code(clock):
+    notifier = make_notifier(clock, max_retries=2, backoff_base=1.0)
+    with patch.object(notifier._session, "post", side_effect=[ok_response(code=9499), ok_response()]):
+        notifier.send_text("retry me")
+        assert notifier.flush(2)
+    stats = notifier.stats()
+    assert stats["sent"] == 1 and stats["retried"] == 1
+    assert sum(clock.sleeps) >= 1.0
+
+
+def test_rate_limit_spaces_out_bursts(clock):
+    notifier = make_notifier(clock)
+    with patch.object(notifier._session, "post", return_value=ok_response()):
+        for i in range(12):
+            notifier.send_text(f"msg {i}")
+        assert notifier.flush(2)
+    # 每秒最多 5 条：12 条至少要跨过 2 个 1 秒窗口
+    assert sum(clock.sleeps) >= 2.0
+    assert notifier.stats()["sent"] == 12
+
+
+def test_full_queue_drops_oldest(clock):
+    notifier = make_notifier(clock, max_queue=2)
+    notifier.start = lambda: None  # 不启动后台线程，只看入队行为
+    for i in range(3):
+        notifier.send_text(f"msg {i}")
+    assert notifier.stats()["dropped"] == 1
+    assert [p["content"]["text"] for p, _ in list(notifier._queue.queue)] == ["msg 1", "msg 2"]
+
+
+def test_send_blocks_keeps_alerts_whole(clock):
+    notifier = make_notifier(clock)
+    notifier.start = lambda: None
+    blocks = [f"SYM{i}USDT\n" + "y" * 5000 for i in range(6)]
+    count = notifier.send_blocks(blocks, header="[header]\n\n", keyword="KW")
+    texts = [p["content"]["text"] for p, _ in list(notifier._queue.queue)]
+    assert count == len(texts) == 2
+    assert all(t.startswith("KW [header]") for t in texts)
+    for block in blocks:
+        assert sum(block in t for t in texts) == 1
+
+
+def test_send_table_enqueues_interactive_card(clock):
+    notifier = make_notifier(clock)
+    notifier.start = lambda: None
+    rows = [{"symbol": "AAAUSDT", "price": "1.0"}]
+    assert notifier.send_table("异动", [("symbol", "Symbol"), ("price", "Price")], rows, keyword="KW") == 1
+    payload, _ = notifier._queue.get_nowait()
+    assert payload["msg_type"] == "interactive"
+    assert payload["card"]["header"]["title"]["content"] == "KW 异动"
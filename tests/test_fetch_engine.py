@@ -0,0 +1,45 @@
+import threading
+import time
+
+from scripts.fetch_engine import fetch_all
+
+
+def test_fetch_all_keeps_symbol_order_and_collects_errors():
+    def fetch_one(symbol: str) -> str:
+        if symbol == "BADUSDT":
+            raise ValueError("boom")
+        # 让前面的 symbol 更晚返回，验证结果仍按输入顺序
+        time.sleep(0.01 if symbol == "BTCUSDT" else 0)
+        return symbol.lower()
+
+    results, errors = fetch_all(["BTCUSDT", "BADUSDT", "ETHUSDT"], fetch_one, max_workers=4)
+    assert list(results) == ["BTCUSDT", "ETHUSDT"]
+    assert results["ETHUSDT"] == "ethusdt"
+    assert isinstance(errors["BADUSDT"], ValueError)
+
+
+def test_fetch_all_bounds_concurrency():
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def fetch_one(symbol: str) -> int:
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with lock:
+            active -= 1
+        return 1
+
+    results, errors = fetch_all([f"S{i}USDT" for i in range(12)], fetch_one, max_workers=3)
+    assert len(results) == 12 and not errors
+    assert peak <= 3
+
+
+def test_fetch_all_serial_when_single_worker():
+    seen = []
+    results, _ = fetch_all(["A", "B"], lambda s: seen.append(s) or s, max_workers=1)
+    assert seen == ["A", "B"]
+    assert results == {"A": "A", "B": "B"}
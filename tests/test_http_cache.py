@@ -0,0 +1,128 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+import scripts.binance_http as binance_http
+from scripts.http_cache import ResponseCache, make_key, period_expiry
+
+OI_URL = "https://fapi.binance.com/futures/data/openInterestHist"
+
+
+def test_period_expiry_aligns_to_next_boundary():
+    params = {"symbol": "BTCUSDT", "period": "5m", "limit": 3}
+    # 12:01:40 -> 下一个 5m 边界 12:05:00 + 15s
+    now = 1_700_000_000 - (1_700_000_000 % 300) + 100
+    assert period_expiry(OI_URL, params, now, 15) == now - 100 + 300 + 15
+    # 刚过边界 5 秒：只缓存到 grace 结束，之后重新拉新周期的数据
+    just_after = now - 100 + 5
+    assert period_expiry(OI_URL, params, just_after, 15) == just_after - 5 + 15
+
+
+def test_period_expiry_skips_non_period_endpoints():
+    assert period_expiry("https://fapi.binance.com/fapi/v1/klines", {"interval": "5m"}, 0, 15) is None
+    assert period_expiry(OI_URL, {"symbol": "BTCUSDT"}, 0, 15) is None
+
+
+def test_make_key_ignores_param_order():
+    assert make_key(OI_URL, {"a": 1, "b": 2}) == make_key(OI_URL, {"b": 2, "a": 1})
+
+
+def test_cache_hits_until_expiry():
+    now = [100.0]
+    cache = ResponseCache(clock=lambda: now[0])
+    calls = []
+    fetch = lambda: calls.append(1) or len(calls)  # noqa: E731
+
+    assert cache.get_or_fetch(("k", ()), 200.0, fetch) == 1
+    assert cache.get_or_fetch(("k", ()), 200.0, fetch) == 1
+    now[0] = 201.0
+    assert cache.get_or_fetch(("k", ()), 300.0, fetch) == 2
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_concurrent_identical_requests_share_one_fetch():
+    cache = ResponseCache()
+    started = threading.Event()
+    calls = []
+
+    def slow_fetch():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return "payload"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_fetch(("k", ()), time.time() + 60, slow_fetch)))
+        for _ in range(5)
+    ]
+    threads[0].start()
+    started.wait(1)
+    for t in threads[1:]:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == [1]
+    assert results == ["payload"] * 5
+    assert cache.coalesced == 4
+
+
+def test_failed_fetch_is_not_cached():
+    cache = ResponseCache()
+
+    def boom():
+        raise ValueError("down")
+
+    with pytest.raises(ValueError):
+        cache.get_or_fetch(("k", ()), time.time() + 60, boom)
+    assert cache.get_or_fetch(("k", ()), time.time() + 60, lambda: "ok") == "ok"
+
+
+def test_http_get_serves_period_data_from_cache():
+    resp = SimpleNamespace(status_code=200, headers={}, raise_for_status=lambda: None)
+    with patch.object(binance_http, "response_cache", ResponseCache()), patch.object(
+        binance_http.session, "get", return_value=resp
+    ) as get:
+        params = {"symbol": "BTCUSDT", "period": "5m", "limit": 3}
+        assert binance_http.http_get(OI_URL, params=params) is resp
+        assert binance_http.http_get(OI_URL, params=dict(params)) is resp
+    assert get.call_count == 1
+
+
+def test_http_get_coalesces_in_flight_requests_without_caching_them():
+    resp = SimpleNamespace(status_code=200, headers={}, raise_for_status=lambda: None)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_get(url, params=None, timeout=None):
+        started.set()
+        release.wait(1)
+        return resp
+
+    url = "https://fapi.binance.com/fapi/v1/klines"
+    params = {"symbol": "BTCUSDT", "interval": "5m", "limit": 2}
+    cache = ResponseCache()
+    with patch.object(binance_http, "response_cache", cache), patch.object(
+        binance_http.session, "get", side_effect=slow_get
+    ) as get:
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(binance_http.http_get(url, params=params)))]
+        threads[0].start()
+        started.wait(1)
+        threads += [threading.Thread(target=lambda: results.append(binance_http.http_get(url, params=params)))
+                    for _ in range(3)]
+        for t in threads[1:]:
+            t.start()
+        deadline = time.time() + 5
+        while cache.coalesced < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+        # 在途时合并成一次；K 线不按周期缓存，之后的请求重新拉
+        assert get.call_count == 1 and results == [resp] * 4
+        binance_http.http_get(url, params=params)
+    assert get.call_count == 2 and len(cache) == 0
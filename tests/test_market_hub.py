@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+
+import scripts.binance_features_OI as oi_basic
+import scripts.binance_features_oi_1 as oi_monitor
+from bench.fake_binance import FakeBinance
+from bench.run_bench import bench_hub
+from scripts.market_hub import MarketHub, next_tick, run_plugins, universe_changes
+
+
+def test_source_is_fetched_once_per_round_and_reused_within_max_age(clock):
+    calls = []
+    hub = MarketHub(max_age=5, clock=clock.time)
+    hub.add_source("ticker", lambda: calls.append(1) or {"BTCUSDT": {"lastPrice": "1"}})
+    # 同名的源先注册的生效
+    hub.add_source("ticker", lambda: pytest.fail("second registration must be ignored"))
+
+    first = hub.snapshot()
+    assert first.get("ticker") == {"BTCUSDT": {"lastPrice": "1"}}
+    first.get("ticker")
+    hub.snapshot().get("ticker")
+    assert len(calls) == 1
+
+    clock.now += 6
+    hub.snapshot().get("ticker")
+    assert len(calls) == 2
+
+
+def test_failed_source_returns_default_and_unknown_source():
+    hub = MarketHub(max_age=0)
+
+    def broken():
+        raise ConnectionError("down")
+
+    hub.add_source("premium", broken)
+    snapshot = hub.snapshot()
+    assert snapshot.get("premium", {}) == {}
+    assert isinstance(snapshot.errors["premium"], ConnectionError)
+    assert snapshot.get("missing") is None
+    assert isinstance(snapshot.errors["missing"], KeyError)
+
+
+def test_series_store_is_shared_by_name_and_grows_before_use():
+    hub = MarketHub()
+    small = hub.series_store("fapi_5m", 13, 300_000)
+    large = hub.series_store("fapi_5m", 25, 300_000)
+    assert small is large and large.capacity == 25
+    # 已经够大的不缩
+    assert hub.series_store("fapi_5m", 5, 300_000).capacity == 25
+    with pytest.raises(ValueError):
+        hub.series_store("fapi_5m", 13, 60_000)
+    large.buffer("BTCUSDT", "oi")
+    with pytest.raises(ValueError):
+        hub.series_store("fapi_5m", 50, 300_000)
+
+
+def test_universe_changes_and_aligned_ticks():
+    assert universe_changes(["A", "B"], ["B", "C", "D"]) == (["C", "D"], ["A"])
+    assert next_tick(125.0, 60) == 180.0
+    assert next_tick(120.0, 60) == 180.0
+
+
+def test_plugins_in_threads_share_one_fetch():
+    calls = []
+    started = threading.Event()
+
+    def slow_fetch():
+        calls.append(1)
+        started.wait(1)
+        return {"BTCUSDT": 1.0}
+
+    class Plugin:
+        interval = 3600
+
+        def __init__(self, name):
+            self.name = name
+            self.seen = threading.Event()
+
+        def setup(self, hub):
+            hub.add_source("spot_prices", slow_fetch)
+
+        def run_round(self, snapshot):
+            assert snapshot.get("spot_prices") == {"BTCUSDT": 1.0}
+            self.seen.set()
+
+    hub = MarketHub(max_age=60)
+    plugins = [Plugin("a"), Plugin("b")]
+    stop = threading.Event()
+    threads = run_plugins(hub, plugins, stop)
+    started.set()
+    assert all(p.seen.wait(5) for p in plugins)
+    stop.set()
+    for thread in threads:
+        thread.join(5)
+    # 两个插件同时要，第二个等第一个的结果
+    assert len(calls) == 1
+
+
+def test_monitors_as_plugins_fetch_shared_data_once(tmp_path):
+    server = FakeBinance(symbols=30, movers=0.2).start()
+    try:
+        original_store = oi_monitor.series_store
+        records = bench_hub(server.base_url, plugins=("oi1", "oi", "futures"), rounds=2, gap=0, workdir=str(tmp_path))
+    finally:
+        server.stop()
+    first, second = records
+    # 启动 + 第 1 轮：合约列表只拉一次，三个插件都要的 24hr ticker 每轮也只拉一次
+    assert first["by_path"]["/fapi/v1/exchangeInfo"] == 1
+    assert first["by_path"]["/fapi/v1/ticker/24hr"] == 1
+    assert second["by_path"]["/fapi/v1/ticker/24hr"] == 1
+    assert second["by_path"]["/fapi/v1/premiumIndex"] == 1
+    # 插件改写的模块变量在结束后恢复
+    assert oi_monitor.series_store is original_store
+    assert oi_basic.oi_store.capacity == oi_basic.OI_POINTS
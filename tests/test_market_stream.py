@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+from unittest.mock import patch
+
+from websockets.sync.server import serve
+
+import scripts.market_stream as market_stream
+from scripts.market_stream import MarketStream
+
+
+class FakeBinanceStream:
+    """本地 WebSocket 服务，模拟 fstream 的组合流：收 SUBSCRIBE，按脚本推送消息。"""
+
+    def __init__(self, script_per_connection):
+        self.script_per_connection = script_per_connection
+        self.subscriptions = []
+        self.connections = 0
+        self._server = serve(self._handler, "127.0.0.1", 0)
+        self.url = f"ws://127.0.0.1:{self._server.socket.getsockname()[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def _handler(self, ws):
+        idx = self.connections
+        self.connections += 1
+        sub = json.loads(ws.recv())
+        self.subscriptions.append(sub["params"])
+        ws.send(json.dumps({"result": None, "id": sub["id"]}))
+        script = self.script_per_connection[min(idx, len(self.script_per_connection) - 1)]
+        for stream, data in script:
+            ws.send(json.dumps({"stream": stream, "data": data}))
+        if idx < len(self.script_per_connection) - 1:
+            return  # 主动断开，测试客户端重连
+        try:
+            ws.recv()
+        except Exception:  # noqa: BLE001
+            pass
+
+    def close(self):
+        self._server.shutdown()
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def kline(symbol, open_time, close):
+    return {"e": "kline", "s": symbol, "k": {"t": open_time, "i": "15m", "c": str(close), "x": False}}
+
+
+def test_stream_updates_state_and_resubscribes_after_disconnect():
+    first = [
+        ("!markPrice@arr@1s", [{"s": "BTCUSDT", "p": "100.5", "i": "100", "r": "0.0001", "T": 123}]),
+        ("btcusdt@kline_15m", kline("BTCUSDT", 0, 100)),
+    ]
+    second = [
+        ("!ticker@arr", [{"s": "BTCUSDT", "c": "110", "P": "5.5", "q": "1000000"}]),
+        ("btcusdt@kline_15m", kline("BTCUSDT", 900_000, 110)),
+    ]
+    server = FakeBinanceStream([first, second])
+    stream = MarketStream(["BTCUSDT"], kline_intervals=["15m"], base_url=server.url)
+    with patch.object(market_stream, "RECONNECT_MIN_DELAY", 0.05):
+        stream.start()
+        try:
+            assert wait_until(lambda: stream.price_change("BTCUSDT", "15m") is not None)
+        finally:
+            stream.stop()
+            server.close()
+
+    # 断线后重连，并且两次连接都完整订阅了同一组 stream
+    assert server.connections >= 2
+    assert server.subscriptions[0] == server.subscriptions[1]
+    assert "btcusdt@kline_15m" in server.subscriptions[0]
+
+    pct, last = stream.price_change("BTCUSDT", "15m")
+    assert last == 110.0
+    assert round(pct, 2) == 10.0
+    assert stream.premium_map()["BTCUSDT"]["mark_price"] == 100.5
+    assert stream.ticker_map()["BTCUSDT"]["quoteVolume"] == 1_000_000.0
+
+
+def test_seed_kline_fills_history_until_stream_rolls_over():
+    stream = MarketStream(["ETHUSDT"], kline_intervals=["15m"])
+    stream.handle_message(json.dumps({"stream": "ethusdt@kline_15m", "data": kline("ETHUSDT", 900_000, 99)}))
+    assert stream.price_change("ETHUSDT", "15m") is None
+
+    stream.seed_kline("ETHUSDT", "15m", 900_000, [90.0, 95.0])
+    pct, last = stream.price_change("ETHUSDT", "15m")
+    # 推送的最新收盘价优先于 REST 预热值
+    assert last == 99.0
+    assert round(pct, 2) == 10.0
+    assert stream.closes("ETHUSDT", "15m") == [90.0, 99.0]
+
+
+def test_streams_split_across_connections():
+    symbols = [f"S{i}USDT" for i in range(150)]
+    stream = MarketStream(symbols, kline_intervals=["15m", "1h"])
+    groups = stream._connection_groups()
+    assert len(stream.streams()) == 302
+    assert all(len(g) <= market_stream.STREAMS_PER_CONNECTION for g in groups)
+    assert sum(len(g) for g in groups) == 302
+
+
+def test_stale_entries_are_dropped_so_callers_fall_back_to_rest(clock):
+    stream = MarketStream(["BTCUSDT", "ETHUSDT"], max_age=20, clock=clock)
+    stream.handle_message(json.dumps({"stream": "!markPrice@arr@1s", "data": [
+        {"s": "BTCUSDT", "p": "100", "i": "100"}, {"s": "ETHUSDT", "p": "10", "i": "10"},
+    ]}))
+    stream.handle_message(json.dumps({"stream": "!ticker@arr", "data": [{"s": "BTCUSDT", "c": "100", "q": "1"}]}))
+
+    clock.now += 15
+    stream.handle_message(json.dumps({"stream": "!markPrice@arr@1s", "data": [{"s": "BTCUSDT", "p": "101", "i": "100"}]}))
+    clock.now += 10
+    # ETH 标记价格 25 秒没推送、BTC ticker 也 25 秒没推送：都不返回
+    assert list(stream.premium_map()) == ["BTCUSDT"]
+    assert stream.ticker_map() == {}
+
+    # 推送整个停了：整张表都过期，调用方拿到空表回退到 REST
+    clock.now += 30
+    assert stream.premium_map() == {}
+    # 不设 max_age 时照旧返回最后状态
+    stream.max_age = None
+    assert set(stream.premium_map()) == {"BTCUSDT", "ETHUSDT"}
+
+
+def test_reconnect_gap_invalidates_history_until_reseeded():
+    first = [
+        ("solusdt@kline_15m", kline("SOLUSDT", 0, 100)),
+        ("solusdt@kline_15m", kline("SOLUSDT", 900_000, 101)),
+    ]
+    # 断线期间 1_800_000 那根 K 线没收到，重连后直接推 2_700_000
+    second = [("solusdt@kline_15m", kline("SOLUSDT", 2_700_000, 130))]
+    server = FakeBinanceStream([first, second])
+    stream = MarketStream(["SOLUSDT"], kline_intervals=["15m"], base_url=server.url)
+    with patch.object(market_stream, "RECONNECT_MIN_DELAY", 0.05):
+        stream.start()
+        try:
+            assert wait_until(lambda: stream.kline_gaps() == [("SOLUSDT", "15m")])
+        finally:
+            stream.stop()
+            server.close()
+
+    # 101 -> 130 跨了两根 K 线，不能当成 15m 变化；history 作废，调用方回退到 REST
+    assert stream.price_change("SOLUSDT", "15m") is None
+    assert stream.closes("SOLUSDT", "15m") == [130.0]
+
+    stream.seed_kline("SOLUSDT", "15m", 2_700_000, [101.0, 120.0, 129.0])
+    assert stream.kline_gaps() == []
+    assert stream.closes("SOLUSDT", "15m") == [101.0, 120.0, 130.0]
+    pct, last = stream.price_change("SOLUSDT", "15m")
+    assert last == 130.0 and round(pct, 2) == 8.33
+
+
+def test_consecutive_klines_are_not_a_gap():
+    stream = MarketStream(["ETHUSDT"], kline_intervals=["15m"])
+    for open_time, close in [(0, 10), (900_000, 11), (1_800_000, 12)]:
+        stream.handle_message(json.dumps({"stream": "ethusdt@kline_15m", "data": kline("ETHUSDT", open_time, close)}))
+    assert stream.kline_gaps() == []
+    assert stream.closes("ETHUSDT", "15m") == [10.0, 11.0, 12.0]
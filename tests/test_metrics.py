@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+import requests
+
+import scripts.binance_http as binance_http
+from scripts.fetch_engine import FETCH_ERRORS, fetch_all
+from scripts.metrics import REGISTRY, Registry, observe_round, start_metrics_server
+from scripts.pipeline import Stage, StagedPipeline
+
+
+def response(status_code):
+    return SimpleNamespace(status_code=status_code, headers={}, raise_for_status=lambda: None)
+
+
+def test_render_counter_gauge_histogram_and_stats():
+    registry = Registry()
+    errors = registry.counter("errors_total", "Errors", ("error",))
+    errors.inc(error="Timeout")
+    errors.inc(2, error="Timeout")
+    registry.gauge("queue_size", "Queue").set(3)
+    latency = registry.histogram("latency_seconds", "Latency", ("endpoint",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        latency.observe(value, endpoint="/fapi/v1/klines")
+    registry.register_stats("cache", lambda: {"hits": 4, "hit_rate": 0.5, "name": "x"})
+    registry.register_stats("weight", lambda: {"used": 10}, {"limiter": "fapi"})
+    registry.register_stats("weight", lambda: {"used": 20}, {"limiter": "spot"})
+
+    lines = registry.render().splitlines()
+    assert 'errors_total{error="Timeout"} 3' in lines
+    assert "queue_size 3" in lines
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{endpoint="/fapi/v1/klines",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{endpoint="/fapi/v1/klines",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{endpoint="/fapi/v1/klines",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{endpoint="/fapi/v1/klines"} 3' in lines
+    assert "cache_hits 4" in lines and "cache_hit_rate 0.5" in lines
+    # 非数值键不输出；同名 gauge 的多组标签只有一个 TYPE 行
+    assert not any(line.startswith("cache_name") for line in lines)
+    assert lines.count("# TYPE weight_used gauge") == 1
+    assert 'weight_used{limiter="spot"} 20' in lines
+
+    with pytest.raises(ValueError):
+        errors.inc(endpoint="/x")
+    # 同名再声明拿到的是同一个指标
+    assert registry.counter("errors_total", "Errors", ("error",)) is errors
+
+
+def test_observe_round_counts_overruns():
+    registry_text = lambda: REGISTRY.render().splitlines()  # noqa: E731
+    observe_round("test", 12.0, 60)
+    observe_round("test", 75.0, 60)
+    lines = registry_text()
+    assert 'monitor_round_overruns_total{monitor="test"} 1' in lines
+    assert 'monitor_round_overrun_seconds_total{monitor="test"} 15' in lines
+    assert 'monitor_round_seconds_count{monitor="test"} 2' in lines
+    assert 'monitor_round_interval_seconds{monitor="test"} 60' in lines
+
+
+def test_http_get_and_fetch_errors_are_instrumented():
+    url = "https://fapi.binance.com/fapi/v1/premiumIndex"
+    responses = [response(503), response(200), requests.ConnectionError("down")]
+    before_ok = binance_http.REQUESTS.value(endpoint="/fapi/v1/premiumIndex", status=200)
+    before_weight = binance_http.WEIGHT_USED.value(limiter="fapi")
+    with patch.object(binance_http.session, "get", side_effect=responses), patch.object(binance_http.time, "sleep"):
+        binance_http.http_get(url)
+        with pytest.raises(requests.ConnectionError):
+            binance_http.http_get(url)
+
+    assert binance_http.REQUESTS.value(endpoint="/fapi/v1/premiumIndex", status=200) == before_ok + 1
+    assert binance_http.REQUESTS.value(endpoint="/fapi/v1/premiumIndex", status=503) >= 1
+    assert binance_http.REQUEST_ERRORS.value(endpoint="/fapi/v1/premiumIndex", error="ConnectionError") >= 1
+    assert binance_http.REQUEST_SECONDS.count(endpoint="/fapi/v1/premiumIndex") >= 2
+    # premiumIndex 不带 symbol 权重 10，三次请求
+    assert binance_http.WEIGHT_USED.value(limiter="fapi") == before_weight + 30
+
+    def fetch_one(symbol):
+        if symbol == "BAD":
+            raise KeyError(symbol)
+        return symbol
+
+    before = FETCH_ERRORS.value(error="KeyError")
+    fetch_all(["OK", "BAD"], fetch_one, max_workers=2)
+    assert FETCH_ERRORS.value(error="KeyError") == before + 1
+
+
+def test_pipeline_reports_stage_seconds():
+    pipeline = StagedPipeline([Stage("bulk", screen=lambda rows: rows), Stage("kline", fetch=lambda s: {"x": 1.0})])
+    pipeline.run(["AAA", "BBB"])
+    assert [st.name for st in pipeline.stats] == ["bulk", "kline"]
+    assert all(st.seconds >= 0 for st in pipeline.stats)
+
+
+def test_metrics_endpoint_serves_registry():
+    registry = Registry()
+    registry.counter("scrapes_total", "Scrapes").inc()
+    server = start_metrics_server(0, registry=registry)
+    assert server is not None
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        resp = requests.get(base + "/metrics", timeout=5)
+        assert resp.status_code == 200
+        assert resp.headers["Content-Type"].startswith("text/plain")
+        assert "scrapes_total 1" in resp.text.splitlines()
+        assert requests.get(base + "/other", timeout=5).status_code == 404
+        # 端口被占用时不抛异常
+        assert start_metrics_server(server.server_address[1]) is None
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,215 @@
+import json
+import random
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from websockets.sync.server import serve
+
+import scripts.Binance_features_monitor as monitor
+import scripts.market_stream as market_stream
+from scripts.order_book import OrderBook, OrderBookStream, _BookSide
+
+
+def top_notional(levels, depth, descending):
+    prices = sorted(levels, reverse=descending)[:depth]
+    return sum(p * levels[p] for p in prices)
+
+
+@pytest.mark.parametrize("descending", [True, False])
+def test_running_top_n_notional_matches_full_recompute(descending):
+    rng = random.Random(7)
+    side = _BookSide(descending, depth=5, max_levels=40)
+    shadow = {}
+    for _ in range(2000):
+        price = float(rng.randint(90, 130))
+        qty = 0.0 if rng.random() < 0.3 else float(rng.randint(1, 9))
+        side.set(price, qty)
+        if qty > 0:
+            shadow[price] = qty
+        else:
+            shadow.pop(price, None)
+        assert side.notional == pytest.approx(top_notional(shadow, 5, descending))
+    assert side.best() == (max(shadow) if descending else min(shadow))
+
+
+def test_trims_levels_beyond_max_and_loads_snapshot():
+    side = _BookSide(False, depth=2, max_levels=3)
+    side.load([["10", "1"], ["11", "2"], ["12", "1"], ["13", "5"], ["9", "0"]])
+    assert sorted(side.levels) == [10.0, 11.0, 12.0]
+    assert side.notional == pytest.approx(10 + 22)
+    side.set(9.5, 2)
+    assert sorted(side.levels) == [9.5, 10.0, 11.0]
+    assert side.notional == pytest.approx(19 + 10)
+    # 截掉的档位之外本地不知道，前 2 档仍在保留的区间里
+    assert side.covered()
+
+
+def diff(first, last, prev, bids=(), asks=()):
+    return {"e": "depthUpdate", "s": "BTCUSDT", "U": first, "u": last, "pu": prev, "b": list(bids), "a": list(asks)}
+
+
+SNAPSHOT = {"lastUpdateId": 100, "bids": [["99", "1"], ["98", "1"]], "asks": [["101", "1"], ["102", "2"]]}
+
+
+def test_sequence_handling_buffers_bridges_and_detects_gaps():
+    book = OrderBook("BTCUSDT", depth=2)
+    # 快照前的推送先缓存；u < lastUpdateId 的在快照后丢掉
+    assert book.apply_diff(diff(90, 95, 89, bids=[["99", "9"]]))
+    assert book.apply_diff(diff(96, 105, 95, bids=[["99", "3"]]))
+    assert book.imbalance() is None
+    assert book.apply_snapshot(SNAPSHOT)
+    assert book.synced and book.last_update_id == 105
+    assert book.imbalance() == pytest.approx((99 * 3 + 98) / (101 + 204))
+
+    assert book.apply_diff(diff(106, 110, 105, asks=[["101", "0"], ["103", "1"]]))
+    assert book.asks.notional == pytest.approx(204 + 103)
+    # pu 接不上：丢了推送，清空等重新同步
+    assert not book.apply_diff(diff(115, 120, 112))
+    assert not book.synced and book.imbalance() is None
+
+
+def test_snapshot_newer_than_first_buffered_event_is_a_gap():
+    book = OrderBook("BTCUSDT")
+    book.apply_diff(diff(120, 130, 119))
+    # 第一条可用推送的 U 必须 <= lastUpdateId
+    assert not book.apply_snapshot(SNAPSHOT)
+    assert book.apply_snapshot(dict(SNAPSHOT, lastUpdateId=125))
+    assert book.synced and book.last_update_id == 130
+
+
+def test_price_trending_past_snapshot_range_forces_resync():
+    # 快照 limit=4：两侧都拿满 4 档，说明更远的价位没拉到
+    snapshot = {
+        "lastUpdateId": 100,
+        "bids": [[str(p), "1"] for p in (99, 98, 97, 96)],
+        "asks": [[str(p), "1"] for p in (101, 102, 103, 104)],
+    }
+    book = OrderBook("BTCUSDT", depth=2, snapshot_limit=4)
+    assert book.apply_snapshot(snapshot)
+
+    # 价格往上走：卖盘被吃掉，新挂的买盘往上堆；前 2 档卖盘还在快照区间里
+    assert book.apply_diff(diff(99, 101, 98, bids=[["100", "2"]], asks=[["101", "0"], ["102", "0"]]))
+    assert book.imbalance() == pytest.approx((200 + 99) / (103 + 104))
+    # 再往上：104 之外的价位快照没拉到，105 是推送里新出现的，104~105 之间有没有挂单本地不知道
+    assert not book.apply_diff(diff(102, 102, 101, asks=[["103", "0"], ["105", "1"]]))
+    assert book.out_of_range and not book.synced and book.imbalance() is None
+
+    # 重拉的快照覆盖新区间后照常同步
+    assert book.apply_snapshot({"lastUpdateId": 102, "bids": snapshot["bids"], "asks": [["105", "1"], ["105.5", "2"]]})
+    assert book.synced and not book.out_of_range
+    assert book.imbalance() == pytest.approx((99 + 98) / (105 + 211))
+
+    # 一侧被吃到不足 2 档、快照又没拉全：同样要重拉
+    thin = OrderBook("BTCUSDT", depth=2, snapshot_limit=4)
+    assert thin.apply_snapshot(snapshot)
+    assert not thin.apply_diff(diff(99, 101, 98, bids=[["99", "0"], ["98", "0"], ["97", "0"]]))
+    assert thin.out_of_range
+
+    # 快照没到 limit（整个盘口就这么几档）：不足 2 档也是可信的
+    whole = OrderBook("BTCUSDT", depth=2, snapshot_limit=1000)
+    assert whole.apply_snapshot(snapshot)
+    assert whole.apply_diff(diff(99, 101, 98, bids=[["99", "0"], ["98", "0"], ["97", "0"]]))
+    assert whole.imbalance() == pytest.approx(96 / (101 + 102))
+
+
+def test_stream_requests_snapshot_when_book_runs_past_snapshot_range():
+    books = OrderBookStream(["BTCUSDT"], fetch_snapshot=lambda s: SNAPSHOT, depth=2, snapshot_limit=2)
+    books._books["BTCUSDT"].apply_snapshot(SNAPSHOT)
+    books.handle_message(json.dumps({"stream": "btcusdt@depth@100ms", "data": diff(99, 101, 98, asks=[["101", "0"]])}))
+    stats = books.stats()
+    assert stats["out_of_range"] == 1 and stats["gaps"] == 0
+    assert books._resync.get_nowait() == "BTCUSDT"
+
+
+class DepthServer:
+    """本地 WebSocket：收 SUBSCRIBE 后按顺序推深度增量。"""
+
+    def __init__(self, events):
+        self.events = events
+        self.subscriptions = []
+        self._server = serve(self._handler, "127.0.0.1", 0)
+        self.url = f"ws://127.0.0.1:{self._server.socket.getsockname()[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def _handler(self, ws):
+        sub = json.loads(ws.recv())
+        self.subscriptions.append(sub["params"])
+        for event in self.events:
+            ws.send(json.dumps({"stream": "btcusdt@depth@100ms", "data": event}))
+            time.sleep(0.01)
+        try:
+            ws.recv()
+        except Exception:  # noqa: BLE001
+            pass
+
+    def close(self):
+        self._server.shutdown()
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_stream_syncs_books_and_resyncs_after_gap():
+    events = [
+        diff(95, 101, 94, bids=[["99", "2"]]),
+        diff(102, 104, 101, asks=[["101", "3"]]),
+        # 断档，重新拉快照
+        diff(110, 112, 108),
+        diff(113, 114, 112, bids=[["97", "1"]]),
+    ]
+    snapshots = [SNAPSHOT, dict(SNAPSHOT, lastUpdateId=111)]
+    calls = []
+
+    def fetch_snapshot(symbol):
+        calls.append(symbol)
+        # 等第一条推送缓存好再返回，模拟 REST 比推送慢
+        time.sleep(0.05)
+        return snapshots[min(len(calls), len(snapshots)) - 1]
+
+    server = DepthServer(events)
+    books = OrderBookStream([], fetch_snapshot=fetch_snapshot, depth=2, base_url=server.url)
+    with patch.object(market_stream, "RECONNECT_MIN_DELAY", 0.05):
+        books.start()
+        books.add_symbols(["BTCUSDT"])
+        try:
+            assert wait_until(lambda: books.stats()["snapshots"] >= 2 and books.synced("BTCUSDT"))
+            assert wait_until(lambda: books._books["BTCUSDT"].last_update_id == 114)
+        finally:
+            books.stop()
+            server.close()
+
+    assert server.subscriptions[0] == ["btcusdt@depth@100ms"]
+    assert calls == ["BTCUSDT", "BTCUSDT"]
+    assert books.stats()["gaps"] >= 1
+    # 第二次快照之后：买 99x1 98x1（前 2 档），卖 101x1 102x2
+    assert books.imbalance("BTCUSDT") == pytest.approx((99 + 98) / (101 + 204))
+    books.remove_symbols(["BTCUSDT"])
+    assert books.imbalance("BTCUSDT") is None
+
+
+def test_symbol_snapshot_reads_synced_book_instead_of_rest():
+    books = OrderBookStream(["BTCUSDT"], fetch_snapshot=lambda s: SNAPSHOT, depth=2)
+    books.handle_message(json.dumps({"stream": "btcusdt@depth@100ms", "data": diff(99, 101, 98)}))
+    books._books["BTCUSDT"].apply_snapshot(SNAPSHOT)
+
+    with patch.object(monitor, "order_books", books), \
+            patch.object(monitor, "fetch_oi_change", return_value=(1.0, 10.0)), \
+            patch.object(monitor, "fetch_taker_trend", return_value=(1.1, 0.1)), \
+            patch.object(monitor, "fetch_depth_imbalance", side_effect=AssertionError("REST depth called")):
+        _, _, _, _, depth_ratio = monitor.fetch_symbol_snapshot("BTCUSDT")
+    assert depth_ratio == pytest.approx((99 + 98) / (101 + 204))
+
+    # 还没同步的 symbol 仍然走 REST
+    with patch.object(monitor, "order_books", books), \
+            patch.object(monitor, "fetch_oi_change", return_value=(1.0, 10.0)), \
+            patch.object(monitor, "fetch_taker_trend", return_value=(1.1, 0.1)), \
+            patch.object(monitor, "fetch_depth_imbalance", return_value=1.5):
+        assert monitor.fetch_symbol_snapshot("ETHUSDT")[-1] == 1.5
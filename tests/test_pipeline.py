@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+import scripts.binance_features_OI as oi_basic
+import scripts.binance_features_oi_1 as oi_monitor
+from scripts.pipeline import Stage, StagedPipeline
+
+
+def test_pipeline_only_fetches_survivors_and_counts_each_stage():
+    calls = {"price": [], "oi": []}
+
+    def fetch_price(symbol):
+        calls["price"].append(symbol)
+        if symbol == "ERRUSDT":
+            raise RuntimeError("boom")
+        return {"price": {"AAAUSDT": 12.0, "BBBUSDT": 1.0, "CCCUSDT": -15.0}[symbol]}
+
+    def fetch_oi(symbol):
+        calls["oi"].append(symbol)
+        return {"oi": 20.0}
+
+    pipeline = StagedPipeline(
+        [
+            Stage("bulk", screen=lambda rows: [s for s in rows if rows[s]["volume"] >= 10]),
+            Stage("kline", fetch=fetch_price, screen=lambda rows: [s for s in rows if abs(rows[s]["price"]) >= 10]),
+            Stage("oi", fetch=fetch_oi),
+        ],
+        max_workers=1,
+    )
+    bulk = {"AAAUSDT": {"volume": 50}, "BBBUSDT": {"volume": 50}, "CCCUSDT": {"volume": 50},
+            "ERRUSDT": {"volume": 50}, "DDDUSDT": {"volume": 1}}
+    rows = pipeline.run(list(bulk), rows=bulk)
+
+    assert list(rows) == ["AAAUSDT", "CCCUSDT"]
+    assert rows["CCCUSDT"] == {"volume": 50, "price": -15.0, "oi": 20.0}
+    assert "DDDUSDT" not in calls["price"]
+    assert calls["oi"] == ["AAAUSDT", "CCCUSDT"]
+    assert list(pipeline.errors) == ["ERRUSDT"]
+    # 被筛掉的 symbol 也保留已拉到的指标（快照记录用）
+    assert pipeline.rows["BBBUSDT"] == {"volume": 50, "price": 1.0}
+    assert pipeline.rows["DDDUSDT"] == {"volume": 1}
+    assert [(st.name, st.entered, st.passed) for st in pipeline.stats] == [
+        ("bulk", 5, 4), ("kline", 4, 2), ("oi", 2, 2)
+    ]
+    assert pipeline.describe() == "bulk 5→4 | kline 4→2 (err 1) | oi 2→2"
+
+
+def test_oi_monitor_skips_oi_for_symbols_failing_price_or_mc():
+    ticker = {s: {"priceChangePercent": "0", "quoteVolume": "1e7"} for s in ("AAAUSDT", "BBBUSDT", "NOMCUSDT")}
+    mc = {"AAAUSDT": 1e8, "BBBUSDT": 1e8}
+    prices = {"AAAUSDT": 12.0, "BBBUSDT": 0.5, "NOMCUSDT": 30.0}
+
+    def fake_kline(symbol):
+        return {"last_price": 1.0, "price_15m_pct": 0.0, "price_1h_pct": prices[symbol]}
+
+    def fake_oi(symbol):
+        return {"oi_notional": 5e6, "oi_15m_pct": 0.0, "oi_1h_pct": 11.0}
+
+    with patch.object(oi_monitor, "fetch_kline_metrics", side_effect=fake_kline) as kline, patch.object(
+        oi_monitor, "fetch_oi_metrics", side_effect=fake_oi
+    ) as oi:
+        pipeline = oi_monitor.build_pipeline(oi_monitor.required_sources(oi_monitor.rule_set), ticker, mc)
+        rows = pipeline.run(list(ticker))
+
+    # NOMCUSDT 在 bulk 阶段就因为没有 MC 被筛掉，BBBUSDT 价格不够不拉 OI
+    assert [c.args[0] for c in kline.call_args_list] == ["AAAUSDT", "BBBUSDT"]
+    assert [c.args[0] for c in oi.call_args_list] == ["AAAUSDT"]
+    assert list(rows) == ["AAAUSDT"]
+
+
+def test_oi_basic_pipeline_ranks_and_screens():
+    ticker = {
+        "AAAUSDT": {"quoteVolume": "5e6", "lastPrice": "1", "highPrice": "1", "lowPrice": "1"},
+        "BBBUSDT": {"quoteVolume": "9e6", "lastPrice": "1", "highPrice": "1", "lowPrice": "1"},
+        "LOWUSDT": {"quoteVolume": "10", "lastPrice": "1", "highPrice": "1", "lowPrice": "1"},
+    }
+    with patch.object(oi_basic, "fetch_price_stage", return_value={"price_1h_pct": -20.0, "last_price": 1.0}), \
+            patch.object(oi_basic, "fetch_oi_stage", return_value={"oi_1h_pct": 15.0, "oi_notional": 1e6}):
+        pipeline = oi_basic.build_pipeline(ticker)
+        rows = pipeline.run(list(ticker))
+    assert list(rows) == ["AAAUSDT", "BBBUSDT"]
+    assert pipeline.stats[0].passed == 2
@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+import scripts.binance_http as binance_http
+from scripts.rate_limiter import WeightLimiter, request_weight
+
+
+class MockResponse(SimpleNamespace):
+    text: str = "ok"
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise ValueError(f"status {self.status_code}")
+
+
+@pytest.mark.parametrize(
+    "url,params,weight",
+    [
+        ("https://fapi.binance.com/fapi/v1/klines", {"symbol": "BTCUSDT", "limit": 2}, 1),
+        ("https://fapi.binance.com/fapi/v1/klines", {"symbol": "BTCUSDT", "limit": 500}, 5),
+        ("https://fapi.binance.com/fapi/v1/depth", {"symbol": "BTCUSDT", "limit": 50}, 2),
+        ("https://fapi.binance.com/fapi/v1/ticker/24hr", None, 40),
+        ("https://fapi.binance.com/fapi/v1/ticker/24hr", {"symbol": "BTCUSDT"}, 1),
+        ("https://fapi.binance.com/futures/data/openInterestHist", {"period": "5m"}, 1),
+        ("https://api.coingecko.com/api/v3/simple/price", {"ids": "bitcoin"}, 0),
+    ],
+)
+def test_request_weight_per_endpoint(url, params, weight):
+    assert request_weight(url, params) == weight
+
+
+def test_limiter_waits_for_next_window_when_budget_used(clock):
+    limiter = WeightLimiter(100, safety_ratio=0.5, clock=clock.time, sleep=clock.sleep)
+    limiter.acquire(40)
+    limiter.acquire(10)
+    assert clock.sleeps == []
+
+    # 预算 50 已用满，下一次要等到下一个自然分钟
+    limiter.acquire(1)
+    assert clock.sleeps and clock.now % 60 == 0
+    assert limiter.used == 1
+
+
+def test_limiter_syncs_with_server_used_weight_and_pauses(clock):
+    limiter = WeightLimiter(100, safety_ratio=1.0, clock=clock.time, sleep=clock.sleep)
+    limiter.acquire(5)
+    limiter.sync_used(99)
+    assert limiter.used == 99
+
+    limiter.pause(7)
+    start = clock.now
+    limiter.acquire(1)
+    assert clock.now - start >= 7
+
+
+def test_http_get_follows_retry_after(clock):
+    responses = [
+        MockResponse(status_code=429, headers={"Retry-After": "3"}),
+        MockResponse(status_code=200, headers={"X-MBX-USED-WEIGHT-1M": "12"}),
+    ]
+    limiter = WeightLimiter(2400, clock=clock.time, sleep=clock.sleep)
+    with patch.object(binance_http, "fapi_limiter", limiter), patch.object(
+        binance_http.session, "get", side_effect=responses
+    ) as get:
+        resp = binance_http.http_get(
+            "https://fapi.binance.com/fapi/v1/klines", params={"symbol": "BTCUSDT", "limit": 2}
+        )
+    assert resp.status_code == 200
+    assert get.call_count == 2
+    assert sum(clock.sleeps) >= 3
+    assert limiter.used == 12
+
+
+def test_futures_data_limiter_ignores_ip_weight_header(clock):
+    limiter = WeightLimiter(1000, window_seconds=300, clock=clock.time, sleep=clock.sleep)
+    response = MockResponse(status_code=200, headers={"X-MBX-USED-WEIGHT-1M": "2300"})
+    with patch.object(binance_http, "futures_data_limiter", limiter), patch.object(
+        binance_http, "HTTP_CACHE_ENABLED", False
+    ), patch.object(binance_http.session, "get", return_value=response):
+        binance_http.http_get(
+            "https://fapi.binance.com/futures/data/openInterestHist", params={"symbol": "BTCUSDT", "period": "5m"}
+        )
+        # 忙的一分钟 IP 权重超过 900，也不能让 5 分钟的次数桶看起来已经用完
+        assert limiter.used == 1
+        binance_http.http_get(
+            "https://fapi.binance.com/futures/data/takerlongshortRatio", params={"symbol": "BTCUSDT", "period": "5m"}
+        )
+    assert limiter.used == 2 and clock.sleeps == []
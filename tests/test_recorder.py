@@ -0,0 +1,135 @@
+import json
+
+import numpy as np
+
+from scripts.recorder import SnapshotRecorder, list_days, read_day
+
+DAY1 = 1_767_225_600.0  # 2026-01-01 00:00:00 UTC
+DAY2 = DAY1 + 86_400
+
+
+def test_rounds_append_and_read_back_via_memmap(tmp_path):
+    recorder = SnapshotRecorder(tmp_path, ["price", "oi"])
+    recorder.start()
+    recorder.record(DAY1 + 60, ["BTCUSDT", "ETHUSDT"], {"price": np.array([100.0, 10.0]), "oi": np.array([1.0, 2.0])})
+    # 缺失的列写 NaN，多出来的列忽略
+    recorder.record(DAY1 + 120, ["ETHUSDT", "SOLUSDT"], {"price": np.array([11.0, 5.0]), "extra": np.array([0, 0])})
+    assert recorder.flush()
+    recorder.stop()
+
+    assert list_days(tmp_path) == ["2026-01-01"]
+    day = read_day(tmp_path, "2026-01-01")
+    assert len(day) == 4
+    assert isinstance(day.columns["price"], np.memmap)
+    assert day.symbols == ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+    np.testing.assert_allclose(day.columns["price"], [100.0, 10.0, 11.0, 5.0])
+    assert np.isnan(day.columns["oi"][2:]).all()
+    np.testing.assert_allclose(day.columns["price"][day.symbol_mask("ETHUSDT")], [10.0, 11.0])
+    assert day.rounds().tolist() == [int((DAY1 + 60) * 1000), int((DAY1 + 120) * 1000)]
+    assert not day.symbol_mask("XRPUSDT").any()
+    # 每行 8 字节时间戳 + 2 字节编号 + 每列 4 字节
+    assert recorder.bytes_written == 4 * (8 + 2 + 2 * 4)
+
+
+def test_partitions_by_utc_day_and_keeps_symbol_ids_across_restarts(tmp_path):
+    first = SnapshotRecorder(tmp_path, ["price"])
+    first.start()
+    first.record(DAY1 + 10, ["BTCUSDT"], {"price": np.array([1.0])})
+    first.flush()
+    first.stop()
+
+    second = SnapshotRecorder(tmp_path, ["price"])
+    second.start()
+    second.record(DAY2 + 10, ["ETHUSDT", "BTCUSDT"], {"price": np.array([2.0, 3.0])})
+    second.flush()
+    second.stop()
+
+    assert list_days(tmp_path) == ["2026-01-01", "2026-01-02"]
+    assert json.loads((tmp_path / "symbols.json").read_text()) == ["BTCUSDT", "ETHUSDT"]
+    day = read_day(tmp_path, "2026-01-02")
+    assert day.symbol_ids.tolist() == [1, 0]
+
+
+def test_truncated_column_is_read_to_shortest_length(tmp_path):
+    recorder = SnapshotRecorder(tmp_path, ["price", "oi"])
+    recorder.start()
+    recorder.record(DAY1, ["BTCUSDT", "ETHUSDT"], {"price": np.array([1.0, 2.0]), "oi": np.array([3.0, 4.0])})
+    recorder.flush()
+    recorder.stop()
+    # 模拟写到一半崩溃：最后一列只写了一行
+    path = tmp_path / "2026-01-01" / "oi.f4"
+    path.write_bytes(path.read_bytes()[:4])
+
+    day = read_day(tmp_path, "2026-01-01")
+    assert len(day) == 1
+    assert day.columns["price"].tolist() == [1.0]
+
+
+def test_restart_after_crash_truncates_partition_before_appending(tmp_path):
+    first = SnapshotRecorder(tmp_path, ["price", "oi"])
+    first.start()
+    first.record(DAY1, ["BTCUSDT"], {"price": np.array([1.0]), "oi": np.array([2.0])})
+    first.flush()
+    first.stop()
+    # 模拟第二轮写到一半崩溃：ts / symbol / price 写进去了，oi 没写
+    day_dir = tmp_path / "2026-01-01"
+    for name, data in (("ts.i8", b"\0" * 8), ("symbol.u2", b"\0" * 2), ("price.f4", b"\0" * 4)):
+        with open(day_dir / name, "ab") as fh:
+            fh.write(data)
+
+    second = SnapshotRecorder(tmp_path, ["price", "oi"])
+    second.start()
+    second.record(DAY1 + 60, ["BTCUSDT"], {"price": np.array([3.0]), "oi": np.array([4.0])})
+    second.flush()
+    second.stop()
+    day = read_day(tmp_path, "2026-01-01")
+    # 半行被截掉，新的一轮和 oi 列对齐
+    assert day.columns["price"].tolist() == [1.0, 3.0]
+    assert day.columns["oi"].tolist() == [2.0, 4.0]
+    assert (day_dir / "price.f4").stat().st_size == 8
+
+
+def test_schema_change_within_a_day_opens_a_new_partition(tmp_path):
+    old = SnapshotRecorder(tmp_path, ["price"])
+    old.start()
+    old.record(DAY1, ["BTCUSDT"], {"price": np.array([1.0])})
+    old.flush()
+    old.stop()
+
+    new = SnapshotRecorder(tmp_path, ["price", "oi"])
+    new.start()
+    for k in range(2):
+        new.record(DAY1 + 60 * (k + 1), ["BTCUSDT"], {"price": np.array([2.0 + k]), "oi": np.array([5.0])})
+    new.record(DAY2, ["BTCUSDT"], {"price": np.array([9.0]), "oi": np.array([6.0])})
+    new.flush()
+    new.stop()
+
+    # 列变了不再每轮报错丢数据，而是另开一个分区
+    assert new.errors == 0
+    assert list_days(tmp_path) == ["2026-01-01", "2026-01-01.1", "2026-01-02"]
+    assert read_day(tmp_path, "2026-01-01").columns["price"].tolist() == [1.0]
+    assert read_day(tmp_path, "2026-01-01.1").columns["price"].tolist() == [2.0, 3.0]
+    assert read_day(tmp_path, "2026-01-02").columns["oi"].tolist() == [6.0]
+
+
+def test_full_queue_drops_oldest_round_without_blocking(tmp_path):
+    # 不启动后台线程，队列只能放 2 轮
+    recorder = SnapshotRecorder(tmp_path, ["price"], max_queue=2)
+    for k in range(4):
+        assert recorder.record(DAY1 + k, ["BTCUSDT"], {"price": np.array([float(k)])})
+    assert recorder.dropped == 2
+    recorder.start()
+    recorder.flush()
+    recorder.stop()
+    assert read_day(tmp_path, "2026-01-01").columns["price"].tolist() == [2.0, 3.0]
+
+
+def test_recorded_arrays_are_copies(tmp_path):
+    recorder = SnapshotRecorder(tmp_path, ["price"], max_queue=4)
+    values = np.array([1.0])
+    recorder.record(DAY1, ["BTCUSDT"], {"price": values})
+    values[0] = 99.0
+    recorder.start()
+    recorder.flush()
+    recorder.stop()
+    assert read_day(tmp_path, "2026-01-01").columns["price"].tolist() == [1.0]
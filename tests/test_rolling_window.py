@@ -0,0 +1,130 @@
+import contextlib
+import importlib
+import random
+from unittest.mock import patch
+
+import pytest
+
+import scripts.btc_watch as btc_watch
+from bench.fake_binance import FakeBinance
+from bench.run_bench import patch_module
+from scripts.btc_watch import BtcWatch
+from scripts.market_hub import MarketHub
+from scripts.rolling_window import RollingMinMax, SwingDetector, format_swing, parse_windows
+from scripts.universe import UniverseManager
+
+
+def test_monotonic_deques_match_brute_force_window():
+    rng = random.Random(3)
+    rolling = RollingMinMax(60)
+    history = []
+    ts = 0.0
+    for _ in range(3000):
+        ts += rng.choice([1, 5, 10, 30])
+        value = rng.uniform(90, 110)
+        history.append((ts, value))
+        rolling.push(ts, value)
+        window = [v for t, v in history if t >= ts - 60]
+        assert rolling.high()[1] == max(window)
+        assert rolling.low()[1] == min(window)
+        # 队列长度受窗口约束，不随总点数增长
+        assert len(rolling) <= len(window)
+
+
+def test_parse_windows():
+    assert parse_windows("1m:0.5, 15m:2") == {"1m": (60.0, 0.5), "15m": (900.0, 2.0)}
+    assert parse_windows("") == {}
+    with pytest.raises(ValueError):
+        parse_windows("5m")
+
+
+def test_detects_intra_window_spike_and_reversal_per_window():
+    detector = SwingDetector(parse_windows("1m:1,5m:3"))
+    assert detector.update_many(0, {"BTCUSDT": 100.0, "ETHUSDT": 10.0}) == {}
+    # 30 秒内冲高 1.5% 又回落：只和上次价比较时看不到
+    assert detector.update("BTCUSDT", 30, 101.5)[0].window == "1m"
+    hits = detector.update("BTCUSDT", 45, 100.0)
+    # 回落到 100：最低点在最高点之后，按从高点算的跌幅报
+    assert [(h.window, h.rising) for h in hits] == [("1m", False)]
+    assert hits[0].pct == pytest.approx(1.5 / 101.5 * 100)
+
+    # 每 30 秒涨 0.45%：1m 窗口里一直不到 1%，5m 窗口累计超过 3%
+    slow = SwingDetector(parse_windows("1m:1,5m:3"))
+    hits = []
+    for i in range(8):
+        hits = slow.update("ETHUSDT", i * 30, 100 + 0.45 * i)
+    assert [h.window for h in hits] == ["5m"]
+    assert hits[0].rising and hits[0].pct == pytest.approx(3.15)
+
+    # 先高后低：按从高点算的跌幅
+    drop = SwingDetector(parse_windows("5m:3"))
+    drop.update("SOLUSDT", 0, 100.0)
+    swing = drop.update("SOLUSDT", 60, 96.0)[0]
+    assert not swing.rising and swing.pct == pytest.approx(4.0)
+    assert format_swing(swing) == "5m 内下跌 4.00%（100 → 96）"
+
+    # 超出窗口的点不再参与
+    assert drop.update("SOLUSDT", 400, 96.5) == []
+    drop.remove(["SOLUSDT"])
+    assert drop.stats() == {"symbols": 0, "samples": 0}
+
+
+def test_spot_watch_alerts_on_swing_once_per_cooldown(clock):
+    feed = {"BTCUSDT": 100.0}
+    batches = []
+    hub = MarketHub(max_age=0, clock=clock.time)
+    hub.add_source("spot_prices", lambda: dict(feed))
+    watch = BtcWatch({"BTCUSDT": 5.0}, swing_windows=parse_windows("1m:0.8"))
+    watch.setup(hub)
+
+    with patch.object(btc_watch, "send_feishu_text", lambda content: None), \
+            patch.object(btc_watch, "send_feishu_alerts", batches.append):
+        for price in (100.0, 101.0, 100.0, 100.9, 100.0):
+            feed["BTCUSDT"] = price
+            watch.run_round(hub.snapshot())
+            clock.now += 5
+    # 相对通知价从没超过 5%，但 1m 内冲高 1%：只报一次，冷却期内振幅没明显变大不再报
+    assert len(batches) == 1
+    assert batches[0][0].startswith("BTCUSDT 区间波动预警：\n1m 内拉升 1.00%")
+
+
+@pytest.mark.parametrize("module_name", ["binance_features_OI", "binance_features_oi_1"])
+def test_oi_monitors_alert_on_ticker_price_swings(module_name, clock, tmp_path):
+    module = importlib.import_module(f"scripts.{module_name}")
+    server = FakeBinance(symbols=5, movers=0.0).start()
+    batches = []
+    try:
+        with contextlib.ExitStack() as stack:
+            patch_module(stack, module, module_name, server.base_url, str(tmp_path))
+            stack.enter_context(patch.object(module, "send_feishu_text", lambda content: None))
+            stack.enter_context(patch.object(module, "send_feishu_alerts", lambda header, alerts: batches.append(alerts)))
+            if hasattr(module, "FEISHU_MSG_FORMAT"):
+                stack.enter_context(patch.object(module, "FEISHU_MSG_FORMAT", "text"))
+            universe = UniverseManager(lambda: ["AAAUSDT", "BBBUSDT"])
+            hub = MarketHub(universe, max_age=0, clock=clock.time)
+            hub.start()
+            feed = {"AAAUSDT": 100.0, "BBBUSDT": 10.0}
+            # 先注册的同名数据源生效：24H ticker 用这里的价格；BBB 成交额太低，不看
+            hub.add_source("ticker", lambda: {
+                s: {"lastPrice": str(p), "quoteVolume": "1e9" if s == "AAAUSDT" else "1", "priceChangePercent": "0"}
+                for s, p in feed.items()
+            })
+            plugin = module.OiRulesMonitor() if hasattr(module, "OiRulesMonitor") else module.OiMonitor()
+            plugin.swings = SwingDetector(parse_windows("15m:3"))
+            plugin.setup(hub)
+            try:
+                for aaa, bbb in ((100.0, 10.0), (103.5, 12.0), (100.0, 10.0), (103.6, 12.0)):
+                    feed.update(AAAUSDT=aaa, BBBUSDT=bbb)
+                    plugin.run_round(hub.snapshot())
+                    clock.now += 60
+            finally:
+                universe.stop()
+                if getattr(plugin, "recorder", None) is not None:
+                    plugin.recorder.stop()
+    finally:
+        server.stop()
+
+    swings = [alert for batch in batches for alert in batch if "15m 内" in alert]
+    # 第 2 轮冲高 3.5% 报一次；冷却期内振幅没明显变大不再报；成交额过滤掉的 BBB 不报
+    assert len(swings) == 1
+    assert swings[0].startswith("AAAUSDT") and "15m 内拉升 3.50%" in swings[0]
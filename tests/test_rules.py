@@ -0,0 +1,112 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import scripts.binance_features_oi_1 as oi_monitor
+from scripts.rules import Rule, RuleError, fill_template, load_rules, parse_rules
+
+METRICS = ["price_15m", "oi_15m", "quote_volume", "mc"]
+
+
+def columns():
+    return {
+        "price_15m": np.array([-9.0, 9.0, 1.0, np.nan]),
+        "oi_15m": np.array([10.0, 2.0, 10.0, 10.0]),
+        "quote_volume": np.array([6e6, 6e6, 6e6, 6e6]),
+        "mc": np.array([1e8, 0.0, 1e8, 1e8]),
+    }
+
+
+def test_rule_compiles_to_vectorized_predicate():
+    rule = Rule("r", "abs(price_15m) >= 8 and oi_15m >= 8 and quote_volume >= 5e6", METRICS)
+    assert rule.metrics == {"price_15m", "oi_15m", "quote_volume"}
+    assert rule.evaluate(columns(), 4).tolist() == [True, False, False, False]
+
+
+def test_rule_supports_arithmetic_chains_and_functions():
+    cols = columns()
+    assert Rule("a", "1 < oi_15m / 5 <= 2", METRICS).evaluate(cols, 4).tolist() == [True, False, True, True]
+    assert Rule("b", "not mc > 0 or max(price_15m, 0) > 5", METRICS).evaluate(cols, 4).tolist() == [
+        False, True, False, False
+    ]
+    # 常量表达式广播到整列
+    assert Rule("c", "True", METRICS).evaluate(cols, 4).tolist() == [True] * 4
+
+
+@pytest.mark.parametrize(
+    "expr",
+    ["unknown >= 1", "__import__('os')", "price_15m.real > 1", "abs(price_15m, 1) > 1", "price_15m ** 2 > 1"],
+)
+def test_rule_rejects_unsafe_or_unknown(expr):
+    with pytest.raises(RuleError):
+        Rule("bad", expr, METRICS)
+
+
+def test_prefilter_only_uses_available_metrics():
+    rule = Rule("r", "abs(price_15m) >= 8 and oi_15m >= 8", METRICS)
+    cols = {"price_15m": columns()["price_15m"]}
+    assert rule.prefilter(cols, 4, {"price_15m"}).tolist() == [True, True, False, False]
+
+
+def test_rule_set_collects_metrics_and_skips_disabled(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(
+        json.dumps(
+            {
+                "rules": [
+                    {"name": "a", "expr": "price_15m > 1"},
+                    {"name": "b", "expr": "mc > 0", "enabled": False},
+                ]
+            }
+        ),
+        encoding="utf-8",
+    )
+    rules = load_rules(path, METRICS)
+    assert [r.name for r in rules.rules] == ["a"]
+    assert rules.metrics == {"price_15m"}
+
+    with pytest.raises(RuleError):
+        parse_rules({"rules": [{"name": "x", "expr": "1"}, {"name": "x", "expr": "1"}]}, METRICS)
+
+
+def test_oi_monitor_skips_sources_no_rule_needs():
+    rules = parse_rules({"rules": [{"name": "p", "expr": "abs(price_15m) >= 8 and quote_volume > 0"}]},
+                        oi_monitor.RULE_METRICS)
+    assert oi_monitor.required_sources(rules) == {"kline", "ticker"}
+    assert oi_monitor.required_sources(oi_monitor.rule_set) == {"kline", "oi", "mc"}
+
+
+def test_example_rules_file_parses():
+    path = Path(oi_monitor.RULES_FILE).with_name("rules.example.json")
+    rules = load_rules(path, oi_monitor.RULE_METRICS)
+    assert len(rules) == 2
+
+
+def test_default_rules_follow_threshold_constants(tmp_path):
+    # 仓库不带 rules.json：默认规则由阈值常量生成，改常量就生效
+    rules = load_rules(tmp_path / "rules.json", oi_monitor.RULE_METRICS, oi_monitor.DEFAULT_RULES)
+    exprs = [rule["expr"] for rule in oi_monitor.DEFAULT_RULES["rules"]]
+    assert len(rules) == 2
+    assert f">= {oi_monitor.PRICE_CHANGE_1H_PCT} and oi_1h >= {oi_monitor.OI_CHANGE_1H_PCT}" in exprs[0]
+    assert f">= {oi_monitor.PRICE_CHANGE_15M_PCT} and oi_15m >= {oi_monitor.OI_CHANGE_15M_PCT}" in exprs[1]
+    assert exprs[0].startswith("abs(price_1h)") == oi_monitor.USE_ABS_PRICE_CHANGE
+
+
+def test_severity_expression_is_vectorized_and_counted_in_metrics():
+    spec = {"rules": [{"name": "r", "expr": "oi_15m >= 8", "severity": "abs(price_15m)"}]}
+    rules = parse_rules(spec, METRICS)
+    assert rules.metrics == {"oi_15m", "price_15m"}
+    severity = rules.severities(columns(), 4)["r"]
+    assert severity[:3].tolist() == [9.0, 9.0, 1.0]
+    assert parse_rules({"rules": [{"expr": "mc > 0"}]}, METRICS).severities(columns(), 4) == {"rule_0": None}
+
+
+def test_fill_template_substitutes_parameters():
+    spec = {"rules": [{"name": "p", "expr": "price_15m >= {P}", "severity": "price_15m"}, {"expr": "mc > 0"}]}
+    filled = fill_template(spec, {"P": 8.5})
+    assert [item["expr"] for item in filled["rules"]] == ["price_15m >= 8.5", "mc > 0"]
+    assert spec["rules"][0]["expr"] == "price_15m >= {P}"
+    with pytest.raises(RuleError):
+        fill_template(spec, {})
@@ -0,0 +1,71 @@
+from scripts.scheduler import TieredScheduler, rank_symbols
+
+
+def ticker(volume, high=1.0, low=1.0, last=1.0):
+    return {"quoteVolume": str(volume), "highPrice": str(high), "lowPrice": str(low), "lastPrice": str(last)}
+
+
+def universe(n):
+    # S0 成交额最大，依次递减；振幅都一样
+    return {f"S{i}": ticker(1_000_000 * (n - i)) for i in range(n)}
+
+
+def make_scheduler(clock, **kwargs):
+    params = dict(hot_size=2, warm_size=3, intervals={"hot": 60, "warm": 180, "cold": 600}, clock=clock)
+    params.update(kwargs)
+    return TieredScheduler(**params)
+
+
+def test_rank_uses_volume_and_amplitude_not_alphabet():
+    tickers = {
+        "AAAUSDT": ticker(1e6),
+        "ZZZUSDT": ticker(1e9, high=1.2, low=0.9, last=1.0),
+        "MMMUSDT": ticker(1e8),
+    }
+    assert rank_symbols(sorted(tickers), tickers) == ["ZZZUSDT", "MMMUSDT", "AAAUSDT"]
+    # 没有 ticker 的排最后
+    assert rank_symbols(["NOPE", "AAAUSDT"], tickers) == ["AAAUSDT", "NOPE"]
+
+
+def test_tiers_have_different_refresh_intervals(clock):
+    scheduler = make_scheduler(clock, max_symbols=8)
+    tickers = universe(10)
+    assert scheduler.update(tickers) == {"hot": 2, "warm": 3, "cold": 3}
+    assert "S9" not in scheduler.tiers  # 超过 max_symbols 的不调度
+
+    first = scheduler.due()
+    assert first[:2] == ["S0", "S1"] and len(first) == 8
+    scheduler.mark_polled(first)
+
+    start = clock.now
+    clock.now = start + 60
+    assert scheduler.due() == ["S0", "S1"]
+    clock.now = start + 180
+    assert scheduler.due() == ["S0", "S1", "S2", "S3", "S4"]
+    clock.now = start + 600
+    assert len(scheduler.due()) == 8
+
+
+def test_retier_with_hysteresis_and_boost(clock):
+    scheduler = make_scheduler(clock, hot_size=10, warm_size=10, hysteresis=0.2)
+    tickers = universe(30)
+    scheduler.update(tickers)
+    assert scheduler.tiers["S9"] == "hot"
+
+    # S9 掉到第 11 名：还在滞回余量内，不换层
+    tickers["S9"] = ticker(1_000_000 * 19.5)
+    scheduler.update(tickers)
+    assert scheduler.tiers["S9"] == "hot"
+    # 掉到第 14 名：越过余量才降层
+    tickers["S9"] = ticker(1_000_000 * 16.5)
+    scheduler.update(tickers)
+    assert scheduler.tiers["S9"] == "warm"
+    assert scheduler.moves >= 1
+
+    scheduler.boost(["S25"])
+    assert scheduler.tiers["S25"] == "hot"
+    scheduler.update(tickers)
+    assert scheduler.tiers["S25"] == "hot"
+    clock.now += scheduler.boost_seconds + 1
+    scheduler.update(tickers)
+    assert scheduler.tiers["S25"] == "cold"
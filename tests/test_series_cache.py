@@ -0,0 +1,88 @@
+import threading
+import time
+
+import numpy as np
+
+from scripts.series_cache import RingBuffer, SeriesStore
+
+STEP = 300_000
+
+
+def test_ring_buffer_wraps_and_overwrites_same_timestamp():
+    buf = RingBuffer(3)
+    for i in range(5):
+        buf.append(i * STEP, float(i))
+    assert buf.timestamps().tolist() == [2 * STEP, 3 * STEP, 4 * STEP]
+    assert buf.values().tolist() == [2.0, 3.0, 4.0]
+
+    # 同一时间戳（未收盘 K 线）覆盖，旧时间戳忽略
+    buf.append(4 * STEP, 4.5)
+    buf.append(1 * STEP, 99.0)
+    assert buf.values().tolist() == [2.0, 3.0, 4.5]
+    assert buf.last_ts == 4 * STEP
+
+
+def test_series_store_fetches_only_new_rows_after_warmup():
+    now = [12 * STEP / 1000]
+    history = [(i * STEP, float(100 + i)) for i in range(20)]
+    calls = []
+
+    def fetch(symbol, start_time, limit):
+        calls.append((start_time, limit))
+        current = int(now[0] * 1000)
+        rows = [r for r in history if r[0] <= current and (start_time is None or r[0] >= start_time)]
+        return rows[-limit:] if start_time is None else rows[:limit]
+
+    store = SeriesStore(13, STEP, clock=lambda: now[0])
+    values = store.refresh("BTCUSDT", "close", fetch)
+    assert calls[-1] == (None, 13)
+    assert values.tolist() == [float(100 + i) for i in range(13)]
+
+    # 过了一根 K 线：只从最后缓存的时间戳拉 2 条
+    now[0] += STEP / 1000
+    values = store.refresh("BTCUSDT", "close", fetch)
+    assert calls[-1] == (12 * STEP, 2)
+    assert len(values) == 13 and values[-1] == 113.0
+    assert store.full_fetches == 1 and store.incremental_fetches == 1
+
+
+def test_series_store_refetches_everything_after_long_gap():
+    now = [0.0]
+    store = SeriesStore(3, STEP, clock=lambda: now[0])
+    store.refresh("ETHUSDT", "oi", lambda s, start, limit: [(0, 1.0)])
+    now[0] = 10 * STEP / 1000
+    values = store.refresh("ETHUSDT", "oi", lambda s, start, limit: [(10 * STEP, 2.0)] if start is None else [])
+    assert np.array_equal(values, np.array([2.0]))
+    assert store.full_fetches == 2
+
+
+def test_concurrent_refresh_of_a_shared_series_is_serialized_and_coalesced():
+    store = SeriesStore(13, STEP, clock=lambda: 12 * STEP / 1000)
+    rows = [(i * STEP, float(i)) for i in range(13)]
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_fetch(symbol, start_time, limit):
+        calls.append(start_time)
+        started.set()
+        release.wait(1)
+        return rows
+
+    results = []
+    # 两个插件（不同线程）同一时刻刷新同一条 (symbol, "oi") 序列
+    first = threading.Thread(target=lambda: results.append(store.refresh("BTCUSDT", "oi", slow_fetch)))
+    first.start()
+    started.wait(1)
+    second = threading.Thread(target=lambda: results.append(store.refresh("BTCUSDT", "oi", slow_fetch)))
+    second.start()
+    time.sleep(0.05)
+    release.set()
+    first.join()
+    second.join()
+
+    assert calls == [None]
+    assert [r.tolist() for r in results] == [[float(i) for i in range(13)]] * 2
+    assert store.stats()["coalesced"] == 1 and store.full_fetches == 1
+    # 不并发时照常增量刷新
+    store.refresh("BTCUSDT", "oi", lambda s, start, limit: [(12 * STEP, 12.5)])
+    assert store.incremental_fetches == 1 and len(store.buffer("BTCUSDT", "oi")) == 13
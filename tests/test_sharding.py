@@ -0,0 +1,212 @@
+import contextlib
+import socket
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import scripts.Binance_features_monitor as monitor
+from bench.fake_binance import FakeBinance
+from bench.run_bench import patch_module
+from scripts.market_hub import MarketHub
+from scripts.sharding import Coordinator, HashRing, RemoteFetchError, parse_address, run_worker
+from scripts.universe import UniverseManager
+
+SYMBOLS = [f"S{i}USDT" for i in range(400)]
+
+
+def test_hash_ring_balances_and_moves_only_the_new_nodes_share():
+    ring = HashRing(["w0", "w1", "w2", "w3"], replicas=64)
+    before = {s: ring.node_for(s) for s in SYMBOLS}
+    counts = {node: len(chunk) for node, chunk in ring.assign(SYMBOLS).items()}
+    assert sorted(counts) == ["w0", "w1", "w2", "w3"]
+    assert all(50 <= n <= 150 for n in counts.values())
+
+    ring.add("w4")
+    after = {s: ring.node_for(s) for s in SYMBOLS}
+    moved = [s for s in SYMBOLS if before[s] != after[s]]
+    # 只有分给新节点的会动，大约 1/5
+    assert all(after[s] == "w4" for s in moved)
+    assert 40 <= len(moved) <= 130
+
+    ring.remove("w1")
+    final = {s: ring.node_for(s) for s in SYMBOLS}
+    assert all(final[s] == after[s] for s in SYMBOLS if after[s] != "w1")
+    assert HashRing().assign(SYMBOLS) == {}
+
+
+def test_parse_address():
+    assert parse_address("0.0.0.0:9120") == ("0.0.0.0", 9120)
+    with pytest.raises(ValueError):
+        parse_address("localhost")
+
+
+class Workers:
+    """测试用：在线程里跑 run_worker，记下每个 worker 拉了哪些 symbol。"""
+
+    def __init__(self, coordinator):
+        self.coordinator = coordinator
+        self.seen = {}
+        self.stops = {}
+        self.threads = {}
+
+    def start(self, name, fail=()):
+        self.seen[name] = []
+        stop = self.stops[name] = threading.Event()
+
+        def fetch(symbols):
+            self.seen[name].extend(symbols)
+            results = {s: (name, s) for s in symbols if s not in fail}
+            errors = {s: ConnectionError("boom") for s in symbols if s in fail}
+            return results, errors
+
+        thread = threading.Thread(
+            target=run_worker, args=(self.coordinator.address, "secret", name), kwargs={"fetch": fetch, "stop": stop}
+        )
+        thread.start()
+        self.threads[name] = thread
+        deadline = time.time() + 5
+        while name not in self.coordinator.workers() and time.time() < deadline:
+            time.sleep(0.01)
+        assert name in self.coordinator.workers()
+
+    def stop(self, name):
+        self.stops[name].set()
+        self.threads[name].join(5)
+
+
+@pytest.fixture
+def coordinator():
+    coord = Coordinator(("127.0.0.1", 0), "secret", timeout=5).start()
+    yield coord
+    coord.stop()
+
+
+def test_coordinator_splits_round_and_merges_results(coordinator):
+    workers = Workers(coordinator)
+    workers.start("a", fail={"S3USDT"})
+    workers.start("b")
+    symbols = SYMBOLS[:40]
+
+    results, errors = coordinator.fetch(symbols)
+    assert list(results) == [s for s in symbols if s != "S3USDT"]
+    assert isinstance(errors["S3USDT"], RemoteFetchError) and "boom" in str(errors["S3USDT"])
+    # 每个 symbol 恰好由一个 worker 拉，两边都分到了
+    assert sorted(workers.seen["a"] + workers.seen["b"]) == sorted(symbols)
+    assert workers.seen["a"] and workers.seen["b"]
+    assert all(results[s][0] == ("a" if s in workers.seen["a"] else "b") for s in results)
+
+    # 同样的 worker 下一轮分法不变
+    first = {name: list(seen) for name, seen in workers.seen.items()}
+    for seen in workers.seen.values():
+        seen.clear()
+    coordinator.fetch(symbols)
+    assert workers.seen == first
+    assert coordinator.stats()["moved"] == 0
+    workers.stop("a")
+    workers.stop("b")
+
+
+def test_departed_worker_share_is_reassigned_within_the_round(coordinator):
+    workers = Workers(coordinator)
+    workers.start("a")
+    workers.start("b")
+    workers.stop("b")
+
+    results, errors = coordinator.fetch(SYMBOLS[:30])
+    assert not errors and list(results) == SYMBOLS[:30]
+    assert all(value[0] == "a" for value in results.values())
+    assert coordinator.workers() == ["a"]
+    stats = coordinator.stats()
+    assert stats["leaves"] == 1 and stats["reassigned"] > 0
+    workers.stop("a")
+
+
+def test_no_workers_falls_back_or_reports_errors():
+    coord = Coordinator(("127.0.0.1", 0), "secret", fallback=lambda symbols: ({s: "local" for s in symbols}, {}))
+    coord.start()
+    try:
+        assert coord.fetch(["BTCUSDT"]) == ({"BTCUSDT": "local"}, {})
+        coord.fallback = None
+        _, errors = coord.fetch(["BTCUSDT"])
+        assert isinstance(errors["BTCUSDT"], RemoteFetchError)
+    finally:
+        coord.stop()
+    with pytest.raises(ValueError):
+        Coordinator(("127.0.0.1", 0), "")
+
+
+def test_silent_connection_does_not_block_other_workers_joining(coordinator):
+    # 连上却一个字节都不发（连密钥校验都不答），握手在它自己的线程里等
+    silent = socket.create_connection(coordinator.address)
+    try:
+        workers = Workers(coordinator)
+        started = time.time()
+        workers.start("a")
+        assert time.time() - started < 2
+        with pytest.raises(Exception):
+            run_worker(coordinator.address, "wrong-key", "intruder")
+        assert coordinator.workers() == ["a"]
+        workers.stop("a")
+    finally:
+        silent.close()
+
+
+def test_sharded_futures_monitor_sends_one_feishu_batch(tmp_path, coordinator):
+    server = FakeBinance(symbols=30, movers=0.3).start()
+    sent = []
+    try:
+        with contextlib.ExitStack() as stack:
+            patch_module(stack, monitor, "futures", server.base_url, str(tmp_path), max_symbols=30)
+            stack.enter_context(patch.object(monitor, "HOT_TIER_SIZE", 30))
+            stack.enter_context(patch.object(monitor, "send_feishu_text", lambda content: None))
+            stack.enter_context(patch.object(monitor, "send_feishu_alerts", lambda header, alerts: sent.append(alerts)))
+            threads = []
+            fetched_by = {}
+
+            def fetch_as(name):
+                def fetch(symbols):
+                    fetched_by.update((symbol, name) for symbol in symbols)
+                    return monitor.fetch_round_symbols(symbols)
+
+                return fetch
+
+            for name in ("a", "b", "c"):
+                thread = threading.Thread(
+                    target=run_worker, args=(coordinator.address, "secret", name), kwargs={"fetch": fetch_as(name)}
+                )
+                thread.start()
+                threads.append(thread)
+            deadline = time.time() + 5
+            while len(coordinator.workers()) < 3 and time.time() < deadline:
+                time.sleep(0.01)
+
+            universe = UniverseManager(monitor.fetch_usdt_perpetual_symbols)
+            hub = MarketHub(universe, max_age=0)
+            hub.start()
+            plugin = monitor.FuturesMonitor()
+            plugin.fetch_symbols = coordinator.fetch
+            plugin.setup(hub)
+            try:
+                for _ in range(2):
+                    plugin.run_round(hub.snapshot())
+            finally:
+                universe.stop()
+                if plugin.recorder is not None:
+                    plugin.recorder.stop()
+            coordinator.stop()
+            for thread in threads:
+                thread.join(5)
+    finally:
+        server.stop()
+
+    stats = coordinator.stats()
+    assert stats["workers"] == 0 and stats["joins"] == 3
+    assert stats["dispatched"] == 60 and stats["fallback"] == 0
+    # 每轮最多一条飞书消息，各 worker 的告警合在一起
+    assert 1 <= len(sent) <= 2 and all(batch for batch in sent)
+    # 告警首行是 "[时间] SYMBOL"；至少有一条消息同时带着不同 worker 拉的 symbol
+    owners = [{fetched_by[alert.split("] ", 1)[1].split("\n", 1)[0]] for alert in batch} for batch in sent]
+    assert any(len(names) > 1 for names in owners)
+    assert len(plugin.mark_history) == 30
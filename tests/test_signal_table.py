@@ -0,0 +1,54 @@
+import math
+
+import numpy as np
+import pytest
+
+import scripts.binance_features_oi_1 as oi_monitor
+from scripts.signal_table import MetricTable
+
+
+def test_from_rows_fills_missing_with_nan():
+    table = MetricTable.from_rows(
+        {"BTCUSDT": {"a": 1.0, "b": None}, "ETHUSDT": {"a": 2.0, "b": 3.0}},
+        ["a", "b"],
+    )
+    assert table.symbols == ["BTCUSDT", "ETHUSDT"]
+    assert table["a"].tolist() == [1.0, 2.0]
+    assert math.isnan(table["b"][0])
+    # NaN 比较结果为 False，缺数据不触发
+    assert table.indices(table["b"] >= 0) == [1]
+    assert table.row(0) == {"symbol": "BTCUSDT", "a": 1.0, "b": None}
+
+
+def test_add_column_checks_length():
+    table = MetricTable(["A", "B"], {"x": [1, 2]})
+    table.add_column("y", np.array([3.0, 4.0]))
+    assert table["y"].tolist() == [3.0, 4.0]
+    with pytest.raises(ValueError):
+        table.add_column("z", [1.0])
+
+
+def test_oi_monitor_default_rules_match_either_window_and_require_mc():
+    metrics = {
+        # 1H 条件满足
+        "AAAUSDT": {"price_1h_pct": -12.0, "oi_1h_pct": 11.0, "price_15m_pct": 1.0, "oi_15m_pct": 0.0},
+        # 15m 条件满足但没有 MC
+        "BBBUSDT": {"price_1h_pct": 0.0, "oi_1h_pct": 0.0, "price_15m_pct": 9.0, "oi_15m_pct": 9.0},
+        # 价格够但 OI 不够
+        "CCCUSDT": {"price_1h_pct": 20.0, "oi_1h_pct": 1.0, "price_15m_pct": 9.0, "oi_15m_pct": 1.0},
+    }
+    for row in metrics.values():
+        row.update(last_price=1.0, oi_notional=5e6)
+    ticker = {s: {"priceChangePercent": "3.5", "quoteVolume": "1e7"} for s in metrics}
+    mc = {"AAAUSDT": 1e8, "CCCUSDT": 1e8}
+
+    table = oi_monitor.build_metric_table(metrics, ticker, mc)
+    matches = oi_monitor.evaluate_rules(table)
+    assert matches["条件1（1H）"].tolist() == [True, False, False]
+    assert not matches["条件2（15m）"].any()
+
+    text = oi_monitor.format_alert(table.row(0), ["条件1（1H）"])
+    assert text.startswith("AAAUSDT  MC:$100.00M")
+    assert "1H price change:-12.00%" in text
+    assert "24H Price change:+3.50%" in text
+    assert text.endswith("Rules: 条件1（1H）")
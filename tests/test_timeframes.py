@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+import scripts.binance_features_oi_1 as oi_monitor
+from scripts.series_cache import SeriesStore
+from scripts.timeframes import interval_minutes, points_needed, window_changes
+
+
+def test_interval_minutes_parses_binance_intervals():
+    assert interval_minutes("5m") == 5
+    assert interval_minutes("4h") == 240
+    assert interval_minutes("1d") == 1440
+    with pytest.raises(ValueError):
+        interval_minutes("1w")
+
+
+def test_points_needed_covers_longest_window():
+    assert points_needed(5, {"15m": 15, "1h": 60}) == 13
+    with pytest.raises(ValueError):
+        points_needed(5, {"7m": 7})
+
+
+def test_window_changes_from_single_series():
+    # 13 个 5m 点：第 0 个是 1 小时前，第 9 个是 15 分钟前
+    values = [100.0] * 9 + [110.0, 115.0, 120.0, 121.0]
+    changes = window_changes(values, 5, {"15m": 15, "1h": 60})
+    assert changes["15m"] == pytest.approx(10.0)
+    assert changes["1h"] == pytest.approx(21.0)
+
+
+def test_window_changes_handles_short_series():
+    assert window_changes([1.0], 5, {"15m": 15}) == {"15m": 0.0}
+    # 不足 4H 的数据退化为用最早的点
+    assert window_changes([50.0, 100.0], 5, {"4h": 240})["4h"] == pytest.approx(100.0)
+
+
+def test_kline_and_oi_stages_use_one_request_each():
+    klines = [[i * 300_000, "0", "0", "0", str(100 + i)] for i in range(13)]
+    oi_rows = [{"timestamp": i * 300_000, "sumOpenInterestValue": str(1000 + 10 * i)} for i in range(13)]
+
+    def fake_get(url, *, params=None, timeout=10):
+        payload = klines if url == oi_monitor.FAPI_KLINES else oi_rows
+        assert params["limit"] == 13
+        return SimpleNamespace(json=lambda: payload)
+
+    store = SeriesStore(oi_monitor.SERIES_POINTS, 300_000)
+    with patch.object(oi_monitor, "http_get", side_effect=fake_get) as get, patch.object(
+        oi_monitor, "series_store", store
+    ):
+        metrics = oi_monitor.fetch_kline_metrics("BTCUSDT")
+        metrics.update(oi_monitor.fetch_oi_metrics("BTCUSDT"))
+
+    assert get.call_count == 2
+    kline_params = get.call_args_list[0].kwargs["params"]
+    oi_params = get.call_args_list[1].kwargs["params"]
+    assert kline_params["interval"] == oi_params["period"] == "5m"
+    assert metrics["last_price"] == 112.0
+    assert metrics["price_15m_pct"] == pytest.approx((112 - 109) / 109 * 100)
+    assert metrics["price_1h_pct"] == pytest.approx(12.0)
+    assert metrics["oi_1h_pct"] == pytest.approx(12.0)
+    assert metrics["oi_notional"] == 1120.0
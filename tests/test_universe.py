@@ -0,0 +1,72 @@
+import json
+import time
+
+from scripts.market_stream import MarketStream
+from scripts.universe import UniverseManager, parse_usdt_perpetuals
+
+
+def test_parse_usdt_perpetuals_filters_and_sorts():
+    payload = {"symbols": [
+        {"symbol": "ETHUSDT", "contractType": "PERPETUAL", "quoteAsset": "USDT", "status": "TRADING"},
+        {"symbol": "BTCUSDT", "contractType": "PERPETUAL", "quoteAsset": "USDT", "status": "TRADING"},
+        {"symbol": "BTCUSDT_250627", "contractType": "CURRENT_QUARTER", "quoteAsset": "USDT", "status": "TRADING"},
+        {"symbol": "OLDUSDT", "contractType": "PERPETUAL", "quoteAsset": "USDT", "status": "SETTLING"},
+        {"symbol": "BTCUSDC", "contractType": "PERPETUAL", "quoteAsset": "USDC", "status": "TRADING"},
+    ]}
+    assert parse_usdt_perpetuals(payload) == ["BTCUSDT", "ETHUSDT"]
+
+
+def test_warm_start_from_cache_skips_fetch(tmp_path):
+    path = tmp_path / "universe.json"
+    path.write_text(json.dumps({"updated_at": 1.0, "symbols": ["AAAUSDT", "BBBUSDT"]}), encoding="utf-8")
+    calls = []
+    universe = UniverseManager(lambda: calls.append(1) or [], cache_path=path)
+    assert universe.load() == ["AAAUSDT", "BBBUSDT"]
+    assert calls == []
+
+
+def test_cold_start_fetches_and_persists(tmp_path, clock):
+    path = tmp_path / "sub" / "universe.json"
+    universe = UniverseManager(lambda: ["BBBUSDT", "AAAUSDT"], cache_path=path, clock=clock)
+    assert universe.load() == ["AAAUSDT", "BBBUSDT"]
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data == {"updated_at": clock.now, "symbols": ["AAAUSDT", "BBBUSDT"]}
+    # 第一次加载不算变更
+    assert universe.drain_changes() == ([], [])
+
+
+def test_refresh_accumulates_deltas_until_drained():
+    lists = iter([["AAAUSDT", "BBBUSDT"], ["AAAUSDT", "CCCUSDT"], ["AAAUSDT", "BBBUSDT", "DDDUSDT"]])
+    universe = UniverseManager(lambda: next(lists))
+    universe.load()
+    assert universe.refresh() == (["CCCUSDT"], ["BBBUSDT"])
+    universe.refresh()
+    # BBBUSDT 下架又上线抵消；CCCUSDT 新增又下架抵消
+    assert universe.drain_changes() == (["DDDUSDT"], [])
+    assert universe.drain_changes() == ([], [])
+    assert universe.symbols() == ["AAAUSDT", "BBBUSDT", "DDDUSDT"]
+
+
+def test_background_refresh_when_cache_is_stale(tmp_path):
+    path = tmp_path / "universe.json"
+    path.write_text(json.dumps({"updated_at": 0.0, "symbols": ["AAAUSDT"]}), encoding="utf-8")
+    universe = UniverseManager(lambda: ["AAAUSDT", "NEWUSDT"], cache_path=path, refresh_seconds=3600)
+    universe.load()
+    universe.start()
+    try:
+        deadline = time.time() + 2
+        while universe.refresh_count == 0 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        universe.stop()
+    assert universe.drain_changes() == (["NEWUSDT"], [])
+
+
+def test_market_stream_add_and_remove_symbols():
+    stream = MarketStream(["AAAUSDT"], kline_intervals=["5m"])
+    stream.seed_kline("AAAUSDT", "5m", 0, [1.0, 2.0])
+    stream.add_symbols(["BBBUSDT"])
+    assert "bbbusdt@kline_5m" in stream.streams()
+    stream.remove_symbols(["AAAUSDT"])
+    assert stream.symbols == ["BBBUSDT"]
+    assert stream.closes("AAAUSDT", "5m") == []